@@ -17,6 +17,9 @@ from os import path
 from .plugin.utils import tools
 from .plugin.view_config import view_config_manager
 from .plugin import flags_sources
+from .plugin.completion import completion_index
+from .plugin.completion import lib_complete
+from .plugin.completion import pch_manager
 from .plugin.utils import thread_pool
 from .plugin.utils import thread_job
 from .plugin.utils import progress_status
@@ -25,6 +28,9 @@ from .plugin.utils import action_request
 from .plugin.utils import module_reloader
 from .plugin.utils import singleton
 from .plugin.utils import include_parser
+from .plugin.utils import instrumentation
+from .plugin.utils import output_panel_handler
+from .plugin.utils import prefetcher
 from .plugin.utils import file
 from .plugin.settings import settings_manager
 from .plugin.settings import settings_storage
@@ -54,7 +60,13 @@ ThreadPool = thread_pool.ThreadPool
 ThreadJob = thread_job.ThreadJob
 ErrorQuickPanelHandler = quick_panel_handler.ErrorQuickPanelHandler
 IncludeCompleter = include_parser.IncludeCompleter
+Instrumentation = instrumentation.Instrumentation
+OutputPanelHandler = output_panel_handler.OutputPanelHandler
+Prefetcher = prefetcher.Prefetcher
 ActionRequest = action_request.ActionRequest
+CompletionIndex = completion_index.CompletionIndex
+LibCompleter = lib_complete.Completer
+PchManager = pch_manager.PchManager
 ZeroIndexedRowCol = row_col.ZeroIndexedRowCol
 Bazel = bazel.Bazel
 
@@ -134,7 +146,10 @@ class EccGotoDeclarationCommand(sublime_plugin.TextCommand):
         config_manager = EasyClangComplete.view_config_manager
         if not config_manager:
             return
-        location = config_manager.trigger_get_declaration_location(self.view)
+        settings = EasyClangComplete.settings_manager.settings_for_view(
+            self.view)
+        location = config_manager.trigger_get_declaration_location(
+            self.view, settings)
         if location:
             loc = location.file.name
             loc += ":" + str(location.line)
@@ -239,6 +254,62 @@ class EccShowPopupInfoCommand(sublime_plugin.TextCommand):
         EasyClangComplete.begin_show_info_job(self.view, position)
 
 
+class EccTogglePinViewCommand(sublime_plugin.TextCommand):
+    """Command that keeps the config of current view from being removed."""
+
+    def run(self, edit):
+        """Run toggle pin view command."""
+        if not SublBridge.is_valid_view(self.view):
+            return
+        config_manager = EasyClangComplete.view_config_manager
+        v_id = self.view.buffer_id()
+        pinned = not config_manager.is_pinned(v_id)
+        config_manager.set_pinned(v_id, pinned)
+        if pinned:
+            sublime.status_message("ECC: translation unit kept in memory")
+        else:
+            sublime.status_message("ECC: translation unit can be removed")
+
+
+class EccShowTimingsCommand(sublime_plugin.TextCommand):
+    """Command that shows how long every stage of the plugin takes."""
+
+    def run(self, edit):
+        """Run show timings command."""
+        OutputPanelHandler.show(
+            Instrumentation.report() + "\n\n" +
+            EasyClangComplete.thread_pool.cancellation_report())
+
+
+class EccExportTraceCommand(sublime_plugin.TextCommand):
+    """Command that exports timings of the plugin as a Chrome trace."""
+
+    def run(self, edit):
+        """Run export trace command.
+
+        Asks for the file to write, which defaults to the temp folder.
+        """
+        window = self.view.window()
+        if not window:
+            return
+        default_file_name = path.join(
+            File.get_temp_dir(), "ecc_trace.json")
+        window.show_input_panel("ECC: export trace to:", default_file_name,
+                                EccExportTraceCommand.export, None, None)
+
+    @staticmethod
+    def export(file_name):
+        """Write the trace to a file and tell the user about it."""
+        try:
+            num_spans = Instrumentation.export_chrome_trace(file_name)
+        except OSError as e:
+            log.error("cannot export trace to '%s': %s", file_name, e)
+            sublime.status_message("ECC: cannot export trace")
+            return
+        sublime.status_message("ECC: exported {} spans to '{}'".format(
+            num_spans, file_name))
+
+
 class EasyClangComplete(sublime_plugin.EventListener):
     """Base class for this plugin.
 
@@ -260,6 +331,8 @@ class EasyClangComplete(sublime_plugin.EventListener):
 
         # init instance variables to reasonable defaults
         self.current_completions = None
+        # Text typed after the trigger when completions were requested.
+        self.completions_prefix = None
         self.loaded = False
 
     def on_plugin_unloaded(self):
@@ -279,6 +352,7 @@ class EasyClangComplete(sublime_plugin.EventListener):
         self.on_settings_changed()
         # init view config manager
         EasyClangComplete.view_config_manager = ViewConfigManager()
+        LibCompleter.thread_pool = EasyClangComplete.thread_pool
 
         # As the plugin has just loaded, we might have missed an activation
         # event for the active view so completion will not work for it until
@@ -315,6 +389,8 @@ class EasyClangComplete(sublime_plugin.EventListener):
         else:
             progress_style = NoneSublimeProgressStatus()
         EasyClangComplete.thread_pool.progress_status = progress_style
+        EasyClangComplete.thread_pool.max_workers = \
+            user_settings.max_worker_threads
 
     def on_activated_async(self, view):
         """Call upon activating a view. Execution in a worker thread.
@@ -349,9 +425,78 @@ class EasyClangComplete(sublime_plugin.EventListener):
             name=ThreadJob.UPDATE_TAG,
             callback=EasyClangComplete.config_updated,
             function=EasyClangComplete.view_config_manager.load_for_view,
-            args=[view, settings])
+            args=[view, settings],
+            lane=view.buffer_id())
+        EasyClangComplete.thread_pool.new_job(job)
+        EasyClangComplete.begin_index_job(view, settings)
+        EasyClangComplete.prefetch_views(view, settings)
+
+    @staticmethod
+    def begin_index_job(view, settings):
+        """Index symbols of a view in background once it is parsed.
+
+        Args:
+            view (sublime.View): view to index
+            settings (SettingsStorage): settings for this view
+        """
+        if not settings.use_symbol_index:
+            return
+        job = ThreadJob(
+            name=ThreadJob.INDEX_TAG,
+            callback=EasyClangComplete.symbols_indexed,
+            function=EasyClangComplete.view_config_manager.index_symbols,
+            args=[view, settings],
+            lane=view.buffer_id())
         EasyClangComplete.thread_pool.new_job(job)
 
+    @staticmethod
+    def prefetch_views(active_view, settings):
+        """Parse other open views in background before they are activated.
+
+        Args:
+            active_view (sublime.View): current view
+            settings (SettingsStorage): settings for current view
+        """
+        window = active_view.window()
+        if not window or settings.max_prefetched_views < 1:
+            return
+        config_manager = EasyClangComplete.view_config_manager
+        candidates = {}
+        open_files = []
+        for view in window.views():
+            if not SublBridge.is_valid_view(view):
+                continue
+            if view.buffer_id() == active_view.buffer_id():
+                continue
+            # Checking must not touch the config, as its age decides when
+            # it is removed.
+            if config_manager.in_cache(view.buffer_id()):
+                continue
+            view_settings = \
+                EasyClangComplete.settings_manager.settings_for_view(view)
+            if not SublBridge.has_valid_syntax(view, view_settings):
+                continue
+            if File.is_ignored(view.file_name(), view_settings.ignore_list):
+                continue
+            candidates[view.file_name()] = (view, view_settings)
+            open_files.append(view.file_name())
+        files_to_prefetch = Prefetcher.pick_files(
+            active_file=active_view.file_name(),
+            open_files=open_files,
+            header_to_source_mapping=settings.header_to_source_mapping,
+            max_files=settings.max_prefetched_views)
+        for file_name in files_to_prefetch:
+            view, view_settings = candidates[file_name]
+            log.debug("prefetching view %s", view.buffer_id())
+            job = ThreadJob(
+                name=ThreadJob.PREFETCH_TAG,
+                callback=EasyClangComplete.config_updated,
+                function=config_manager.load_for_view,
+                args=[view, view_settings],
+                lane=view.buffer_id())
+            EasyClangComplete.thread_pool.new_job(job)
+            EasyClangComplete.begin_index_job(view, view_settings)
+
     def on_selection_modified_async(self, view):
         """Call when selection is modified. Executed in gui thread.
 
@@ -413,12 +558,16 @@ class EasyClangComplete(sublime_plugin.EventListener):
         if File.is_ignored(view.file_name(), settings.ignore_list):
             return
         log.debug("saving view: %s", view.buffer_id())
+        # A saved header might outdate shared precompiled headers.
+        PchManager.get().file_saved()
         job = ThreadJob(
             name=ThreadJob.UPDATE_TAG,
             callback=EasyClangComplete.config_updated,
             function=EasyClangComplete.view_config_manager.load_for_view,
-            args=[view, settings])
+            args=[view, settings],
+            lane=view.buffer_id())
         EasyClangComplete.thread_pool.new_job(job)
+        EasyClangComplete.begin_index_job(view, settings)
         # invalidate current completions
         self.current_completions = None
 
@@ -440,12 +589,17 @@ class EasyClangComplete(sublime_plugin.EventListener):
         # Now we know that the view is valid and we need to clear it.
         log.debug("closing view %s", view.buffer_id())
         EasyClangComplete.settings_manager.clear_for_view(view)
+        view_config = EasyClangComplete.view_config_manager.get_from_cache(
+            view)
+        if view_config and view_config.completer:
+            view_config.completer.error_vis.erase_regions(view)
         file_id = view.buffer_id()
         job = ThreadJob(
             name=ThreadJob.CLEAR_TAG,
             callback=EasyClangComplete.config_removed,
             function=EasyClangComplete.view_config_manager.clear_for_view,
-            args=[file_id])
+            args=[file_id],
+            lane=file_id)
         EasyClangComplete.thread_pool.new_job(job)
 
     @staticmethod
@@ -474,6 +628,20 @@ class EasyClangComplete(sublime_plugin.EventListener):
         else:
             log.debug("could not update config -> cancelled")
 
+    @staticmethod
+    def symbols_indexed(future):
+        """Call this callback when symbols of a view have been indexed.
+
+        Args:
+            future (concurrent.Future): future telling if the view was indexed
+        """
+        if future.cancelled():
+            log.debug("could not index symbols -> cancelled")
+        elif future.exception():
+            log.error("cannot index symbols: %s", future.exception())
+        else:
+            log.debug("indexed symbols: %s", future.result())
+
     @staticmethod
     def on_open_declaration(location):
         """Call this callback when link to type is clicked in info popup.
@@ -494,6 +662,9 @@ class EasyClangComplete(sublime_plugin.EventListener):
             return
         if future.cancelled():
             return
+        if not future.result():
+            # The job was stopped as a newer one made it outdated.
+            return
         (tooltip_request, current_popup) = future.result()
         if not tooltip_request:
             return
@@ -506,6 +677,22 @@ class EasyClangComplete(sublime_plugin.EventListener):
                            location=tooltip_request.get_trigger_position(),
                            on_navigate=EasyClangComplete.on_open_declaration)
 
+    def start_completion_job(self, view, completion_request):
+        """Submit an async completion job.
+
+        Args:
+            view (sublime.View): current view
+            completion_request (ActionRequest): position to complete at
+        """
+        config_manager = EasyClangComplete.view_config_manager
+        job = ThreadJob(
+            name=ThreadJob.COMPLETE_TAG,
+            callback=self.completion_finished,
+            function=config_manager.trigger_completion,
+            args=[view, completion_request],
+            lane=view.buffer_id())
+        EasyClangComplete.thread_pool.new_job(job)
+
     def completion_finished(self, future):
         """Call this callback when completion async function has returned.
 
@@ -519,6 +706,9 @@ class EasyClangComplete(sublime_plugin.EventListener):
             return
         if future.cancelled():
             return
+        if not future.result():
+            # The job was stopped as a newer one made it outdated.
+            return
         (completion_request, completions) = future.result()
         if not completion_request:
             return
@@ -527,7 +717,12 @@ class EasyClangComplete(sublime_plugin.EventListener):
             return
         active_view = sublime.active_window().active_view()
         if completion_request.is_suitable_for_view(active_view):
-            self.current_completions = completions
+            # Index the completions here, in the worker thread, so that the
+            # popup can be refined quickly while typing.
+            settings = EasyClangComplete.settings_manager.settings_for_view(
+                active_view)
+            self.current_completions = CompletionIndex(
+                completions, settings.max_completions_shown)
         else:
             log.debug("ignoring completions")
             self.current_completions = []
@@ -570,7 +765,8 @@ class EasyClangComplete(sublime_plugin.EventListener):
             name=ThreadJob.INFO_TAG,
             callback=EasyClangComplete.info_finished,
             function=EasyClangComplete.view_config_manager.trigger_info,
-            args=[view, tooltip_request, settings])
+            args=[view, tooltip_request, settings],
+            lane=view.buffer_id())
         EasyClangComplete.thread_pool.new_job(job)
 
     def on_query_completions(self, view, prefix, locations):
@@ -611,9 +807,21 @@ class EasyClangComplete(sublime_plugin.EventListener):
         current_job_id = EasyClangComplete.current_job_id
         if self.current_completions and current_pos_id == current_job_id:
             log.debug("returning existing completions")
+            completions = self.current_completions.top(
+                prefix, settings.max_completions_shown)
+            if prefix != self.completions_prefix and \
+                    self.current_completions.misses_matches(
+                        completions, settings.max_completions_shown):
+                # The completer stopped at the limit, so it has to search
+                # the rest of the results for the typed prefix.
+                log.debug("refining completions with prefix: '%s'", prefix)
+                self.completions_prefix = prefix
+                self.start_completion_job(view, completion_request)
+            # Sublime Text only filters the completions shown so far, so it
+            # has to ask again for a longer prefix if they were cut.
             return SublBridge.format_completions(
-                self.current_completions,
-                settings.hide_default_completions)
+                completions, settings.hide_default_completions,
+                is_cut=self.current_completions.is_cut)
 
         # Verify that character under the cursor is one allowed trigger
         if pos_status == PosStatus.WRONG_TRIGGER:
@@ -635,14 +843,8 @@ class EasyClangComplete(sublime_plugin.EventListener):
                   EasyClangComplete.current_job_id)
 
         if pos_status == PosStatus.COMPLETION_NEEDED:
-            # submit async completion job
-            config_manager = EasyClangComplete.view_config_manager
-            job = ThreadJob(
-                name=ThreadJob.COMPLETE_TAG,
-                callback=self.completion_finished,
-                function=config_manager.trigger_completion,
-                args=[view, completion_request])
-            EasyClangComplete.thread_pool.new_job(job)
+            self.completions_prefix = prefix
+            self.start_completion_job(view, completion_request)
 
         # show default completions for now if allowed
         if settings.hide_default_completions:
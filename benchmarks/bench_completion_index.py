@@ -0,0 +1,94 @@
+"""Benchmark ranking of completions on a synthetic namespace.
+
+Runs without Sublime Text:
+    python3 benchmarks/bench_completion_index.py [num_symbols]
+"""
+import random
+import sys
+import time
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(
+    __file__))), "plugin", "completion"))
+
+from completion_index import CompletionIndex  # noqa: E402
+
+WORDS = ["get", "set", "file", "name", "size", "buffer", "read", "write",
+         "open", "close", "stream", "value", "index", "node", "tree", "make",
+         "create", "destroy", "update", "parse", "token", "string", "count",
+         "begin", "end", "find", "insert", "erase", "clear", "reset"]
+
+PREFIXES = ["g", "ge", "get", "gfn", "file", "bufsz", "ptok", "xyz",
+            "make_", "update_node_v"]
+
+
+def synthetic_completions(num_symbols, seed=42):
+    """Generate completions in the format produced by the completers.
+
+    Args:
+        num_symbols (int): number of completions to generate
+        seed (int): seed for the random generator
+
+    Returns:
+        list: completions as pairs [trigger, contents]
+    """
+    rand = random.Random(seed)
+    completions = []
+    for number in range(num_symbols):
+        words = rand.sample(WORDS, rand.randint(1, 4))
+        if number % 2:
+            trigger = words[0] + ''.join(w.title() for w in words[1:])
+        else:
+            trigger = '_'.join(words)
+        trigger += "_v{}".format(number)
+        completions.append([trigger + "\tvoid " + trigger + "(int a)",
+                            trigger + "(${1:int a})"])
+    return completions
+
+
+def linear_filter(completions, prefix, limit):
+    """Filter completions with a full scan to compare against."""
+    prefix = prefix.lower()
+    picked = []
+    for completion in completions:
+        if CompletionIndex.is_subsequence(
+                prefix, completion[0].split('\t', 1)[0].lower()):
+            picked.append(completion)
+            if len(picked) >= limit:
+                break
+    return picked
+
+
+def measure(function, repeats):
+    """Get the median and the worst time of a function in milliseconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2], times[-1]
+
+
+def main(argv):
+    """Run the benchmark and print the results."""
+    num_symbols = int(argv[1]) if len(argv) > 1 else 50000
+    limit = 500
+    completions = synthetic_completions(num_symbols)
+    start = time.perf_counter()
+    index = CompletionIndex(completions)
+    print("indexed {} completions in {:.1f} ms".format(
+        num_symbols, (time.perf_counter() - start) * 1000))
+    print("{:>16} {:>8} {:>12} {:>12} {:>12}".format(
+        "prefix", "found", "index ms", "worst ms", "scan ms"))
+    for prefix in PREFIXES:
+        found = len(index.top(prefix, limit))
+        median, worst = measure(lambda: index.top(prefix, limit), 50)
+        scan, _ = measure(
+            lambda: linear_filter(completions, prefix, limit), 5)
+        print("{:>16} {:>8} {:>12.3f} {:>12.3f} {:>12.3f}".format(
+            prefix, found, median, worst, scan))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
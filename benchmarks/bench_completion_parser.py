@@ -0,0 +1,167 @@
+"""Benchmark parsing completions printed by the clang binary.
+
+Compares the single pass parser of the bin completer with the regex based
+parser it replaced on a generated completion dump:
+    python3 benchmarks/bench_completion_parser.py --lines 30000
+
+The dump is also read from a running process to compare reading the whole
+output before parsing it with parsing it while it is printed.
+"""
+import argparse
+import re
+import shutil
+import sys
+import tempfile
+from os import path
+
+import headless
+
+from EasyClangComplete.plugin.completion.bin_complete import Completer
+from EasyClangComplete.plugin.utils.tools import Tools
+
+COMPLETION_TEMPLATES = [
+    "COMPLETION: {name} : [#int#]{name}",
+    "COMPLETION: {name} : [#void#]{name}(<#int value#>)",
+    "COMPLETION: {name} : [#bool#]{name}(<#const std::string &text#>{#, "
+    "<#size_t pos#>{#, <#size_t count#>#}#})",
+    "COMPLETION: {name} : [#std::vector<int>#]{name}(<#T first#>, "
+    "<#T last#>)",
+    "COMPLETION: {name} : {name}::",
+    "COMPLETION: {name} : [#Widget &#]{name}(<#const Widget &#>)",
+    "COMPLETION: {name} : [#NSInteger *#]{name}:<#(BOOL)#> "
+    "strParam:<#(NSString *)#>",
+]
+
+
+def regex_parse_completions(complete_results):
+    """Parse completions like the bin completer did before."""
+    compl_regex = re.compile(
+        r"COMPLETION:\s(?P<name>.*)\s:\s(?P<content>.*)")
+    compl_content_regex = re.compile(
+        r"\<#{group_params}#\>|\[#{group_types}#\]".format(
+            group_params=Completer.group_params,
+            group_types=Completer.group_types))
+    opts_regex = re.compile("{#|#}")
+
+    class Parser:
+        """Count place holders of a single completion."""
+
+        def __init__(self):
+            """Start without place holders."""
+            self.place_holders = 0
+
+        def tokenize_params(self, match):
+            """Turn a parameter into a snippet field."""
+            dict_match = match.groupdict()
+            if dict_match[Completer.PARAM_TAG]:
+                self.place_holders += 1
+                return "${{{count}:{text}}}".format(
+                    count=self.place_holders,
+                    text=dict_match[Completer.PARAM_TAG])
+            return ''
+
+        @staticmethod
+        def make_pretty(match):
+            """Show a parameter or a type in the hint."""
+            dict_match = match.groupdict()
+            if dict_match[Completer.PARAM_TAG]:
+                return dict_match[Completer.PARAM_TAG]
+            if dict_match[Completer.TYPE_TAG]:
+                return dict_match[Completer.TYPE_TAG] + ' '
+            return ''
+
+    completions = []
+    for completion in complete_results:
+        pos_search = compl_regex.search(completion)
+        if not pos_search:
+            continue
+        comp_dict = pos_search.groupdict()
+        trigger = comp_dict['name']
+        parser = Parser()
+        comp_dict['content'] = re.sub(opts_regex, '', comp_dict['content'])
+        contents = re.sub(compl_content_regex, parser.tokenize_params,
+                          comp_dict['content'])
+        hint = re.sub(compl_content_regex, Parser.make_pretty,
+                      comp_dict['content'])
+        completions.append([trigger + "\t" + hint, contents])
+    return completions
+
+
+def make_dump(num_lines):
+    """Generate the output of clang with the given number of completions."""
+    lines = []
+    for index in range(num_lines):
+        template = COMPLETION_TEMPLATES[index % len(COMPLETION_TEMPLATES)]
+        lines.append(template.replace("{name}", "symbol_{}".format(index)))
+    return "\n".join(lines) + "\n"
+
+
+def main(argv):
+    """Run the benchmarks and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=30000,
+                        help="number of completions in the dump")
+    parser.add_argument("--limit", type=int, default=500,
+                        help="number of completions to stop reading at")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="how often to parse the dump")
+    args = parser.parse_args(argv[1:])
+
+    dump = make_dump(args.lines)
+    lines = dump.splitlines()
+    expected = regex_parse_completions(lines)
+    if Completer._parse_completions(lines) != expected:
+        print("single pass parser differs from the regex parser")
+        return 1
+
+    results = {}
+    repeats = list(range(args.repeats))
+    results["regex parser"] = headless.measure(
+        lambda _: regex_parse_completions(lines), repeats)
+    results["single pass parser"] = headless.measure(
+        lambda _: Completer._parse_completions(lines), repeats)
+    results["single pass parser, first {}".format(args.limit)] = \
+        headless.measure(
+            lambda _: Completer._parse_completions(lines, args.limit),
+            repeats)
+
+    cat_binary = shutil.which("cat")
+    if cat_binary:
+        folder = tempfile.mkdtemp(prefix="ecc_bench_")
+        try:
+            dump_file = path.join(folder, "completions.txt")
+            with open(dump_file, 'w') as output:
+                output.write(dump)
+            command = [cat_binary, dump_file]
+
+            def read_then_parse(_):
+                output_text = Tools.run_command(command)
+                regex_parse_completions(output_text.splitlines())
+
+            def stream(limit):
+                output_lines = Tools.iter_command_lines(command)
+                try:
+                    Completer._parse_completions(output_lines, limit)
+                finally:
+                    output_lines.close()
+            results["process: read all, regex parser"] = headless.measure(
+                read_then_parse, repeats)
+            results["process: streamed"] = headless.measure(
+                lambda _: stream(0), repeats)
+            results["process: streamed, first {}".format(args.limit)] = \
+                headless.measure(lambda _: stream(args.limit), repeats)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    row = "{:<45}{:>7}{:>10}{:>10}"
+    print("{} completions".format(args.lines))
+    print(row.format("benchmark", "count", "p50 ms", "max ms"))
+    for name, stats in results.items():
+        print(row.format(name, stats['count'],
+                         "{:.2f}".format(stats['p50_ms']),
+                         "{:.2f}".format(stats['max_ms'])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
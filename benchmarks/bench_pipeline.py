@@ -0,0 +1,209 @@
+"""Benchmark the plugin pipeline headlessly on a generated project.
+
+Runs without Sublime Text, see headless.py:
+    python3 benchmarks/bench_pipeline.py --files 50 --json new.json
+    python3 benchmarks/bench_pipeline.py --files 50 --compare new.json
+
+Completions and info popups need clang or libclang to be installed, the
+benchmarks that need them are skipped otherwise.
+"""
+import argparse
+import json
+import logging
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from os import path
+
+import headless
+
+from EasyClangComplete.plugin.flags_sources.compilation_db import \
+    CompilationDb
+from EasyClangComplete.plugin.flags_sources.flags_file import FlagsFile
+from EasyClangComplete.plugin.settings.settings_manager import \
+    SettingsManager
+from EasyClangComplete.plugin.utils.action_request import ActionRequest
+from EasyClangComplete.plugin.utils.instrumentation import Instrumentation
+from EasyClangComplete.plugin.utils.search_scope import TreeSearchScope
+from EasyClangComplete.plugin.utils.singleton import GenericCache
+from EasyClangComplete.plugin.utils.singleton import ThreadCache
+from EasyClangComplete.plugin.view_config.view_config_manager import \
+    ViewConfigManager
+
+INCLUDE_PREFIXES = ["-I", "-isystem"]
+
+
+def git_revision():
+    """Get the current commit to tell apart results of different commits."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=headless.PACKAGE_ROOT,
+            stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def bench_flags(project, results, repeats):
+    """Measure generating flags from the flags sources."""
+    search_scope = TreeSearchScope(from_folder=project.folder,
+                                   to_folder=project.folder)
+    sources = {
+        "compile_commands.json": CompilationDb(
+            INCLUDE_PREFIXES, header_to_source_map=[],
+            lazy_flag_parsing=False),
+        ".clang_complete": FlagsFile(INCLUDE_PREFIXES),
+    }
+    for name, flags_source in sorted(sources.items()):
+        def cold(file_name):
+            GenericCache.clear_all_caches()
+            flags_source.get_flags(file_name, search_scope)
+        results["flags {} cold".format(name)] = headless.measure(
+            cold, project.sources)
+        results["flags {} warm".format(name)] = headless.measure(
+            lambda file_name: flags_source.get_flags(file_name, search_scope),
+            project.sources, repeats)
+    GenericCache.clear_all_caches()
+
+
+def bench_views(project, results, args):
+    """Measure loading configs of the views and using them."""
+    settings_manager = SettingsManager()
+    clang_binary = args.clang_binary or \
+        settings_manager.user_settings().clang_binary
+    if not shutil.which(clang_binary):
+        # The settings ask clang for its version, so nothing works without.
+        print("skipping views: clang binary '{}' not found".format(
+            clang_binary))
+        return
+    views = project.open_views()
+
+    def load_settings(view):
+        settings = settings_manager.settings_for_view(view)
+        settings.use_libclang = args.use_libclang
+        if args.clang_binary:
+            settings.clang_binary = args.clang_binary
+        settings.libclang_worker_processes = 0
+        return settings
+
+    results["settings for view"] = headless.measure(load_settings, views)
+    settings = {view.buffer_id(): load_settings(view) for view in views}
+
+    manager = ViewConfigManager()
+    try:
+        results["load_for_view cold"] = headless.measure(
+            lambda view: manager.load_for_view(
+                view, settings[view.buffer_id()]), views)
+        results["load_for_view warm"] = headless.measure(
+            lambda view: manager.load_for_view(
+                view, settings[view.buffer_id()]), views, args.repeats)
+        completer = manager.get_from_cache(views[0]).completer
+        print("completer: {}".format(completer.name))
+
+        def complete(view):
+            request = ActionRequest(
+                view, headless.Project.completion_position(view))
+            manager.trigger_completion(view, request)
+        results["trigger_completion"] = headless.measure(
+            complete, views, args.repeats)
+        if completer.name == "bin":
+            print("skipping info: not supported by the clang binary")
+            return
+
+        def info(view):
+            request = ActionRequest(
+                view, headless.Project.completion_position(view) - 2)
+            manager.trigger_info(view, request, settings[view.buffer_id()])
+        results["trigger_info"] = headless.measure(
+            info, views, args.repeats)
+    finally:
+        for view in views:
+            manager.clear_for_view(view.buffer_id())
+        # Stop the timer that removes old configs, so that we can exit.
+        timer = ThreadCache().pop(ViewConfigManager.TAG, None)
+        if timer:
+            timer.cancel()
+
+
+def print_results(results, baseline=None):
+    """Print a table of results, compared to a baseline if given."""
+    row = "{:<40}{:>7}{:>12}{:>10}{:>10}{:>10}{:>10}"
+    print(row.format("benchmark", "count", "ops/s", "p50 ms", "p95 ms",
+                     "max ms", "vs base"))
+    for name, stats in results.items():
+        change = ""
+        if baseline and name in baseline['results']:
+            old_p50 = baseline['results'][name]['p50_ms']
+            if old_p50 > 0:
+                change = "{:+.0%}".format(stats['p50_ms'] / old_p50 - 1)
+        print(row.format(name, stats['count'],
+                         "{:.1f}".format(stats['ops_per_sec']),
+                         "{:.2f}".format(stats['p50_ms']),
+                         "{:.2f}".format(stats['p95_ms']),
+                         "{:.2f}".format(stats['max_ms']), change))
+
+
+def main(argv):
+    """Run the benchmarks and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20,
+                        help="number of source files in the project")
+    parser.add_argument("--includes", type=int, default=5,
+                        help="number of headers included by every source")
+    parser.add_argument("--symbols", type=int, default=20,
+                        help="number of symbols in every file")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="how often to repeat the warm benchmarks")
+    parser.add_argument("--use-libclang", action="store_true",
+                        help="complete with libclang instead of clang")
+    parser.add_argument("--clang-binary", default=None,
+                        help="clang binary to use instead of the default")
+    parser.add_argument("--json", default=None,
+                        help="store the results in this file")
+    parser.add_argument("--compare", default=None,
+                        help="compare to results stored with --json")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show the log of the plugin")
+    args = parser.parse_args(argv[1:])
+
+    log = logging.getLogger("ECC")
+    log.addHandler(logging.StreamHandler())
+    log.setLevel(logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    folder = tempfile.mkdtemp(prefix="ecc_bench_")
+    try:
+        project = headless.Project(folder, args.files, args.includes,
+                                   args.symbols)
+        results = {}
+        bench_flags(project, results, args.repeats)
+        bench_views(project, results, args)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print("comparing to {}".format(baseline['meta']['revision']))
+    print_results(results, baseline)
+    print()
+    print(Instrumentation.report())
+    if args.json:
+        meta = {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'files': args.files,
+            'includes': args.includes,
+            'symbols': args.symbols,
+            'use_libclang': args.use_libclang,
+        }
+        with open(args.json, 'w') as json_file:
+            json.dump({'meta': meta, 'results': results}, json_file,
+                      indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
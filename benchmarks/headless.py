@@ -0,0 +1,208 @@
+"""Run the plugin without Sublime Text on generated projects.
+
+Importing this module puts the stand-ins from the sublime_stub folder on the
+path and makes the repository importable as the EasyClangComplete package, so
+that the plugin code can be imported as usual:
+
+    import headless
+    from EasyClangComplete.plugin.settings import settings_manager
+"""
+import json
+import math
+import sys
+import time
+import types
+from os import makedirs
+from os import path
+
+BENCHMARKS_DIR = path.dirname(path.abspath(__file__))
+PACKAGE_ROOT = path.dirname(BENCHMARKS_DIR)
+PACKAGE_NAME = "EasyClangComplete"
+
+# Real modules, e.g. mdpopups, win over the stand-ins if they are installed.
+sys.path.append(path.join(BENCHMARKS_DIR, "sublime_stub"))
+
+if PACKAGE_NAME not in sys.modules:
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PACKAGE_ROOT]
+    sys.modules[PACKAGE_NAME] = package
+
+import sublime  # noqa: E402
+
+HEADER_TEMPLATE = """#pragma once
+#include <cstddef>
+
+namespace gen {{
+struct Widget{index} {{
+{members}
+}};
+{functions}
+}}  // namespace gen
+"""
+
+SOURCE_TEMPLATE = """{includes}
+
+namespace gen {{
+{functions}
+}}  // namespace gen
+
+void use_widgets() {{
+  gen::Widget{widget} widget;
+  widget.{completion_marker}
+}}
+"""
+
+COMPLETION_MARKER = "/*complete here*/"
+
+
+class Project:
+    """A generated C++ project along with files to read its flags from.
+
+    Both a compile_commands.json and a .clang_complete file are written.
+
+    Every source file includes a number of headers, each of which declares a
+    struct with fields and methods and a number of free functions. The last
+    function of every source file stops after a member access, which is
+    where completions are requested.
+
+    Attributes:
+        folder (str): root folder of the project.
+        sources (str[]): full paths to the generated source files.
+        headers (str[]): full paths to the generated header files.
+    """
+
+    def __init__(self, folder, num_files, num_includes=5, num_symbols=20):
+        """Generate the project.
+
+        Args:
+            folder (str): empty folder to generate the project in.
+            num_files (int): number of source files, there are as many
+                headers as source files.
+            num_includes (int): number of headers included by every source.
+            num_symbols (int): number of members and functions per header.
+        """
+        self.folder = folder
+        self.sources = []
+        self.headers = []
+        include_dir = path.join(folder, "include")
+        source_dir = path.join(folder, "src")
+        for directory in [include_dir, source_dir]:
+            if not path.exists(directory):
+                makedirs(directory)
+        for index in range(num_files):
+            header = path.join(include_dir, "widget_{}.h".format(index))
+            Project.__write(header, HEADER_TEMPLATE.format(
+                index=index,
+                members="\n".join(
+                    "  int field_{0};\n  int get_field_{0}() const;".format(
+                        member) for member in range(num_symbols)),
+                functions="\n".join(
+                    "int widget_{}_function_{}(int value);".format(
+                        index, function) for function in range(num_symbols))))
+            self.headers.append(header)
+        for index in range(num_files):
+            included = [(index + offset) % num_files
+                        for offset in range(min(num_includes, num_files))]
+            source = path.join(source_dir, "file_{}.cpp".format(index))
+            Project.__write(source, SOURCE_TEMPLATE.format(
+                includes="\n".join('#include "widget_{}.h"'.format(header)
+                                   for header in included),
+                functions="\n".join(
+                    "int file_{0}_function_{1}(int value) {{ return value + "
+                    "{1}; }}".format(index, function)
+                    for function in range(num_symbols)),
+                widget=included[-1],
+                completion_marker=COMPLETION_MARKER))
+            self.sources.append(source)
+        self.__write_compilation_db()
+        self.__write_clang_complete()
+
+    def __write_compilation_db(self):
+        """Write a compilation database with a command per source file."""
+        entries = []
+        for index, source in enumerate(self.sources):
+            entries.append({
+                'directory': self.folder,
+                'file': source,
+                'command': "clang++ -std=c++11 -Iinclude -DGEN_FILE={} "
+                           "-DGEN_PROJECT=1 -Wall -c {}".format(index, source),
+            })
+        with open(path.join(self.folder, "compile_commands.json"), 'w') as db:
+            json.dump(entries, db, indent=2)
+
+    def __write_clang_complete(self):
+        """Write a .clang_complete file shared by all source files."""
+        Project.__write(path.join(self.folder, ".clang_complete"),
+                        "-std=c++11\n-Iinclude\n-DGEN_PROJECT=1\n-Wall\n")
+
+    @staticmethod
+    def __write(file_name, text):
+        with open(file_name, 'w') as new_file:
+            new_file.write(text)
+
+    def open_views(self, files=None):
+        """Open files of the project in a fresh window.
+
+        Args:
+            files (str[]): files to open, all the sources by default.
+
+        Returns:
+            sublime.View[]: the opened views.
+        """
+        window = sublime.Window(self.folder)
+        sublime.set_active_window(window)
+        return [window.open_file(file_name)
+                for file_name in (files or self.sources)]
+
+    @staticmethod
+    def completion_position(view):
+        """Get the position right after the member access of a view."""
+        text = view.substr(sublime.Region(0, view.size()))
+        return text.index(COMPLETION_MARKER)
+
+
+def percentile(sorted_values, percent):
+    """Get a percentile of sorted values using the nearest rank."""
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize(durations):
+    """Summarize durations of single operations.
+
+    Args:
+        durations (float[]): durations in seconds.
+
+    Returns:
+        dict: count, throughput in operations per second and latencies in
+            milliseconds.
+    """
+    values = sorted(durations)
+    total = sum(values)
+    return {
+        'count': len(values),
+        'ops_per_sec': len(values) / total if total > 0 else float('inf'),
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'max_ms': values[-1] * 1000,
+    }
+
+
+def measure(function, items, repeats=1):
+    """Measure a function applied to every item.
+
+    Args:
+        function (callable): function that takes a single item.
+        items (list): items to apply the function to.
+        repeats (int): how many times to go over all the items.
+
+    Returns:
+        dict: summary of the durations, see summarize().
+    """
+    durations = []
+    for _ in range(repeats):
+        for item in items:
+            start = time.perf_counter()
+            function(item)
+            durations.append(time.perf_counter() - start)
+    return summarize(durations)
@@ -0,0 +1,16 @@
+"""A headless stand-in for mdpopups used by the benchmarks."""
+
+
+def show_popup(view, content, *args, **kwargs):
+    """Ignore popups."""
+    pass
+
+
+def hide_popup(view):
+    """Ignore popups."""
+    pass
+
+
+def md2html(view, markup, *args, **kwargs):
+    """Return the markdown unchanged."""
+    return markup
@@ -0,0 +1,467 @@
+"""A headless stand-in for the sublime module used by the benchmarks.
+
+Views are backed by strings and keep only what the plugin asks them for. All
+the functions that would show something to the user do nothing.
+"""
+import json
+import re
+from os import path
+
+INHIBIT_WORD_COMPLETIONS = 8
+INHIBIT_EXPLICIT_COMPLETIONS = 16
+DRAW_EMPTY = 1
+HIDE_ON_MOUSE_MOVE_AWAY = 2
+DRAW_NO_FILL = 32
+HIDDEN = 128
+DRAW_NO_OUTLINE = 256
+DRAW_SOLID_UNDERLINE = 512
+DRAW_STIPPLED_UNDERLINE = 1024
+DRAW_SQUIGGLY_UNDERLINE = 2048
+HOVER_TEXT = 1
+ENCODED_POSITION = 1
+MONOSPACE_FONT = 1
+
+PACKAGE_ROOT = path.dirname(path.dirname(path.dirname(path.abspath(
+    __file__))))
+
+SYNTAXES = {
+    '.c': "Packages/C++/C.sublime-syntax",
+    '.m': "Packages/Objective-C/Objective-C.sublime-syntax",
+    '.mm': "Packages/Objective-C/Objective-C++.sublime-syntax",
+}
+DEFAULT_SYNTAX = "Packages/C++/C++.sublime-syntax"
+VISIBLE_ROWS = 50
+
+
+class Region:
+    """A region between two points of a view."""
+
+    def __init__(self, a, b=None):
+        """Create a region, empty if only one point is given."""
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        """Get the smaller point."""
+        return min(self.a, self.b)
+
+    def end(self):
+        """Get the larger point."""
+        return max(self.a, self.b)
+
+    def size(self):
+        """Get the number of characters in the region."""
+        return self.end() - self.begin()
+
+    def empty(self):
+        """Check if the region has no characters."""
+        return self.a == self.b
+
+    def __eq__(self, other):
+        """Compare the points of two regions."""
+        return isinstance(other, Region) and \
+            (self.a, self.b) == (other.a, other.b)
+
+    def __hash__(self):
+        """Hash the points of the region."""
+        return hash((self.a, self.b))
+
+    def __repr__(self):
+        """Show the points of the region."""
+        return "Region({}, {})".format(self.a, self.b)
+
+
+class Settings:
+    """Settings backed by a dictionary."""
+
+    def __init__(self, values=None):
+        """Create settings with the given values."""
+        self.__values = dict(values or {})
+
+    def get(self, key, default=None):
+        """Get a value or the default if it is not set."""
+        return self.__values.get(key, default)
+
+    def set(self, key, value):
+        """Set a value."""
+        self.__values[key] = value
+
+    def has(self, key):
+        """Check if a value is set."""
+        return key in self.__values
+
+    def erase(self, key):
+        """Remove a value."""
+        self.__values.pop(key, None)
+
+    def add_on_change(self, tag, callback):
+        """Ignore the listener, the benchmarks change settings directly."""
+        pass
+
+    def clear_on_change(self, tag):
+        """Ignore the listener, the benchmarks change settings directly."""
+        pass
+
+
+class Selection(list):
+    """Cursors of a view as a list of regions."""
+
+    def add(self, region):
+        """Add a cursor."""
+        self.append(region)
+
+
+class View:
+    """A view backed by a string with the contents of a file."""
+
+    __next_buffer_id = 1
+
+    def __init__(self, file_name, window=None, text=None):
+        """Open a file in a view.
+
+        Args:
+            file_name (str): file shown in the view.
+            window (Window): window of the view.
+            text (str): contents of the view, read from the file if None.
+        """
+        if text is None:
+            with open(file_name) as opened_file:
+                text = opened_file.read()
+        self.__file_name = file_name
+        self.__window = window
+        self.__buffer_id = View.__next_buffer_id
+        View.__next_buffer_id += 1
+        self.__change_count = 0
+        self.__dirty = False
+        self.__regions = {}
+        self.__selection = Selection([Region(0)])
+        extension = path.splitext(file_name)[1]
+        self.__settings = Settings(
+            {'syntax': SYNTAXES.get(extension, DEFAULT_SYNTAX)})
+        self.__set_text(text)
+
+    def __set_text(self, text):
+        """Replace the text and remember where the lines start."""
+        self.__text = text
+        self.__line_starts = [0] + [match.end() for match in
+                                    re.finditer('\n', text)]
+
+    def replace_text(self, text):
+        """Replace the whole text as if the user edited it."""
+        self.__set_text(text)
+        self.__change_count += 1
+        self.__dirty = True
+
+    def buffer_id(self):
+        """Get the unique id of the buffer."""
+        return self.__buffer_id
+
+    def id(self):
+        """Get the unique id of the view."""
+        return self.__buffer_id
+
+    def file_name(self):
+        """Get the full path to the file."""
+        return self.__file_name
+
+    def window(self):
+        """Get the window of the view."""
+        return self.__window
+
+    def settings(self):
+        """Get the settings of the view."""
+        return self.__settings
+
+    def size(self):
+        """Get the number of characters."""
+        return len(self.__text)
+
+    def substr(self, region):
+        """Get the text in a region or the character at a point."""
+        if isinstance(region, Region):
+            return self.__text[region.begin():region.end()]
+        return self.__text[region:region + 1]
+
+    def rowcol(self, point):
+        """Convert a point to a zero based row and column."""
+        point = max(0, min(point, len(self.__text)))
+        row = 0
+        low, high = 0, len(self.__line_starts)
+        while low < high:
+            middle = (low + high) // 2
+            if self.__line_starts[middle] <= point:
+                row = middle
+                low = middle + 1
+            else:
+                high = middle
+        return row, point - self.__line_starts[row]
+
+    def text_point(self, row, col):
+        """Convert a zero based row and column to a point."""
+        row = max(0, min(row, len(self.__line_starts) - 1))
+        return min(self.__line_starts[row] + col, len(self.__text))
+
+    def line(self, point):
+        """Get the region of the line containing a point."""
+        if isinstance(point, Region):
+            point = point.begin()
+        row, _ = self.rowcol(point)
+        begin = self.__line_starts[row]
+        end = self.__text.find('\n', begin)
+        if end < 0:
+            end = len(self.__text)
+        return Region(begin, end)
+
+    def word(self, point):
+        """Get the region of the word around a point."""
+        if isinstance(point, Region):
+            point = point.begin()
+        begin = point
+        while begin > 0 and View.__is_word_char(self.__text[begin - 1]):
+            begin -= 1
+        end = point
+        while end < len(self.__text) and \
+                View.__is_word_char(self.__text[end]):
+            end += 1
+        return Region(begin, end)
+
+    @staticmethod
+    def __is_word_char(char):
+        return char.isalnum() or char == '_'
+
+    def visible_region(self):
+        """Get the region of the lines shown, i.e. the first screen."""
+        last_row = min(VISIBLE_ROWS, len(self.__line_starts)) - 1
+        return Region(0, self.line(self.__line_starts[last_row]).end())
+
+    def sel(self):
+        """Get the cursors."""
+        return self.__selection
+
+    def change_count(self):
+        """Get the number of changes made to the buffer."""
+        return self.__change_count
+
+    def is_dirty(self):
+        """Check if there are unsaved changes."""
+        return self.__dirty
+
+    def is_scratch(self):
+        """Report that the view is a normal view."""
+        return False
+
+    def is_loading(self):
+        """Report that the view is loaded, which happens immediately."""
+        return False
+
+    def add_regions(self, key, regions, *args, **kwargs):
+        """Store regions, e.g. of errors."""
+        self.__regions[key] = list(regions)
+
+    def get_regions(self, key):
+        """Get stored regions."""
+        return self.__regions.get(key, [])
+
+    def erase_regions(self, key):
+        """Remove stored regions."""
+        self.__regions.pop(key, None)
+
+    def set_status(self, key, value):
+        """Ignore status messages."""
+        pass
+
+    def erase_status(self, key):
+        """Ignore status messages."""
+        pass
+
+    def run_command(self, command, args=None):
+        """Ignore commands, e.g. showing the completion popup."""
+        pass
+
+    def show(self, *args, **kwargs):
+        """Ignore scrolling."""
+        pass
+
+    def hide_popup(self):
+        """Ignore popups."""
+        pass
+
+    def set_read_only(self, read_only):
+        """Ignore read only state."""
+        pass
+
+    def match_selector(self, point, selector):
+        """Match no scopes."""
+        return False
+
+    def scope_name(self, point):
+        """Report the scope of the whole file."""
+        return "source.c++ "
+
+
+class Window:
+    """A window holding views of a project folder."""
+
+    def __init__(self, folder=None):
+        """Create a window for a project folder."""
+        self.folder = folder
+        self.__views = []
+        self.__active_view = None
+
+    def open_file(self, file_name, flags=0):
+        """Open a file in a new view or return the view showing it."""
+        file_name = file_name.split(':')[0] if flags else file_name
+        for view in self.__views:
+            if view.file_name() == file_name:
+                self.__active_view = view
+                return view
+        view = View(file_name, window=self)
+        self.__views.append(view)
+        self.__active_view = view
+        return view
+
+    def views(self):
+        """Get all the open views."""
+        return list(self.__views)
+
+    def active_view(self):
+        """Get the view opened last."""
+        return self.__active_view
+
+    def folders(self):
+        """Get the project folders."""
+        return [self.folder] if self.folder else []
+
+    def project_data(self):
+        """Get project data with the project folders."""
+        return {'folders': [{'path': folder} for folder in self.folders()]}
+
+    def project_file_name(self):
+        """Report that there is no project file."""
+        return None
+
+    def extract_variables(self):
+        """Get variables used to expand settings."""
+        variables = {'packages': path.dirname(PACKAGE_ROOT),
+                     'platform': platform()}
+        if self.folder:
+            variables['folder'] = self.folder
+            variables['project_base_name'] = path.basename(self.folder)
+        view = self.__active_view
+        if view:
+            variables['file'] = view.file_name()
+            variables['file_path'] = path.dirname(view.file_name())
+            variables['file_name'] = path.basename(view.file_name())
+        return variables
+
+    def run_command(self, command, args=None):
+        """Ignore commands."""
+        pass
+
+    def active_panel(self):
+        """No panel is ever shown."""
+        return None
+
+    def create_output_panel(self, name):
+        """Create a view to print to."""
+        return View(name, window=self, text="")
+
+    def destroy_output_panel(self, name):
+        """Ignore panels."""
+        pass
+
+    def show_quick_panel(self, *args, **kwargs):
+        """Ignore quick panels."""
+        pass
+
+    def show_input_panel(self, *args, **kwargs):
+        """Ignore input panels."""
+        pass
+
+
+__active_window = Window()
+
+
+def active_window():
+    """Get the window used by the benchmarks."""
+    return __active_window
+
+
+def set_active_window(window):
+    """Replace the window used by the benchmarks."""
+    global __active_window
+    __active_window = window
+
+
+def load_settings(base_name):
+    """Load settings of this package, the user settings are ignored.
+
+    The package is named after its folder, which might not be called
+    EasyClangComplete in a checkout, so its settings are always loaded.
+    Sublime Text allows comments in settings files, so they are removed
+    before parsing them as json.
+    """
+    settings_path = path.join(PACKAGE_ROOT, base_name)
+    if not path.exists(settings_path):
+        settings_path = path.join(PACKAGE_ROOT,
+                                  "EasyClangComplete.sublime-settings")
+    with open(settings_path) as settings_file:
+        text = settings_file.read()
+    text = re.sub(r'^\s*//.*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r',(\s*[\]}])', r'\1', text)
+    return Settings(json.loads(text, strict=False))
+
+
+def load_resource(name):
+    """Load a file of this package by its resource name."""
+    prefix = "Packages/EasyClangComplete/"
+    if not name.startswith(prefix):
+        return ""
+    with open(path.join(PACKAGE_ROOT, name[len(prefix):])) as resource:
+        return resource.read()
+
+
+def expand_variables(value, variables):
+    """Expand ${name} variables in a string."""
+    return re.sub(r'\$\{(\w+)\}',
+                  lambda match: variables.get(match.group(1), ""), value)
+
+
+def platform():
+    """Get the platform like Sublime Text reports it."""
+    import sys
+    if sys.platform.startswith('win'):
+        return "windows"
+    if sys.platform == "darwin":
+        return "osx"
+    return "linux"
+
+
+def version():
+    """Pretend to be a recent Sublime Text 3."""
+    return "3211"
+
+
+def status_message(message):
+    """Ignore status messages."""
+    pass
+
+
+def error_message(message):
+    """Ignore error dialogs."""
+    pass
+
+
+def message_dialog(message):
+    """Ignore message dialogs."""
+    pass
+
+
+def set_timeout(callback, delay=0):
+    """Run the callback immediately."""
+    callback()
+
+
+def set_timeout_async(callback, delay=0):
+    """Run the callback immediately."""
+    callback()
@@ -0,0 +1,35 @@
+"""A headless stand-in for sublime_plugin used by the benchmarks."""
+
+
+class EventListener:
+    """Base class of event listeners."""
+    pass
+
+
+class ViewEventListener:
+    """Base class of event listeners bound to a view."""
+
+    def __init__(self, view):
+        """Bind the listener to a view."""
+        self.view = view
+
+
+class TextCommand:
+    """Base class of commands run in a view."""
+
+    def __init__(self, view):
+        """Bind the command to a view."""
+        self.view = view
+
+
+class WindowCommand:
+    """Base class of commands run in a window."""
+
+    def __init__(self, window):
+        """Bind the command to a window."""
+        self.window = window
+
+
+class ApplicationCommand:
+    """Base class of commands run by the application."""
+    pass
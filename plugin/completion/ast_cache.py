@@ -0,0 +1,186 @@
+"""Store translation units on disk to load them quickly after a restart.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import json
+import logging
+from os import listdir
+from os import path
+from os import remove
+from os import utime
+
+from ..utils.file import File
+from ..utils.tools import Tools
+
+log = logging.getLogger("ECC")
+
+
+class AstCache:
+    """Cache of serialized translation units.
+
+    Every entry consists of an AST file written by libclang and a small json
+    file with modification times of the parsed file and all the files it
+    includes. An entry is only valid if none of these files have changed.
+    Entries are keyed by the file path and a fingerprint of the flags and the
+    clang version used to parse it. Loading an entry marks it as used, so
+    that the least recently used entries are evicted first.
+
+    Attributes:
+        AST_EXT (str): extension of serialized translation units.
+        META_EXT (str): extension of files with modification times.
+        FOLDER_NAME (str): name of the cache folder within temp folder.
+    """
+    AST_EXT = ".ast"
+    META_EXT = ".json"
+    FOLDER_NAME = "ast_cache"
+
+    def __init__(self, file_name, flags, version_str):
+        """Initialize a cache entry for a file.
+
+        Args:
+            file_name (str): full path to the parsed file.
+            flags (str[]): flags used to parse the file.
+            version_str (str): version of clang.
+        """
+        self.file_name = file_name
+        key = Tools.get_unique_str(
+            "\n".join([file_name, version_str] + list(flags)))
+        folder = File.get_temp_dir(AstCache.FOLDER_NAME)
+        self.ast_file = path.join(folder, key + AstCache.AST_EXT)
+        self.meta_file = path.join(folder, key + AstCache.META_EXT)
+
+    def load(self, cindex, index):
+        """Load a translation unit if the cache entry is still valid.
+
+        Args:
+            cindex (module): cindex module to use.
+            index (cindex.Index): index to load the translation unit into.
+
+        Returns:
+            cindex.TranslationUnit: loaded translation unit or None.
+        """
+        if not self.is_up_to_date():
+            return None
+        try:
+            trans_unit = cindex.TranslationUnit.from_ast_file(
+                self.ast_file, index=index)
+        except Exception as e:
+            log.debug("cannot load ast file '%s': %s", self.ast_file, e)
+            self.remove()
+            return None
+        try:
+            utime(self.ast_file)
+        except OSError as e:
+            log.debug("cannot mark '%s' as used: %s", self.ast_file, e)
+        return trans_unit
+
+    def is_up_to_date(self):
+        """Check that the entry exists and none of its files has changed.
+
+        Returns:
+            bool: True if the entry can be used.
+        """
+        if not path.exists(self.ast_file) or not path.exists(self.meta_file):
+            return False
+        try:
+            with open(self.meta_file, 'r') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError) as e:
+            log.debug("cannot read ast cache entry '%s': %s",
+                      self.meta_file, e)
+            return False
+        if meta.get('file_name') != self.file_name:
+            return False
+        for file_name, mtime in meta.get('mtimes', {}).items():
+            if AstCache.__get_mtime(file_name) != mtime:
+                log.debug("'%s' changed, ast cache entry is outdated",
+                          file_name)
+                self.remove()
+                return False
+        return True
+
+    def store(self, tu):
+        """Store the translation unit on disk.
+
+        Args:
+            tu (cindex.TranslationUnit): translation unit parsed from the
+                contents of the file on disk.
+
+        Returns:
+            bool: True if stored successfully.
+        """
+        mtimes = {self.file_name: AstCache.__get_mtime(self.file_name)}
+        for include in tu.get_includes():
+            include_name = include.include.name
+            if include_name not in mtimes:
+                mtimes[include_name] = AstCache.__get_mtime(include_name)
+        try:
+            tu.save(self.ast_file)
+            with open(self.meta_file, 'w') as meta_file:
+                json.dump({'file_name': self.file_name, 'mtimes': mtimes},
+                          meta_file)
+        except Exception as e:
+            log.debug("cannot store ast cache entry '%s': %s",
+                      self.ast_file, e)
+            self.remove()
+            return False
+        log.debug("stored ast of '%s' to '%s'", self.file_name, self.ast_file)
+        return True
+
+    def remove(self):
+        """Remove the cache entry from disk."""
+        for file_name in [self.meta_file, self.ast_file]:
+            try:
+                remove(file_name)
+            except OSError:
+                pass
+
+    @staticmethod
+    def evict(max_size):
+        """Remove the least recently used entries until the cache fits.
+
+        Args:
+            max_size (int): maximum size of all the entries in bytes.
+
+        Returns:
+            int: number of removed entries.
+        """
+        folder = File.get_temp_dir(AstCache.FOLDER_NAME)
+        entries = []
+        total_size = 0
+        for file_name in listdir(folder):
+            if not file_name.endswith(AstCache.AST_EXT):
+                continue
+            ast_file = path.join(folder, file_name)
+            meta_file = ast_file[:-len(AstCache.AST_EXT)] + AstCache.META_EXT
+            try:
+                last_used = path.getmtime(ast_file)
+                size = path.getsize(ast_file)
+                if path.exists(meta_file):
+                    size += path.getsize(meta_file)
+            except OSError:
+                continue
+            entries.append((last_used, size, ast_file, meta_file))
+            total_size += size
+        removed = 0
+        for _, size, ast_file, meta_file in sorted(entries):
+            if total_size <= max_size:
+                break
+            log.debug("evicting ast cache entry '%s'", ast_file)
+            for entry_file in [meta_file, ast_file]:
+                try:
+                    remove(entry_file)
+                except OSError:
+                    pass
+            total_size -= size
+            removed += 1
+        return removed
+
+    @staticmethod
+    def __get_mtime(file_name):
+        """Get modification time of a file or None if it does not exist."""
+        try:
+            return path.getmtime(file_name)
+        except OSError:
+            return None
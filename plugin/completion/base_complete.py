@@ -19,6 +19,8 @@ class BaseCompleter:
         valid (bool): is completer valid
         version_str (str): version string of format "3.4.0"
         error_vis (obj): an object of error visualizer
+        tu_generation (int): number of times the translation unit was
+            (re)parsed, stays 0 for completers without one.
     """
     name = "base"
 
@@ -46,6 +48,7 @@ class BaseCompleter:
         self.error_vis = error_vis
         # Store the latest errors here
         self.latest_errors = None
+        self.tu_generation = 0
 
     def complete(self, completion_request):
         """Generate completions. See children for implementation.
@@ -89,6 +92,14 @@ class BaseCompleter:
         """
         raise NotImplementedError("calling abstract method")
 
+    def dispose(self):
+        """Free what the completer holds outside of itself.
+
+        Called once the config of the view is removed. Does nothing unless
+        the completer shares something with others.
+        """
+        pass
+
     def get_declaration_location(self, view, row_col):
         """Get location of declaration from given location in file.
 
@@ -101,6 +112,59 @@ class BaseCompleter:
         """
         raise NotImplementedError("calling abstract method")
 
+    def get_definition_location(self, view, row_col):
+        """Get location of a definition found without leaving the unit.
+
+        Args:
+            view (sublime.View): current view.
+            row_col (ZeroBasedRowCol): location of the cursor.
+
+        Returns:
+            Location: location of the definition or None if the unit does
+                not contain it or if not supported.
+        """
+        return None
+
+    def get_symbol_usr(self, view, row_col):
+        """Get unified symbol resolution of a symbol at given location.
+
+        Args:
+            view (sublime.View): current view.
+            row_col (ZeroBasedRowCol): location of the cursor.
+
+        Returns:
+            str: USR of the referenced symbol or None if not supported.
+        """
+        return None
+
+    def collect_symbols(self, view):
+        """Collect symbols declared in the file of this view.
+
+        Args:
+            view (sublime.View): current view.
+
+        Returns:
+            list: symbols in the format of SymbolIndex or None if not
+                supported.
+        """
+        return None
+
+    def included_files(self):
+        """Get all the files included by the parsed file.
+
+        Returns:
+            set: full paths to the included files or None if not supported.
+        """
+        return None
+
+    def memory_usage(self):
+        """Get memory used by this completer.
+
+        Returns:
+            int: number of bytes held by the completer, 0 if unknown.
+        """
+        return 0
+
     def save_errors(self, output):
         """Generate and store the errors.
 
@@ -5,11 +5,15 @@ Attributes:
 """
 import re
 import sublime
-import time
 import logging
 
 from os import path
+from os import remove
+from threading import Lock
 
+from ..utils.instrumentation import Instrumentation
+from ..utils.lru_cache import LruCache
+from ..utils.thread_job import JobToken
 from ..utils.tools import Tools
 from ..utils.file import File
 from ..utils.subl.row_col import ZeroIndexedRowCol
@@ -17,6 +21,7 @@ from ..utils.subl.row_col import OneIndexedRowCol
 from .base_complete import BaseCompleter
 from .compiler_variant import ClangCompilerVariant
 from .compiler_variant import ClangClCompilerVariant
+from .serialized_diagnostics import SerializedDiagnostics
 
 log = logging.getLogger("ECC")
 
@@ -33,20 +38,47 @@ Please use libclang or set "show_type_info" to false.
 If you *are* using libclang and still see this, open an issue.
 """
 
+# Completes a member in a tiny file to check if clang can read from stdin.
+STDIN_PROBE = "struct probe { int member; }; void f(struct probe p) { p."
+
 
 class Completer(BaseCompleter):
     """Encapsulate completions based on the output from clang_binary.
 
+    The contents of the view are passed to clang through stdin if clang
+    supports it. Otherwise they are written to a temporary file first.
+
+    Errors are read from the output of clang, which only shows errors, or
+    from diagnostics serialized by clang into a file, which also contain
+    warnings, ranges and fix-its.
+
+    Completions are parsed while clang prints them and clang is stopped once
+    enough completions are collected.
+
+    Completions are cached by the code they depend on: the flags, the code
+    before the statement with the trigger, the trigger and the expression
+    before it. Completing the same expression again, e.g. after edits below
+    the cursor, does not run clang. The cache is cleared on every update,
+    as included files may have changed.
+
     Attributes:
         clang_binary (str): e.g. "clang++" or "clang++-3.6"
+        stdin_support (dict): for every clang binary, True if it can read the
+            code to complete from stdin.
+        use_stdin (bool): pass the code through stdin if supported.
+        use_serialized_diagnostics (bool): read errors from diagnostics
+            serialized by clang if supported.
+        max_clang_binary_completions (int): maximum number of completions
+            read from clang for a single request, 0 for no limit.
+        triggers (str[]): triggers of completions, see settings.
+        completions_cache (LruCache): completions by the key of the code
+            they were generated for.
         flags_dict (dict): compilation flags lists for each view
         std_flag (TYPE): std flag, e.g. "std=c++11"
 
         completions (list): current completions
-        compl_regex (regex): regex to parse raw completion for name and content
-        compl_content_regex (regex): regex to parse the content of the
-        completion opts_regex (regex): regex to detect optional parameters
-        triggers
+        compl_chunk_regex (regex): regex to find optional chunks, parameters
+            and types in the content of a completion
 
         group_params (str): string for a group to capture function parameters
         group_types (str): string for a group to capture type names
@@ -73,12 +105,25 @@ class Completer(BaseCompleter):
 
     compl_str_mask = "{complete_flag}={file}:{row}:{col}"
 
-    compl_regex = re.compile(r"COMPLETION:\s(?P<name>.*)\s:\s(?P<content>.*)")
-    compl_content_regex = re.compile(
-        r"\<#{group_params}#\>|\[#{group_types}#\]".format(
-            group_params=group_params, group_types=group_types))
+    STDIN_FILE = "-"
+    STDIN_NAME_IN_OUTPUT = "<stdin>:"
 
-    opts_regex = re.compile("{#|#}")
+    # Clang binary -> True if it can complete code read from stdin.
+    stdin_support = {}
+    stdin_support_lock = Lock()
+
+    COMPLETION_TAG = "COMPLETION:"
+    NAME_SEPARATOR = " : "
+
+    # Characters that end a statement or start a new one.
+    STATEMENT_BORDERS = ";{}"
+    # Characters of an expression before a trigger outside of brackets.
+    EXPRESSION_CHARS = "_.:-><"
+
+    # Optional chunks are only unwrapped, so they only match their borders.
+    compl_chunk_regex = re.compile(
+        r"\{{#|#\}}|\<#{group_params}#\>|\[#{group_types}#\]".format(
+            group_params=group_params, group_types=group_types))
 
     def __init__(self, settings, error_vis):
         """Initialize the Completer.
@@ -89,6 +134,12 @@ class Completer(BaseCompleter):
         """
         # init common completer interface
         super().__init__(settings, error_vis)
+        self.use_stdin = settings.use_stdin_for_clang_binary
+        self.use_serialized_diagnostics = settings.use_serialized_diagnostics
+        self.max_clang_binary_completions = \
+            settings.max_clang_binary_completions
+        self.triggers = settings.triggers
+        self.completions_cache = LruCache(settings.max_cached_completions)
 
         # Create compiler options of specific variant of the compiler.
         filename = path.splitext(path.basename(self.clang_binary))[0]
@@ -105,16 +156,83 @@ class Completer(BaseCompleter):
         """
         log.debug("completing with cmd command")
         view = completion_request.get_view()
-        start = time.time()
-        output_text = self.run_clang_command(
-            view, "complete", completion_request.get_trigger_position())
-        raw_complete = output_text.splitlines()
-        end = time.time()
-        log.debug("code complete done in %s seconds", end - start)
+        cache_key = self.completion_cache_key(
+            view, completion_request.get_trigger_position())
+        completions = self.completions_cache.get(cache_key)
+        if completions is not None:
+            log.debug("reusing %s cached completions", len(completions))
+            return (completion_request, list(completions))
+        with Instrumentation.span(Instrumentation.CODE_COMPLETE,
+                                  file=view.file_name()):
+            # Completions are parsed while clang prints them.
+            output_lines = self.stream_clang_command(
+                view, "complete", completion_request.get_trigger_position())
+            try:
+                completions = Completer._parse_completions(
+                    output_lines, self.max_clang_binary_completions)
+            finally:
+                # Stops clang if it is still running.
+                output_lines.close()
+        log.debug("parsed %s completions", len(completions))
+        self.completions_cache.put(cache_key, completions)
+        return (completion_request, list(completions))
+
+    def completion_cache_key(self, view, trigger_position):
+        """Summarize the code that completions at a position depend on.
+
+        Completions only depend on the code before the statement they are
+        in and on the expression they complete, e.g. `foo.bar` in `x =
+        foo.bar->`. The code after the cursor is ignored.
+
+        Args:
+            view (sublime.View): current view
+            trigger_position (int): position right after the trigger
+
+        Returns:
+            tuple: flags fingerprint, hash of the code before the statement,
+                trigger and expression before the trigger.
+        """
+        text = view.substr(sublime.Region(0, trigger_position))
+        statement_start = max(
+            text.rfind(border) for border in Completer.STATEMENT_BORDERS) + 1
+        trigger = ''
+        for candidate in self.triggers:
+            if len(candidate) > len(trigger) and text.endswith(candidate):
+                trigger = candidate
+        statement = text[statement_start:len(text) - len(trigger)]
+        flags_fingerprint = hash(
+            (self.clang_binary, view.file_name(), tuple(self.clang_flags)))
+        return (flags_fingerprint,
+                hash(text[:statement_start]),
+                trigger,
+                Completer._expression_before(statement))
 
-        completions = Completer._parse_completions(raw_complete)
-        log.debug('completions: %s' % completions)
-        return (completion_request, completions)
+    @staticmethod
+    def _expression_before(statement):
+        """Find the expression at the end of a part of a statement.
+
+        Args:
+            statement (str): code of a statement up to a trigger.
+
+        Returns:
+            str: the expression with whitespace normalized, e.g.
+                "foo(a, b).bar" for "x = foo(a,  b).bar".
+        """
+        depth = 0
+        start = len(statement)
+        while start > 0:
+            char = statement[start - 1]
+            if char in ')]':
+                depth += 1
+            elif char in '([':
+                if depth == 0:
+                    break
+                depth -= 1
+            elif depth == 0 and not (char.isalnum() or char.isspace() or
+                                     char in Completer.EXPRESSION_CHARS):
+                break
+            start -= 1
+        return " ".join(statement[start:].split())
 
     def info(self, tooltip_request, settings):
         """Provide information about object in given location.
@@ -143,18 +261,70 @@ class Completer(BaseCompleter):
                 dummy function as we gain nothing from building it with binary.
 
         """
+        # Included files may have changed, so completions may be outdated.
+        self.completions_cache.clear()
         if not settings.show_errors:
             # in this class there is no need to rebuild the file. It brings no
             # benefits. We only want to do it if we need to show errors.
             return False
 
-        start = time.time()
-        output_text = self.run_clang_command(view, "update")
-        end = time.time()
-        log.debug("rebuilding done in %s seconds", end - start)
-        self.save_errors(output_text)
+        task_type = "update"
+        diagnostics_file = None
+        if self.use_serialized_diagnostics and \
+                self.compiler_variant.serialize_diagnostics_flag:
+            task_type = "diagnose"
+            diagnostics_file = Completer.__diagnostics_file(view.file_name())
+            if path.exists(diagnostics_file):
+                # Never read diagnostics of an older run.
+                remove(diagnostics_file)
+        with Instrumentation.span(Instrumentation.PARSE,
+                                  file=view.file_name()):
+            output_text = self.run_clang_command(view, task_type)
+        JobToken.check("parse errors")
+        errors = None
+        if diagnostics_file:
+            errors = SerializedDiagnostics.read_file(diagnostics_file)
+        if errors is None:
+            # The output is None if clang could not run or was stopped.
+            self.save_errors(output_text or "")
+        else:
+            self.latest_errors = Completer.__errors_in_file(
+                errors, view.file_name())
         self.show_errors(view)
 
+    @staticmethod
+    def __diagnostics_file(file_name):
+        """Get the file clang serializes the diagnostics of a file to."""
+        tempdir = File.get_temp_dir(Tools.get_unique_str(file_name))
+        return path.join(tempdir, path.basename(file_name) + ".dia")
+
+    @staticmethod
+    def __errors_in_file(errors, file_name):
+        """Prepare serialized diagnostics to be shown in a view.
+
+        Diagnostics of code read from stdin point to "<stdin>" instead of the
+        file. Just like with libclang, warnings about "#pragma once" in a
+        header compiled on its own are skipped.
+
+        Args:
+            errors (list(dict)): errors read from serialized diagnostics.
+            file_name (str): file of the view.
+
+        Returns:
+            list(dict): errors to show.
+        """
+        stdin_name = Completer.STDIN_NAME_IN_OUTPUT[:-1]
+        shown_errors = []
+        for error_dict in errors:
+            if "#pragma once" in error_dict['error']:
+                continue
+            for located in [error_dict] + error_dict['ranges'] + \
+                    [fixit['range'] for fixit in error_dict['fixits']]:
+                if located['file'] == stdin_name:
+                    located['file'] = file_name
+            shown_errors.append(error_dict)
+        return shown_errors
+
     def get_declaration_location(self, view, row_col):
         """Get location of declaration from given location in file."""
         sublime.error_message("Not supported for this backend.")
@@ -164,31 +334,110 @@ class Completer(BaseCompleter):
 
         Args:
             view (sublime.View): current view
-            task_type (str): one of: {"complete", "update"}
+            task_type (str): one of: {"complete", "update", "diagnose"}
             location (int, optional): cursor location
 
         Returns:
             str: Output from command
         """
+        command = self.__prepare_clang_command(view, task_type, location)
+        if not command:
+            return None
+        complete_cmd, file_name, file_body = command
+        JobToken.check("run clang")
+        # A newer completion makes the running one useless.
+        timeout = Tools.COMPILE_TIMEOUT
+        if task_type == "complete":
+            timeout = Tools.COMPLETE_TIMEOUT
+        cancellable = task_type == "complete"
+        if file_body is None:
+            return Tools.run_command(complete_cmd, timeout=timeout,
+                                     cancellable=cancellable)
+        # Quoted includes are searched relative to the current folder.
+        output_text = Tools.run_command(complete_cmd,
+                                        cwd=path.dirname(file_name),
+                                        input_text=file_body,
+                                        timeout=timeout,
+                                        cancellable=cancellable)
+        if not output_text:
+            return output_text
+        # Errors must point to the file to be shown in the view.
+        return output_text.replace(Completer.STDIN_NAME_IN_OUTPUT,
+                                   file_name + ":")
+
+    def stream_clang_command(self, view, task_type, location=0):
+        """Construct and run clang command, yield its output line by line.
+
+        Clang is stopped once the returned generator is closed.
+
+        Args:
+            view (sublime.View): current view
+            task_type (str): one of: {"complete", "update", "diagnose"}
+            location (int, optional): cursor location
+
+        Yields:
+            str: lines of the output of the command
+        """
+        command = self.__prepare_clang_command(view, task_type, location)
+        if not command:
+            return
+        complete_cmd, file_name, file_body = command
+        JobToken.check("run clang")
+        # A newer completion makes the running one useless.
+        if file_body is None:
+            output_lines = Tools.iter_command_lines(
+                complete_cmd, timeout=Tools.COMPLETE_TIMEOUT,
+                cancellable=True)
+        else:
+            output_lines = Tools.iter_command_lines(
+                complete_cmd, cwd=path.dirname(file_name),
+                input_text=file_body, timeout=Tools.COMPLETE_TIMEOUT,
+                cancellable=True)
+        try:
+            for line in output_lines:
+                yield line
+        finally:
+            output_lines.close()
+
+    def __prepare_clang_command(self, view, task_type, location):
+        """Construct clang command based on task.
+
+        Args:
+            view (sublime.View): current view
+            task_type (str): one of: {"complete", "update", "diagnose"}
+            location (int): cursor location
+
+        Returns:
+            tuple: command, name of the file and contents of the file to
+                pass through stdin or None if the command reads a temporary
+                file. None for an unknown task.
+        """
+        file_name = view.file_name()
         file_body = view.substr(sublime.Region(0, view.size()))
 
-        tempdir = File.get_temp_dir(Tools.get_unique_str(view.file_name()))
-        temp_file_name = path.join(tempdir, path.basename(view.file_name()))
-        with open(temp_file_name, "w", encoding='utf-8') as tmp_file:
-            tmp_file.write(file_body)
+        # Copy the flags, the ones of the completer must not change.
+        flags = list(self.clang_flags)
+        use_stdin = self.__can_use_stdin(flags)
+        if use_stdin:
+            input_file = Completer.STDIN_FILE
+        else:
+            input_file = Completer.__write_temp_file(file_name, file_body)
 
-        flags = self.clang_flags
         if task_type == "update":
             # we construct command for update task. No alternations needed, so
             # just pass here.
             pass
+        elif task_type == "diagnose":
+            # Also write the diagnostics to a file.
+            flags += [self.compiler_variant.serialize_diagnostics_flag,
+                      Completer.__diagnostics_file(file_name)]
         elif task_type == "complete":
             # we construct command for complete task
             file_row_col = OneIndexedRowCol.from_zero_indexed(
                 ZeroIndexedRowCol.from_1d_location(view, location))
             complete_at_str = Completer.compl_str_mask.format(
                 complete_flag="-code-completion-at",
-                file=temp_file_name,
+                file=input_file,
                 row=file_row_col.row,
                 col=file_row_col.col)
             flags += ["-Xclang"] + [complete_at_str]
@@ -196,92 +445,146 @@ class Completer(BaseCompleter):
             log.critical(" unknown type of cmd command wanted.")
             return None
         # construct cmd from building parts
-        complete_cmd = [self.clang_binary] + flags + [temp_file_name]
-        # now run this command
+        complete_cmd = [self.clang_binary] + flags + [input_file]
         log.debug("clang command: \n%s",
                   " ".join(["'" + s + "'" for s in complete_cmd]))
-        return Tools.run_command(complete_cmd)
+        return complete_cmd, file_name, file_body if use_stdin else None
+
+    def __can_use_stdin(self, flags):
+        """Check if the buffer can be passed to clang through stdin.
+
+        Clang needs to know the language of the code read from stdin, so the
+        flags must contain -x, which is not the case for clang-cl.
+
+        Args:
+            flags (str[]): flags used to run clang.
+
+        Returns:
+            bool: True if the buffer can be sent through stdin.
+        """
+        if not self.use_stdin or '-x' not in flags:
+            return False
+        return Completer.supports_stdin(self.clang_binary)
 
     @staticmethod
-    def _parse_completions(complete_results):
-        """Create snippet-like structures from a list of completions.
+    def supports_stdin(clang_binary):
+        """Check once per binary if it can complete code read from stdin.
 
         Args:
-            complete_results (list): raw completions list
+            clang_binary (str): clang binary to check.
 
         Returns:
-            list: updated completions
+            bool: True if the binary supports completing code from stdin.
         """
-        class Parser:
-            """Help class to parse completions with regex.
-
-            Attributes:
-                place_holders (int): number of place holders in use
-            """
-
-            def __init__(self):
-                self.place_holders = 0
-
-            def tokenize_params(self, match):
-                """Create tockens from a match.
-
-                Used as part or re.sub function.
-
-                Args:
-                    match (re.match): current match
-
-                Returns:
-                    str: current match, wrapped in snippet
-                """
-                dict_match = match.groupdict()
-                if dict_match[Completer.PARAM_TAG]:
-                    self.place_holders += 1
-                    return "${{{count}:{text}}}".format(
-                        count=self.place_holders,
-                        text=dict_match[Completer.PARAM_TAG])
-                return ''
-
-            @staticmethod
-            def make_pretty(match):
-                """Process raw match and remove ugly placeholders.
-
-                Needed to have a human readable text for each completion.
-
-                Args:
-                    match (re.match): current completion
-
-                Returns:
-                    str: match stripped from unneeded placeholders
-                """
-                dict_match = match.groupdict()
-                if dict_match[Completer.PARAM_TAG]:
-                    return dict_match[Completer.PARAM_TAG]
-                if dict_match[Completer.TYPE_TAG]:
-                    return dict_match[Completer.TYPE_TAG] + ' '
-                return ''
+        with Completer.stdin_support_lock:
+            if clang_binary not in Completer.stdin_support:
+                complete_at_str = Completer.compl_str_mask.format(
+                    complete_flag="-code-completion-at",
+                    file=Completer.STDIN_FILE,
+                    row=1,
+                    col=len(STDIN_PROBE) + 1)
+                output_text = Tools.run_command(
+                    [clang_binary, "-fsyntax-only", "-x", "c", "-Xclang",
+                     complete_at_str, Completer.STDIN_FILE],
+                    input_text=STDIN_PROBE, timeout=Tools.QUERY_TIMEOUT)
+                supported = bool(output_text) and \
+                    "COMPLETION: member" in output_text
+                if not supported:
+                    log.info("'%s' cannot read code from stdin, using "
+                             "temporary files instead", clang_binary)
+                Completer.stdin_support[clang_binary] = supported
+            return Completer.stdin_support[clang_binary]
 
+    @staticmethod
+    def __write_temp_file(file_name, file_body):
+        """Write the contents of a view to a temporary file.
+
+        Args:
+            file_name (str): file of the view.
+            file_body (str): contents of the view.
+
+        Returns:
+            str: full path to the temporary file.
+        """
+        tempdir = File.get_temp_dir(Tools.get_unique_str(file_name))
+        temp_file_name = path.join(tempdir, path.basename(file_name))
+        with open(temp_file_name, "w", encoding='utf-8') as tmp_file:
+            tmp_file.write(file_body)
+        return temp_file_name
+
+    @staticmethod
+    def _parse_completions(complete_results, max_results=0):
+        """Create snippet-like structures from completions printed by clang.
+
+        Args:
+            complete_results (iterable): raw lines of output, e.g. read from
+                the output of clang while it is running.
+            max_results (int): stop reading once so many completions are
+                found, 0 for no limit.
+
+        Returns:
+            list: completions, each a list [trigger + hint, snippet].
+        """
         completions = []
-        for completion in complete_results:
-            pos_search = Completer.compl_regex.search(completion)
-            if not pos_search:
-                log.debug(
-                    " completion '%s' did not match pattern '%s'",
-                    completion, Completer.compl_regex.pattern)
+        for line in complete_results:
+            completion = Completer._parse_completion(line)
+            if not completion:
                 continue
-            comp_dict = pos_search.groupdict()
-            # log.debug("completions parsed: %s", comp_dict)
-            trigger = comp_dict['name']
-            parser = Parser()
-            # remove optional parameters triggers
-            comp_dict['content'] = re.sub(
-                Completer.opts_regex, '', comp_dict['content'])
-            # tokenize parameters
-            contents = re.sub(Completer.compl_content_regex,
-                              parser.tokenize_params,
-                              comp_dict['content'])
-            # make the hint look pretty
-            hint = re.sub(Completer.compl_content_regex,
-                          Parser.make_pretty,
-                          comp_dict['content'])
-            completions.append([trigger + "\t" + hint, contents])
+            completions.append(completion)
+            if len(completions) == max_results:
+                log.debug("got %s completions, stop reading", max_results)
+                break
         return completions
+
+    @staticmethod
+    def _parse_completion(line):
+        """Parse a single completion printed by clang in a single pass.
+
+        A line looks like "COMPLETION: foo : [#void#]foo(<#int a#>{#, <#int
+        b#>#})". The name is followed by the content, where parameters are
+        wrapped in <# #>, types in [# #] and optional parameters in {# #}.
+        Parameters become numbered fields of the snippet and the hint shows
+        both types and parameters.
+
+        Args:
+            line (str): a line of the output of clang.
+
+        Returns:
+            list: [trigger and hint separated by a tab, snippet] or None if
+                the line is no completion.
+        """
+        start = line.find(Completer.COMPLETION_TAG)
+        if start < 0:
+            return None
+        start += len(Completer.COMPLETION_TAG)
+        if not line[start:start + 1].isspace():
+            return None
+        body = line[start + 1:].rstrip('\r\n')
+        separator = body.rfind(Completer.NAME_SEPARATOR)
+        if separator < 0:
+            log.debug(" completion '%s' has no name separator", line)
+            return None
+        trigger = body[:separator]
+        content = body[separator + len(Completer.NAME_SEPARATOR):]
+        snippet = []
+        hint = []
+        place_holders = 0
+        last_end = 0
+        for match in Completer.compl_chunk_regex.finditer(content):
+            text_before = content[last_end:match.start()]
+            snippet.append(text_before)
+            hint.append(text_before)
+            last_end = match.end()
+            param = match.group(Completer.PARAM_TAG)
+            if param:
+                place_holders += 1
+                snippet.append("${{{count}:{text}}}".format(
+                    count=place_holders, text=param))
+                hint.append(param)
+                continue
+            type_name = match.group(Completer.TYPE_TAG)
+            if type_name:
+                hint.append(type_name + ' ')
+        snippet.append(content[last_end:])
+        hint.append(content[last_end:])
+        return [trigger + "\t" + "".join(hint), "".join(snippet)]
@@ -41,8 +41,11 @@ class ClangCompilerVariant(CompilerVariant):
 
     Attributes:
         error_regex (re): regex to find contents of an error
+        serialize_diagnostics_flag (str): flag to write diagnostics to a
+            file, None if not supported
     """
     include_prefixes = ["-isystem", "-I", "-isysroot", "-iquote"]
+    serialize_diagnostics_flag = "-serialize-diagnostics"
     error_regex = re.compile(r"(?P<file>.*)" +
                              r":(?P<row>\d+):(?P<col>\d+)" +
                              r":\s*.*error: (?P<error>.*)")
@@ -76,6 +79,7 @@ class ClangClCompilerVariant(ClangCompilerVariant):
     """
     need_lang_flags = False
     include_prefixes = ["-I", "/I", "-msvc", "/msvc", "-iquote", "/iquote"]
+    serialize_diagnostics_flag = None
     error_regex = re.compile(r"(?P<file>.*)" +
                              r"\((?P<row>\d+),(?P<col>\d+)\)\s*" +
                              r":\s*.*error: (?P<error>.*)")
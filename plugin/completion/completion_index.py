@@ -0,0 +1,161 @@
+"""An index to rank completions by the prefix typed after the trigger.
+
+This module does not depend on Sublime Text and uses no relative imports, so
+that it can be benchmarked standalone.
+"""
+from bisect import bisect_left
+from itertools import islice
+
+
+class CompletionIndex:
+    """Find the best completions for a typed prefix without a full scan.
+
+    Completions are ranked in tiers. Within a tier the original order, i.e.
+    the priority from clang, is kept:
+        0. the trigger starts with the prefix, e.g. "get" for "getFileName"
+        1. a later word of the trigger starts with the prefix, e.g. "file"
+        2. the first letters of the words start with the prefix, e.g. "gfn"
+        3. the prefix is a subsequence of the trigger, e.g. "gtfl"
+
+    The first three tiers are answered with a binary search in sorted tables.
+    Only the last one checks the triggers that contain all the letters of the
+    prefix, which are found by intersecting sets of triggers per letter.
+
+    Attributes:
+        completions (list): indexed completions as pairs [trigger, contents]
+        is_cut (bool): True if the completer may have stopped at the limit,
+            so matches for a longer prefix may be missing from the index.
+    """
+
+    def __init__(self, completions, limit=0):
+        """Build the index.
+
+        Args:
+            completions (list): completions as pairs [trigger, contents]
+            limit (int): maximum number of completions the completer was
+                asked for, 0 if it returned all of them
+        """
+        self.completions = completions
+        self.is_cut = limit > 0 and len(completions) == limit
+        self.__triggers = []
+        self.__letter_sets = {}
+        prefixes = []
+        words = []
+        acronyms = []
+        for index, completion in enumerate(completions):
+            trigger = completion[0].split('\t', 1)[0]
+            lower = trigger.lower()
+            self.__triggers.append(lower)
+            if not lower:
+                continue
+            starts = CompletionIndex.word_starts(trigger)
+            prefixes.append((lower, index))
+            for start in starts[1:]:
+                words.append((lower[start:], index))
+            if len(starts) > 1:
+                acronyms.append((''.join(lower[s] for s in starts), index))
+            for letter in set(lower):
+                self.__letter_sets.setdefault(letter, set()).add(index)
+        self.__tables = []
+        for table in [prefixes, words, acronyms]:
+            table.sort()
+            self.__tables.append(([key for key, _ in table],
+                                  [index for _, index in table]))
+
+    def __len__(self):
+        """Get the number of indexed completions."""
+        return len(self.completions)
+
+    def top(self, prefix, limit):
+        """Get the best completions for a typed prefix.
+
+        Args:
+            prefix (str): text typed after the trigger
+            limit (int): maximum number of completions, 0 for all of them
+
+        Returns:
+            list: completions as pairs [trigger, contents]
+        """
+        if not prefix:
+            if limit < 1:
+                return list(self.completions)
+            return self.completions[:limit]
+        prefix = prefix.lower()
+        picked = []
+        seen = set()
+        for keys, indices in self.__tables:
+            start = bisect_left(keys, prefix)
+            end = bisect_left(keys, prefix + '\U0010ffff', start)
+            matches = sorted(set(indices[start:end]) - seen)
+            if limit > 0:
+                matches = matches[:limit - len(picked)]
+            picked += [self.completions[index] for index in matches]
+            seen.update(matches)
+            if limit > 0 and len(picked) >= limit:
+                return picked
+        letter_sets = [self.__letter_sets.get(letter, set())
+                       for letter in set(prefix)]
+        letter_sets.sort(key=len)
+        candidates = letter_sets[0].intersection(*letter_sets[1:]) - seen
+        is_subsequence = CompletionIndex.is_subsequence
+        triggers = self.__triggers
+        matches = (index for index in sorted(candidates)
+                   if is_subsequence(prefix, triggers[index]))
+        if limit > 0:
+            matches = islice(matches, limit - len(picked))
+        picked += [self.completions[index] for index in matches]
+        return picked
+
+    def misses_matches(self, matches, limit):
+        """Check if the completer could return more matches than the index.
+
+        Args:
+            matches (list): completions picked by `top` for a prefix
+            limit (int): maximum number of completions shown
+
+        Returns:
+            bool: True if the completions were cut and there are less
+                matches than can be shown.
+        """
+        return self.is_cut and (limit < 1 or len(matches) < limit)
+
+    @staticmethod
+    def word_starts(trigger):
+        """Find positions where the words of a trigger start.
+
+        Words are separated by underscores and by changes to upper case, so
+        both "get_file_name" and "getFileName" consist of three words.
+
+        Args:
+            trigger (str): trigger of a completion
+
+        Returns:
+            int[]: positions of the first letters of all words
+        """
+        starts = []
+        previous = '_'
+        for position, char in enumerate(trigger):
+            if char != '_':
+                if previous == '_' or (
+                        char.isupper() and not previous.isupper()):
+                    starts.append(position)
+            previous = char
+        return starts
+
+    @staticmethod
+    def is_subsequence(prefix, text):
+        """Check if all characters of a prefix appear in text in order.
+
+        Args:
+            prefix (str): lower case prefix
+            text (str): lower case text
+
+        Returns:
+            bool: True if the prefix is a subsequence of the text
+        """
+        position = 0
+        for char in prefix:
+            position = text.find(char, position) + 1
+            if position == 0:
+                return False
+        return True
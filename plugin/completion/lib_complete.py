@@ -10,14 +10,24 @@ import sublime
 import time
 import logging
 
+from .ast_cache import AstCache
 from .base_complete import BaseCompleter
+from .libclang_completions import LazyCompletions
+from .libclang_completions import LibClangCompletions
 from .compiler_variant import LibClangCompilerVariant
+from .pch_manager import PchManager
 from ..utils.clang_utils import ClangUtils
+from ..utils.clang_index import SharedIndex
+from ..utils.instrumentation import Instrumentation
+from ..utils.thread_job import JobToken
+from ..utils.thread_job import ThreadJob
+from ..utils.tu_resource_usage import TuResourceUsage
 from ..utils.subl.subl_bridge import SublBridge
 from ..utils.subl.row_col import ZeroIndexedRowCol
 from ..utils.subl.row_col import OneIndexedRowCol
 from ..error_vis.popups import Popup
 
+from threading import Event
 from threading import RLock
 from os import path
 
@@ -38,12 +48,26 @@ class Completer(BaseCompleter):
             This list is used when completion is triggered with `::`.
         compiler_variant: Compiler variant currently in use.
         cindex (module): clang cindex.py module for the correct version
-        rlock (threading.Rlock): recursive mutex
+        libclang_lock (threading.RLock): recursive mutex that guards the
+            global state of libclang shared by all translation units, i.e.
+            loading the library and creating an index.
+        tu_lock (threading.RLock): recursive mutex owned by the translation
+            unit of this completer. Guards all operations on this unit only.
+        index (cindex.Index): libclang index shared between all completers
         tu (cindex.TranslationUnit): current translation unit
+        tu_generation (int): number of times the translation unit was
+            (re)parsed. Results computed for an older generation are stale.
+        reparses_avoided (int): number of reparses skipped because neither
+            the buffer, nor the flags, nor the included files have changed.
+        max_completions_shown (int): maximum number of completions returned
+            for a single request, 0 for no limit.
         valid (bool): Will be False if we fail to build proper clang index.
+        thread_pool (ThreadPool): pool of the plugin that fully parses units
+            loaded from the ast cache. Without it the ast cache is not read.
     """
     name = "lib"
-    rlock = RLock()
+    libclang_lock = RLock()
+    thread_pool = None
 
     def __init__(self, settings, error_vis):
         """Initialize the Completer from clang binary, reading its version.
@@ -60,10 +84,52 @@ class Completer(BaseCompleter):
         # Create compiler options of specific variant of the compiler.
         self.compiler_variant = LibClangCompilerVariant()
 
+        # Every translation unit is guarded by its own lock, so that views do
+        # not wait for each other while parsing or completing.
+        self.tu_lock = RLock()
+
+        # Completions for the last trigger position stored along with a key
+        # (view id, trigger position, hash of the code before the trigger,
+        # tu generation) they were generated for.
+        # Typing after the trigger only filters these completions. Only the
+        # best completions are materialized, the rest are kept in libclang.
+        self.__completions_cache = (None, None)
+        self.max_completions_shown = settings.max_completions_shown
+
+        # Info popups for the current tu generation. They are stored by the
+        # hovered position and by the identity of the symbol they describe,
+        # so that hovering the same symbol again only costs a lookup.
+        self.__info_cache = {}
+
+        # State of the buffer the translation unit was last reparsed with and
+        # modification times of all the files it includes.
+        self.__reparsed_state = None
+        self.__include_mtimes = {}
+        self.reparses_avoided = 0
+
+        # A translation unit loaded from the ast cache cannot be reparsed or
+        # used for completion. It is replaced by a parsed one in background.
+        self.__tu_from_ast = False
+        self.__full_parse_job = None
+        self.__full_parse_done = Event()
+        self.__full_parse_done.set()
+
+        # Precompiled header shared with other files that the translation
+        # unit was parsed with, if any, and the last one it failed to use.
+        self.__pch_file = None
+        self.__rejected_pch_file = None
+
+        # Contents of the main file and of the included headers whose views
+        # are served by this unit, see owner_complete.py. All of them are
+        # passed to libclang whenever the unit is reparsed or completed.
+        self.__main_file = None
+        self.__header_bodies = {}
+
         # init tu related variables
-        with Completer.rlock:
+        with Completer.libclang_lock:
             self.tu = None
             self.cindex = None
+            self.index = None
 
             # slightly more complicated name retrieving to allow for more
             # complex version strings, e.g. 3.8.0
@@ -82,10 +148,8 @@ class Completer(BaseCompleter):
             self.cindex = importlib.import_module(cindex_module_name)
 
             # initialize ignore list to account for private methods etc.
-            self.default_ignore_list = [self.cindex.CursorKind.DESTRUCTOR]
-            self.bigger_ignore_list = self.default_ignore_list +\
-                [self.cindex.CursorKind.CLASS_DECL,
-                 self.cindex.CursorKind.ENUM_CONSTANT_DECL]
+            self.default_ignore_list, self.bigger_ignore_list = \
+                LibClangCompletions.ignore_lists(self.cindex)
 
             # If we haven't already initialized the clang Python bindings, try
             # to figure out the path libclang.
@@ -99,13 +163,9 @@ class Completer(BaseCompleter):
                     self.cindex.Config.set_library_file(libclang_file)
                     self.cindex.Config.set_library_path(libclang_dir)
 
-            # check if we can build an index. If not, set valid to false
-            try:
-                self.cindex.Index.create()
-                self.valid = True
-            except Exception as e:
-                log.error("error: %s", e)
-                self.valid = False
+            # check if we can get an index. If not, set valid to false
+            self.index = SharedIndex.get(self.cindex)
+            self.valid = self.index is not None
 
     def parse_tu(self, view, settings):
         """Initialize the completer. Builds the view.
@@ -123,40 +183,105 @@ class Completer(BaseCompleter):
         file_name = view.file_name()
         file_body = view.substr(sublime.Region(0, view.size()))
 
-        unsaved_files = [(file_name, file_body)]
-
         # flags are loaded by base completer already
         log.debug("clang flags are: %s", self.clang_flags)
         v_id = view.buffer_id()
         if v_id == 0:
             log.warning(" this is default id. View is closed. Abort!")
             return
-        with Completer.rlock:
-            start = time.time()
+        with self.tu_lock:
+            self.__main_file = (file_name, file_body)
+            unsaved_files = self.__unsaved_files()
             try:
-                TU = self.cindex.TranslationUnit
                 log.debug("compilation started for view id: %s", v_id)
-                if not file_name or not path.exists(file_name):
-                    raise ValueError("file name does not exist anymore")
-
-                parse_options = \
-                    (TU.PARSE_PRECOMPILED_PREAMBLE |
-                     TU.PARSE_DETAILED_PROCESSING_RECORD |
-                     TU.PARSE_INCLUDE_BRIEF_COMMENTS_IN_CODE_COMPLETION)
-                if settings.use_libclang_caching:
-                    parse_options |= TU.PARSE_CACHE_COMPLETION_RESULTS
-
-                trans_unit = TU.from_source(
-                    filename=file_name,
-                    args=self.clang_flags,
-                    unsaved_files=unsaved_files,
-                    options=parse_options)
+                with Instrumentation.span(Instrumentation.PARSE,
+                                          file=file_name):
+                    trans_unit = self.__parse_from_source(
+                        file_name, unsaved_files, settings)
                 self.tu = trans_unit
+                self.__on_tu_changed()
                 self.save_errors(self.tu.diagnostics)  # Store for the future.
             except Exception as e:
                 log.error("error while compiling: %s", e)
-            end = time.time()
-            log.debug("compilation done in %s seconds", end - start)
+
+    def __parse_from_source(self, file_name, unsaved_files, settings):
+        """Parse a new translation unit from source.
+
+        Args:
+            file_name (str): name of the file to parse
+            unsaved_files (list): unsaved contents of the files
+            settings (SettingsStorage): current settings
+
+        Returns:
+            cindex.TranslationUnit: a newly parsed translation unit
+
+        Raises:
+            ValueError: if file name does not exist - throw exception.
+        """
+        TU = self.cindex.TranslationUnit
+        if not file_name or not path.exists(file_name):
+            raise ValueError("file name does not exist anymore")
+
+        parse_options = \
+            (TU.PARSE_PRECOMPILED_PREAMBLE |
+             TU.PARSE_DETAILED_PROCESSING_RECORD |
+             TU.PARSE_INCLUDE_BRIEF_COMMENTS_IN_CODE_COMPLETION)
+        if settings.use_libclang_caching:
+            parse_options |= TU.PARSE_CACHE_COMPLETION_RESULTS
+
+        args = self.clang_flags
+        pch_file = None
+        if settings.use_shared_pch:
+            pch_file = self.__shared_pch_file(file_name, unsaved_files[0][1])
+            if pch_file == self.__rejected_pch_file:
+                pch_file = None
+            if pch_file:
+                args = self.clang_flags + ['-include-pch', pch_file]
+
+        trans_unit = TU.from_source(
+            filename=file_name,
+            args=args,
+            unsaved_files=unsaved_files,
+            options=parse_options,
+            index=self.index)
+        if pch_file and PchManager.has_pch_errors(trans_unit, self.cindex):
+            log.debug("cannot use shared pch, parsing without it")
+            self.__rejected_pch_file = pch_file
+            pch_file = None
+            trans_unit = TU.from_source(
+                filename=file_name,
+                args=self.clang_flags,
+                unsaved_files=unsaved_files,
+                options=parse_options,
+                index=self.index)
+        self.__use_pch_file(pch_file)
+        return trans_unit
+
+    def __shared_pch_file(self, file_name, file_body):
+        """Get the shared precompiled header the file should use now.
+
+        Returns:
+            str: path to the precompiled header, None if there is none yet.
+        """
+        if not Completer.thread_pool:
+            return None
+        pch_args = PchManager.get().args_for(
+            file_name, file_body, self.clang_flags, self.cindex, self.index,
+            Completer.thread_pool)
+        return pch_args[-1] if pch_args else None
+
+    def __use_pch_file(self, pch_file):
+        """Switch to another shared precompiled header.
+
+        The old header can be removed once no translation unit uses it.
+        """
+        if pch_file == self.__pch_file:
+            return
+        if pch_file:
+            PchManager.get().acquire(pch_file)
+        if self.__pch_file:
+            PchManager.get().release(self.__pch_file)
+        self.__pch_file = pch_file
 
     def complete(self, completion_request):
         """Create a list of autocompletions. Called asynchronously.
@@ -172,21 +297,38 @@ class Completer(BaseCompleter):
             ValueError: if file name does not exist - throw exception.
 
         """
+        # A unit loaded from the ast cache cannot complete code.
+        self.__wait_for_full_parse()
         view = completion_request.get_view()
+        trigger_position = completion_request.get_trigger_position()
+        # The code before the trigger can change without a reparse, e.g. when
+        # "foo." is replaced by "bar." in place.
+        code_before_trigger = view.substr(sublime.Region(0, trigger_position))
+        typed_prefix = Completer._get_typed_prefix(view, trigger_position)
+        # Refining reads the results held by libclang and sorts the shared
+        # cached completions, so it must not overlap with other requests.
+        with self.tu_lock:
+            cache_key = (view.buffer_id(), trigger_position,
+                         hash(code_before_trigger), self.tu_generation)
+            cached_key, cached_completions = self.__completions_cache
+            if typed_prefix is not None and cached_key == cache_key:
+                log.debug("refining cached completions with prefix: '%s'",
+                          typed_prefix)
+                return (completion_request, cached_completions.matching(
+                    typed_prefix, self.max_completions_shown))
+
         file_name = view.file_name()
         file_body = view.substr(sublime.Region(0, view.size()))
-        row_col = ZeroIndexedRowCol.from_1d_location(
-            view, completion_request.get_trigger_position())
+        row_col = ZeroIndexedRowCol.from_1d_location(view, trigger_position)
         file_row_col = OneIndexedRowCol.from_zero_indexed(row_col)
 
-        # unsaved files
-        unsaved_files = [(file_name, file_body)]
-
         v_id = view.buffer_id()
 
-        with Completer.rlock:
+        JobToken.check("lock translation unit")
+        with self.tu_lock:
+            JobToken.check("code complete")
+            unsaved_files = self.__unsaved_files(file_name, file_body)
             # execute clang code completion
-            start = time.time()
             log.debug("started code complete for view %s", v_id)
             try:
                 if not file_name or not path.exists(file_name):
@@ -207,34 +349,45 @@ class Completer(BaseCompleter):
                     # clang, where the assert is different, we make sure to
                     # pass False if the version is older. See issue #245.
                     include_brief_comments = False
-                complete_obj = self.tu.codeComplete(
-                    file_name,
-                    file_row_col.row, file_row_col.col,
-                    unsaved_files=unsaved_files,
-                    include_macros=True,
-                    include_brief_comments=include_brief_comments)
+                with Instrumentation.span(Instrumentation.CODE_COMPLETE,
+                                          file=file_name):
+                    complete_obj = self.tu.codeComplete(
+                        file_name,
+                        file_row_col.row, file_row_col.col,
+                        unsaved_files=unsaved_files,
+                        include_macros=True,
+                        include_brief_comments=include_brief_comments)
             except Exception as e:
                 log.error("error while completing view %s: %s", file_name, e)
                 complete_obj = None
-            end = time.time()
-            log.debug("code complete done in %s seconds", end - start)
 
-        if complete_obj is None or len(complete_obj.results) == 0:
-            completions = []
+        if complete_obj is None:
+            return (completion_request, [])
+
+        JobToken.check("sort completions")
+        point = completion_request.get_trigger_position()
+        trigger = view.substr(point - 2) + view.substr(point - 1)
+        log.debug("Current trigger: '%s'", trigger)
+        # We clean trigger from all symbols that cannot be part of one.
+        sanitized_trigger = ''.join(
+            [c for c in trigger if c in ALLOWED_TRIGGER_SYMBOLS])
+        log.debug("Current sanitized_trigger: '%s'", sanitized_trigger)
+        if sanitized_trigger not in GLOBAL_TRIGGERS:
+            excluded = self.bigger_ignore_list
         else:
-            point = completion_request.get_trigger_position()
-            trigger = view.substr(point - 2) + view.substr(point - 1)
-            log.debug("Current trigger: '%s'", trigger)
-            # We clean trigger from all symbols that cannot be part of one.
-            sanitized_trigger = ''.join(
-                [c for c in trigger if c in ALLOWED_TRIGGER_SYMBOLS])
-            log.debug("Current sanitized_trigger: '%s'", sanitized_trigger)
-            if sanitized_trigger not in GLOBAL_TRIGGERS:
-                excluded = self.bigger_ignore_list
+            excluded = self.default_ignore_list
+        with Instrumentation.span(Instrumentation.POST_PROCESS):
+            lazy_completions = LazyCompletions(complete_obj, excluded)
+            if typed_prefix:
+                completions = lazy_completions.matching(
+                    typed_prefix, self.max_completions_shown)
             else:
-                excluded = self.default_ignore_list
-            completions = Completer._parse_completions(complete_obj, excluded)
-        log.debug('completions: %s' % completions)
+                completions = lazy_completions.first(
+                    self.max_completions_shown)
+        log.debug("picked %s of %s completions",
+                  len(completions), len(complete_obj.results))
+        with self.tu_lock:
+            self.__completions_cache = (cache_key, lazy_completions)
         return (completion_request, completions)
 
     def info(self, tooltip_request, settings):
@@ -265,29 +418,50 @@ class Completer(BaseCompleter):
             self.cindex.CursorKind.OBJC_CLASS_REF,
             self.cindex.CursorKind.OBJC_PROTOCOL_REF,
         ]
-        empty_info = (tooltip_request, None)
-        with Completer.rlock:
+        JobToken.check("lock translation unit")
+        with self.tu_lock:
             if not self.tu:
-                return empty_info
+                return (tooltip_request, None)
             view = tooltip_request.get_view()
             row_col = ZeroIndexedRowCol.from_1d_location(
                 view, tooltip_request.get_trigger_position())
             file_row_col = OneIndexedRowCol.from_zero_indexed(row_col)
+            # Popups depend on these settings, which can change in place.
+            popup_settings = (settings.show_index_references,
+                              settings.popup_maximum_width,
+                              settings.popup_maximum_height)
+            position_key = (self.tu_generation, view.file_name(),
+                            file_row_col.as_tuple(), popup_settings)
+            if position_key in self.__info_cache:
+                return (tooltip_request, self.__info_cache[position_key])
 
             cursor = self.tu.cursor.from_location(
                 self.tu,
                 self.tu.get_location(
                     view.file_name(), (file_row_col.row, file_row_col.col)))
-            if not cursor:
-                return empty_info
-            if cursor.kind in objc_types:
-                info_popup = Popup.info_objc(cursor, self.cindex, settings)
-                return tooltip_request, info_popup
-            if cursor.referenced:
-                info_popup = Popup.info(
-                    cursor.referenced, self.cindex, settings)
-                return tooltip_request, info_popup
-            return empty_info
+            info_popup = None
+            if cursor and cursor.kind in objc_types:
+                symbol_key = (self.tu_generation, 'objc',
+                              Completer.__cursor_identity(cursor),
+                              popup_settings)
+                info_popup = self.__info_cache.get(symbol_key)
+                if not info_popup:
+                    with Instrumentation.span(Instrumentation.POPUP_INFO):
+                        info_popup = Popup.info_objc(
+                            cursor, self.cindex, settings)
+            elif cursor and cursor.referenced:
+                symbol_key = (self.tu_generation, 'ref',
+                              Completer.__cursor_identity(cursor.referenced),
+                              popup_settings)
+                info_popup = self.__info_cache.get(symbol_key)
+                if not info_popup:
+                    with Instrumentation.span(Instrumentation.POPUP_INFO):
+                        info_popup = Popup.info(
+                            cursor.referenced, self.cindex, settings)
+            if info_popup:
+                self.__info_cache[symbol_key] = info_popup
+            self.__info_cache[position_key] = info_popup
+            return (tooltip_request, info_popup)
 
     def update(self, view, settings):
         """Reparse the translation unit.
@@ -305,10 +479,20 @@ class Completer(BaseCompleter):
         """
         v_id = view.buffer_id()
         log.debug("view is %s", v_id)
-        with Completer.rlock:
+        self.__wait_for_full_parse()
+        JobToken.check("lock translation unit")
+        with self.tu_lock:
+            # Once the unit is parsed, the job is not stopped any more. The
+            # parse would be lost, as the config of a new view is only stored
+            # after its first update.
+            parsed = False
+            if not self.tu and settings.use_ast_cache:
+                if self.__load_from_ast_cache(view, settings):
+                    return True
             if not self.tu:
                 log.debug("translation unit does not exist. Creating.")
                 self.parse_tu(view, settings)
+                parsed = True
             if not self.tu:
                 log.critical(" cannot create translation unit. Abort.")
                 return False
@@ -330,32 +514,164 @@ class Completer(BaseCompleter):
                           displayname, view.file_name())
                 log.debug("recreate translation unit completely")
                 self.parse_tu(view, settings)
+                parsed = True
             log.debug("reparsing translation_unit for view %s", v_id)
             if not self.tu:
                 log.error("translation unit is not available. Not reparsing.")
                 return False
 
-            # Prepare unsaved files.
+            # Skip the reparse if the buffer is the same as the last time.
+            # Checking the change count is cheap, hashing the buffer catches
+            # edits that were undone.
             file_name = view.file_name()
-            file_body = view.substr(sublime.Region(0, view.size()))
-            unsaved_files = [(file_name, file_body)]
+            change_count = view.change_count()
+            file_body = None
+            body_hash = None
+            if not self.__is_reparse_redundant(file_name, change_count):
+                file_body = view.substr(sublime.Region(0, view.size()))
+                body_hash = hash(file_body)
+            if file_body is None or self.__is_reparse_redundant(
+                    file_name, body_hash=body_hash):
+                self.reparses_avoided += 1
+                log.debug("view %s unchanged, skip reparse. Avoided: %s",
+                          v_id, self.reparses_avoided)
+                self.__reparsed_state['change_count'] = change_count
+                if settings.show_errors:
+                    self.show_errors(view)
+                return True
+
+            # Prepare unsaved files.
+            unsaved_files = self.__unsaved_files(file_name, file_body)
 
-            start = time.time()
-            self.tu.reparse(unsaved_files=unsaved_files)
-            end = time.time()
-            log.debug("reparsed in %s seconds", end - start)
-            # Store and potentially show errors to the user.
+            if settings.use_shared_pch and not parsed and \
+                    self.__needs_other_pch_file(file_name, file_body):
+                # The unit cannot be reparsed with an outdated shared pch and
+                # has to be parsed again to use a newly built one.
+                log.debug("shared pch changed, parsing from scratch")
+                self.parse_tu(view, settings)
+                parsed = True
+                if not self.tu:
+                    return False
+            else:
+                if not parsed:
+                    JobToken.check("reparse")
+                with Instrumentation.span(Instrumentation.REPARSE,
+                                          file=file_name):
+                    self.tu.reparse(unsaved_files=unsaved_files)
+                self.__on_tu_changed()
+            self.__remember_reparsed_state(
+                file_name, change_count, body_hash)
+            # Only a unit parsed from scratch is worth storing, a reparsed
+            # one is already stored or was loaded from the cache.
+            if parsed and settings.use_ast_cache:
+                self.__store_in_ast_cache(view, settings)
+            # Store and potentially show errors to the user. A newer job
+            # shows the stored errors even if it does not reparse.
             self.save_errors(self.tu.diagnostics)  # Store for the future.
+            if not parsed:
+                JobToken.check("show errors")
             if settings.show_errors:
                 self.show_errors(view)
             return True
         log.error("no translation unit for view id %s", v_id)
         return False
 
+    def update_header(self, view, settings):
+        """Reparse the translation unit with the contents of a header view.
+
+        The unit serves completions and errors of the headers it includes,
+        see owner_complete.py.
+
+        Args:
+            view (sublime.View): view of a header included by this unit
+            settings: ECC settings
+
+        Returns:
+            bool: False if the unit does not include the header.
+        """
+        file_name = view.file_name()
+        self.__wait_for_full_parse()
+        JobToken.check("lock translation unit")
+        with self.tu_lock:
+            if not self.tu or not self.includes(file_name):
+                return False
+            file_body = view.substr(sublime.Region(0, view.size()))
+            if view.is_dirty():
+                unchanged = self.__header_bodies.get(file_name) == file_body
+                unsaved_header = (file_name, file_body)
+            else:
+                # The saved header is read from disk. Unless the unit holds
+                # the same unsaved contents, it was parsed with the header
+                # on disk, which might have changed since, e.g. on checkout.
+                stored_body = self.__header_bodies.pop(file_name, None)
+                if stored_body is None:
+                    unchanged = self.__include_mtimes[file_name] == \
+                        Completer.__mtime(file_name)
+                else:
+                    unchanged = stored_body == file_body
+                unsaved_header = (None, None)
+            if unchanged:
+                self.reparses_avoided += 1
+                log.debug("header '%s' unchanged, skip reparse", file_name)
+            else:
+                unsaved_files = self.__unsaved_files(*unsaved_header)
+                JobToken.check("reparse")
+                with Instrumentation.span(Instrumentation.REPARSE,
+                                          file=file_name):
+                    self.tu.reparse(unsaved_files=unsaved_files)
+                self.__on_tu_changed()
+                self.save_errors(self.tu.diagnostics)
+            if not view.is_dirty():
+                # The unit now matches the header on disk.
+                self.__include_mtimes[file_name] = Completer.__mtime(
+                    file_name)
+            return True
+
+    def dispose(self):
+        """Stop sharing a precompiled header with other files."""
+        with self.tu_lock:
+            if self.__main_file:
+                PchManager.get().forget(self.__main_file[0])
+            self.__use_pch_file(None)
+
+    def forget_header(self, file_name):
+        """Stop passing the unsaved contents of a header to libclang.
+
+        Called once the view of the header is closed or served otherwise.
+        The unit is reparsed with the header stored on disk on its next
+        update.
+
+        Args:
+            file_name (str): file of the header view
+        """
+        with self.tu_lock:
+            if self.__header_bodies.pop(file_name, None) is None:
+                return
+            log.debug("forget unsaved contents of '%s'", file_name)
+            self.__reparsed_state = None
+
+    def included_files(self):
+        """Get all the files included by the translation unit."""
+        with self.tu_lock:
+            return set(self.__include_mtimes)
+
+    def includes(self, file_name):
+        """Check if the translation unit includes a file."""
+        return file_name in self.__include_mtimes
+
+    def memory_usage(self):
+        """Get memory used by the translation unit.
+
+        Returns:
+            int: number of bytes reported by libclang.
+        """
+        with self.tu_lock:
+            return TuResourceUsage.memory_in_bytes(self.cindex, self.tu)
+
     def get_declaration_location(self, view, row_col):
         """Get location of declaration from given location in file."""
         file_row_col = OneIndexedRowCol.from_zero_indexed(row_col)
-        with Completer.rlock:
+        with self.tu_lock:
             if not self.tu:
                 return None
             cursor = self.tu.cursor.from_location(
@@ -369,73 +685,309 @@ class Completer(BaseCompleter):
                 return (ref_new or ref).location
             return None
 
-    @staticmethod
-    def _is_valid_result(completion_result, excluded_kinds):
-        """Check if completion is valid.
+    def get_definition_location(self, view, row_col):
+        """Get location of a definition if this unit contains it."""
+        file_row_col = OneIndexedRowCol.from_zero_indexed(row_col)
+        with self.tu_lock:
+            if not self.tu:
+                return None
+            cursor = self.tu.cursor.from_location(
+                self.tu, self.tu.get_location(view.file_name(),
+                                              file_row_col.as_tuple()))
+            if not cursor or not cursor.referenced:
+                return None
+            definition = cursor.referenced.get_definition()
+            if not definition or not definition.location.file:
+                return None
+            return definition.location
+
+    def get_symbol_usr(self, view, row_col):
+        """Get unified symbol resolution of a symbol at given location."""
+        file_row_col = OneIndexedRowCol.from_zero_indexed(row_col)
+        with self.tu_lock:
+            if not self.tu:
+                return None
+            cursor = self.tu.cursor.from_location(
+                self.tu, self.tu.get_location(view.file_name(),
+                                              file_row_col.as_tuple()))
+            if cursor and cursor.referenced:
+                return cursor.referenced.get_usr() or None
+            return None
 
-           Remove excluded types and unaccessible members.
+    def collect_symbols(self, view):
+        """Collect symbols declared in the file of this view."""
+        JobToken.check("collect symbols")
+        with self.tu_lock:
+            if not self.tu:
+                return None
+            return LibClangCompletions.collect_symbols(self.tu)
+
+    def collect_header_symbols(self, file_name):
+        """Collect symbols declared in a header included by the unit.
+
+        Args:
+            file_name (str): file of the header.
+
+        Returns:
+            list: symbols in the format of SymbolIndex or None if the unit
+                does not include the header.
+        """
+        JobToken.check("collect symbols")
+        with self.tu_lock:
+            if not self.tu or not self.includes(file_name):
+                return None
+            return LibClangCompletions.collect_symbols(self.tu, file_name)
+
+    def __load_from_ast_cache(self, view, settings):
+        """Load the translation unit stored in the ast cache.
+
+        The loaded unit is enough to show errors and info, but it cannot be
+        reparsed, so a full parse is started in the background.
 
         Args:
-            completion_result: completion result from libclang
-            excluded_kinds (list): list of CursorKind types that shouldn't be
-                                   added to completion list
+            view (sublime.View): current view
+            settings (SettingsStorage): current settings
 
         Returns:
-            boolean: True if completion should be added to completion list
+            bool: True if the translation unit was loaded.
         """
-        if str(completion_result.string.availability) != "Available":
+        if view.is_dirty() or not Completer.thread_pool:
             return False
-        try:
-            if completion_result.kind in excluded_kinds:
-                return False
-        except ValueError as e:
-            log.error("error: %s", e)
+        start = time.time()
+        ast_cache = AstCache(
+            view.file_name(), self.clang_flags, self.version_str)
+        trans_unit = ast_cache.load(self.cindex, self.index)
+        if not trans_unit:
+            return False
+        log.debug("loaded translation unit from ast cache in %s seconds",
+                  time.time() - start)
+        self.tu = trans_unit
+        self.__on_tu_changed()
+        self.__tu_from_ast = True
+        self.__full_parse_done.clear()
+        self.save_errors(self.tu.diagnostics)
+        if settings.show_errors:
+            self.show_errors(view)
+        # The job has a lane of its own, so that no other job cancels it.
+        self.__full_parse_job = ThreadJob(
+            name=ThreadJob.FULL_PARSE_TAG,
+            callback=Completer.__full_parse_finished,
+            function=self.__replace_ast_tu,
+            args=[view, settings],
+            lane=(ThreadJob.FULL_PARSE_TAG, view.buffer_id()))
+        Completer.thread_pool.new_job(self.__full_parse_job)
         return True
 
     @staticmethod
-    def _parse_completions(complete_results, excluded):
-        """Create snippet-like structures from a list of completions.
+    def __full_parse_finished(future):
+        """Log errors of a full parse that ran in the thread pool."""
+        if not future.cancelled() and future.exception():
+            log.error("error while compiling in background: %s",
+                      future.exception())
+
+    def __replace_ast_tu(self, view, settings):
+        """Replace translation unit loaded from the ast cache by a parsed one.
+
+        Args:
+            view (sublime.View): current view
+            settings (SettingsStorage): current settings
+        """
+        file_name = view.file_name()
+        file_body = view.substr(sublime.Region(0, view.size()))
+        start = time.time()
+        with self.tu_lock:
+            self.__main_file = (file_name, file_body)
+            unsaved_files = self.__unsaved_files()
+        try:
+            trans_unit = self.__parse_from_source(
+                file_name, unsaved_files, settings)
+        except Exception as e:
+            log.error("error while compiling in background: %s", e)
+            trans_unit = None
+        log.debug("background compilation done in %s seconds",
+                  time.time() - start)
+        with self.tu_lock:
+            self.__tu_from_ast = False
+            try:
+                if not trans_unit:
+                    self.tu = None
+                    return
+                self.tu = trans_unit
+                self.__on_tu_changed()
+                # Reparse with the latest contents of the view. This also
+                # builds the preamble.
+                self.update(view, settings)
+            finally:
+                self.__full_parse_done.set()
+
+    def __needs_other_pch_file(self, file_name, file_body):
+        """Check if the unit should be parsed with another shared pch."""
+        pch_file = self.__shared_pch_file(file_name, file_body)
+        if pch_file == self.__rejected_pch_file:
+            pch_file = None
+        return pch_file != self.__pch_file
+
+    def __wait_for_full_parse(self):
+        """Wait until a unit loaded from the ast cache is fully parsed.
+
+        If the full parse has not started yet, it runs right here instead, as
+        it might otherwise wait for the worker that this job occupies.
+        """
+        if not self.__tu_from_ast:
+            return
+        with self.tu_lock:
+            job, self.__full_parse_job = self.__full_parse_job, None
+        if job and job.future.cancel():
+            log.debug("fully parsing translation unit loaded from ast cache")
+            self.__replace_ast_tu(*job.args)
+            return
+        log.debug("waiting for translation unit parsed in background")
+        self.__full_parse_done.wait()
+
+    def __store_in_ast_cache(self, view, settings):
+        """Store the translation unit if it matches the file on disk.
+
+        Evicts the least recently used entries if the cache grows too big.
+
+        Args:
+            view (sublime.View): current view
+            settings (SettingsStorage): current settings
+        """
+        # A unit that uses a shared pch cannot be loaded without it.
+        if view.is_dirty() or self.__pch_file:
+            return
+        ast_cache = AstCache(
+            view.file_name(), self.clang_flags, self.version_str)
+        if ast_cache.is_up_to_date() or not ast_cache.store(self.tu):
+            return
+        if settings.max_ast_cache_mb > 0:
+            AstCache.evict(settings.max_ast_cache_mb * 1024 * 1024)
+
+    def __on_tu_changed(self):
+        """Start a new generation of the translation unit.
+
+        Invalidates everything computed for the previous generation.
+        """
+        self.tu_generation += 1
+        self.__completions_cache = (None, None)
+        self.__info_cache = {}
+        self.__reparsed_state = None
+
+    def __unsaved_files(self, file_name=None, file_body=None):
+        """Get the unsaved files to pass to libclang, main file first.
+
+        Args:
+            file_name (str): name of the file of the current view, if any
+            file_body (str): contents of the current view
+
+        Returns:
+            list: tuples (file name, contents) of all the served views.
+        """
+        if file_name:
+            if self.__main_file and self.__main_file[0] != file_name:
+                self.__header_bodies[file_name] = file_body
+            else:
+                self.__main_file = (file_name, file_body)
+        unsaved_files = [self.__main_file] if self.__main_file else []
+        unsaved_files += sorted(self.__header_bodies.items())
+        return unsaved_files
+
+    @staticmethod
+    def __cursor_identity(cursor):
+        """Identify the symbol a cursor points to within a translation unit.
 
         Args:
-            complete_results (list): raw completions list
-            excluded (list): list of excluded classes of completions
+            cursor (cindex.Cursor): cursor to identify
 
         Returns:
-            list: updated completions
+            tuple: kind of the cursor with its USR if it has one, or with the
+                location of its extent otherwise.
         """
-        completions = []
+        usr = cursor.get_usr()
+        if usr:
+            return (cursor.kind.value, usr)
+        start = cursor.extent.start
+        end = cursor.extent.end
+        file_name = start.file.name if start.file else None
+        return (cursor.kind.value, file_name, start.offset, end.offset)
 
-        # sort results according to their clang based priority
-        sorted_results = sorted(complete_results.results,
-                                key=lambda x: x.string.priority)
+    def __remember_reparsed_state(self, file_name, change_count, body_hash):
+        """Remember what the translation unit was reparsed with.
 
-        for c in sorted_results:
-            if not Completer._is_valid_result(c, excluded):
+        Args:
+            file_name (str): name of the parsed file
+            change_count (int): change count of the view
+            body_hash (int): hash of the contents of the view
+        """
+        self.__reparsed_state = {
+            'file_name': file_name,
+            'change_count': change_count,
+            'body_hash': body_hash,
+            'flags_hash': hash(tuple(self.clang_flags))}
+        self.__include_mtimes = {}
+        for include in self.tu.get_includes():
+            include_name = include.include.name
+            if include_name in self.__include_mtimes:
                 continue
-            hint = ''
-            contents = ''
-            trigger = ''
-            place_holders = 1
-            for chunk in c.string:
-                if not chunk:
-                    continue
-                if not chunk.spelling:
-                    continue
-                hint += chunk.spelling
-                if chunk.isKindTypedText():
-                    trigger += chunk.spelling
-                if chunk.isKindResultType():
-                    hint += ' '
-                    continue
-                if chunk.isKindOptional():
-                    continue
-                if chunk.isKindInformative():
-                    continue
-                if chunk.isKindPlaceHolder():
-                    contents += ('${' + str(place_holders) + ':' +
-                                 chunk.spelling + '}')
-                    place_holders += 1
-                else:
-                    contents += chunk.spelling
-            completions.append([trigger + "\t" + hint, contents])
-        return completions
+            self.__include_mtimes[include_name] = Completer.__mtime(
+                include_name)
+
+    @staticmethod
+    def __mtime(file_name):
+        """Get the modification time of a file or None if it is missing."""
+        try:
+            return path.getmtime(file_name)
+        except OSError:
+            return None
+
+    def __is_reparse_redundant(
+            self, file_name, change_count=None, body_hash=None):
+        """Check if a reparse would produce the same translation unit.
+
+        Args:
+            file_name (str): name of the file in the view
+            change_count (int): change count of the view, if known
+            body_hash (int): hash of the contents of the view, if known
+
+        Returns:
+            bool: True if nothing has changed since the last reparse.
+        """
+        state = self.__reparsed_state
+        if not state or state['file_name'] != file_name:
+            return False
+        if change_count is not None and \
+                change_count != state['change_count']:
+            return False
+        if body_hash is not None and body_hash != state['body_hash']:
+            return False
+        if state['flags_hash'] != hash(tuple(self.clang_flags)):
+            return False
+        for include_name, mtime in self.__include_mtimes.items():
+            if Completer.__mtime(include_name) != mtime:
+                return False
+        return True
+
+    @staticmethod
+    def _get_typed_prefix(view, trigger_position):
+        """Get the text typed between the trigger and the cursor.
+
+        Args:
+            view (sublime.View): current view
+            trigger_position (int): position right after the trigger
+
+        Returns:
+            str: typed identifier prefix or None if the cursor has left the
+                token that starts at the trigger position.
+        """
+        selection = view.sel()
+        if not selection or len(selection) < 1:
+            return None
+        cursor_position = selection[0].a
+        if cursor_position < trigger_position:
+            return None
+        typed_text = view.substr(
+            sublime.Region(trigger_position, cursor_position))
+        for char in typed_text:
+            if not (char.isalnum() or char == '_'):
+                return None
+        return typed_text
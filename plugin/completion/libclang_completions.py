@@ -0,0 +1,320 @@
+"""Convert libclang results into plain python structures.
+
+This module does not depend on Sublime Text, so that it can also be used by
+the libclang worker processes. For the same reason it only uses absolute
+imports.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import heapq
+import logging
+
+log = logging.getLogger("ECC")
+
+# Symbols declared in these cursors are local, so we do not index them.
+FUNCTION_LIKE_KINDS = set([
+    "FUNCTION_DECL",
+    "CXX_METHOD",
+    "CONSTRUCTOR",
+    "DESTRUCTOR",
+    "CONVERSION_FUNCTION",
+    "FUNCTION_TEMPLATE",
+    "OBJC_INSTANCE_METHOD_DECL",
+    "OBJC_CLASS_METHOD_DECL",
+])
+
+
+class LibClangCompletions:
+    """Helpers to process results of libclang."""
+
+    @staticmethod
+    def ignore_lists(cindex):
+        """Get the kinds of completions that are not shown to the user.
+
+        Args:
+            cindex (module): cindex module in use.
+
+        Returns:
+            (list, list): kinds ignored after any trigger and the kinds that
+                are additionally ignored after a member access trigger.
+        """
+        default_ignore_list = [cindex.CursorKind.DESTRUCTOR]
+        bigger_ignore_list = default_ignore_list + [
+            cindex.CursorKind.CLASS_DECL,
+            cindex.CursorKind.ENUM_CONSTANT_DECL]
+        return default_ignore_list, bigger_ignore_list
+
+    @staticmethod
+    def is_valid_result(completion_result, excluded_kinds):
+        """Check if completion is valid.
+
+           Remove excluded types and unaccessible members.
+
+        Args:
+            completion_result: completion result from libclang
+            excluded_kinds (list): list of CursorKind types that shouldn't be
+                                   added to completion list
+
+        Returns:
+            boolean: True if completion should be added to completion list
+        """
+        if str(completion_result.string.availability) != "Available":
+            return False
+        try:
+            if completion_result.kind in excluded_kinds:
+                return False
+        except ValueError as e:
+            log.error("error: %s", e)
+        return True
+
+    @staticmethod
+    def parse_completions(complete_results, excluded, limit=0, prefix=''):
+        """Create snippet-like structures from a list of completions.
+
+        Args:
+            complete_results (list): raw completions list
+            excluded (list): list of excluded classes of completions
+            limit (int): maximum number of completions, 0 for all of them
+            prefix (str): typed prefix the completions must match
+
+        Returns:
+            list: updated completions
+        """
+        lazy_completions = LazyCompletions(complete_results, excluded)
+        if prefix:
+            return lazy_completions.matching(prefix, limit)
+        return lazy_completions.first(limit)
+
+    @staticmethod
+    def materialize(completion_result):
+        """Create a snippet-like structure from a single completion result.
+
+        Args:
+            completion_result: completion result from libclang
+
+        Returns:
+            list: pair [trigger with hint, contents]
+        """
+        hint = ''
+        contents = ''
+        trigger = ''
+        place_holders = 1
+        for chunk in completion_result.string:
+            if not chunk:
+                continue
+            if not chunk.spelling:
+                continue
+            hint += chunk.spelling
+            if chunk.isKindTypedText():
+                trigger += chunk.spelling
+            if chunk.isKindResultType():
+                hint += ' '
+                continue
+            if chunk.isKindOptional():
+                continue
+            if chunk.isKindInformative():
+                continue
+            if chunk.isKindPlaceHolder():
+                contents += ('${' + str(place_holders) + ':' +
+                             chunk.spelling + '}')
+                place_holders += 1
+            else:
+                contents += chunk.spelling
+        return [trigger + "\t" + hint, contents]
+
+    @staticmethod
+    def typed_text(completion_result):
+        """Get the text that the user types to pick a completion result.
+
+        This is much cheaper than materializing the result as we stop at the
+        first typed text chunk, which is usually one of the first chunks.
+
+        Args:
+            completion_result: completion result from libclang
+
+        Returns:
+            str: typed text of the result
+        """
+        for chunk in completion_result.string:
+            if chunk and chunk.isKindTypedText():
+                return chunk.spelling or ''
+        return ''
+
+    @staticmethod
+    def fuzzy_match(prefix, text):
+        """Check if the characters of a prefix appear in text in order.
+
+        Args:
+            prefix (str): lower case typed prefix
+            text (str): text to match, e.g. a trigger of a completion
+
+        Returns:
+            bool: True if the text matches the prefix ignoring the case.
+        """
+        text = text.lower()
+        position = 0
+        for char in prefix:
+            position = text.find(char, position) + 1
+            if position == 0:
+                return False
+        return True
+
+    @staticmethod
+    def collect_symbols(translation_unit, file_name=None):
+        """Collect the symbols declared in a single file of a unit.
+
+        Other files are skipped, they are indexed on their own. Bodies of
+        functions are skipped too, as their symbols are local.
+
+        Args:
+            translation_unit (cindex.TranslationUnit): unit to walk.
+            file_name (str): file to collect the symbols of, the main file
+                of the unit if None, e.g. a header served by the unit.
+
+        Returns:
+            list: symbols as lists [usr, spelling, is_definition, line,
+                column] in the format of SymbolIndex.
+        """
+        if file_name is None:
+            file_name = translation_unit.spelling
+        symbols = []
+        cursors = [cursor for cursor in translation_unit.cursor.get_children()
+                   if cursor.location.file and
+                   cursor.location.file.name == file_name]
+        cursors.reverse()
+        while cursors:
+            cursor = cursors.pop()
+            if not cursor.kind.is_declaration():
+                continue
+            usr = cursor.get_usr()
+            if usr:
+                symbols.append([usr,
+                                cursor.spelling,
+                                bool(cursor.is_definition()),
+                                cursor.location.line,
+                                cursor.location.column])
+            if cursor.kind.name in FUNCTION_LIKE_KINDS:
+                continue
+            children = list(cursor.get_children())
+            children.reverse()
+            cursors += children
+        return symbols
+
+    @staticmethod
+    def serialize_diagnostics(diagnostics):
+        """Convert diagnostics into dicts that can be sent between processes.
+
+        Args:
+            diagnostics (list): diagnostics of a translation unit.
+
+        Returns:
+            list(dict): location, spelling and severity of each diagnostic.
+        """
+        return [{'location': str(diag.location),
+                 'spelling': str(diag.spelling),
+                 'severity': diag.severity} for diag in diagnostics]
+
+
+class LazyCompletions:
+    """Completions that are only created when they are shown to the user.
+
+    Walking the chunks of a completion result takes several calls through
+    ctypes. After `::` in a big namespace there can be tens of thousands of
+    results, most of which are never shown. So only the priorities are read
+    upfront and the results are materialized best first, on demand.
+    """
+
+    def __init__(self, complete_results, excluded):
+        """Order the results by their priority.
+
+        Args:
+            complete_results (CodeCompletionResults): results from libclang.
+                Kept alive as long as this object.
+            excluded (list): list of excluded classes of completions
+        """
+        self.__complete_results = complete_results
+        self.__results = complete_results.results
+        self.__excluded = excluded
+        # Results that were not looked at yet. The index keeps the order of
+        # results with the same priority stable.
+        self.__heap = [(result.string.priority, index)
+                       for index, result in enumerate(self.__results)]
+        heapq.heapify(self.__heap)
+        # Valid completions taken from the top of the heap in order.
+        self.__completions = []
+        # Completions materialized while searching the rest of the results.
+        self.__materialized = {}
+        self.__typed_texts = {}
+
+    def first(self, limit):
+        """Get the completions with the best priority.
+
+        Args:
+            limit (int): maximum number of completions, 0 for all of them
+
+        Returns:
+            list: completions as pairs [trigger, contents]
+        """
+        while self.__heap and (
+                limit < 1 or len(self.__completions) < limit):
+            _, index = heapq.heappop(self.__heap)
+            completion = self.__materialize_if_valid(index)
+            if completion:
+                self.__completions.append(completion)
+        if limit < 1:
+            return list(self.__completions)
+        return self.__completions[:limit]
+
+    def matching(self, prefix, limit):
+        """Get the best completions that fuzzy match the typed prefix.
+
+        Only the typed text of the results is read to match them. Just the
+        matching results are materialized.
+
+        Args:
+            prefix (str): typed prefix
+            limit (int): maximum number of completions, 0 for all of them
+
+        Returns:
+            list: completions as pairs [trigger, contents]
+        """
+        prefix = prefix.lower()
+        matches = []
+        for completion in self.__completions:
+            if limit > 0 and len(matches) >= limit:
+                return matches
+            trigger = completion[0].split('\t', 1)[0]
+            if LibClangCompletions.fuzzy_match(prefix, trigger):
+                matches.append(completion)
+        # A sorted list is still a valid heap, so we can walk the rest of the
+        # results in the order of their priority without popping them.
+        self.__heap.sort()
+        for _, index in self.__heap:
+            if limit > 0 and len(matches) >= limit:
+                break
+            if not LibClangCompletions.fuzzy_match(
+                    prefix, self.__typed_text(index)):
+                continue
+            completion = self.__materialize_if_valid(index)
+            if completion:
+                matches.append(completion)
+        return matches
+
+    def __typed_text(self, index):
+        """Get a typed text of a result, cache it for the next prefix."""
+        if index not in self.__typed_texts:
+            self.__typed_texts[index] = LibClangCompletions.typed_text(
+                self.__results[index])
+        return self.__typed_texts[index]
+
+    def __materialize_if_valid(self, index):
+        """Materialize a result once, returns None if it is not valid."""
+        if index not in self.__materialized:
+            result = self.__results[index]
+            if LibClangCompletions.is_valid_result(result, self.__excluded):
+                self.__materialized[index] = \
+                    LibClangCompletions.materialize(result)
+            else:
+                self.__materialized[index] = None
+        return self.__materialized[index]
@@ -0,0 +1,243 @@
+"""A worker process that serves libclang requests over pipes.
+
+The worker is started by the WorkerPool with a standalone python interpreter
+and does not depend on Sublime Text. It reads one json request per line from
+stdin and writes one json response per line to stdout. Every request holds
+all the data needed to (re)build a translation unit, so a restarted worker
+can continue where a crashed one stopped.
+
+Usage:
+    python3 libclang_worker.py <cindex_module> [<libclang_file> <libclang_dir>]
+"""
+import io
+import os
+import sys
+import json
+import importlib
+
+COMPLETION_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(COMPLETION_DIR)
+
+
+class LibClangWorker:
+    """Hold translation units and answer the requests about them."""
+
+    def __init__(self, cindex, completions_helper, resource_usage):
+        """Initialize the worker.
+
+        Args:
+            cindex (module): cindex module with configured library path.
+            completions_helper (class): LibClangCompletions class.
+            resource_usage (class): TuResourceUsage class.
+        """
+        self.cindex = cindex
+        self.helper = completions_helper
+        self.resource_usage = resource_usage
+        self.index = None
+        self.units = {}
+        self.default_ignore_list = None
+        self.bigger_ignore_list = None
+
+    def handle(self, request):
+        """Dispatch a request to a handler.
+
+        Args:
+            request (dict): request with a 'command' field.
+
+        Returns:
+            object: result of the command that can be dumped to json.
+        """
+        handler = getattr(self, 'cmd_' + request['command'], None)
+        if not handler:
+            raise ValueError("unknown command: " + request['command'])
+        return handler(request)
+
+    def cmd_ping(self, request):
+        """Check that the worker is alive."""
+        return {'pid': os.getpid()}
+
+    def cmd_update(self, request):
+        """Parse or reparse a translation unit and return its diagnostics."""
+        unit = self.__unit_for(request, reparse=True)
+        return self.helper.serialize_diagnostics(unit.diagnostics)
+
+    def cmd_complete(self, request):
+        """Complete code at the given position."""
+        unit = self.__unit_for(request)
+        complete_obj = unit.codeComplete(
+            request['file_name'],
+            request['row'], request['col'],
+            unsaved_files=self.__unsaved_files(request),
+            include_macros=True,
+            include_brief_comments=request['include_brief_comments'])
+        if complete_obj is None or len(complete_obj.results) == 0:
+            return []
+        if request['use_bigger_ignore_list']:
+            excluded = self.bigger_ignore_list
+        else:
+            excluded = self.default_ignore_list
+        return self.helper.parse_completions(
+            complete_obj, excluded, request['max_completions_shown'],
+            request.get('typed_prefix') or '')
+
+    def cmd_info(self, request):
+        """Get a short description of the symbol at the given position."""
+        cursor = self.__cursor_at(request)
+        if not cursor or not cursor.referenced:
+            return None
+        referenced = cursor.referenced
+        declaration = referenced.displayname or referenced.spelling
+        type_spelling = referenced.result_type.spelling or \
+            referenced.type.spelling
+        if type_spelling and type_spelling != declaration:
+            declaration = type_spelling + " " + declaration
+        return {'declaration': declaration,
+                'brief_comment': referenced.brief_comment}
+
+    def cmd_declaration(self, request):
+        """Get the location of a declaration of the symbol under cursor."""
+        cursor = self.__cursor_at(request)
+        if not cursor or not cursor.referenced:
+            return None
+        ref = cursor.referenced
+        ref_new = None
+        if cursor.kind.is_declaration():
+            ref_new = ref.get_definition()
+        location = (ref_new or ref).location
+        if not location or not location.file:
+            return None
+        return {'file': location.file.name,
+                'line': location.line,
+                'column': location.column}
+
+    def cmd_definition(self, request):
+        """Get the location of a definition if the unit contains it."""
+        cursor = self.__cursor_at(request)
+        if not cursor or not cursor.referenced:
+            return None
+        definition = cursor.referenced.get_definition()
+        if not definition or not definition.location.file:
+            return None
+        location = definition.location
+        return {'file': location.file.name,
+                'line': location.line,
+                'column': location.column}
+
+    def cmd_usr(self, request):
+        """Get the USR of the symbol under cursor."""
+        cursor = self.__cursor_at(request)
+        if not cursor or not cursor.referenced:
+            return None
+        return cursor.referenced.get_usr() or None
+
+    def cmd_symbols(self, request):
+        """Collect the symbols declared in the main file."""
+        return self.helper.collect_symbols(self.__unit_for(request))
+
+    def cmd_memory(self, request):
+        """Get the memory used by the translation unit of a view."""
+        stored = self.units.get(request['v_id'])
+        if not stored:
+            return 0
+        return self.resource_usage.memory_in_bytes(
+            self.cindex, stored['unit'])
+
+    def cmd_dispose(self, request):
+        """Forget the translation unit of a view."""
+        self.units.pop(request['v_id'], None)
+        return None
+
+    def __cursor_at(self, request):
+        unit = self.__unit_for(request)
+        return unit.cursor.from_location(
+            unit, unit.get_location(request['file_name'],
+                                    (request['row'], request['col'])))
+
+    @staticmethod
+    def __unsaved_files(request):
+        return [(request['file_name'], request['contents'])]
+
+    def __unit_for(self, request, reparse=False):
+        """Get a translation unit for a request, parse it if needed."""
+        if not self.index:
+            self.index = self.cindex.Index.create()
+            self.default_ignore_list, self.bigger_ignore_list = \
+                self.helper.ignore_lists(self.cindex)
+        key = request['v_id']
+        flags = request['flags']
+        stored = self.units.get(key)
+        if stored and stored['flags'] == flags and \
+                stored['file_name'] == request['file_name']:
+            unit = stored['unit']
+            if reparse:
+                unit.reparse(unsaved_files=self.__unsaved_files(request))
+            return unit
+        TU = self.cindex.TranslationUnit
+        parse_options = (TU.PARSE_PRECOMPILED_PREAMBLE |
+                         TU.PARSE_DETAILED_PROCESSING_RECORD |
+                         TU.PARSE_INCLUDE_BRIEF_COMMENTS_IN_CODE_COMPLETION)
+        if request['use_libclang_caching']:
+            parse_options |= TU.PARSE_CACHE_COMPLETION_RESULTS
+        unit = TU.from_source(
+            filename=request['file_name'],
+            args=flags,
+            unsaved_files=self.__unsaved_files(request),
+            options=parse_options,
+            index=self.index)
+        # Build the preamble right away, so that completion is fast.
+        unit.reparse(unsaved_files=self.__unsaved_files(request))
+        self.units[key] = {'unit': unit,
+                           'flags': flags,
+                           'file_name': request['file_name']}
+        return unit
+
+
+def load_cindex(module_name, libclang_file, libclang_dir):
+    """Import a bundled cindex module and point it to libclang.
+
+    Args:
+        module_name (str): name of the module, e.g. "cindex50".
+        libclang_file (str): full path to libclang, might be empty.
+        libclang_dir (str): folder with libclang, might be empty.
+
+    Returns:
+        module: cindex module.
+    """
+    cindex = importlib.import_module("clang." + module_name)
+    if libclang_file:
+        cindex.Config.set_library_file(libclang_file)
+    if libclang_dir:
+        cindex.Config.set_library_path(libclang_dir)
+    return cindex
+
+
+def main(argv):
+    """Serve requests until stdin is closed."""
+    sys.path.insert(0, PLUGIN_DIR)
+    sys.path.insert(0, COMPLETION_DIR)
+    from libclang_completions import LibClangCompletions
+    from utils.tu_resource_usage import TuResourceUsage
+
+    module_name = argv[1]
+    libclang_file = argv[2] if len(argv) > 2 else ''
+    libclang_dir = argv[3] if len(argv) > 3 else ''
+    cindex = load_cindex(module_name, libclang_file, libclang_dir)
+    worker = LibClangWorker(cindex, LibClangCompletions, TuResourceUsage)
+
+    stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    for line in stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        response = {'id': request.get('id')}
+        try:
+            response['result'] = worker.handle(request)
+        except Exception as e:
+            response['error'] = "{}: {}".format(type(e).__name__, e)
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,136 @@
+"""Contains a class that serves a header from the unit of its owner.
+
+Attributes:
+    log (logging.Logger): logger for this module
+"""
+import logging
+import weakref
+
+from .base_complete import BaseCompleter
+
+log = logging.getLogger("ECC")
+
+
+class Completer(BaseCompleter):
+    """Serves a header view from the translation unit of a source file.
+
+    Headers are rarely self-contained, so parsing them on their own is slow
+    and produces wrong errors. Once a source file that includes the header,
+    its owner, is parsed with libclang, the owner's unit is reparsed with the
+    unsaved contents of the header instead. Completions, info and errors in
+    the header view are then computed from this unit.
+
+    The owner is only referenced weakly, so that the unit is freed once the
+    config of the owner is removed. The config of the header is then
+    replaced on the next update, see ViewConfigManager.
+
+    Attributes:
+        owner_file (str): source file whose unit serves the header.
+        valid (bool): False if the owner is gone.
+    """
+    name = "owner"
+
+    def __init__(self, settings, error_vis, owner, owner_file):
+        """Initialize the completer for a header.
+
+        Args:
+            settings (SettingsStorage): object that stores current settings
+            error_vis (ErrorVis): an object of error visualizer
+            owner (lib_complete.Completer): completer of the owner.
+            owner_file (str): source file of the owner.
+        """
+        super().__init__(settings, error_vis)
+        self.compiler_variant = owner.compiler_variant
+        self.owner_file = owner_file
+        self.__owner = weakref.ref(owner)
+        self.valid = owner.valid
+
+    def owner(self):
+        """Get the completer of the owner or None if it is gone."""
+        return self.__owner()
+
+    def has_owner(self, file_name):
+        """Check if the owner is alive and still includes a file.
+
+        Args:
+            file_name (str): file of the header view.
+
+        Returns:
+            bool: True if the owner can serve the file.
+        """
+        owner = self.owner()
+        return owner is not None and owner.includes(file_name)
+
+    def release(self, file_name):
+        """Tell the owner that it does not serve a header anymore.
+
+        Args:
+            file_name (str): file of the header view.
+        """
+        owner = self.owner()
+        if owner is not None:
+            owner.forget_header(file_name)
+
+    def complete(self, completion_request):
+        """Complete code in the header with the unit of the owner."""
+        owner = self.owner()
+        if not owner:
+            return (completion_request, [])
+        return owner.complete(completion_request)
+
+    def info(self, tooltip_request, settings):
+        """Provide info from the unit of the owner."""
+        owner = self.owner()
+        if not owner:
+            return (tooltip_request, None)
+        return owner.info(tooltip_request, settings)
+
+    def update(self, view, settings):
+        """Reparse the unit of the owner with the contents of the header.
+
+        Args:
+            view (sublime.View): view of the header
+            settings: all plugin settings
+
+        Returns:
+            bool: False if the owner cannot serve this header anymore.
+        """
+        owner = self.owner()
+        if not owner or not owner.update_header(view, settings):
+            log.debug("'%s' cannot serve '%s' anymore",
+                      self.owner_file, view.file_name())
+            return False
+        # The owner parses the diagnostics, the error visualizer only shows
+        # those located in the header.
+        self.latest_errors = owner.latest_errors
+        if settings.show_errors:
+            self.show_errors(view)
+        return True
+
+    def get_declaration_location(self, view, row_col):
+        """Get location of declaration from the unit of the owner."""
+        owner = self.owner()
+        if not owner:
+            return None
+        return owner.get_declaration_location(view, row_col)
+
+    def get_definition_location(self, view, row_col):
+        """Get location of a definition from the unit of the owner."""
+        owner = self.owner()
+        if not owner:
+            return None
+        return owner.get_definition_location(view, row_col)
+
+    def get_symbol_usr(self, view, row_col):
+        """Get unified symbol resolution from the unit of the owner."""
+        owner = self.owner()
+        if not owner:
+            return None
+        return owner.get_symbol_usr(view, row_col)
+
+    def collect_symbols(self, view):
+        """Collect symbols declared in the header from the owner's unit."""
+        owner = self.owner()
+        if not owner:
+            return None
+        return owner.collect_header_symbols(view.file_name())
@@ -0,0 +1,461 @@
+"""Share precompiled headers between files that start with the same includes.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import json
+import logging
+import re
+from os import path
+from os import remove
+from threading import Lock
+
+from ..utils.file import File
+from ..utils.thread_job import ThreadJob
+from ..utils.tools import Tools
+
+log = logging.getLogger("ECC")
+
+
+class PchManager:
+    """Build one precompiled header per flags and shared leading includes.
+
+    Files parsed with identical flags often start with the same block of
+    includes, e.g. STL, Boost or Qt. Libclang builds a private preamble for
+    every translation unit, so each view compiles these headers again and
+    keeps them in memory. Once at least two files with identical flags share
+    a leading sequence of includes, this sequence is compiled into a single
+    precompiled header in the temp folder, which all these files then use
+    through -include-pch.
+
+    Only includes in angle brackets are shared, as quoted includes are
+    resolved relative to the including file. Every precompiled header comes
+    with a json file with modification times of all the headers it includes.
+    Once any of them changes, a new precompiled header is built under a new
+    name. The old one is only removed once no translation unit uses it.
+
+    Precompiled headers are built by background jobs of the thread pool.
+    Until a header is built, the files that share it are parsed without it
+    and switch to it on their next update. Whether a header is up to date is
+    only checked again after a file is saved.
+
+    Attributes:
+        FOLDER_NAME (str): name of the folder within temp folder.
+        MIN_FILES (int): number of files that must share includes.
+        HEADER_LANGS (dict): language of a header for every language.
+        folder (str): folder with all the precompiled headers.
+    """
+    FOLDER_NAME = "pch"
+    PCH_EXT = ".pch"
+    META_EXT = ".json"
+    HEADER_EXT = ".h"
+    MIN_FILES = 2
+
+    HEADER_LANGS = {
+        'c': 'c-header',
+        'c++': 'c++-header',
+        'objective-c': 'objective-c-header',
+        'objective-c++': 'objective-c++-header',
+    }
+
+    INCLUDE_REGEX = re.compile(r'^\s*#\s*include\s*(<[^>]+>)\s*(//.*)?$')
+    SKIPPED_LINE_REGEX = re.compile(r'^\s*(//.*|#\s*pragma\s+once\s*)?$')
+
+    __shared = None
+    __shared_lock = Lock()
+
+    def __init__(self, folder):
+        """Initialize a manager storing precompiled headers in a folder.
+
+        Args:
+            folder (str): folder to store the precompiled headers in.
+        """
+        self.folder = folder
+        self.__lock = Lock()
+        # Flags key -> {file name: leading includes of this file}.
+        self.__includes_by_flags = {}
+        # Pch key -> latest precompiled header built for it or None.
+        self.__current_pch = {}
+        # Pch keys with a build job that has not finished yet.
+        self.__building = set()
+        # Pch keys that failed to build since the last save.
+        self.__failed_builds = set()
+        # Precompiled header -> result of the last check since a save.
+        self.__up_to_date = {}
+        # Precompiled header -> number of translation units using it.
+        self.__users = {}
+        # Outdated precompiled headers to remove once nobody uses them.
+        self.__retired = set()
+
+    @staticmethod
+    def get():
+        """Get the manager shared by all translation units."""
+        with PchManager.__shared_lock:
+            if not PchManager.__shared:
+                PchManager.__shared = PchManager(
+                    File.get_temp_dir(PchManager.FOLDER_NAME))
+            return PchManager.__shared
+
+    def args_for(self, file_name, text, flags, cindex, index, thread_pool):
+        """Get the arguments to use a shared precompiled header for a file.
+
+        Starts a job that builds the precompiled header if it does not exist
+        yet or any of the headers it includes has changed.
+
+        Args:
+            file_name (str): full path to the parsed file.
+            text (str): contents of the file.
+            flags (str[]): flags used to parse the file.
+            cindex (module): cindex module to use.
+            index (cindex.Index): index to parse the header with.
+            thread_pool (ThreadPool): pool to build the header in.
+
+        Returns:
+            str[]: arguments to add to the flags, empty if there is no
+                precompiled header to share yet.
+        """
+        if PchManager.header_flags(flags) is None:
+            return []
+        shared = self.shared_includes(
+            file_name, PchManager.leading_includes(text), flags)
+        if not shared:
+            return []
+        key = Tools.get_unique_str("\n".join(list(flags) + list(shared)))
+        pch_file = self.__get_current_pch(key)
+        if pch_file and self.is_up_to_date(pch_file):
+            return ['-include-pch', pch_file]
+        with self.__lock:
+            if key in self.__building or key in self.__failed_builds:
+                return []
+            self.__building.add(key)
+        job = ThreadJob(
+            name=ThreadJob.PCH_TAG,
+            callback=PchManager.__build_finished,
+            function=self.__build_in_background,
+            args=[key, flags, shared, cindex, index],
+            lane=(ThreadJob.PCH_TAG, key))
+        thread_pool.new_job(job)
+        return []
+
+    def acquire(self, pch_file):
+        """Remember that a translation unit uses a precompiled header."""
+        with self.__lock:
+            self.__users[pch_file] = self.__users.get(pch_file, 0) + 1
+
+    def release(self, pch_file):
+        """Forget a user of a precompiled header, remove it if outdated."""
+        with self.__lock:
+            users = self.__users.get(pch_file, 0) - 1
+            if users > 0:
+                self.__users[pch_file] = users
+                return
+            self.__users.pop(pch_file, None)
+            if pch_file not in self.__retired:
+                return
+            self.__retired.discard(pch_file)
+        PchManager.__remove(pch_file)
+
+    def forget(self, file_name):
+        """Forget the includes of a file that is not parsed anymore.
+
+        Args:
+            file_name (str): full path to the file.
+        """
+        with self.__lock:
+            for flags_key, files in list(self.__includes_by_flags.items()):
+                files.pop(file_name, None)
+                if not files:
+                    del self.__includes_by_flags[flags_key]
+
+    def file_saved(self):
+        """Check again if precompiled headers are up to date.
+
+        Also allows building headers again that failed to build.
+        """
+        with self.__lock:
+            self.__up_to_date.clear()
+            self.__failed_builds.clear()
+
+    def shared_includes(self, file_name, includes, flags):
+        """Remember the includes of a file and find those it shares.
+
+        Args:
+            file_name (str): full path to the file.
+            includes (tuple): leading includes of the file.
+            flags (str[]): flags used to parse the file.
+
+        Returns:
+            tuple: longest sequence of leading includes that this file shares
+                with another file with identical flags, empty if none.
+        """
+        flags_key = Tools.get_unique_str("\n".join(flags))
+        with self.__lock:
+            files = self.__includes_by_flags.setdefault(flags_key, {})
+            if includes:
+                files[file_name] = includes
+            else:
+                files.pop(file_name, None)
+            longest = 0
+            sharing_files = 1
+            for other_file, other_includes in files.items():
+                if other_file == file_name:
+                    continue
+                common = PchManager.__common_length(includes, other_includes)
+                if common > longest:
+                    longest = common
+                    sharing_files = 1
+                if common == longest and common:
+                    sharing_files += 1
+            if sharing_files < PchManager.MIN_FILES:
+                return ()
+            return includes[:longest]
+
+    def is_up_to_date(self, pch_file):
+        """Check that a precompiled header exists and its headers are unchanged.
+
+        The result is reused until a file is saved, see file_saved.
+
+        Args:
+            pch_file (str): path to the precompiled header.
+
+        Returns:
+            bool: True if the precompiled header can still be used.
+        """
+        with self.__lock:
+            up_to_date = self.__up_to_date.get(pch_file)
+        if up_to_date is None:
+            up_to_date = PchManager.__check_up_to_date(pch_file)
+            with self.__lock:
+                self.__up_to_date[pch_file] = up_to_date
+        return up_to_date
+
+    @staticmethod
+    def __check_up_to_date(pch_file):
+        """Compare modification times of the headers with the meta file."""
+        meta = PchManager.__read_meta(PchManager.__meta_file_for(pch_file))
+        if not meta or meta.get('pch_file') != pch_file:
+            return False
+        if not path.exists(pch_file):
+            return False
+        for file_name, mtime in meta.get('mtimes', {}).items():
+            if PchManager.__get_mtime(file_name) != mtime:
+                log.debug("'%s' changed, '%s' is outdated", file_name,
+                          pch_file)
+                return False
+        return True
+
+    @staticmethod
+    def has_pch_errors(tu, cindex):
+        """Check if a translation unit failed to use a precompiled header.
+
+        Args:
+            tu (cindex.TranslationUnit): unit parsed with -include-pch.
+            cindex (module): cindex module the unit was parsed with.
+
+        Returns:
+            bool: True if there are fatal errors about the header.
+        """
+        for diag in tu.diagnostics:
+            if diag.severity < cindex.Diagnostic.Fatal:
+                continue
+            message = diag.spelling.lower()
+            if 'precompiled' in message or 'pch' in message or \
+                    'ast file' in message:
+                log.debug("shared pch cannot be used: %s", diag.spelling)
+                return True
+        return False
+
+    @staticmethod
+    def leading_includes(text):
+        """Find the includes in angle brackets at the start of a file.
+
+        Blank lines, comments and `#pragma once` are skipped. Anything else,
+        e.g. a quoted include or a macro definition, ends the sequence.
+
+        Args:
+            text (str): contents of a file.
+
+        Returns:
+            tuple: includes like "<vector>" in the order they appear.
+        """
+        includes = []
+        in_comment = False
+        for line in text.splitlines():
+            if in_comment:
+                in_comment = '*/' not in line
+                continue
+            stripped = line.strip()
+            if stripped.startswith('/*'):
+                in_comment = '*/' not in stripped[2:]
+                if in_comment or stripped.endswith('*/'):
+                    continue
+                break
+            if PchManager.SKIPPED_LINE_REGEX.match(line):
+                continue
+            match = PchManager.INCLUDE_REGEX.match(line)
+            if not match:
+                break
+            includes.append(match.group(1))
+        return tuple(includes)
+
+    @staticmethod
+    def header_flags(flags):
+        """Convert flags of a source file to flags that compile a header.
+
+        Args:
+            flags (str[]): flags used to parse a source file.
+
+        Returns:
+            str[]: same flags with the language of a header, None if the
+                language is unknown.
+        """
+        header_flags = list(flags)
+        lang_index = None
+        for index, flag in enumerate(header_flags[:-1]):
+            if flag == '-x':
+                lang_index = index + 1
+        if lang_index is None:
+            return None
+        header_lang = PchManager.HEADER_LANGS.get(header_flags[lang_index])
+        if not header_lang:
+            return None
+        header_flags[lang_index] = header_lang
+        return header_flags
+
+    def __get_current_pch(self, key):
+        """Get the latest precompiled header for a key, read it once."""
+        with self.__lock:
+            if key in self.__current_pch:
+                return self.__current_pch[key]
+        meta = PchManager.__read_meta(
+            path.join(self.folder, key + PchManager.META_EXT))
+        pch_file = meta.get('pch_file') if meta else None
+        with self.__lock:
+            return self.__current_pch.setdefault(key, pch_file)
+
+    def __build_in_background(self, key, flags, includes, cindex, index):
+        """Build a precompiled header and replace the one built before."""
+        pch_file = None
+        old_pch_file = None
+        try:
+            pch_file = self.__build(key, flags, includes, cindex, index)
+        finally:
+            with self.__lock:
+                self.__building.discard(key)
+                if pch_file:
+                    old_pch_file = self.__current_pch.get(key)
+                    self.__current_pch[key] = pch_file
+                    self.__up_to_date[pch_file] = True
+                else:
+                    self.__failed_builds.add(key)
+        if old_pch_file and old_pch_file != pch_file:
+            self.__retire(old_pch_file)
+
+    @staticmethod
+    def __build_finished(future):
+        """Log errors of a build that ran in the thread pool."""
+        if not future.cancelled() and future.exception():
+            log.error("cannot build shared pch: %s", future.exception())
+
+    def __retire(self, pch_file):
+        """Remove an outdated precompiled header once nobody uses it."""
+        with self.__lock:
+            if self.__users.get(pch_file):
+                log.debug("keep outdated '%s' until it is unused", pch_file)
+                self.__retired.add(pch_file)
+                return
+        PchManager.__remove(pch_file)
+
+    def __build(self, key, flags, includes, cindex, index):
+        """Build a precompiled header and store its meta file.
+
+        Returns:
+            str: path to the precompiled header, None if it cannot be built.
+        """
+        header_file = path.join(self.folder, key + PchManager.HEADER_EXT)
+        with open(header_file, 'w') as header:
+            header.write("\n".join(
+                "#include " + include for include in includes) + "\n")
+        log.debug("building shared pch for %s", ", ".join(includes))
+        try:
+            tu = cindex.TranslationUnit.from_source(
+                filename=header_file,
+                args=PchManager.header_flags(flags),
+                options=cindex.TranslationUnit.PARSE_INCOMPLETE,
+                index=index)
+        except Exception as e:
+            log.error("cannot build shared pch: %s", e)
+            return None
+        errors = [diag.spelling for diag in tu.diagnostics
+                  if diag.severity >= cindex.Diagnostic.Error]
+        if errors:
+            log.debug("not sharing includes that have errors: %s", errors)
+            return None
+        mtimes = {}
+        for include in tu.get_includes():
+            include_name = include.include.name
+            mtimes[include_name] = PchManager.__get_mtime(include_name)
+        # Name the header after the included files, so that a new header
+        # never overwrites one that translation units might still use.
+        stamp = Tools.get_unique_str(json.dumps(mtimes, sort_keys=True))
+        pch_file = path.join(self.folder, key + "_" + stamp[:8] +
+                             PchManager.PCH_EXT)
+        try:
+            tu.save(pch_file)
+            with open(PchManager.__meta_file_for(pch_file), 'w') as meta:
+                json.dump({'pch_file': pch_file, 'mtimes': mtimes}, meta)
+        except Exception as e:
+            log.error("cannot store shared pch '%s': %s", pch_file, e)
+            PchManager.__remove(pch_file)
+            return None
+        log.debug("built shared pch '%s' from %s headers",
+                  pch_file, len(mtimes))
+        return pch_file
+
+    @staticmethod
+    def __meta_file_for(pch_file):
+        """Get the meta file for a precompiled header named key_stamp.pch."""
+        if not pch_file:
+            return None
+        key = path.basename(pch_file).rsplit('_', 1)[0]
+        return path.join(path.dirname(pch_file), key + PchManager.META_EXT)
+
+    @staticmethod
+    def __read_meta(meta_file):
+        """Read a meta file or return None if it cannot be read."""
+        if not meta_file or not path.exists(meta_file):
+            return None
+        try:
+            with open(meta_file, 'r') as meta:
+                return json.load(meta)
+        except (OSError, ValueError) as e:
+            log.debug("cannot read pch meta file '%s': %s", meta_file, e)
+            return None
+
+    @staticmethod
+    def __remove(file_name):
+        """Remove a file that might still be in use, e.g. on Windows."""
+        if not file_name:
+            return
+        try:
+            remove(file_name)
+        except OSError as e:
+            log.debug("cannot remove '%s': %s", file_name, e)
+
+    @staticmethod
+    def __common_length(first, second):
+        """Count the leading elements two sequences share."""
+        length = 0
+        for first_item, second_item in zip(first, second):
+            if first_item != second_item:
+                break
+            length += 1
+        return length
+
+    @staticmethod
+    def __get_mtime(file_name):
+        """Get modification time of a file or None if it does not exist."""
+        try:
+            return path.getmtime(file_name)
+        except OSError:
+            return None
@@ -0,0 +1,288 @@
+"""Contains a class for libclang based completion in worker processes.
+
+Attributes:
+    log (logging.Logger): logger for this module
+"""
+import sublime
+import logging
+
+from collections import namedtuple
+from os import path
+from threading import Lock
+
+from .base_complete import BaseCompleter
+from .compiler_variant import LibClangCompilerVariant
+from .lib_complete import ALLOWED_TRIGGER_SYMBOLS
+from .lib_complete import Completer as LibCompleter
+from .lib_complete import GLOBAL_TRIGGERS
+from .worker_pool import WORKER_SCRIPT
+from .worker_pool import WorkerCrashedError
+from .worker_pool import WorkerPool
+from .worker_pool import WorkerRequestError
+from ..utils.clang_utils import ClangUtils
+from ..utils.index_location import IndexLocation
+from ..utils.instrumentation import Instrumentation
+from ..utils.subl.subl_bridge import SublBridge
+from ..utils.thread_job import JobToken
+from ..utils.tools import Tools
+from ..utils.subl.row_col import ZeroIndexedRowCol
+from ..utils.subl.row_col import OneIndexedRowCol
+from ..error_vis.popups import Popup
+
+log = logging.getLogger("ECC")
+
+# Mimics the fields of a libclang diagnostic used by LibClangCompilerVariant.
+Diagnostic = namedtuple('Diagnostic', ['location', 'spelling', 'severity'])
+
+
+class Completer(BaseCompleter):
+    """Encapsulates completions based on libclang running in other processes.
+
+    A crash of libclang only kills the worker process that serves the view.
+    The worker is restarted on the next request and rebuilds the translation
+    unit from the data sent along with every request.
+
+    Attributes:
+        pool_lock (threading.Lock): guards creation of the shared pool.
+        shared_pool (WorkerPool): worker processes shared by all completers.
+        shared_pool_key (tuple): settings the shared pool was created with.
+        valid (bool): False if the worker processes cannot be started.
+    """
+    name = "proc"
+    pool_lock = Lock()
+    shared_pool = None
+    shared_pool_key = None
+
+    def __init__(self, settings, error_vis):
+        """Initialize the Completer and make sure the workers are alive.
+
+        Args:
+            settings (SettingStorage): object that stores current settings
+            error_vis (ErrorVis): an object of error visualizer
+        """
+        super().__init__(settings, error_vis)
+        self.compiler_variant = LibClangCompilerVariant()
+        self.use_libclang_caching = settings.use_libclang_caching
+        self.max_completions_shown = settings.max_completions_shown
+        self.v_id = None
+        self.pool = None
+        if not path.exists(WORKER_SCRIPT):
+            log.error("worker script not found: %s", WORKER_SCRIPT)
+            return
+        self.pool = Completer.__get_pool(settings)
+        try:
+            self.pool.request(0, "ping")
+        except (OSError, WorkerCrashedError, WorkerRequestError) as e:
+            log.error("cannot start libclang worker: %s", e)
+            return
+        self.valid = True
+
+    def dispose(self):
+        """Free the translation unit held by the worker.
+
+        Waits for the worker, so it must not be called with locks held that
+        other views need.
+        """
+        if not self.valid or self.v_id is None:
+            return
+        v_id, self.v_id = self.v_id, None
+        try:
+            self.pool.request(v_id, "dispose", v_id=v_id)
+        except (OSError, WorkerCrashedError, WorkerRequestError) as e:
+            log.debug("cannot dispose translation unit: %s", e)
+
+    def complete(self, completion_request):
+        """Create a list of autocompletions. Called asynchronously.
+
+        Args:
+            completion_request (tools.ActionRequest): completion request
+                holding information about the view and needed location.
+
+        Returns:
+            (tools.ActionRequest, list): request along with the completions.
+        """
+        view = completion_request.get_view()
+        point = completion_request.get_trigger_position()
+        trigger = view.substr(point - 2) + view.substr(point - 1)
+        # We clean trigger from all symbols that cannot be part of one.
+        sanitized_trigger = ''.join(
+            [c for c in trigger if c in ALLOWED_TRIGGER_SYMBOLS])
+        log.debug("Current sanitized_trigger: '%s'", sanitized_trigger)
+        # See lib_complete.Completer.complete for why this depends on the
+        # version of clang.
+        include_brief_comments = int(self.version_str[0]) > 3
+        row_col = ZeroIndexedRowCol.from_1d_location(view, point)
+        with Instrumentation.span(Instrumentation.CODE_COMPLETE,
+                                  file=view.file_name()):
+            completions = self.__request(
+                view, "complete", row_col,
+                include_brief_comments=include_brief_comments,
+                max_completions_shown=self.max_completions_shown,
+                typed_prefix=LibCompleter._get_typed_prefix(view, point),
+                use_bigger_ignore_list=(
+                    sanitized_trigger not in GLOBAL_TRIGGERS))
+        return (completion_request, completions or [])
+
+    def info(self, tooltip_request, settings):
+        """Provide information about object in given location.
+
+        Args:
+            tooltip_request (tools.ActionRequest): A request for action
+                from the plugin.
+            settings: All plugin settings.
+
+        Returns:
+            (tools.ActionRequest, Popup): request along with the info popup.
+        """
+        view = tooltip_request.get_view()
+        row_col = ZeroIndexedRowCol.from_1d_location(
+            view, tooltip_request.get_trigger_position())
+        info = self.__request(view, "info", row_col)
+        if not info:
+            return (tooltip_request, None)
+        return (tooltip_request, Popup.info_text(
+            info['declaration'], info['brief_comment'], settings))
+
+    def update(self, view, settings):
+        """Reparse the translation unit in the worker and show errors.
+
+        Args:
+            view (sublime.View): current view
+            settings: ECC settings
+
+        Returns:
+            bool: reparsed successfully
+        """
+        if not SublBridge.is_valid_view(view):
+            return False
+        with Instrumentation.span(Instrumentation.REPARSE,
+                                  file=view.file_name()):
+            diagnostics = self.__request(view, "update")
+        if diagnostics is None:
+            return False
+        self.tu_generation += 1
+        # The worker has updated its unit already, so the job is not stopped
+        # here. Its config would be lost along with the unit in the worker.
+        self.save_errors([Diagnostic(**diag) for diag in diagnostics])
+        if settings.show_errors:
+            self.show_errors(view)
+        return True
+
+    def memory_usage(self):
+        """Get memory used by the translation unit in the worker.
+
+        Returns:
+            int: number of bytes reported by libclang in the worker.
+        """
+        v_id = self.v_id
+        if not self.valid or v_id is None:
+            return 0
+        try:
+            return self.pool.request(v_id, "memory", v_id=v_id) or 0
+        except (OSError, WorkerCrashedError, WorkerRequestError) as e:
+            log.debug("cannot measure translation unit memory: %s", e)
+            return 0
+
+    def get_declaration_location(self, view, row_col):
+        """Get location of declaration from given location in file."""
+        location = self.__request(view, "declaration", row_col)
+        if not location:
+            return None
+        return IndexLocation(filename=location['file'],
+                             line=location['line'],
+                             column=location['column'])
+
+    def get_definition_location(self, view, row_col):
+        """Get location of a definition if the unit contains it."""
+        location = self.__request(view, "definition", row_col)
+        if not location:
+            return None
+        return IndexLocation(filename=location['file'],
+                             line=location['line'],
+                             column=location['column'])
+
+    def get_symbol_usr(self, view, row_col):
+        """Get unified symbol resolution of a symbol at given location."""
+        return self.__request(view, "usr", row_col)
+
+    def collect_symbols(self, view):
+        """Collect symbols declared in the file of this view."""
+        return self.__request(view, "symbols")
+
+    def __request(self, view, command, row_col=None, **kwargs):
+        """Send a request about this view to its worker.
+
+        Args:
+            view (sublime.View): current view
+            command (str): command for the worker
+            row_col (ZeroIndexedRowCol): location in the view if needed
+            **kwargs: additional arguments of the command
+
+        Returns:
+            object: result of the command or None if it failed.
+        """
+        file_name = view.file_name()
+        if not file_name or not path.exists(file_name):
+            log.error("file name does not exist anymore")
+            return None
+        JobToken.check("request " + command)
+        self.v_id = view.buffer_id()
+        if row_col is not None:
+            file_row_col = OneIndexedRowCol.from_zero_indexed(row_col)
+            kwargs['row'] = file_row_col.row
+            kwargs['col'] = file_row_col.col
+        try:
+            return self.pool.request(
+                self.v_id, command,
+                v_id=self.v_id,
+                file_name=file_name,
+                flags=self.clang_flags,
+                contents=view.substr(sublime.Region(0, view.size())),
+                use_libclang_caching=self.use_libclang_caching,
+                **kwargs)
+        except WorkerCrashedError as e:
+            log.error("libclang worker crashed, restarting it: %s", e)
+        except WorkerRequestError as e:
+            log.error("libclang worker failed to '%s': %s", command, e)
+        return None
+
+    @staticmethod
+    def __get_pool(settings):
+        """Get a pool of workers for the settings, create it if needed.
+
+        Libclang is only looked for when the pool has to be created, as
+        finding it might run the clang binary.
+
+        Args:
+            settings (SettingStorage): current settings
+
+        Returns:
+            WorkerPool: pool shared between all completers.
+        """
+        pool_key = (settings.libclang_worker_python,
+                    settings.libclang_worker_processes,
+                    settings.clang_binary,
+                    settings.libclang_path,
+                    settings.clang_version)
+        with Completer.pool_lock:
+            if Completer.shared_pool_key != pool_key:
+                if Completer.shared_pool:
+                    Completer.shared_pool.stop()
+                libclang_dir, libclang_file = ClangUtils.find_libclang(
+                    settings.clang_binary,
+                    settings.libclang_path,
+                    settings.clang_version)
+                cindex_module_name = ClangUtils.get_cindex_module_for_version(
+                    settings.clang_version)
+                worker_args = [cindex_module_name.split('.')[-1],
+                               libclang_file or '',
+                               libclang_dir or '']
+                log.debug("starting %s libclang workers",
+                          settings.libclang_worker_processes)
+                Completer.shared_pool = WorkerPool(
+                    settings.libclang_worker_python,
+                    settings.libclang_worker_processes,
+                    worker_args,
+                    timeout=Tools.COMPILE_TIMEOUT)
+                Completer.shared_pool_key = pool_key
+            return Completer.shared_pool
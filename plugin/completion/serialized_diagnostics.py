@@ -0,0 +1,493 @@
+"""Read diagnostics that clang serialized with -serialize-diagnostics.
+
+Clang stores them in the LLVM bitstream format. This module contains a small
+reader of this format that only supports what clang uses for diagnostics.
+It does not depend on Sublime Text.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import logging
+
+log = logging.getLogger("ECC")
+
+
+class DiagnosticsFormatError(Exception):
+    """Raised when a file is not a valid serialized diagnostics file."""
+    pass
+
+
+class BitstreamReader:
+    """Read abbreviated records and blocks from an LLVM bitstream.
+
+    Attributes:
+        data (bytes): the whole stream.
+        position (int): position of the next bit to read.
+    """
+
+    # Abbreviation ids every block understands.
+    END_BLOCK = 0
+    ENTER_SUBBLOCK = 1
+    DEFINE_ABBREV = 2
+    UNABBREV_RECORD = 3
+    FIRST_APPLICATION_ABBREV = 4
+
+    # Encodings of the operands of an abbreviation.
+    FIXED = 1
+    VBR = 2
+    ARRAY = 3
+    CHAR6 = 4
+    BLOB = 5
+    # Not part of the format, see compile_abbrev.
+    FIXED_RUN = 0
+
+    BLOCKINFO_BLOCK_ID = 0
+    BLOCKINFO_CODE_SETBID = 1
+
+    CHAR6_CHARS = \
+        "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._"
+
+    def __init__(self, data, position=0):
+        """Initialize the reader.
+
+        Args:
+            data (bytes): the stream to read.
+            position (int): position in bytes to start reading at.
+        """
+        self.data = data
+        self.position = position * 8
+        # Block id -> abbreviations defined for it in the BLOCKINFO block.
+        self.block_abbrevs = {}
+
+    def at_end(self):
+        """Check if the whole stream is read."""
+        return self.position >= len(self.data) * 8
+
+    def read(self, width):
+        """Read a fixed width value.
+
+        Args:
+            width (int): number of bits to read.
+
+        Returns:
+            int: the value.
+        """
+        if width == 0:
+            return 0
+        first_byte = self.position >> 3
+        shift = self.position & 7
+        last_byte = first_byte + ((shift + width + 7) >> 3)
+        if last_byte > len(self.data):
+            raise DiagnosticsFormatError("unexpected end of the stream")
+        chunk = int.from_bytes(self.data[first_byte:last_byte], 'little')
+        self.position += width
+        return (chunk >> shift) & ((1 << width) - 1)
+
+    def read_vbr(self, width):
+        """Read a variable width value in chunks of the given width."""
+        high_bit = 1 << (width - 1)
+        value = 0
+        shift = 0
+        while True:
+            chunk = self.read(width)
+            value |= (chunk & (high_bit - 1)) << shift
+            if not chunk & high_bit:
+                return value
+            shift += width - 1
+
+    def align_32(self):
+        """Skip to the next multiple of 32 bits."""
+        self.position = (self.position + 31) & ~31
+
+    def read_blob(self):
+        """Read a blob of bytes aligned to 32 bits."""
+        length = self.read_vbr(6)
+        self.align_32()
+        start = self.position >> 3
+        if start + length > len(self.data):
+            raise DiagnosticsFormatError("unexpected end of a blob")
+        self.position += length * 8
+        self.align_32()
+        return self.data[start:start + length]
+
+    def read_abbrev(self):
+        """Read the definition of an abbreviation.
+
+        Returns:
+            list: operands as tuples (encoding, value), see compile_abbrev.
+        """
+        num_ops = self.read_vbr(5)
+        ops = []
+        while len(ops) < num_ops:
+            if self.read(1):
+                ops.append((None, self.read_vbr(8)))
+                continue
+            encoding = self.read(3)
+            if encoding in (BitstreamReader.FIXED, BitstreamReader.VBR):
+                ops.append((encoding, self.read_vbr(5)))
+            elif encoding in (BitstreamReader.ARRAY, BitstreamReader.CHAR6,
+                              BitstreamReader.BLOB):
+                ops.append((encoding, 0))
+            else:
+                raise DiagnosticsFormatError(
+                    "unknown encoding {}".format(encoding))
+        return BitstreamReader.compile_abbrev(ops)
+
+    @staticmethod
+    def compile_abbrev(ops):
+        """Merge consecutive fixed width operands of an abbreviation.
+
+        Clang stores most values of its records with a fixed width, so they
+        are read with a single read of all their bits.
+
+        Args:
+            ops (list): operands as tuples (encoding, value), a literal value
+                has the encoding None.
+
+        Returns:
+            list: the operands, where runs of literal and fixed width ones
+                are replaced by tuples (FIXED_RUN, width of the run, fields).
+                A field is a tuple (shift, mask) or (literal, None).
+        """
+        compiled = []
+        fields = []
+        width = 0
+        for i, (encoding, value) in enumerate(ops):
+            if i > 0 and ops[i - 1][0] == BitstreamReader.ARRAY:
+                # The element type of an array is read on its own.
+                compiled.append((encoding, value))
+                continue
+            if encoding is None:
+                fields.append((value, None))
+                continue
+            if encoding == BitstreamReader.FIXED:
+                fields.append((width, (1 << value) - 1))
+                width += value
+                continue
+            if fields:
+                compiled.append((BitstreamReader.FIXED_RUN, width, fields))
+                fields = []
+                width = 0
+            compiled.append((encoding, value))
+        if fields:
+            compiled.append((BitstreamReader.FIXED_RUN, width, fields))
+        return compiled
+
+    def read_operand(self, op):
+        """Read a single scalar operand of an abbreviated record."""
+        encoding, value = op
+        if encoding is None:
+            return value
+        if encoding == BitstreamReader.FIXED:
+            return self.read(value)
+        if encoding == BitstreamReader.VBR:
+            # A value without bits is always 0.
+            return self.read_vbr(value) if value else 0
+        if encoding == BitstreamReader.CHAR6:
+            return ord(BitstreamReader.CHAR6_CHARS[self.read(6)])
+        raise DiagnosticsFormatError(
+            "encoding {} is no scalar".format(encoding))
+
+    def read_record(self, abbrev_id, abbrevs):
+        """Read a record.
+
+        Args:
+            abbrev_id (int): abbreviation id the record starts with.
+            abbrevs (list): abbreviations of the current block.
+
+        Returns:
+            tuple: code of the record, list of its values and its blob or
+                None if it has none.
+        """
+        if abbrev_id == BitstreamReader.UNABBREV_RECORD:
+            code = self.read_vbr(6)
+            num_ops = self.read_vbr(6)
+            return code, [self.read_vbr(6) for _ in range(num_ops)], None
+        index = abbrev_id - BitstreamReader.FIRST_APPLICATION_ABBREV
+        if not 0 <= index < len(abbrevs):
+            raise DiagnosticsFormatError(
+                "unknown abbreviation {}".format(abbrev_id))
+        ops = abbrevs[index]
+        values = []
+        blob = None
+        i = 0
+        while i < len(ops):
+            encoding = ops[i][0]
+            if encoding == BitstreamReader.FIXED_RUN:
+                _, width, fields = ops[i]
+                chunk = self.read(width)
+                for shift, mask in fields:
+                    values.append(shift if mask is None
+                                  else (chunk >> shift) & mask)
+            elif encoding == BitstreamReader.ARRAY:
+                # The element type is the next and last operand.
+                i += 1
+                if i >= len(ops):
+                    raise DiagnosticsFormatError("array without element")
+                length = self.read_vbr(6)
+                values += [self.read_operand(ops[i]) for _ in range(length)]
+            elif encoding == BitstreamReader.BLOB:
+                blob = self.read_blob()
+            else:
+                values.append(self.read_operand(ops[i]))
+            i += 1
+        if not values:
+            raise DiagnosticsFormatError("record without code")
+        return values[0], values[1:], blob
+
+    def read_block_info(self, abbrev_width):
+        """Read the BLOCKINFO block that defines abbreviations of blocks."""
+        current_block = None
+        while True:
+            abbrev_id = self.read(abbrev_width)
+            if abbrev_id == BitstreamReader.END_BLOCK:
+                self.align_32()
+                return
+            if abbrev_id == BitstreamReader.ENTER_SUBBLOCK:
+                self.skip_block()
+            elif abbrev_id == BitstreamReader.DEFINE_ABBREV:
+                if current_block is None:
+                    raise DiagnosticsFormatError("abbreviation without block")
+                self.block_abbrevs.setdefault(current_block, []).append(
+                    self.read_abbrev())
+            else:
+                code, values, _ = self.read_record(abbrev_id, [])
+                if code == BitstreamReader.BLOCKINFO_CODE_SETBID and values:
+                    current_block = values[0]
+
+    def skip_block(self):
+        """Skip a block after its id, the ENTER_SUBBLOCK is already read."""
+        self.read_vbr(8)
+        self.read_vbr(4)
+        self.align_32()
+        num_words = self.read(32)
+        self.position += num_words * 32
+
+    def enter_block(self):
+        """Read the header of a block after ENTER_SUBBLOCK.
+
+        Returns:
+            tuple: id of the block and the width of its abbreviation ids.
+        """
+        block_id = self.read_vbr(8)
+        abbrev_width = self.read_vbr(4)
+        self.align_32()
+        # Number of 32 bit words in the block, only needed to skip it.
+        self.read(32)
+        return block_id, abbrev_width
+
+
+class SerializedDiagnostics:
+    """Decode diagnostics serialized by clang into error dicts.
+
+    The error dicts have the format the libclang backend uses: zero based
+    "row" and "col", "file", "error" and "severity". They also hold the
+    "ranges" of the diagnostic and its "fixits", e.g. to replace a range
+    with a text. Notes attached to a diagnostic are skipped, like libclang
+    does.
+    """
+
+    MAGIC = b"DIAG"
+    TOP_LEVEL_ABBREV_WIDTH = 2
+
+    BLOCK_META = 8
+    BLOCK_DIAG = 9
+
+    RECORD_VERSION = 1
+    RECORD_DIAG = 2
+    RECORD_SOURCE_RANGE = 3
+    RECORD_DIAG_FLAG = 4
+    RECORD_CATEGORY = 5
+    RECORD_FILENAME = 6
+    RECORD_FIXIT = 7
+
+    # Clang levels of a diagnostic mapped to libclang severities.
+    LEVEL_NOTE = 1
+    LEVEL_REMARK = 5
+
+    @staticmethod
+    def read_file(file_name):
+        """Read the diagnostics serialized to a file.
+
+        Args:
+            file_name (str): file written by clang.
+
+        Returns:
+            list(dict): errors found in the file, None if the file cannot
+                be read.
+        """
+        try:
+            with open(file_name, 'rb') as dia_file:
+                data = dia_file.read()
+        except OSError as e:
+            log.debug("cannot read diagnostics from '%s': %s", file_name, e)
+            return None
+        try:
+            return SerializedDiagnostics.parse(data)
+        except DiagnosticsFormatError as e:
+            log.error("cannot decode diagnostics in '%s': %s", file_name, e)
+            return None
+
+    @staticmethod
+    def parse(data):
+        """Decode serialized diagnostics.
+
+        Args:
+            data (bytes): contents of a serialized diagnostics file.
+
+        Raises:
+            DiagnosticsFormatError: if the data are not valid.
+
+        Returns:
+            list(dict): errors found in the data.
+        """
+        if not data.startswith(SerializedDiagnostics.MAGIC):
+            raise DiagnosticsFormatError("no serialized diagnostics")
+        reader = BitstreamReader(data, len(SerializedDiagnostics.MAGIC))
+        # File id -> name of the file, shared by all the diagnostics.
+        file_names = {}
+        errors = []
+        width = SerializedDiagnostics.TOP_LEVEL_ABBREV_WIDTH
+        while not reader.at_end():
+            abbrev_id = reader.read(width)
+            if abbrev_id != BitstreamReader.ENTER_SUBBLOCK:
+                raise DiagnosticsFormatError(
+                    "unexpected abbreviation {} at top level".format(
+                        abbrev_id))
+            block_id, abbrev_width = reader.enter_block()
+            if block_id == BitstreamReader.BLOCKINFO_BLOCK_ID:
+                reader.read_block_info(abbrev_width)
+            elif block_id == SerializedDiagnostics.BLOCK_DIAG:
+                error_dict = SerializedDiagnostics.__read_diag(
+                    reader, abbrev_width, file_names)
+                if error_dict:
+                    errors.append(error_dict)
+            else:
+                SerializedDiagnostics.__skip_rest_of_block(
+                    reader, block_id, abbrev_width, file_names)
+        return errors
+
+    @staticmethod
+    def __read_diag(reader, abbrev_width, file_names):
+        """Read a diagnostic block, skipping nested notes."""
+        abbrevs = list(reader.block_abbrevs.get(
+            SerializedDiagnostics.BLOCK_DIAG, []))
+        error_dict = None
+        ranges = []
+        fixits = []
+        while True:
+            abbrev_id = reader.read(abbrev_width)
+            if abbrev_id == BitstreamReader.END_BLOCK:
+                reader.align_32()
+                break
+            if abbrev_id == BitstreamReader.ENTER_SUBBLOCK:
+                # Notes are diagnostic blocks nested in their diagnostic,
+                # only their file names are needed.
+                block_id, width = reader.enter_block()
+                SerializedDiagnostics.__skip_rest_of_block(
+                    reader, block_id, width, file_names)
+                continue
+            if abbrev_id == BitstreamReader.DEFINE_ABBREV:
+                abbrevs.append(reader.read_abbrev())
+                continue
+            code, values, blob = reader.read_record(abbrev_id, abbrevs)
+            if code == SerializedDiagnostics.RECORD_FILENAME:
+                SerializedDiagnostics.__add_file_name(
+                    values, blob, file_names)
+            elif code == SerializedDiagnostics.RECORD_DIAG:
+                error_dict = SerializedDiagnostics.__make_error(
+                    values, blob, file_names)
+            elif code == SerializedDiagnostics.RECORD_SOURCE_RANGE:
+                source_range = SerializedDiagnostics.__make_range(
+                    values, file_names)
+                if source_range:
+                    ranges.append(source_range)
+            elif code == SerializedDiagnostics.RECORD_FIXIT:
+                source_range = SerializedDiagnostics.__make_range(
+                    values, file_names)
+                if source_range:
+                    fixits.append({'range': source_range,
+                                   'text': SerializedDiagnostics.__text(
+                                       blob)})
+        if error_dict:
+            error_dict['ranges'] = ranges
+            error_dict['fixits'] = fixits
+        return error_dict
+
+    @staticmethod
+    def __skip_rest_of_block(reader, block_id, abbrev_width,
+                             file_names=None):
+        """Read a block to its end, only remembering file names in it."""
+        abbrevs = list(reader.block_abbrevs.get(block_id, []))
+        while True:
+            abbrev_id = reader.read(abbrev_width)
+            if abbrev_id == BitstreamReader.END_BLOCK:
+                reader.align_32()
+                return
+            if abbrev_id == BitstreamReader.ENTER_SUBBLOCK:
+                nested_id, width = reader.enter_block()
+                SerializedDiagnostics.__skip_rest_of_block(
+                    reader, nested_id, width, file_names)
+            elif abbrev_id == BitstreamReader.DEFINE_ABBREV:
+                abbrevs.append(reader.read_abbrev())
+            else:
+                code, values, blob = reader.read_record(abbrev_id, abbrevs)
+                if file_names is not None and \
+                        code == SerializedDiagnostics.RECORD_FILENAME:
+                    SerializedDiagnostics.__add_file_name(
+                        values, blob, file_names)
+
+    @staticmethod
+    def __add_file_name(values, blob, file_names):
+        """Remember the name of a file from a FILENAME record.
+
+        The record holds the file id, its size, its modification time and
+        the length of the name stored in the blob.
+        """
+        if values:
+            file_names[values[0]] = SerializedDiagnostics.__text(blob)
+
+    @staticmethod
+    def __make_error(values, blob, file_names):
+        """Make an error dict from a DIAG record.
+
+        The record holds the level, the location as file id, line, column
+        and offset, the category, the flag and the length of the message
+        stored in the blob.
+        """
+        if len(values) < 5:
+            raise DiagnosticsFormatError("diagnostic record is too short")
+        level, file_id, line, column = values[:4]
+        if file_id == 0:
+            # Diagnostics without location cannot be shown in a view.
+            return None
+        if level == SerializedDiagnostics.LEVEL_REMARK:
+            level = SerializedDiagnostics.LEVEL_NOTE
+        return {'file': file_names.get(file_id, ''),
+                'row': max(line - 1, 0),
+                'col': max(column - 1, 0),
+                'error': SerializedDiagnostics.__text(blob),
+                'severity': level}
+
+    @staticmethod
+    def __make_range(values, file_names):
+        """Make a range dict from the first 8 values of a record.
+
+        Both ends are stored as file id, line, column and offset.
+
+        Returns:
+            dict: "file" and zero based "start" and "end" as (row, col) or
+                None if the range has no file.
+        """
+        if len(values) < 8 or values[0] == 0:
+            return None
+        return {'file': file_names.get(values[0], ''),
+                'start': (max(values[1] - 1, 0), max(values[2] - 1, 0)),
+                'end': (max(values[5] - 1, 0), max(values[6] - 1, 0))}
+
+    @staticmethod
+    def __text(blob):
+        """Decode the text stored in a blob."""
+        if blob is None:
+            return ''
+        return blob.decode('utf-8', errors='replace')
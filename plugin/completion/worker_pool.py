@@ -0,0 +1,277 @@
+"""A pool of processes that run libclang outside of the plugin host.
+
+This module does not depend on Sublime Text, so that the pool can be tested
+headless.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import json
+import logging
+import platform
+import subprocess
+from os import path
+from threading import Lock
+from threading import Timer
+
+from ..utils.thread_job import JobToken
+
+log = logging.getLogger("ECC")
+
+WORKER_SCRIPT = path.join(path.dirname(path.abspath(__file__)),
+                          "libclang_worker.py")
+
+
+class WorkerCrashedError(Exception):
+    """Raised when a worker process dies while serving a request."""
+    pass
+
+
+class WorkerRequestError(Exception):
+    """Raised when a worker process fails to serve a request."""
+    pass
+
+
+class Worker:
+    """A single worker process that serves one request at a time.
+
+    The process is started on the first request and restarted on the next
+    request after it crashes. A process that does not answer in time or
+    whose job is cancelled is stopped, so that a hung worker does not block
+    the later requests.
+    """
+
+    def __init__(self, cmd, timeout=None):
+        """Initialize a worker.
+
+        Args:
+            cmd (str[]): command that starts the worker process.
+            timeout (float): seconds to wait for a response, no limit if
+                None.
+        """
+        self.__cmd = cmd
+        self.__timeout = timeout
+        self.__process = None
+        self.__lock = Lock()
+        self.__next_request_id = 0
+
+    @property
+    def pid(self):
+        """Get the id of the worker process or None if it is not running."""
+        process = self.__process
+        if process and process.poll() is None:
+            return process.pid
+        return None
+
+    def request(self, command, **kwargs):
+        """Send a request to the worker process and wait for the response.
+
+        Args:
+            command (str): command for the worker.
+            **kwargs: arguments of the command.
+
+        Returns:
+            object: result of the command.
+
+        Raises:
+            WorkerCrashedError: if the worker process died or was stopped
+                after the timeout.
+            WorkerRequestError: if the worker failed to process the request.
+            JobCancelledError: if the worker was stopped because the job
+                waiting for it was cancelled.
+        """
+        with self.__lock:
+            if not self.pid:
+                self.__start()
+            self.__next_request_id += 1
+            kwargs['command'] = command
+            kwargs['id'] = self.__next_request_id
+            with _ResponseWatch(self.__process, command,
+                                self.__timeout) as watch:
+                try:
+                    self.__process.stdin.write(
+                        (json.dumps(kwargs) + "\n").encode('utf-8'))
+                    self.__process.stdin.flush()
+                    line = self.__process.stdout.readline()
+                except (OSError, ValueError) as e:
+                    log.debug("cannot communicate with worker: %s", e)
+                    line = b''
+            if not line:
+                self.__stop_process()
+                if watch.cancelled:
+                    JobToken.check("wait for worker")
+                if watch.timed_out:
+                    raise WorkerCrashedError(
+                        "worker stopped after {} seconds of '{}'".format(
+                            self.__timeout, command))
+                raise WorkerCrashedError(
+                    "worker died while processing '{}'".format(command))
+            response = json.loads(line.decode('utf-8'))
+        if 'error' in response:
+            raise WorkerRequestError(response['error'])
+        return response.get('result')
+
+    def stop(self):
+        """Stop the worker process."""
+        with self.__lock:
+            self.__stop_process()
+
+    def __start(self):
+        """Start a worker process."""
+        log.debug("starting worker: %s", self.__cmd)
+        startupinfo = None
+        if platform.system() == "Windows":
+            # Don't let console window pop-up.
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = subprocess.SW_HIDE
+        self.__process = subprocess.Popen(
+            self.__cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            startupinfo=startupinfo)
+
+    def __stop_process(self):
+        """Stop the worker process if it is running."""
+        process = self.__process
+        self.__process = None
+        if not process:
+            return
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+
+
+class _ResponseWatch:
+    """Kill a worker once it answers too late or its job is cancelled.
+
+    Attributes:
+        timed_out (bool): True if the worker was killed after the timeout.
+        cancelled (bool): True if the worker was killed because the job
+            waiting for it was cancelled.
+    """
+
+    def __init__(self, process, command, timeout):
+        """Prepare watching a worker process.
+
+        Args:
+            process (subprocess.Popen): the worker process.
+            command (str): the command the worker serves, for logging.
+            timeout (float): seconds after which the worker is killed, no
+                limit if None.
+        """
+        self.timed_out = False
+        self.cancelled = False
+        self.__process = process
+        self.__command = command
+        self.__timeout = timeout
+        self.__token = JobToken.current()
+        self.__timer = None
+        self.__lock = Lock()
+        self.__done = False
+
+    def __enter__(self):
+        """Start watching the worker."""
+        if self.__timeout is not None:
+            self.__timer = Timer(self.__timeout, self.__on_timeout)
+            self.__timer.daemon = True
+            self.__timer.start()
+        if self.__token:
+            self.__token.add_cancel_callback(self.__on_cancel)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop watching the worker."""
+        with self.__lock:
+            self.__done = True
+        if self.__timer:
+            self.__timer.cancel()
+        if self.__token:
+            self.__token.remove_cancel_callback(self.__on_cancel)
+        return False
+
+    def __on_timeout(self):
+        """Kill the worker after the timeout."""
+        if self.__stop('timed_out'):
+            log.warning("Stopped worker after %s seconds of '%s'",
+                        self.__timeout, self.__command)
+
+    def __on_cancel(self):
+        """Kill the worker once its job is cancelled."""
+        if self.__stop('cancelled'):
+            log.debug("Stopped worker serving '%s' for a cancelled job",
+                      self.__command)
+
+    def __stop(self, reason):
+        """Kill the worker if it is still watched and running.
+
+        Args:
+            reason (str): attribute of the watch to set, e.g. 'timed_out'.
+
+        Returns:
+            bool: True if the worker was killed.
+        """
+        with self.__lock:
+            if self.__done or self.__process.poll() is not None:
+                return False
+            setattr(self, reason, True)
+            self.__process.kill()
+            return True
+
+
+class WorkerPool:
+    """A fixed number of worker processes, views are sharded between them.
+
+    All requests for a single view go to the same worker, which holds the
+    translation unit of that view. Requests for views served by different
+    workers run truly in parallel.
+    """
+
+    def __init__(self, python_binary, num_workers, worker_args,
+                 timeout=None):
+        """Initialize a pool. Processes are started lazily.
+
+        Args:
+            python_binary (str): python 3 interpreter to run the workers.
+            num_workers (int): number of worker processes.
+            worker_args (str[]): arguments for the worker script.
+            timeout (float): seconds to wait for a response of a worker, no
+                limit if None.
+        """
+        cmd = [python_binary, WORKER_SCRIPT] + list(worker_args)
+        self.workers = [Worker(cmd, timeout)
+                        for _ in range(max(1, num_workers))]
+
+    def worker_for(self, shard_key):
+        """Get a worker responsible for a shard, e.g. a view id.
+
+        Args:
+            shard_key (int): key of the shard.
+
+        Returns:
+            Worker: worker for this shard.
+        """
+        return self.workers[shard_key % len(self.workers)]
+
+    def request(self, shard_key, command, **kwargs):
+        """Send a request to the worker responsible for a shard.
+
+        Args:
+            shard_key (int): key of the shard, e.g. a view id.
+            command (str): command for the worker.
+            **kwargs: arguments of the command.
+
+        Returns:
+            object: result of the command.
+        """
+        return self.worker_for(shard_key).request(command, **kwargs)
+
+    def stop(self):
+        """Stop all worker processes."""
+        for worker in self.workers:
+            worker.stop()
@@ -6,9 +6,11 @@ Attributes:
 import logging
 import sublime
 from os import path
+from threading import RLock
 
 from ..completion.compiler_variant import LibClangCompilerVariant
 from ..settings.settings_storage import SettingsStorage
+from ..utils.instrumentation import Instrumentation
 from ..utils.subl.row_col import ZeroIndexedRowCol
 from .popups import Popup
 
@@ -22,12 +24,25 @@ MIN_ERROR_SEVERITY = 3
 class PopupErrorVis:
     """A class for compile error visualization with popups.
 
+    Diagnostics rarely change between two updates of a view, so the regions
+    computed for every (row, col, message) are also added to the view as
+    hidden regions. Sublime Text moves them along when the text is edited, so
+    on the next update only new or moved diagnostics need a new region.
+    Regions are only added to the view if they differ from the ones shown
+    already. In files with thousands of warnings, regions are first shown
+    for errors in the visible area and for a limited number of the closest
+    errors outside of it. The regions of the rest are generated and shown
+    right after that in a background pass.
+
     Attributes:
         err_regions (dict): dictionary of error regions for view ids
+        max_offscreen_regions (int): maximum number of regions generated
+            outside of the visible area before showing them, 0 for no limit.
     """
 
     _TAG_ERRORS = "easy_clang_complete_errors"
     _TAG_WARNINGS = "easy_clang_complete_warnings"
+    _TAG_TRACKED = "easy_clang_complete_tracked"
     _ERROR_SCOPE = "undefined"
     _WARNING_SCOPE = "undefined"
 
@@ -40,8 +55,15 @@ class PopupErrorVis:
         gutter_style = settings.gutter_style
         mark_style = settings.linter_mark_style
         self.settings = settings
+        self.max_offscreen_regions = settings.max_offscreen_error_regions
 
         self.err_regions = {}
+        # Guards the regions, as the regions skipped for errors far from the
+        # visible area are generated in another thread than the rest.
+        self.__regions_lock = RLock()
+        # View id -> (regions added to the view as hidden regions, list of
+        # (index of region, offset of error in it, message) for every error).
+        self.__tracked_regions = {}
         if gutter_style == SettingsStorage.GUTTER_COLOR_STYLE:
             self.gutter_mark_error = PATH_TO_ICON.format(
                 icon="error.png")
@@ -88,45 +110,176 @@ class PopupErrorVis:
             view (sublime.View): current view
             errors (list): list of parsed errors (dict objects)
         """
+        with self.__regions_lock:
+            self.__generate(view, errors, self.max_offscreen_regions)
+            view_errors = self.err_regions.get(view.buffer_id())
+            if view_errors and PopupErrorVis.__has_skipped_regions(view_errors):
+                # Generate the rest once the closest regions are shown.
+                sublime.set_timeout_async(
+                    lambda: self.__generate_skipped_regions(view, view_errors))
+
+    def __generate(self, view, errors, max_offscreen_regions):
+        """Generate the error regions of a view and store them.
+
+        Args:
+            view (sublime.View): current view
+            errors (list): list of parsed errors (dict objects)
+            max_offscreen_regions (int): maximum number of regions generated
+                outside of the visible area, 0 for no limit.
+        """
         view_id = view.buffer_id()
         if view_id == 0:
             log.error("Trying to show error on invalid view. Abort.")
             return
         log.debug("Generating error regions for view %s", view_id)
-        # first clear old regions
-        if view_id in self.err_regions:
-            log.debug("Removing old error regions")
-            del self.err_regions[view_id]
-        # create an empty region dict for view id
-        self.err_regions[view_id] = {}
-
         # If the view is closed while this is running, there will be
         # errors. We want to handle them gracefully.
         try:
-            for error in errors:
-                self.add_error(view, error)
-            log.debug("%s error regions ready", len(self.err_regions))
+            with Instrumentation.span(Instrumentation.ERROR_VIS,
+                                      errors=len(errors)):
+                self.err_regions[view_id] = self.__generate_regions(
+                    view, errors, max_offscreen_regions)
+            log.debug("%s error regions ready",
+                      len(self.err_regions[view_id]))
         except (AttributeError, KeyError, TypeError) as e:
             log.error("View was closed -> cannot generate error vis in it")
             log.info("Original exception: '%s'", repr(e))
+            self.err_regions.pop(view_id, None)
+            self.__tracked_regions.pop(view_id, None)
 
-    def add_error(self, view, error_dict):
-        """Put new compile error in the dictionary of errors.
+    def __generate_regions(self, view, errors, max_offscreen_regions):
+        """Group the errors of a view by rows and find their regions.
 
         Args:
             view (sublime.View): current view
-            error_dict (dict): current error dict {row, col, file, region}
+            errors (list): list of parsed errors (dict objects)
+            max_offscreen_regions (int): maximum number of regions generated
+                outside of the visible area, 0 for no limit.
+
+        Returns:
+            dict: errors of this view for every row.
         """
-        logging.debug("Adding error %s", error_dict)
-        error_source_file = path.basename(error_dict['file'])
-        if error_source_file == path.basename(view.file_name()):
-            row_col = ZeroIndexedRowCol(error_dict['row'], error_dict['col'])
-            point = row_col.as_1d_location(view)
-            error_dict['region'] = view.word(point)
-            if row_col.row in self.err_regions[view.buffer_id()]:
-                self.err_regions[view.buffer_id()][row_col.row] += [error_dict]
+        file_name = path.basename(view.file_name())
+        view_errors = [error_dict for error_dict in errors
+                       if path.basename(error_dict['file']) == file_name]
+        old_regions = self.__shifted_regions(view)
+        first_row, last_row = PopupErrorVis.__visible_rows(view)
+        offscreen = [error_dict for error_dict in view_errors
+                     if not first_row <= error_dict['row'] <= last_row]
+        skipped = set()
+        if max_offscreen_regions and \
+                len(offscreen) > max_offscreen_regions:
+            # Show the errors closest to the visible area.
+            offscreen.sort(key=lambda error_dict: min(
+                abs(error_dict['row'] - first_row),
+                abs(error_dict['row'] - last_row)))
+            skipped = set(id(error_dict) for error_dict in
+                          offscreen[max_offscreen_regions:])
+            log.debug("skip regions of %s errors outside the visible area",
+                      len(skipped))
+        err_regions = {}
+        regions = {}
+        generated = 0
+        for error_dict in view_errors:
+            row = error_dict['row']
+            if id(error_dict) in skipped:
+                error_dict['region'] = None
             else:
-                self.err_regions[view.buffer_id()][row_col.row] = [error_dict]
+                key = (row, error_dict['col'], error_dict['error'])
+                if key not in old_regions:
+                    row_col = ZeroIndexedRowCol(row, error_dict['col'])
+                    point = row_col.as_1d_location(view)
+                    region = view.word(point)
+                    old_regions[key] = (region, point - region.begin())
+                    generated += 1
+                regions[key] = old_regions[key]
+                error_dict['region'] = regions[key][0]
+            err_regions.setdefault(row, []).append(error_dict)
+        log.debug("%s error regions reused, %s generated",
+                  len(regions) - generated, generated)
+        self.__track_regions(view, regions)
+        return err_regions
+
+    def __shifted_regions(self, view):
+        """Get the regions of the last update where the text moved them.
+
+        Args:
+            view (sublime.View): current view
+
+        Returns:
+            dict: (region, offset of the error in it) for every
+                (row, col, message) at the current position of the error.
+        """
+        old_regions, entries = self.__tracked_regions.get(
+            view.buffer_id(), ([], []))
+        new_regions = view.get_regions(PopupErrorVis._TAG_TRACKED)
+        if len(new_regions) != len(old_regions):
+            # Regions were erased or merged, so they cannot be matched.
+            return {}
+        shifted = {}
+        for index, offset, message in entries:
+            old_region = old_regions[index]
+            new_region = new_regions[index]
+            if new_region.end() - new_region.begin() != \
+                    old_region.end() - old_region.begin():
+                # The text of the region was edited.
+                continue
+            row, col = view.rowcol(new_region.begin() + offset)
+            shifted[(row, col, message)] = (new_region, offset)
+        return shifted
+
+    def __track_regions(self, view, regions):
+        """Add hidden regions for errors to move them along with the text.
+
+        Args:
+            view (sublime.View): current view
+            regions (dict): (region, offset of the error in it) for every
+                (row, col, message)
+        """
+        points = sorted(set((region.begin(), region.end())
+                            for region, _ in regions.values()))
+        index_of_points = {point: index for index, point in enumerate(points)}
+        entries = [(index_of_points[(region.begin(), region.end())],
+                    offset, message)
+                   for (_, _, message), (region, offset) in regions.items()]
+        tracked_regions = [sublime.Region(begin, end) for begin, end in points]
+        view.add_regions(
+            key=PopupErrorVis._TAG_TRACKED,
+            regions=tracked_regions,
+            flags=sublime.HIDDEN)
+        self.__tracked_regions[view.buffer_id()] = (tracked_regions, entries)
+
+    @staticmethod
+    def __visible_rows(view):
+        """Get the first and the last row visible in the view."""
+        visible_region = view.visible_region()
+        first_row, _ = view.rowcol(visible_region.begin())
+        last_row, _ = view.rowcol(visible_region.end())
+        return first_row, last_row
+
+    def __generate_skipped_regions(self, view, view_errors):
+        """Generate the regions skipped for errors far from the visible area.
+
+        Args:
+            view (sublime.View): current view
+            view_errors (dict): errors of the view whose regions were skipped
+        """
+        with self.__regions_lock:
+            if self.err_regions.get(view.buffer_id()) is not view_errors:
+                # The errors were updated or cleared in the meantime.
+                return
+            log.debug("Generating regions of errors outside the visible area")
+            errors = [error_dict for row_errors in view_errors.values()
+                      for error_dict in row_errors]
+            self.__generate(view, errors, 0)
+            self.show_errors(view)
+
+    @staticmethod
+    def __has_skipped_regions(view_errors):
+        """Check if regions of some errors of a view were skipped."""
+        return any(error_dict['region'] is None
+                   for row_errors in view_errors.values()
+                   for error_dict in row_errors)
 
     def show_errors(self, view):
         """Show current error regions.
@@ -134,37 +287,66 @@ class PopupErrorVis:
         Args:
             view (sublime.View): Current view
         """
-        if view.buffer_id() not in self.err_regions:
-            # view has no errors for it
-            return
-        current_error_dict = self.err_regions[view.buffer_id()]
-        error_regions, warning_regions = PopupErrorVis._as_region_list(
-            current_error_dict)
-        log.debug("Showing error regions: %s", error_regions)
-        log.debug("Showing warning regions: %s", warning_regions)
-        view.add_regions(
-            key=PopupErrorVis._TAG_ERRORS,
-            regions=error_regions,
-            scope=PopupErrorVis._ERROR_SCOPE,
-            icon=self.gutter_mark_error,
-            flags=self.draw_flags)
-        view.add_regions(
-            key=PopupErrorVis._TAG_WARNINGS,
-            regions=warning_regions,
-            scope=PopupErrorVis._WARNING_SCOPE,
-            icon=self.gutter_mark_warning,
-            flags=self.draw_flags)
+        with self.__regions_lock:
+            if view.buffer_id() not in self.err_regions:
+                # view has no errors for it
+                return
+            current_error_dict = self.err_regions[view.buffer_id()]
+            error_regions, warning_regions = PopupErrorVis._as_region_list(
+                current_error_dict)
+            with Instrumentation.span(Instrumentation.ERROR_REGIONS):
+                if not PopupErrorVis.__is_shown(
+                        view, PopupErrorVis._TAG_ERRORS, error_regions):
+                    log.debug("Showing %s error regions", len(error_regions))
+                    view.add_regions(
+                        key=PopupErrorVis._TAG_ERRORS,
+                        regions=error_regions,
+                        scope=PopupErrorVis._ERROR_SCOPE,
+                        icon=self.gutter_mark_error,
+                        flags=self.draw_flags)
+                if not PopupErrorVis.__is_shown(
+                        view, PopupErrorVis._TAG_WARNINGS, warning_regions):
+                    log.debug("Showing %s warning regions",
+                              len(warning_regions))
+                    view.add_regions(
+                        key=PopupErrorVis._TAG_WARNINGS,
+                        regions=warning_regions,
+                        scope=PopupErrorVis._WARNING_SCOPE,
+                        icon=self.gutter_mark_warning,
+                        flags=self.draw_flags)
+
+    @staticmethod
+    def __is_shown(view, key, regions):
+        """Check if the view shows exactly these regions for a key.
+
+        Sublime Text moves shown regions along with the text, so regions of
+        errors that did not change stay equal to the ones in the view.
+        """
+        def as_points(regions):
+            return sorted(set((region.begin(), region.end())
+                              for region in regions))
+        return as_points(view.get_regions(key)) == as_points(regions)
 
     def erase_regions(self, view):
-        """Erase error regions for view.
+        """Erase error regions for view along with the hidden ones.
 
         Args:
             view (sublime.View): erase regions for view
         """
-        if view.buffer_id() not in self.err_regions:
-            # view has no errors for it
-            return
-        log.debug("Erasing error regions for view %s", view.buffer_id())
+        with self.__regions_lock:
+            view_id = view.buffer_id()
+            if view_id not in self.__tracked_regions:
+                # view has no errors for it
+                return
+            log.debug("Erasing error regions for view %s", view_id)
+            self.__erase_shown_regions(view)
+            view.erase_regions(PopupErrorVis._TAG_TRACKED)
+            self.__tracked_regions.pop(view_id, None)
+            self.err_regions.pop(view_id, None)
+
+    @staticmethod
+    def __erase_shown_regions(view):
+        """Erase the error and warning regions shown in a view."""
         view.erase_regions(PopupErrorVis._TAG_ERRORS)
         view.erase_regions(PopupErrorVis._TAG_WARNINGS)
 
@@ -197,12 +379,14 @@ class PopupErrorVis:
         Args:
             view (sublime.View): current view
         """
-        if view.buffer_id() not in self.err_regions:
-            # no errors for this view
-            return
-        view.hide_popup()
-        self.erase_regions(view)
-        del self.err_regions[view.buffer_id()]
+        with self.__regions_lock:
+            if view.buffer_id() not in self.err_regions:
+                # no errors for this view
+                return
+            view.hide_popup()
+            # Hidden regions are kept to move along with the edits that follow.
+            PopupErrorVis.__erase_shown_regions(view)
+            del self.err_regions[view.buffer_id()]
 
     @staticmethod
     def _as_msg_list(errors_dicts):
@@ -238,6 +422,9 @@ class PopupErrorVis:
                 severity = MIN_ERROR_SEVERITY
                 if LibClangCompilerVariant.SEVERITY_TAG in entry:
                     severity = entry[LibClangCompilerVariant.SEVERITY_TAG]
+                if entry.get('region') is None:
+                    # Not generated as it is far from the visible area.
+                    continue
                 if severity < MIN_ERROR_SEVERITY:
                     warnings.append(entry['region'])
                 else:
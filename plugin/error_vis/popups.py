@@ -8,6 +8,7 @@ import re
 
 from ..utils.macro_parser import MacroParser
 from ..utils.index_location import IndexLocation
+from ..utils.instrumentation import Instrumentation
 
 POPUP_CSS_FILE = "Packages/EasyClangComplete/plugin/error_vis/popup.css"
 
@@ -87,6 +88,24 @@ class Popup:
         popup.__text = markupsafe.escape(text)
         return popup
 
+    @staticmethod
+    def info_text(declaration, brief_comment, settings):
+        """Initialize a new info popup from a plain text declaration.
+
+        Used when the cursor lives in another process and cannot be queried
+        directly.
+        """
+        popup = Popup((
+            settings.popup_maximum_width, settings.popup_maximum_height
+        ))
+        popup.__popup_type = 'panel-info "ECC: Info"'
+        popup.__text = DECLARATION_TEMPLATE.format(
+            type_declaration=markupsafe.escape(declaration))
+        if brief_comment:
+            popup.__text += BRIEF_DOC_TEMPLATE.format(
+                content=CODE_TEMPLATE.format(lang="", code=brief_comment))
+        return popup
+
     @staticmethod
     def info(cursor, cindex, settings):
         """Initialize a new warning popup."""
@@ -457,14 +476,15 @@ class Popup:
 
     def show(self, view, location=-1, on_navigate=None):
         """Show this popup."""
-        mdpopups.show_popup(view, self.as_markdown(),
-                            max_width=self.max_width,
-                            max_height=self.max_height,
-                            wrapper_class=Popup.WRAPPER_CLASS,
-                            css=self.CSS,
-                            flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
-                            location=location,
-                            on_navigate=on_navigate)
+        with Instrumentation.span(Instrumentation.POPUP):
+            mdpopups.show_popup(view, self.as_markdown(),
+                                max_width=self.max_width,
+                                max_height=self.max_height,
+                                wrapper_class=Popup.WRAPPER_CLASS,
+                                css=self.CSS,
+                                flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
+                                location=location,
+                                on_navigate=on_navigate)
 
     @staticmethod
     def cleanup_comment(raw_comment):
@@ -25,7 +25,8 @@ class Bazel():
             return None
         cmd = [path.join(PKG_FOLDER, 'external',
                          'bazel-compilation-database', 'generate.sh')]
-        output = Tools.run_command(cmd, cwd=workspace_file.folder)
+        output = Tools.run_command(cmd, cwd=workspace_file.folder,
+                                   timeout=Tools.BUILD_SYSTEM_TIMEOUT)
         return output
 
     @staticmethod
@@ -228,7 +228,8 @@ class CMakeFile(FlagsSource):
 
         log.debug(' running command: %s', cmake_cmd)
         output_text = Tools.run_command(
-            command=cmake_cmd, cwd=tempdir, env=updated_environment)
+            command=cmake_cmd, cwd=tempdir, env=updated_environment,
+            default='', timeout=Tools.BUILD_SYSTEM_TIMEOUT)
         log.debug("Cmake produced output: \n%s", output_text)
         if "CMake Error" in output_text:
             error_msg = "Error in file:\n{}\n\n{}".format(
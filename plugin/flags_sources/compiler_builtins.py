@@ -69,7 +69,8 @@ class CompilerBuiltIns:
             self.__includes, self.__defines = CompilerBuiltIns.__cache[cmd_str]
             return
         _log.debug("Generating new default flags with cmd: '%s'", cmd)
-        output = Tools.run_command(cmd, cwd=working_dir)
+        output = Tools.run_command(cmd, cwd=working_dir,
+                                   timeout=Tools.QUERY_TIMEOUT)
         if not output:
             _log.warning("No output from cmd to get default flags: %s", cmd)
             return
@@ -12,6 +12,7 @@ from .flags_source import FlagsSource
 from ..utils.file import File
 from ..utils.singleton import MakefileCache
 from ..utils.flag import Flag
+from ..utils.tools import Tools
 
 log = logging.getLogger("ECC")
 
@@ -102,10 +103,10 @@ class Makefile(FlagsSource):
         ]
         for makevar in makevars:
             cmd.append("print-" + makevar)
-        pipe = subprocess.PIPE
-        make = subprocess.Popen(cmd, stdout=pipe, stdin=pipe, stderr=pipe)
-        printer = "print-%:\n\t@echo '$($*)'\n".encode("utf-8")
-        output = make.communicate(input=printer)[0].decode("utf-8")
+        printer = "print-%:\n\t@echo '$($*)'\n"
+        output = Tools.run_command(cmd, input_text=printer,
+                                   stderr=subprocess.PIPE, default='',
+                                   timeout=Tools.BUILD_SYSTEM_TIMEOUT)
         tokens = []
         for line in output.split("\n"):
             if line:
@@ -7,6 +7,7 @@ import sublime
 import logging
 import copy
 
+from ..utils.instrumentation import Instrumentation
 from ..utils.tools import PKG_NAME
 from ..utils.subl.subl_bridge import SublBridge
 
@@ -100,8 +101,11 @@ class SettingsManager:
             view (sublime.View): current View
         """
         view_id = view.buffer_id()
-        self.__settings_dict[view_id] = copy.deepcopy(self.__default_settings)
-        self.__settings_dict[view_id].update_from_view(view)
+        with Instrumentation.span(Instrumentation.SETTINGS_LOAD,
+                                  view=view_id):
+            self.__settings_dict[view_id] = copy.deepcopy(
+                self.__default_settings)
+            self.__settings_dict[view_id].update_from_view(view)
         log.debug("settings initialized for view: %s", view_id)
 
     def on_settings_changed(self):
@@ -131,7 +135,8 @@ class SettingsManager:
                                            self.on_settings_changed)
 
         # initialize default settings
-        self.__default_settings = SettingsStorage(self.__subl_settings)
+        with Instrumentation.span(Instrumentation.SETTINGS_LOAD):
+            self.__default_settings = SettingsStorage(self.__subl_settings)
         if self.__default_settings.need_reparse():
             # HACK: this is a hacky solution to settings loading problems.
             # Load these settings at a later point in time.
@@ -101,8 +101,18 @@ class SettingsStorage:
         "lang_flags",
         "lazy_flag_parsing",
         "libclang_path",
+        "libclang_worker_processes",
+        "libclang_worker_python",
         "linter_mark_style",
+        "max_ast_cache_mb",
         "max_cache_age",
+        "max_cache_memory_mb",
+        "max_cached_completions",
+        "max_clang_binary_completions",
+        "max_completions_shown",
+        "max_offscreen_error_regions",
+        "max_prefetched_views",
+        "max_worker_threads",
         "popup_maximum_height",
         "popup_maximum_width",
         "progress_style",
@@ -112,10 +122,16 @@ class SettingsStorage:
         "show_type_info",
         "target_compilers",
         "triggers",
+        "use_ast_cache",
         "use_default_definitions",
         "use_default_includes",
         "use_libclang",
         "use_libclang_caching",
+        "use_owner_tu",
+        "use_serialized_diagnostics",
+        "use_shared_pch",
+        "use_stdin_for_clang_binary",
+        "use_symbol_index",
         "valid_lang_syntaxes",
         "verbose",
     ]
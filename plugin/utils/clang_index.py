@@ -0,0 +1,60 @@
+"""Hold a libclang index shared by all translation units of the process.
+
+Attributes:
+    log (logging.Logger): logger for this module
+"""
+import logging
+from threading import Lock
+
+log = logging.getLogger("ECC")
+
+
+class SharedIndex:
+    """A process-wide libclang index, one per bundled cindex module.
+
+    Creating an index is not free and every index keeps its own state, e.g.
+    preambles, so all translation units reuse a single long-lived index.
+
+    Attributes:
+        THREAD_BACKGROUND_PRIORITY_FOR_ALL (int): value of libclang global
+            option CXGlobalOpt_ThreadBackgroundPriorityForAll. Makes the
+            threads that libclang spawns run with background priority, so
+            that parsing does not compete with the UI.
+    """
+    THREAD_BACKGROUND_PRIORITY_FOR_ALL = 0x3
+
+    __indices = {}
+    __lock = Lock()
+
+    @staticmethod
+    def get(cindex):
+        """Get an index for a cindex module, create it if needed.
+
+        Args:
+            cindex (module): bundled cindex module with a loaded library.
+
+        Returns:
+            cindex.Index: shared index or None if it cannot be created.
+        """
+        with SharedIndex.__lock:
+            index = SharedIndex.__indices.get(cindex.__name__)
+            if index:
+                return index
+            try:
+                index = cindex.Index.create()
+            except Exception as e:
+                log.error("cannot create libclang index: %s", e)
+                return None
+            SharedIndex.__set_global_options(cindex, index)
+            log.debug("created shared index for %s", cindex.__name__)
+            SharedIndex.__indices[cindex.__name__] = index
+            return index
+
+    @staticmethod
+    def __set_global_options(cindex, index):
+        """Set global options of an index once, right after its creation."""
+        try:
+            cindex.conf.lib.clang_CXIndex_setGlobalOptions(
+                index, SharedIndex.THREAD_BACKGROUND_PRIORITY_FOR_ALL)
+        except AttributeError as e:
+            log.debug("cannot set global index options: %s", e)
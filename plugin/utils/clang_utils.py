@@ -273,7 +273,8 @@ class ClangUtils:
         check_version_cmd = [clang_binary, "-v"]
         log.info("Getting version from command: `%s`",
                  " ".join(check_version_cmd))
-        output_text = Tools.run_command(check_version_cmd)
+        output_text = Tools.run_command(check_version_cmd, default='',
+                                        timeout=Tools.QUERY_TIMEOUT)
 
         if "Apple" in output_text:
             return cls._get_apple_clang_version_str(output_text)
@@ -0,0 +1,91 @@
+"""Map included files to the source files that include them.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import logging
+from collections import OrderedDict
+from threading import RLock
+
+log = logging.getLogger("ECC")
+
+
+class IncludeMap:
+    """Reverse include map of all the parsed translation units.
+
+    Every parsed source file reports all the files its translation unit
+    includes, directly or through other headers. The map inverts this, so
+    that the source files that include a header, its owners, are found with
+    a single lookup.
+    """
+
+    def __init__(self):
+        """Initialize an empty map."""
+        self.__lock = RLock()
+        # Source file -> set of files included by it.
+        self.__includes = {}
+        # Included file -> owners, the most recently parsed owner last.
+        self.__owners = {}
+
+    def update_source(self, source_file, included_files):
+        """Replace all the files included by a source file.
+
+        Args:
+            source_file (str): full path to the parsed source file.
+            included_files (iterable): full paths to the included files.
+        """
+        included_files = set(included_files)
+        included_files.discard(source_file)
+        with self.__lock:
+            old_files = self.__includes.get(source_file, set())
+            for file_name in old_files - included_files:
+                self.__remove_owner(file_name, source_file)
+            for file_name in included_files:
+                owners = self.__owners.setdefault(file_name, OrderedDict())
+                owners.pop(source_file, None)
+                owners[source_file] = True
+            self.__includes[source_file] = included_files
+        log.debug("'%s' includes %s files", source_file, len(included_files))
+
+    def remove_source(self, source_file):
+        """Forget all the files included by a source file.
+
+        Args:
+            source_file (str): full path to the source file.
+        """
+        with self.__lock:
+            for file_name in self.__includes.pop(source_file, set()):
+                self.__remove_owner(file_name, source_file)
+
+    def owners_of(self, file_name):
+        """Get all the source files that include a file.
+
+        Args:
+            file_name (str): full path to an included file.
+
+        Returns:
+            str[]: source files, the most recently parsed one first.
+        """
+        with self.__lock:
+            return list(reversed(self.__owners.get(file_name, OrderedDict())))
+
+    def includes(self, source_file):
+        """Get all the files included by a source file.
+
+        Args:
+            source_file (str): full path to the source file.
+
+        Returns:
+            set: full paths to the included files.
+        """
+        with self.__lock:
+            return set(self.__includes.get(source_file, set()))
+
+    def __remove_owner(self, file_name, source_file):
+        """Remove a single owner of an included file."""
+        owners = self.__owners.get(file_name)
+        if owners is None:
+            return
+        owners.pop(source_file, None)
+        if not owners:
+            del self.__owners[file_name]
@@ -36,7 +36,8 @@ class IncludeCompleter():
             name=thread_job.ThreadJob.COMPLETE_INCLUDES_TAG,
             function=IncludeCompleter.__get_all_headers,
             callback=self.__on_folders_loaded,
-            args=[initial_folders, force_unix_includes])
+            args=[initial_folders, force_unix_includes],
+            lane=self.view.buffer_id())
         self.thread_pool.new_job(job)
 
     def on_include_picked(self, idx):
@@ -0,0 +1,203 @@
+"""Measure how long every stage of the plugin takes.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+
+log = logging.getLogger("ECC")
+
+
+class Instrumentation:
+    """Collect durations of named spans, e.g. parsing or completing code.
+
+    The latest durations of every span are kept to compute percentiles. All
+    spans are also kept as events that can be exported as a Chrome trace and
+    opened in chrome://tracing or https://ui.perfetto.dev.
+
+    Attributes:
+        MAX_SAMPLES (int): number of durations kept per span.
+        MAX_EVENTS (int): number of events kept for the trace.
+        PERCENTILES (int[]): percentiles shown in the report.
+    """
+    SETTINGS_LOAD = "settings load"
+    FLAGS = "flags from {}"
+    COMPILER_BUILTINS = "compiler builtins"
+    PARSE = "parse"
+    REPARSE = "reparse"
+    CODE_COMPLETE = "code complete"
+    POST_PROCESS = "completion post-processing"
+    ERROR_VIS = "error vis generation"
+    ERROR_REGIONS = "error regions"
+    POPUP_INFO = "popup info"
+    POPUP = "popup rendering"
+
+    MAX_SAMPLES = 1000
+    MAX_EVENTS = 20000
+    PERCENTILES = [50, 95, 99]
+
+    __lock = threading.Lock()
+    # Span name -> deque of durations in seconds.
+    __samples = {}
+    # Tuples (name, start, duration, thread id, thread name, args).
+    __events = deque(maxlen=MAX_EVENTS)
+    __start_time = time.perf_counter()
+
+    @staticmethod
+    @contextmanager
+    def span(name, **args):
+        """Measure the time spent within a with statement.
+
+        Args:
+            name (str): name of the span, one of the constants of this class.
+            **args: details shown for this span in the trace, e.g. file name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            Instrumentation.record(name, start, time.perf_counter() - start,
+                                   args)
+
+    @staticmethod
+    def record(name, start, duration, args=None):
+        """Record a finished span.
+
+        Args:
+            name (str): name of the span.
+            start (float): start time from time.perf_counter().
+            duration (float): duration in seconds.
+            args (dict, optional): details shown for this span in the trace.
+        """
+        thread = threading.current_thread()
+        with Instrumentation.__lock:
+            samples = Instrumentation.__samples.get(name)
+            if samples is None:
+                samples = deque(maxlen=Instrumentation.MAX_SAMPLES)
+                Instrumentation.__samples[name] = samples
+            samples.append(duration)
+            Instrumentation.__events.append(
+                (name, start, duration, thread.ident, thread.name, args))
+        log.debug("'%s' took %.3f seconds", name, duration)
+
+    @staticmethod
+    def span_names():
+        """Get names of all spans recorded so far, sorted."""
+        with Instrumentation.__lock:
+            return sorted(Instrumentation.__samples)
+
+    @staticmethod
+    def percentiles(name):
+        """Compute percentiles of the durations of a span.
+
+        Args:
+            name (str): name of the span.
+
+        Returns:
+            dict: number of samples 'count', maximum 'max' and every
+                percentile, e.g. 'p95', in seconds. None if never recorded.
+        """
+        with Instrumentation.__lock:
+            samples = sorted(Instrumentation.__samples.get(name, []))
+        if not samples:
+            return None
+        stats = {'count': len(samples), 'max': samples[-1]}
+        for percentile in Instrumentation.PERCENTILES:
+            # Use the nearest rank, so that every value is an actual sample.
+            rank = int(math.ceil(percentile / 100.0 * len(samples)))
+            stats['p{}'.format(percentile)] = samples[max(rank, 1) - 1]
+        return stats
+
+    @staticmethod
+    def report():
+        """Format percentiles of all spans as a table in milliseconds.
+
+        Returns:
+            str: table with a row per span.
+        """
+        columns = ['p{}'.format(p) for p in Instrumentation.PERCENTILES]
+        columns.append('max')
+        row_format = "{:<32}{:>8}" + "{:>10}" * len(columns)
+        lines = [row_format.format(
+            "span", "count", *[column + " ms" for column in columns])]
+        for name in Instrumentation.span_names():
+            stats = Instrumentation.percentiles(name)
+            if not stats:
+                continue
+            lines.append(row_format.format(
+                name, stats['count'],
+                *["{:.1f}".format(stats[column] * 1000)
+                  for column in columns]))
+        if len(lines) == 1:
+            lines.append("nothing measured yet")
+        return "\n".join(lines)
+
+    @staticmethod
+    def chrome_trace():
+        """Convert the recorded spans to the Chrome trace event format.
+
+        Returns:
+            dict: trace with complete events and names of the threads.
+        """
+        with Instrumentation.__lock:
+            events = list(Instrumentation.__events)
+        pid = os.getpid()
+        trace_events = []
+        thread_names = {}
+        for name, start, duration, tid, thread_name, args in events:
+            thread_names[tid] = thread_name
+            event = {
+                'name': name,
+                'cat': 'ECC',
+                'ph': 'X',
+                'ts': (start - Instrumentation.__start_time) * 1e6,
+                'dur': duration * 1e6,
+                'pid': pid,
+                'tid': tid,
+            }
+            if args:
+                event['args'] = {key: str(value)
+                                 for key, value in args.items()}
+            trace_events.append(event)
+        for tid, thread_name in thread_names.items():
+            trace_events.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': pid,
+                'tid': tid,
+                'args': {'name': thread_name},
+            })
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    @staticmethod
+    def export_chrome_trace(file_name):
+        """Write the recorded spans to a Chrome trace file.
+
+        Args:
+            file_name (str): path to the json file to write.
+
+        Returns:
+            int: number of exported spans.
+        """
+        trace = Instrumentation.chrome_trace()
+        with open(file_name, 'w') as trace_file:
+            json.dump(trace, trace_file)
+        num_spans = len([event for event in trace['traceEvents']
+                         if event['ph'] == 'X'])
+        log.info("exported %s spans to '%s'", num_spans, file_name)
+        return num_spans
+
+    @staticmethod
+    def clear():
+        """Forget all recorded spans."""
+        with Instrumentation.__lock:
+            Instrumentation.__samples.clear()
+            Instrumentation.__events.clear()
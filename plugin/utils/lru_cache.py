@@ -0,0 +1,82 @@
+"""A bounded cache that evicts the least recently used values.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import logging
+from collections import OrderedDict
+from threading import Lock
+
+log = logging.getLogger("ECC")
+
+
+class LruCache:
+    """Store a bounded number of values by key.
+
+    Both storing and reading a value mark it as the most recently used one.
+    Once the cache is full, storing a new value removes the least recently
+    used one.
+
+    Attributes:
+        max_size (int): maximum number of stored values, 0 to store none.
+        hits (int): number of values found in the cache.
+        misses (int): number of values not found in the cache.
+    """
+
+    def __init__(self, max_size):
+        """Initialize an empty cache.
+
+        Args:
+            max_size (int): maximum number of stored values.
+        """
+        self.max_size = max(max_size, 0)
+        self.hits = 0
+        self.misses = 0
+        self.__lock = Lock()
+        # Key -> value, the most recently used value last.
+        self.__values = OrderedDict()
+
+    def get(self, key):
+        """Get a value and mark it as used.
+
+        Args:
+            key: hashable key of the value.
+
+        Returns:
+            object: the stored value or None if there is none.
+        """
+        with self.__lock:
+            if key not in self.__values:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__values.move_to_end(key)
+            return self.__values[key]
+
+    def put(self, key, value):
+        """Store a value, removing the least recently used one if full.
+
+        Args:
+            key: hashable key of the value.
+            value: value to store.
+        """
+        if self.max_size == 0:
+            return
+        with self.__lock:
+            self.__values[key] = value
+            self.__values.move_to_end(key)
+            while len(self.__values) > self.max_size:
+                self.__values.popitem(last=False)
+
+    def clear(self):
+        """Remove all values."""
+        with self.__lock:
+            self.__values.clear()
+
+    def __len__(self):
+        """Get the number of stored values."""
+        return len(self.__values)
+
+    def __contains__(self, key):
+        """Check if a value is stored without marking it as used."""
+        return key in self.__values
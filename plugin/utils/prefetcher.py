@@ -0,0 +1,75 @@
+"""Pick the views that are worth parsing before the user activates them.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import logging
+from fnmatch import fnmatch
+from os import path
+
+log = logging.getLogger("ECC")
+
+
+class Prefetcher:
+    """Choose open views to parse in background.
+
+    The header/source counterparts of the active file come first as the user
+    is likely to switch to them next. The other open views follow in the
+    order of their tabs.
+    """
+
+    @staticmethod
+    def pick_files(active_file, open_files, header_to_source_mapping,
+                   max_files):
+        """Pick files to prefetch from a list of open files.
+
+        Args:
+            active_file (str): path to the file in the active view.
+            open_files (str[]): paths to the files open in other views.
+            header_to_source_mapping (str[]): templates from the settings.
+            max_files (int): maximum number of files to pick.
+
+        Returns:
+            str[]: files to prefetch ordered by relevance.
+        """
+        if max_files < 1:
+            return []
+        counterparts = []
+        others = []
+        patterns = Prefetcher.__counterpart_patterns(
+            active_file, header_to_source_mapping)
+        for file_name in open_files:
+            if not file_name or file_name == active_file:
+                continue
+            if file_name in counterparts or file_name in others:
+                continue
+            if any(fnmatch(file_name, pattern) for pattern in patterns):
+                counterparts.append(file_name)
+            else:
+                others.append(file_name)
+        return (counterparts + others)[:max_files]
+
+    @staticmethod
+    def __counterpart_patterns(file_name, header_to_source_mapping):
+        """Generate glob patterns that match counterparts of a file.
+
+        Args:
+            file_name (str): path to a file.
+            header_to_source_mapping (str[]): templates from the settings.
+
+        Returns:
+            str[]: glob patterns.
+        """
+        dirname = path.dirname(file_name)
+        basename = path.basename(file_name)
+        stamp, ext = path.splitext(basename)
+        templates = ["{stamp}.*"]
+        for template in header_to_source_mapping or []:
+            if template.endswith("/") or template.endswith("\\"):
+                template += "{stamp}.*"
+            templates.append(template)
+        patterns = []
+        for template in templates:
+            pattern = template.format(basename=basename, stamp=stamp, ext=ext)
+            patterns.append(path.normpath(path.join(dirname, pattern)))
+        return patterns
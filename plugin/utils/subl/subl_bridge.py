@@ -15,6 +15,9 @@ class SublBridge:
     NO_DEFAULT_COMPLETIONS = sublime.INHIBIT_WORD_COMPLETIONS \
         | sublime.INHIBIT_EXPLICIT_COMPLETIONS
 
+    # Asks to query completions again while typing, only in Sublime Text 4.
+    DYNAMIC_COMPLETIONS = getattr(sublime, 'DYNAMIC_COMPLETIONS', 0)
+
     SHOW_DEFAULT_COMPLETIONS = None
     HIDE_DEFAULT_COMPLETIONS = ([], sublime.INHIBIT_WORD_COMPLETIONS |
                                 sublime.INHIBIT_EXPLICIT_COMPLETIONS)
@@ -88,21 +91,28 @@ class SublBridge:
         return view.substr(line)
 
     @staticmethod
-    def format_completions(completions, hide_default_completions):
+    def format_completions(completions, hide_default_completions,
+                           is_cut=False):
         """Get completions. Manage hiding default ones.
 
         Args:
             hide_default_completions (bool): True if we hide default ones
+            is_cut (bool): True if typing more may show other completions
 
         Returns:
             tuple: (completions, flags)
         """
+        flags = 0
+        if is_cut:
+            flags |= SublBridge.DYNAMIC_COMPLETIONS
         if completions and hide_default_completions:
             _log.debug("Hiding default completions")
-            return (completions, SublBridge.NO_DEFAULT_COMPLETIONS)
+            flags |= SublBridge.NO_DEFAULT_COMPLETIONS
         else:
             _log.debug("Adding clang completions to default ones")
+        if not flags:
             return completions
+        return (completions, flags)
 
     @staticmethod
     def show_auto_complete(view):
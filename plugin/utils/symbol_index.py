@@ -0,0 +1,235 @@
+"""Index of symbols across all the files parsed in the project.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import json
+import logging
+from os import listdir
+from os import path
+from os import remove
+from threading import RLock
+
+from .index_location import IndexLocation
+from .tools import Tools
+
+log = logging.getLogger("ECC")
+
+
+class SymbolIndex:
+    """Map unified symbol resolutions (USRs) to their locations.
+
+    The symbols of every indexed file are stored in a separate json file in
+    the index folder, so that indexing a file again only rewrites one small
+    file. The folder is read lazily on the first access. Afterwards looking
+    up a symbol is a dictionary lookup, whether its file is open or not.
+
+    Every symbol is stored as a list [usr, spelling, is_definition, line,
+    column] within the file it is declared in.
+
+    Every project gets an index of its own, see ViewConfigManager.
+
+    Attributes:
+        FOLDER_NAME (str): name of the folder within temp folder that holds
+            the index folders of all projects.
+        folder (str): folder with the json files of the index.
+    """
+    FOLDER_NAME = "symbol_index"
+
+    USR = 0
+    SPELLING = 1
+    IS_DEFINITION = 2
+    LINE = 3
+    COLUMN = 4
+
+    def __init__(self, folder):
+        """Initialize an index stored in a folder.
+
+        Args:
+            folder (str): folder to store the index in.
+        """
+        self.folder = folder
+        self.__lock = RLock()
+        self.__loaded = False
+        # File name -> {'mtime': float, 'symbols': list}.
+        self.__files = {}
+        # USR -> {file name: symbol} for definitions and declarations.
+        self.__definitions = {}
+        self.__declarations = {}
+        # Spelling -> set of USRs.
+        self.__usrs_by_spelling = {}
+
+    def is_up_to_date(self, file_name):
+        """Check if a file was indexed since it was last modified.
+
+        Args:
+            file_name (str): full path to a file.
+
+        Returns:
+            bool: True if the file does not need to be indexed.
+        """
+        with self.__lock:
+            self.__load_if_needed()
+            entry = self.__files.get(file_name)
+            if not entry:
+                return False
+            return entry['mtime'] == SymbolIndex.__get_mtime(file_name)
+
+    def update_file(self, file_name, symbols):
+        """Replace all the symbols of a file and store them on disk.
+
+        Args:
+            file_name (str): full path to the indexed file.
+            symbols (list): symbols declared in this file.
+        """
+        entry = {'file_name': file_name,
+                 'mtime': SymbolIndex.__get_mtime(file_name),
+                 'symbols': symbols}
+        with self.__lock:
+            self.__load_if_needed()
+            self.__forget(file_name)
+            self.__add(entry)
+            try:
+                with open(self.__entry_path(file_name), 'w') as entry_file:
+                    json.dump(entry, entry_file, separators=(',', ':'))
+            except OSError as e:
+                log.debug("cannot store symbols of '%s': %s", file_name, e)
+        log.debug("indexed %s symbols in '%s'", len(symbols), file_name)
+
+    def remove_file(self, file_name):
+        """Remove all the symbols of a file from the index.
+
+        Args:
+            file_name (str): full path to the indexed file.
+        """
+        with self.__lock:
+            self.__load_if_needed()
+            self.__forget(file_name)
+            try:
+                remove(self.__entry_path(file_name))
+            except OSError:
+                pass
+
+    def find(self, usr):
+        """Find the location of a symbol, preferring its definition.
+
+        Args:
+            usr (str): unified symbol resolution of the symbol.
+
+        Returns:
+            IndexLocation: location of the definition, or of a declaration if
+                no definition was indexed, None if the symbol is unknown.
+        """
+        with self.__lock:
+            self.__load_if_needed()
+            return self.__find_in(usr, [self.__definitions,
+                                        self.__declarations])
+
+    def find_definition(self, usr):
+        """Find the location of the definition of a symbol.
+
+        Args:
+            usr (str): unified symbol resolution of the symbol.
+
+        Returns:
+            IndexLocation: location of the definition or None if no
+                definition was indexed.
+        """
+        with self.__lock:
+            self.__load_if_needed()
+            return self.__find_in(usr, [self.__definitions])
+
+    def find_by_spelling(self, spelling):
+        """Find the location of a symbol by its name.
+
+        Used when there is no translation unit to resolve the symbol. Only
+        returns a location if the name is not ambiguous.
+
+        Args:
+            spelling (str): name of the symbol.
+
+        Returns:
+            IndexLocation: location of the symbol or None.
+        """
+        with self.__lock:
+            self.__load_if_needed()
+            usrs = self.__usrs_by_spelling.get(spelling, set())
+            if len(usrs) != 1:
+                log.debug("found %s symbols named '%s'", len(usrs), spelling)
+                return None
+            return self.find(next(iter(usrs)))
+
+    def __find_in(self, usr, locations_list):
+        """Find the first location of a symbol in existing files."""
+        for locations in locations_list:
+            for file_name, symbol in locations.get(usr, {}).items():
+                if path.exists(file_name):
+                    return IndexLocation(filename=file_name,
+                                         line=symbol[SymbolIndex.LINE],
+                                         column=symbol[SymbolIndex.COLUMN])
+        return None
+
+    def __add(self, entry):
+        """Add symbols of a file to the lookup tables."""
+        file_name = entry['file_name']
+        self.__files[file_name] = entry
+        for symbol in entry['symbols']:
+            usr = symbol[SymbolIndex.USR]
+            if symbol[SymbolIndex.IS_DEFINITION]:
+                locations = self.__definitions
+            else:
+                locations = self.__declarations
+            locations.setdefault(usr, {})[file_name] = symbol
+            self.__usrs_by_spelling.setdefault(
+                symbol[SymbolIndex.SPELLING], set()).add(usr)
+
+    def __forget(self, file_name):
+        """Remove symbols of a file from the lookup tables."""
+        entry = self.__files.pop(file_name, None)
+        if not entry:
+            return
+        for symbol in entry['symbols']:
+            usr = symbol[SymbolIndex.USR]
+            for locations in [self.__definitions, self.__declarations]:
+                files = locations.get(usr)
+                if files is None:
+                    continue
+                files.pop(file_name, None)
+                if not files:
+                    del locations[usr]
+            if usr not in self.__definitions and \
+                    usr not in self.__declarations:
+                usrs = self.__usrs_by_spelling.get(
+                    symbol[SymbolIndex.SPELLING], set())
+                usrs.discard(usr)
+
+    def __load_if_needed(self):
+        """Read the index folder on the first access."""
+        if self.__loaded:
+            return
+        self.__loaded = True
+        try:
+            entry_names = listdir(self.folder)
+        except OSError as e:
+            log.debug("cannot read symbol index: %s", e)
+            return
+        for entry_name in entry_names:
+            try:
+                with open(path.join(self.folder, entry_name)) as entry_file:
+                    self.__add(json.load(entry_file))
+            except (OSError, ValueError, KeyError) as e:
+                log.debug("skipping symbol index entry '%s': %s",
+                          entry_name, e)
+
+    def __entry_path(self, file_name):
+        """Get the path to the json file storing symbols of a file."""
+        return path.join(self.folder,
+                         Tools.get_unique_str(file_name) + ".json")
+
+    @staticmethod
+    def __get_mtime(file_name):
+        """Get modification time of a file or None if it does not exist."""
+        try:
+            return path.getmtime(file_name)
+        except OSError:
+            return None
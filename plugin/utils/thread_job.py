@@ -4,11 +4,112 @@ Attributes:
     log (logging.Logger): Logger for current module.
 """
 import logging
+import threading
 
 
 log = logging.getLogger("ECC")
 
 
+class JobCancelledError(Exception):
+    """Raised within a job that was asked to stop.
+
+    Attributes:
+        phase (str): expensive phase of the job that was skipped.
+    """
+
+    def __init__(self, phase):
+        """Store the skipped phase."""
+        super().__init__("job cancelled before '{}'".format(phase))
+        self.phase = phase
+
+
+class JobToken:
+    """A token that lets a running job know that its result is not needed.
+
+    A job can only be cancelled by the thread pool before it starts. Once it
+    runs, a newer job that overrides it cancels its token instead. The job
+    checks the token of the current thread before taking locks and between
+    expensive phases and abandons the outdated work early.
+
+    Attributes:
+        generation (int): order in which jobs were submitted to the pool.
+            A job is outdated once a newer generation overrides it.
+    """
+
+    __local = threading.local()
+
+    def __init__(self, generation=0):
+        """Initialize a token that is not cancelled."""
+        self.generation = generation
+        self.__cancelled = threading.Event()
+        self.__lock = threading.Lock()
+        self.__callbacks = []
+
+    def cancel(self):
+        """Ask the job holding this token to stop."""
+        with self.__lock:
+            self.__cancelled.set()
+            callbacks = list(self.__callbacks)
+        for callback in callbacks:
+            callback()
+
+    def add_cancel_callback(self, callback):
+        """Call a function once this token is cancelled.
+
+        The job can register work that cannot check the token itself, e.g.
+        killing a process it waits for. The function is called right away if
+        the token is already cancelled.
+
+        Args:
+            callback (func): function without arguments.
+        """
+        with self.__lock:
+            if not self.__cancelled.is_set():
+                self.__callbacks.append(callback)
+                return
+        callback()
+
+    def remove_cancel_callback(self, callback):
+        """Stop calling a function once this token is cancelled."""
+        with self.__lock:
+            if callback in self.__callbacks:
+                self.__callbacks.remove(callback)
+
+    def is_cancelled(self):
+        """Check if the job holding this token should stop."""
+        return self.__cancelled.is_set()
+
+    def activate(self):
+        """Make this the token of the job running in the current thread."""
+        JobToken.__local.token = self
+
+    @staticmethod
+    def deactivate():
+        """Remove the token of the job running in the current thread."""
+        JobToken.__local.token = None
+
+    @staticmethod
+    def current():
+        """Get the token of the job running in the current thread or None."""
+        return getattr(JobToken.__local, 'token', None)
+
+    @staticmethod
+    def check(phase):
+        """Stop the job running in the current thread if it was cancelled.
+
+        Does nothing when called outside of a job, e.g. from tests.
+
+        Args:
+            phase (str): expensive phase that is about to start.
+
+        Raises:
+            JobCancelledError: if the current job was cancelled.
+        """
+        token = JobToken.current()
+        if token and token.is_cancelled():
+            raise JobCancelledError(phase)
+
+
 class ThreadJob:
     """A class for a job that can be submitted to ThreadPool.
 
@@ -17,6 +118,9 @@ class ThreadJob:
         callback (func): Function to use as callback.
         function (func): Function to run asynchronously.
         args (object[]): Sequence of additional arguments for `function`.
+        lane (object): Lane of this job, usually a view buffer id. Jobs in
+            the same lane run sequentially and can override each other.
+        token (JobToken): Token to stop this job once it is outdated.
     """
 
     UPDATE_TAG = "Updating translation unit"
@@ -25,8 +129,12 @@ class ThreadJob:
     COMPLETE_INCLUDES_TAG = "Competing includes"
     GENERATE_DB_TAG = "Generating compilation database"
     INFO_TAG = "Showing info"
+    PREFETCH_TAG = "Prefetching translation unit"
+    INDEX_TAG = "Indexing symbols"
+    FULL_PARSE_TAG = "Parsing translation unit"
+    PCH_TAG = "Building precompiled header"
 
-    def __init__(self, name, callback, function, args):
+    def __init__(self, name, callback, function, args, lane=None):
         """Initialize a job.
 
         Args:
@@ -34,13 +142,16 @@ class ThreadJob:
             callback (func): Function to use as callback.
             function (func): Function to run asynchronously.
             args (object[]): Sequence of additional arguments for `function`.
+            lane (object, optional): Lane of this job, e.g. view buffer id.
             future (future): A future that tracks the execution of this job.
         """
         self.name = name
         self.callback = callback
         self.function = function
         self.args = args
+        self.lane = lane
         self.future = None
+        self.token = JobToken()
 
     def is_high_priority(self):
         """Check if job is high priority."""
@@ -48,12 +159,24 @@ class ThreadJob:
                              ThreadJob.CLEAR_TAG,
                              ThreadJob.GENERATE_DB_TAG]
 
+    def is_background(self):
+        """Check if job should only run when no other jobs are running."""
+        return self.name in [ThreadJob.PREFETCH_TAG,
+                             ThreadJob.INDEX_TAG,
+                             ThreadJob.PCH_TAG]
+
     def __repr__(self):
         """Representation."""
-        return "job: '{name}'".format(name=self.name)
+        return "job: '{name}' in lane: '{lane}'".format(
+            name=self.name, lane=self.lane)
 
     def overrides(self, other):
-        """Define if one job overrides another."""
+        """Define if one job overrides another.
+
+        Jobs can only override other jobs from the same lane.
+        """
+        if self.lane != other.lane:
+            return False
         if self.is_same_type_as(other):
             return True
         if self.is_high_priority() and not other.is_high_priority():
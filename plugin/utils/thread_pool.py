@@ -9,15 +9,21 @@ from concurrent import futures
 from threading import Lock
 from threading import Thread
 
+from .thread_job import JobCancelledError
+
 log = logging.getLogger("ECC")
 
 
 class ThreadPool:
     """Thread pool that makes sure we don't get recurring jobs.
 
+    Every job belongs to a lane, usually one lane per view. The jobs within a
+    single lane run one after another, while the jobs from different lanes run
+    in parallel, limited only by the maximum number of workers.
+
     Whenever a job is submitted we check if there is already a job like this
-    running. If it is, we try to cancel the previous job. We are only able to
-    cancel this job if it has not started yet.
+    in the same lane. If it is, we try to cancel the previous job. We are only
+    able to cancel this job if it has not started yet.
 
     Example:
 
@@ -29,9 +35,20 @@ class ThreadPool:
     the translation unit is not up to date). We add a new 'update' to the list.
     Now there are two 'update' jobs, one running, one pending. Adding another
     'update' job will replace the pending update job.
+
+    Jobs from other lanes, i.e., for other views, are never cancelled.
+
+    A running job cannot be cancelled, so instead we cancel its token. The job
+    checks its token between expensive phases and stops as soon as it sees
+    that a newer job has made its result useless.
+
+    Background jobs, e.g. speculative parsing of views that are not active,
+    wait until all the other jobs are done and run one at a time, so that
+    there are always free workers for the jobs the user is waiting for.
     """
     PROGRESS_UPDATE_DELAY = 0.1
     PROGRESS_IDLE_DELAY = 0.3
+    MAX_RUNNING_BACKGROUND_JOBS = 1
 
     def __init__(
             self, max_workers=1, common_callback=None, with_progress=False):
@@ -40,6 +57,7 @@ class ThreadPool:
         Args:
             max_workers (int): Maximum number of parallel workers.
         """
+        self.__max_workers = max_workers
         self.__thread_pool = futures.ThreadPoolExecutor(
             max_workers=max_workers)
 
@@ -53,6 +71,24 @@ class ThreadPool:
 
         # All the jobs that are currently active are stored here.
         self.__active_jobs = []
+        # Jobs that wait for their lane to become free, stored by lane.
+        self.__pending_jobs = {}
+        # Lanes that currently have a running job.
+        self.__busy_lanes = set()
+        # Background jobs that wait for other jobs to finish.
+        self.__background_jobs = []
+        # Background jobs that were submitted to their lanes.
+        self.__started_background_jobs = set()
+
+        # Every job gets a new generation number.
+        self.__next_generation = 0
+        # How much work cancellation has saved.
+        self.__cancellation_stats = {
+            'cancelled_before_start': 0,
+            'stopped_while_running': 0,
+            'skipped_phases': {},
+            'seconds_before_stop': 0.0,
+        }
 
         self.__progress_status = None
         self.__progress_thread = None
@@ -73,31 +109,176 @@ class ThreadPool:
         with self.__progress_lock:
             self.__progress_status = val
 
+    @property
+    def max_workers(self):
+        """Return the maximum number of jobs that can run in parallel."""
+        return self.__max_workers
+
+    @max_workers.setter
+    def max_workers(self, val):
+        """Set the maximum number of jobs that can run in parallel.
+
+        The jobs that are already running are allowed to finish.
+        """
+        if val < 1:
+            log.error("Need at least one worker, got: %s. Using 1.", val)
+            val = 1
+        with self.__lock:
+            if val == self.__max_workers:
+                return
+            log.debug("Resizing thread pool to %s workers", val)
+            old_pool = self.__thread_pool
+            self.__thread_pool = futures.ThreadPoolExecutor(max_workers=val)
+            self.__max_workers = val
+        old_pool.shutdown(wait=False)
+
     def new_job(self, job):
         """Add a new job to be submitted to a thread pool.
 
         Args:
             job (ThreadJob): A job to be run asynchronously.
         """
-        # Cancel all the jobs with the same name that are already running.
-        # Iterating over a list is atomic in python, so we should be safe.
-        for active_job in self.__active_jobs:
+        # Cancel all the jobs in this lane that this job overrides. Only the
+        # jobs that have not started yet can be cancelled.
+        with self.__lock:
+            active_jobs = list(self.__active_jobs)
+        for active_job in active_jobs:
             if job.overrides(active_job):
                 if active_job.future.cancel():
                     log.debug("Canceled job: '%s'", job)
+                    with self.__lock:
+                        self.__cancellation_stats[
+                            'cancelled_before_start'] += 1
                 else:
-                    log.debug("Cannot cancel job: '%s'", active_job)
-        # Submit a new job to the pool.
-        future = self.__thread_pool.submit(job.function, *job.args)
+                    log.debug("Asking running job to stop: '%s'", active_job)
+                    active_job.token.cancel()
+        # The future is completed by the worker that picks up the job.
+        future = futures.Future()
         future.add_done_callback(job.callback)
         future.add_done_callback(self.__on_job_done)
         if self.__common_callback:
             future.add_done_callback(self.__common_callback)
         job.future = future  # Set the future for this job.
         with self.__lock:
+            self.__next_generation += 1
+            job.token.generation = self.__next_generation
             self.__active_jobs.append(job)
             self.__show_animation = True
             self.__current_operation_name = self.__active_jobs[0].name
+            if job.is_background():
+                self.__background_jobs.append(job)
+                self.__start_background_jobs()
+                return
+            self.__pending_jobs.setdefault(job.lane, []).append(job)
+            self.__start_next_in_lane(job.lane)
+
+    def __start_background_jobs(self):
+        """Start background jobs if no other jobs are active.
+
+        Must be called with self.__lock held.
+        """
+        for active_job in self.__active_jobs:
+            if not active_job.is_background() and not active_job.future.done():
+                return
+        while self.__background_jobs and len(
+                self.__started_background_jobs) < \
+                ThreadPool.MAX_RUNNING_BACKGROUND_JOBS:
+            job = self.__background_jobs.pop(0)
+            if job.future.cancelled():
+                continue
+            self.__started_background_jobs.add(job)
+            self.__pending_jobs.setdefault(job.lane, []).append(job)
+            self.__start_next_in_lane(job.lane)
+
+    def __start_next_in_lane(self, lane):
+        """Submit the next job of a lane if the lane is free.
+
+        Must be called with self.__lock held.
+        """
+        if lane in self.__busy_lanes:
+            return
+        pending = self.__pending_jobs.get(lane, [])
+        while pending:
+            job = pending.pop(0)
+            if job.future.cancelled():
+                continue
+            self.__busy_lanes.add(lane)
+            self.__thread_pool.submit(self.__run_job, job)
+            break
+        if not pending:
+            self.__pending_jobs.pop(lane, None)
+
+    @property
+    def cancellation_stats(self):
+        """Get statistics of the work saved by cancelling jobs.
+
+        Returns:
+            dict: number of jobs cancelled before they started, number of
+                running jobs that stopped early, how often every phase was
+                skipped and how long the stopped jobs ran before stopping.
+        """
+        with self.__lock:
+            stats = dict(self.__cancellation_stats)
+            stats['skipped_phases'] = dict(stats['skipped_phases'])
+            return stats
+
+    def cancellation_report(self):
+        """Format the work saved by cancelling jobs as text.
+
+        Returns:
+            str: cancelled and stopped jobs and the phases they skipped.
+        """
+        stats = self.cancellation_stats
+        lines = [
+            "jobs cancelled before start: {}".format(
+                stats['cancelled_before_start']),
+            "jobs stopped while running:  {}".format(
+                stats['stopped_while_running']),
+            "seconds run before stopping: {:.3f}".format(
+                stats['seconds_before_stop']),
+        ]
+        for phase, count in sorted(stats['skipped_phases'].items()):
+            lines.append("  stopped before '{}': {}".format(phase, count))
+        return "\n".join(lines)
+
+    def __run_job(self, job):
+        """Run the job and free its lane afterwards.
+
+        A job that stops because its token was cancelled completes its
+        future with None.
+        """
+        try:
+            if job.future.set_running_or_notify_cancel():
+                start = time.time()
+                job.token.activate()
+                try:
+                    result = job.function(*job.args)
+                except JobCancelledError as e:
+                    self.__on_job_stopped(job, e.phase, time.time() - start)
+                    job.future.set_result(None)
+                except BaseException as e:
+                    job.future.set_exception(e)
+                else:
+                    job.future.set_result(result)
+                finally:
+                    job.token.deactivate()
+        finally:
+            with self.__lock:
+                self.__busy_lanes.discard(job.lane)
+                self.__start_next_in_lane(job.lane)
+
+    def __on_job_stopped(self, job, phase, seconds):
+        """Record the work saved by stopping a running job."""
+        with self.__lock:
+            stats = self.__cancellation_stats
+            stats['stopped_while_running'] += 1
+            stats['seconds_before_stop'] += seconds
+            skipped = stats['skipped_phases']
+            skipped[phase] = skipped.get(phase, 0) + 1
+            log.debug("Stopped outdated %s before '%s' after %.3f seconds. "
+                      "Stopped %s running and cancelled %s pending jobs.",
+                      job, phase, seconds, stats['stopped_while_running'],
+                      stats['cancelled_before_start'])
 
     def __on_job_done(self, _):
         """Call this when the job is done or cancelled."""
@@ -106,10 +287,14 @@ class ThreadPool:
         with self.__lock:
             self.__active_jobs[:] = [
                 job for job in self.__active_jobs if not job.future.done()]
+            self.__started_background_jobs = set(
+                job for job in self.__started_background_jobs
+                if not job.future.done())
             if not self.__active_jobs:
                 self.__show_animation = False
             else:
                 self.__current_operation_name = self.__active_jobs[0].name
+            self.__start_background_jobs()
 
     def __animate_progress(self):
         """Change the status message, mostly used to animate progress."""
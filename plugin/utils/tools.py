@@ -1,11 +1,17 @@
 """Collection of various tools."""
 from os import path
 from os import environ
+from threading import Lock
+from threading import Timer
 
+import os
 import sublime
+import signal
 import logging
 import subprocess
 
+from .thread_job import JobToken
+
 
 PKG_NAME = path.basename(path.dirname(path.dirname(path.dirname(__file__))))
 PKG_FOLDER = path.dirname(path.dirname(path.dirname(__file__)))
@@ -14,7 +20,23 @@ _log = logging.getLogger("ECC")
 
 
 class Tools:
-    """Just a bunch of helpful tools."""
+    """Just a bunch of helpful tools.
+
+    Attributes:
+        QUERY_TIMEOUT (int): seconds to wait for a compiler to print its
+            version or its built-in flags.
+        COMPLETE_TIMEOUT (int): seconds to wait for the completions of the
+            clang binary.
+        COMPILE_TIMEOUT (int): seconds to wait for the clang binary to check
+            a file for errors.
+        BUILD_SYSTEM_TIMEOUT (int): seconds to wait for a build system, e.g.
+            cmake, to generate flags.
+    """
+
+    QUERY_TIMEOUT = 30
+    COMPLETE_TIMEOUT = 30
+    COMPILE_TIMEOUT = 120
+    BUILD_SYSTEM_TIMEOUT = 600
 
     @staticmethod
     def seconds_from_string(time_str):
@@ -31,47 +53,235 @@ class Tools:
 
     @staticmethod
     def run_command(command, shell=False, cwd=path.curdir, env=environ,
-                    stdin=None, default=None):
+                    stdin=None, default=None, input_text=None,
+                    stderr=subprocess.STDOUT, timeout=None,
+                    cancellable=False):
         """Run a generic command in a subprocess.
 
+        The command runs in its own process group, so that stopping it also
+        stops the processes it started, e.g. the compilers run by make.
+
         Args:
             command (str): command to run
             stdin: The standard input channel for the started process.
             default (andy): The default return value in case run fails.
+            input_text (str, optional): text written to the standard input
+                of the process, overrides stdin.
+            stderr: where to write errors, into the output by default.
+            timeout (float, optional): seconds after which the command is
+                stopped and the default value is returned.
+            cancellable (bool): stop the command once the job running it is
+                cancelled, e.g. because a newer job overrides it.
+
+        Raises:
+            JobCancelledError: if the command was stopped because its job was
+                cancelled.
 
         Returns:
             str: raw command output or default value
         """
         output_text = default
+        input_bytes = None
+        if input_text is not None:
+            stdin = subprocess.PIPE
+            input_bytes = input_text.encode('utf-8')
         try:
-            startupinfo = None
-            if sublime.platform() == "windows":
-                # Don't let console window pop-up briefly.
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                startupinfo.wShowWindow = subprocess.SW_HIDE
-                if stdin is None:
-                    stdin = subprocess.PIPE
-            output = subprocess.check_output(command,
-                                             stdin=stdin,
-                                             stderr=subprocess.STDOUT,
-                                             shell=shell,
-                                             cwd=cwd,
-                                             env=env,
-                                             startupinfo=startupinfo)
-            output_text = ''.join(map(chr, output))
-        except subprocess.CalledProcessError as e:
-            output_text = e.output.decode("utf-8")
-            _log.debug("Command finished with code: %s", e.returncode)
-            _log.debug("Command output: \n%s", output_text)
+            process = Tools.__start_process(
+                command, stdin=stdin, stderr=stderr, shell=shell, cwd=cwd,
+                env=env)
         except OSError:
             _log.debug(
                 "Executable file not found executing: {}".format(command))
+            return output_text
+        with _ProcessWatch(process, command, timeout, cancellable) as watch:
+            output, _ = process.communicate(input_bytes)
+        if watch.stopped:
+            JobToken.check("read output of {}".format(command))
+            return output_text
+        output_text = output.decode('utf-8', errors='replace')
+        if process.returncode:
+            _log.debug("Command finished with code: %s",
+                       process.returncode)
+            _log.debug("Command output: \n%s", output_text)
         return output_text
 
+    @staticmethod
+    def iter_command_lines(command, cwd=path.curdir, env=environ,
+                           input_text=None, timeout=None,
+                           cancellable=False):
+        """Run a command and yield the lines of its output as they come.
+
+        The process is killed if the caller stops reading before the end of
+        the output.
+
+        Args:
+            command (str[]): command to run
+            cwd (str): folder to run the command in
+            env (dict): environment of the command
+            input_text (str, optional): text written to the standard input
+                of the process
+            timeout (float, optional): seconds after which the command is
+                stopped, which ends the output early.
+            cancellable (bool): stop the command once the job running it is
+                cancelled.
+
+        Raises:
+            JobCancelledError: if the command was stopped because its job was
+                cancelled.
+
+        Yields:
+            str: lines of the output along with their line endings
+        """
+        stdin = None
+        if input_text is not None:
+            stdin = subprocess.PIPE
+        try:
+            process = Tools.__start_process(
+                command, stdin=stdin, stderr=subprocess.STDOUT, cwd=cwd,
+                env=env)
+        except OSError:
+            _log.debug(
+                "Executable file not found executing: {}".format(command))
+            return
+        try:
+            with _ProcessWatch(process, command, timeout,
+                               cancellable) as watch:
+                if process.stdin:
+                    try:
+                        if input_text is not None:
+                            process.stdin.write(input_text.encode('utf-8'))
+                        process.stdin.close()
+                    except OSError as e:
+                        _log.debug("Cannot write to command: %s", e)
+                for line in process.stdout:
+                    yield line.decode('utf-8', errors='replace')
+            if watch.stopped:
+                JobToken.check("read output of {}".format(command))
+        finally:
+            if process.poll() is None:
+                _log.debug("Stop reading output early, killing command")
+                Tools.kill_process(process)
+            process.stdout.close()
+            process.wait()
+
+    @staticmethod
+    def __start_process(command, stdin, stderr, cwd, env, shell=False):
+        """Start a command in a new process group.
+
+        Returns:
+            subprocess.Popen: the started process.
+        """
+        startupinfo = None
+        kwargs = {}
+        if sublime.platform() == "windows":
+            # Don't let console window pop-up briefly.
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = subprocess.SW_HIDE
+            if stdin is None:
+                stdin = subprocess.PIPE
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs['start_new_session'] = True
+        return subprocess.Popen(command,
+                                stdin=stdin,
+                                stdout=subprocess.PIPE,
+                                stderr=stderr,
+                                shell=shell,
+                                cwd=cwd,
+                                env=env,
+                                startupinfo=startupinfo,
+                                **kwargs)
+
+    @staticmethod
+    def kill_process(process):
+        """Kill a process started by Tools along with its process group.
+
+        Args:
+            process (subprocess.Popen): the process to kill.
+        """
+        try:
+            if sublime.platform() == "windows":
+                process.kill()
+            else:
+                # The process leads its own group, see __start_process.
+                os.killpg(process.pid, signal.SIGKILL)
+        except OSError as e:
+            # The process has already finished.
+            _log.debug("Cannot kill process %s: %s", process.pid, e)
+
     @staticmethod
     def get_unique_str(init_string):
         """Generate md5 unique sting hash given init_string."""
         import hashlib
         augmented_string = init_string + path.expanduser('~')
         return hashlib.md5(augmented_string.encode('utf-8')).hexdigest()
+
+
+class _ProcessWatch:
+    """Kill a process once it runs too long or its job is cancelled.
+
+    Attributes:
+        stopped (bool): True if the process was killed.
+    """
+
+    def __init__(self, process, command, timeout, cancellable):
+        """Prepare watching a process.
+
+        Args:
+            process (subprocess.Popen): the process to watch.
+            command (str[]): the command of the process, for logging.
+            timeout (float): seconds after which the process is killed, no
+                limit if None.
+            cancellable (bool): kill the process if the job in the current
+                thread is cancelled.
+        """
+        self.stopped = False
+        self.__process = process
+        self.__command = command
+        self.__timeout = timeout
+        self.__token = JobToken.current() if cancellable else None
+        self.__timer = None
+        self.__lock = Lock()
+        self.__done = False
+
+    def __enter__(self):
+        """Start watching the process."""
+        if self.__timeout is not None:
+            self.__timer = Timer(self.__timeout, self.__on_timeout)
+            self.__timer.daemon = True
+            self.__timer.start()
+        if self.__token:
+            self.__token.add_cancel_callback(self.__on_cancel)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop watching the process."""
+        with self.__lock:
+            self.__done = True
+        if self.__timer:
+            self.__timer.cancel()
+        if self.__token:
+            self.__token.remove_cancel_callback(self.__on_cancel)
+        return False
+
+    def __on_timeout(self):
+        """Kill the process after the timeout."""
+        if self.__stop():
+            _log.warning("Stopped command after %s seconds: %s",
+                         self.__timeout, self.__command)
+
+    def __on_cancel(self):
+        """Kill the process once its job is cancelled."""
+        if self.__stop():
+            _log.debug("Stopped command of a cancelled job: %s",
+                       self.__command)
+
+    def __stop(self):
+        """Kill the process if it is still watched and running."""
+        with self.__lock:
+            if self.__done or self.__process.poll() is not None:
+                return False
+            self.stopped = True
+            Tools.kill_process(self.__process)
+            return True
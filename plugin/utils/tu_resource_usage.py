@@ -0,0 +1,64 @@
+"""Query libclang for the memory used by a translation unit.
+
+The bundled cindex modules do not expose clang_getCXTUResourceUsage, so we
+bind it here with ctypes.
+
+Attributes:
+    log (logging.Logger): logger for this module.
+"""
+import logging
+from ctypes import POINTER
+from ctypes import Structure
+from ctypes import c_int
+from ctypes import c_uint
+from ctypes import c_ulong
+from ctypes import c_void_p
+
+log = logging.getLogger("ECC")
+
+
+class _CXTUResourceUsageEntry(Structure):
+    """Mirror of CXTUResourceUsageEntry from libclang."""
+    _fields_ = [("kind", c_int), ("amount", c_ulong)]
+
+
+class _CXTUResourceUsage(Structure):
+    """Mirror of CXTUResourceUsage from libclang."""
+    _fields_ = [("data", c_void_p),
+                ("numEntries", c_uint),
+                ("entries", POINTER(_CXTUResourceUsageEntry))]
+
+
+class TuResourceUsage:
+    """Measure memory used by translation units."""
+
+    @staticmethod
+    def memory_in_bytes(cindex, tu):
+        """Get the number of bytes a translation unit uses.
+
+        Args:
+            cindex (module): cindex module with a loaded library.
+            tu (cindex.TranslationUnit): translation unit to measure.
+
+        Returns:
+            int: memory used by the unit or 0 if it cannot be measured.
+        """
+        if not tu:
+            return 0
+        try:
+            lib = cindex.conf.lib
+            get_usage = lib.clang_getCXTUResourceUsage
+            dispose_usage = lib.clang_disposeCXTUResourceUsage
+        except AttributeError as e:
+            log.debug("cannot measure translation unit memory: %s", e)
+            return 0
+        get_usage.restype = _CXTUResourceUsage
+        get_usage.argtypes = [c_void_p]
+        dispose_usage.restype = None
+        dispose_usage.argtypes = [_CXTUResourceUsage]
+        usage = get_usage(tu.obj)
+        try:
+            return sum(usage.entries[i].amount
+                       for i in range(usage.numEntries))
+        finally:
+            dispose_usage(usage)
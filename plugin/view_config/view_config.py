@@ -8,6 +8,7 @@ import logging
 from os import path
 
 from ..utils.file import File
+from ..utils.instrumentation import Instrumentation
 from ..utils.subl.subl_bridge import SublBridge
 
 from ..utils.flag import Flag
@@ -17,6 +18,8 @@ from ..utils.search_scope import TreeSearchScope
 
 from ..completion import lib_complete
 from ..completion import bin_complete
+from ..completion import owner_complete
+from ..completion import proc_complete
 
 from ..error_vis.popup_error_vis import PopupErrorVis
 
@@ -43,35 +46,48 @@ class ViewConfig(object):
 
     Stores everything needed to perform completion tasks on a given view with
     given settings.
+
+    Attributes:
+        completer (BaseCompleter): completer for the view.
+        fingerprint (tuple): cheap summary of the configuration, i.e. kind of
+            the requested completer along with a hash of its flags.
+        include_folders (str[]): include folders found in the flags.
+        file_name (str): file of the view the config was created for.
+        owner_file (str): source file whose translation unit serves this
+            view, None if the view has a unit of its own.
     """
 
-    def __init__(self, view, settings):
+    def __init__(self, view, settings, owner=None):
         """Initialize a view configuration.
 
         Args:
             view (View): Current view.
             settings (SettingsStorage): Current settings.
+            owner (ViewConfig, optional): Config of a source file that
+                includes the file of this view and serves it.
         """
         # initialize with nothing
         self.completer = None
+        self.fingerprint = None
+        self.file_name = None
+        self.owner_file = None
         if not SublBridge.is_valid_view(view):
             return
+        self.file_name = view.file_name()
 
         # init creation time
         self.__last_usage_time = time.time()
 
-        # set up a proper object
-        completer, flags, include_folders = ViewConfig.__generate_essentials(
-            view, settings)
-        if not completer:
-            log.warning(" could not generate completer for view %s",
-                        view.buffer_id())
+        if owner:
+            self.__init_from_owner(view, settings, owner)
             return
 
-        self.completer = completer
-        self.completer.clang_flags = flags
+        # set up a proper object
+        completer = ViewConfig.__init_completer(settings)
+        flags, include_folders = ViewConfig.__generate_flags(
+            view, settings, completer.compiler_variant)
+        self.__set_completer(completer, flags, include_folders, settings)
         self.completer.update(view, settings)
-        self.include_folders = include_folders
 
     def update_if_needed(self, view, settings):
         """Check if the view config has changed.
@@ -85,15 +101,28 @@ class ViewConfig(object):
         """
         # update usage time
         self.touch()
+        if self.owner_file:
+            # The flags belong to the owner, its config tracks them.
+            self.completer.update(view, settings)
+            return self
         # update if needed
-        completer, flags, include_folders = ViewConfig.__generate_essentials(
-            view, settings)
-        if self.needs_update(completer, flags):
+        completer = None
+        completer_kind = ViewConfig.__completer_kind(settings)
+        if self.completer and self.fingerprint[0] == completer_kind:
+            # The existing completer knows how to generate flags.
+            compiler_variant = self.completer.compiler_variant
+        else:
+            completer = ViewConfig.__init_completer(settings)
+            compiler_variant = completer.compiler_variant
+        flags, include_folders = ViewConfig.__generate_flags(
+            view, settings, compiler_variant)
+        fingerprint = ViewConfig.make_fingerprint(completer_kind, flags)
+        if self.needs_update(fingerprint):
             log.debug("config needs new completer.")
-            self.completer = completer
-            self.completer.clang_flags = flags
+            if not completer:
+                completer = ViewConfig.__init_completer(settings)
+            self.__set_completer(completer, flags, include_folders, settings)
             self.completer.update(view, settings)
-            self.include_folders = include_folders
             File.update_mod_time(view.file_name())
             return self
         if ViewConfig.needs_reparse(view):
@@ -101,12 +130,23 @@ class ViewConfig(object):
             self.completer.update(view, settings)
         return self
 
-    def needs_update(self, completer, flags):
+    def is_served_by_owner(self, view):
+        """Check if the view is still served by the unit of an owner.
+
+        Args:
+            view (View): Current view.
+
+        Returns:
+            bool: True if the config has an owner that includes the view.
+        """
+        return bool(self.owner_file) and \
+            self.completer.has_owner(view.file_name())
+
+    def needs_update(self, fingerprint):
         """Check if view config needs update.
 
         Args:
-            completer (Completer): A new completer.
-            flags (str[]): Flags as string list.
+            fingerprint (tuple): A fingerprint of the new configuration.
 
         Returns:
             bool: True if update is needed, False otherwise.
@@ -114,15 +154,28 @@ class ViewConfig(object):
         if not self.completer:
             log.debug("no completer. Need to update.")
             return True
-        if completer.name != self.completer.name:
+        if fingerprint[0] != self.fingerprint[0]:
             log.debug("different completer class. Need to update.")
             return True
-        if flags != self.completer.clang_flags:
+        if fingerprint != self.fingerprint:
             log.debug("different completer flags. Need to update.")
             return True
         log.debug("view config needs no update.")
         return False
 
+    @staticmethod
+    def make_fingerprint(completer_kind, flags):
+        """Summarize a configuration so that it can be compared cheaply.
+
+        Args:
+            completer_kind (str): Kind of the requested completer.
+            flags (str[]): Flags as string list.
+
+        Returns:
+            tuple: A fingerprint of the configuration.
+        """
+        return (completer_kind, hash(tuple(flags)))
+
     def is_older_than(self, age_in_seconds):
         """Check if this view config is older than some time in secs.
 
@@ -144,6 +197,44 @@ class ViewConfig(object):
         """Update time of usage of this config."""
         self.__last_usage_time = time.time()
 
+    def __init_from_owner(self, view, settings, owner):
+        """Serve the view from the translation unit of the owner."""
+        log.debug("serve '%s' from the unit of '%s'",
+                  view.file_name(), owner.file_name)
+        self.owner_file = owner.file_name
+        self.completer = owner_complete.Completer(
+            settings, PopupErrorVis(settings), owner.completer,
+            self.owner_file)
+        self.completer.clang_flags = owner.completer.clang_flags
+        self.include_folders = owner.include_folders
+        self.fingerprint = ViewConfig.make_fingerprint(
+            owner_complete.Completer.name, self.completer.clang_flags)
+        self.completer.update(view, settings)
+
+    def __set_completer(self, completer, flags, include_folders, settings):
+        """Store a completer along with the flags it was configured with."""
+        if self.completer and self.completer is not completer:
+            self.completer.dispose()
+        self.completer = completer
+        self.completer.clang_flags = flags
+        self.include_folders = include_folders
+        self.fingerprint = ViewConfig.make_fingerprint(
+            ViewConfig.__completer_kind(settings), flags)
+
+    def can_serve_headers(self, settings):
+        """Check if this config can serve the headers its unit includes.
+
+        Args:
+            settings (SettingsStorage): Current settings.
+
+        Returns:
+            bool: True for configs of source files parsed by libclang in the
+                plugin host if the settings allow it.
+        """
+        return bool(settings.use_owner_tu) and not self.owner_file and \
+            self.completer is not None and \
+            self.completer.name == lib_complete.Completer.name
+
     @staticmethod
     def needs_reparse(view):
         """Check if view config needs update.
@@ -160,26 +251,23 @@ class ViewConfig(object):
         return False
 
     @staticmethod
-    def __generate_essentials(view, settings):
-        """Generate essentials. Flags and empty Completer. This is fast.
+    def __generate_flags(view, settings, compiler_variant):
+        """Generate flags for a given compiler variant. This is fast.
 
         Args:
             view (View): Current view.
             settings (SettingStorage): Current settings.
+            compiler_variant (CompilerVariant): Variant of the compiler.
 
         Returns:
-            (Completer, str[]): A completer bundled with flags as str list.
+            (str[], str[]): Flags as str list bundled with include folders.
         """
         import fnmatch
-        if not SublBridge.is_valid_view(view):
-            log.warning(" no flags for an invalid view %s.", view)
-            return (None, [])
-        completer = ViewConfig.__init_completer(settings)
-        prefixes = completer.compiler_variant.include_prefixes
+        prefixes = compiler_variant.include_prefixes
 
-        init_flags = completer.compiler_variant.init_flags
+        init_flags = compiler_variant.init_flags
         lang_flags = ViewConfig.__get_default_flags(
-            view, settings, completer.compiler_variant.need_lang_flags)
+            view, settings, compiler_variant.need_lang_flags)
         log.debug("Common")
         common_flags = ViewConfig.__get_common_flags(prefixes, settings)
         log.debug("Source")
@@ -203,7 +291,7 @@ class ViewConfig(object):
             flags_as_str_list += flag.as_list()
 
         include_folders = ViewConfig.__get_include_folders(prefixes, flags)
-        return completer, flags_as_str_list, include_folders
+        return flags_as_str_list, include_folders
 
     @staticmethod
     def __get_include_folders(include_prefixes, all_flags):
@@ -324,7 +412,9 @@ class ViewConfig(object):
             elif file_name == "CppProperties.json":
                 flag_source = CppProperties(include_prefixes)
             # try to get flags (uses cache when needed)
-            flags = flag_source.get_flags(view.file_name(), search_scope)
+            with Instrumentation.span(Instrumentation.FLAGS.format(file_name),
+                                      file=view.file_name()):
+                flags = flag_source.get_flags(view.file_name(), search_scope)
             if flags:
                 # don't load anything more if we have flags
                 log.debug("flags generated from '%s'.", file_name)
@@ -336,6 +426,25 @@ class ViewConfig(object):
         """Get common flags as list of flags."""
         return settings.common_flags
 
+    @staticmethod
+    def __completer_kind(settings):
+        """Get the kind of completer requested by the settings.
+
+        The actual completer might differ from the requested one if libclang
+        cannot be loaded, but this does not change between the calls.
+
+        Args:
+            settings (SettingsStorage): Current settings.
+
+        Returns:
+            str: Name of the requested completer class.
+        """
+        if settings.use_libclang and settings.libclang_worker_processes > 0:
+            return proc_complete.Completer.name
+        if settings.use_libclang:
+            return lib_complete.Completer.name
+        return bin_complete.Completer.name
+
     @staticmethod
     def __init_completer(settings):
         """Initialize completer.
@@ -344,12 +453,19 @@ class ViewConfig(object):
             settings (SettingsStorage): Current settings.
 
         Returns:
-            Completer: A completer. Can be lib completer or bin completer.
+            Completer: A completer. Can be proc, lib or bin completer.
         """
         error_vis = PopupErrorVis(settings)
 
         completer = None
-        if settings.use_libclang:
+        if settings.use_libclang and settings.libclang_worker_processes > 0:
+            log.info("init completer based on libclang in worker processes")
+            completer = proc_complete.Completer(settings, error_vis)
+            if not completer.valid:
+                log.error("cannot start libclang worker processes.")
+                log.info("falling back to libclang in the plugin host.")
+                completer = None
+        if not completer and settings.use_libclang:
             log.info("init completer based on libclang")
             completer = lib_complete.Completer(settings, error_vis)
             if not completer.valid:
@@ -386,9 +502,11 @@ class ViewConfig(object):
         if target_compiler is None and settings.use_default_includes:
             target_compiler = settings.clang_binary
         if target_compiler is not None:
-            built_ins = CompilerBuiltIns(compiler=target_compiler,
-                                         lang_flags=lang_flags,
-                                         filename=None)
+            with Instrumentation.span(Instrumentation.COMPILER_BUILTINS,
+                                      compiler=target_compiler):
+                built_ins = CompilerBuiltIns(compiler=target_compiler,
+                                             lang_flags=lang_flags,
+                                             filename=None)
             if settings.use_default_definitions:
                 lang_flags += built_ins.defines
             lang_flags += built_ins.includes
@@ -5,11 +5,16 @@ Attributes:
 """
 import logging
 import weakref
+from contextlib import contextmanager
 from threading import RLock
 from threading import Timer
 
+from ..utils.file import File
+from ..utils.include_map import IncludeMap
 from ..utils.subl.subl_bridge import SublBridge
 from ..utils.subl.row_col import ZeroIndexedRowCol
+from ..utils.symbol_index import SymbolIndex
+from ..utils.tools import Tools
 
 from .view_config import ViewConfig
 
@@ -27,7 +32,18 @@ Please fix your settings.
 
 
 class ViewConfigManager(object):
-    """A utility class that stores a cache of all view configurations."""
+    """A utility class that stores a cache of all view configurations.
+
+    Configs are removed once they get older than the maximum config age or,
+    starting with the least recently used one, when all of them together use
+    more memory than allowed. Configs of the views pinned by the user are
+    never removed. The config of the active view is also kept when freeing
+    memory.
+
+    A view of a header included by an already parsed source file is served
+    by the translation unit of this source file, its owner. Owners are found
+    through the reverse include map of all parsed units.
+    """
 
     TAG = "view_config_progress"
 
@@ -42,7 +58,25 @@ class ViewConfigManager(object):
         """
         self.__timer_period = timer_period      # Seconds.
         self.__max_config_age = max_config_age  # Seconds.
+        self.__max_cache_memory = 0             # Bytes, 0 means unlimited.
         self.__rlock = RLock()
+        # Locks for every view. They make sure that a config for a single
+        # view is not created and removed at the same time without blocking
+        # the configs for all the other views. Every entry is a list
+        # [lock, number of threads using it].
+        self.__view_locks = {}
+        # Ids of views whose configs must never be removed automatically.
+        self.__pinned_views = set()
+        # Project folder -> symbols of all the parsed files of the project,
+        # also of those that are closed.
+        self.__symbol_indices = {}
+        # Included files -> source files whose units include them.
+        self.include_map = IncludeMap()
+        # Files of the views that have a unit of their own -> view ids.
+        self.__view_ids_by_file = {}
+        # View ids -> bytes used by the units of their configs. Measured
+        # after every reparse, so that freeing memory never waits for a unit.
+        self.__config_sizes = {}
 
         with self.__rlock:
             self.__cache = ViewConfigCache()
@@ -64,6 +98,17 @@ class ViewConfigManager(object):
             return self.__cache[v_id]
         return None
 
+    def in_cache(self, v_id):
+        """Check if there is a config for a view without touching it.
+
+        Args:
+            v_id (int): view buffer id.
+
+        Returns:
+            bool: True if the view has a config.
+        """
+        return v_id in self.__cache
+
     def load_for_view(self, view, settings):
         """Get stored config for a view or generate a new one.
 
@@ -81,19 +126,44 @@ class ViewConfigManager(object):
             v_id = view.buffer_id()
             res = None
             # we need to protect this with mutex to avoid race condition
-            # between creating and removing a config.
-            with self.__rlock:
-                if v_id in self.__cache:
+            # between creating and removing a config. The mutex is per view,
+            # so that we can build configs for multiple views in parallel.
+            with self.__view_lock(v_id):
+                config = self.__cache.get(v_id)
+                if config and config.owner_file and \
+                        not self.__keeps_owner(config, view, settings):
+                    log.debug("Owner of view %s cannot serve it", v_id)
+                    self.__dispose(config)
+                    config = None
+                owner = None
+                if not config or not config.owner_file:
+                    owner = self.__find_owner(view, settings)
+                if config and owner:
+                    log.debug("View %s is now served by '%s'",
+                              v_id, owner.file_name)
+                    self.__forget_source(config.file_name)
+                    self.__dispose(config)
+                    config = None
+                parsed_state = None
+                if config:
                     log.debug("Config exists for path: %s", v_id)
-                    res = self.__cache[v_id].update_if_needed(view, settings)
+                    parsed_state = ViewConfigManager.__parsed_state(config)
+                    res = config.update_if_needed(view, settings)
                 else:
                     log.debug("Generate new config for path: %s", v_id)
-                    config = ViewConfig(view, settings)
-                    self.__cache[v_id] = config
+                    config = ViewConfig(view, settings, owner)
+                    with self.__rlock:
+                        self.__cache[v_id] = config
                     res = config
+                # Nothing else changes unless the unit was reparsed.
+                if ViewConfigManager.__parsed_state(res) != parsed_state:
+                    self.__store_size(v_id, res)
+                    self.__update_include_map(v_id, res)
 
-                # Set the internal max config age.
+                # Set the internal max config age and memory budget.
                 self.__max_config_age = settings.max_cache_age
+                self.__max_cache_memory = \
+                    settings.max_cache_memory_mb * 1024 * 1024
 
             # now return the needed config
             return weakref.proxy(res)
@@ -109,20 +179,125 @@ class ViewConfigManager(object):
         assert isinstance(v_id, int), "View id should be an int."
         import gc
         log.debug("Trying to clear config for view: %s", v_id)
-        with self.__rlock:
-            if v_id in self.__cache:
-                del self.__cache[v_id]
+        with self.__view_lock(v_id):
+            with self.__rlock:
+                config = self.__cache.pop(v_id, None)
+                self.__config_sizes.pop(v_id, None)
+                self.__pinned_views.discard(v_id)
+                for file_name, file_v_id in list(
+                        self.__view_ids_by_file.items()):
+                    if file_v_id == v_id:
+                        self.__forget_source(file_name)
+            if config:
+                self.__dispose(config)
+                del config
                 gc.collect()  # Explicitly collect garbage.
         return v_id
 
-    def trigger_get_declaration_location(self, view):
-        """Return location to object declaration."""
+    def is_pinned(self, v_id):
+        """Check if the config of a view is pinned.
+
+        Args:
+            v_id (int): view buffer id.
+
+        Returns:
+            bool: True if the config is never removed automatically.
+        """
+        return v_id in self.__pinned_views
+
+    def set_pinned(self, v_id, pinned):
+        """Pin or unpin the config of a view.
+
+        Args:
+            v_id (int): view buffer id.
+            pinned (bool): if True, never remove the config automatically.
+        """
+        with self.__rlock:
+            if pinned:
+                self.__pinned_views.add(v_id)
+            else:
+                self.__pinned_views.discard(v_id)
+
+    def symbol_index_for(self, settings):
+        """Get the symbol index of the project of a view.
+
+        Args:
+            settings (SettingsStorage): Settings of the view.
+
+        Returns:
+            SymbolIndex: index stored in a folder of its own for every
+                project folder.
+        """
+        project_folder = settings.project_folder
+        with self.__rlock:
+            if project_folder not in self.__symbol_indices:
+                self.__symbol_indices[project_folder] = SymbolIndex(
+                    File.get_temp_dir(SymbolIndex.FOLDER_NAME,
+                                      Tools.get_unique_str(project_folder)))
+            return self.__symbol_indices[project_folder]
+
+    def trigger_get_declaration_location(self, view, settings):
+        """Return location to object declaration.
+
+        A definition in the translation unit of the view comes first. If the
+        unit has none, the symbol index is asked for a definition, which might
+        be in a file that is not open, and then the unit for a declaration.
+        Without a translation unit for the view, the symbol is looked up by
+        its name.
+        """
+        rowcol = ZeroIndexedRowCol.from_current_cursor_pos(view)
+        symbol_index = None
+        if settings.use_symbol_index:
+            symbol_index = self.symbol_index_for(settings)
         config = self.get_from_cache(view)
         if not config:
-            log.debug("Config is not ready yet. No reference is available.")
-            return None
-        rowcol = ZeroIndexedRowCol.from_current_cursor_pos(view)
-        return config.completer.get_declaration_location(view, rowcol)
+            if not symbol_index:
+                return None
+            log.debug("Config is not ready yet. Looking up symbol by name.")
+            word = view.substr(view.word(rowcol.as_1d_location(view)))
+            return symbol_index.find_by_spelling(word.strip())
+        location = config.completer.get_definition_location(view, rowcol)
+        if location:
+            return location
+        usr = None
+        if symbol_index:
+            usr = config.completer.get_symbol_usr(view, rowcol)
+        if usr:
+            location = symbol_index.find_definition(usr)
+            if location:
+                log.debug("Found definition of '%s' in symbol index.", usr)
+                return location
+        location = config.completer.get_declaration_location(view, rowcol)
+        if not location and usr:
+            return symbol_index.find(usr)
+        return location
+
+    def index_symbols(self, view, settings):
+        """Add symbols declared in the file of a view to the symbol index.
+
+        Only saved views are indexed, so that the stored locations match the
+        files on disk. Files that were not modified since they were last
+        indexed are skipped.
+
+        Args:
+            view (View): Current view.
+            settings (SettingsStorage): Current settings.
+
+        Returns:
+            bool: True if the file was indexed.
+        """
+        config = self.get_from_cache(view)
+        if not config or not config.completer:
+            return False
+        symbol_index = self.symbol_index_for(settings)
+        file_name = view.file_name()
+        if view.is_dirty() or symbol_index.is_up_to_date(file_name):
+            return False
+        symbols = config.completer.collect_symbols(view)
+        if symbols is None:
+            return False
+        symbol_index.update_file(file_name, symbols)
+        return True
 
     def trigger_info(self, view, tooltip_request, settings):
         """Handle getting info from completer.
@@ -147,6 +322,121 @@ class ViewConfigManager(object):
         view_config = self.get_from_cache(view)
         return view_config.completer.complete(completion_request)
 
+    def __find_owner(self, view, settings):
+        """Find a config whose translation unit can serve a view.
+
+        Args:
+            view (View): Current view.
+            settings (SettingsStorage): Current settings.
+
+        Returns:
+            ViewConfig: config of the most recently parsed source file that
+                includes the file of the view, None if there is none.
+        """
+        if not settings.use_owner_tu:
+            return None
+        file_name = view.file_name()
+        for owner_file in self.include_map.owners_of(file_name):
+            with self.__rlock:
+                owner_v_id = self.__view_ids_by_file.get(owner_file)
+                owner = self.__cache.get(owner_v_id)
+            if owner is None or owner.file_name != owner_file:
+                continue
+            if owner.can_serve_headers(settings) and \
+                    owner.completer.includes(file_name):
+                log.debug("'%s' is served by '%s'", file_name, owner_file)
+                return owner
+        return None
+
+    @staticmethod
+    def __dispose(config):
+        """Free what the completer of a config that is not used holds.
+
+        The owner of a header config is told that it stops serving it.
+        """
+        if not config.completer:
+            return
+        if config.owner_file:
+            config.completer.release(config.file_name)
+        else:
+            config.completer.dispose()
+
+    @staticmethod
+    def __keeps_owner(config, view, settings):
+        """Check if a view is still served by the owner of its config."""
+        return bool(settings.use_owner_tu) and \
+            config.is_served_by_owner(view)
+
+    def __forget_source(self, file_name):
+        """Forget a file that no longer has a unit of its own."""
+        with self.__rlock:
+            self.__view_ids_by_file.pop(file_name, None)
+        self.include_map.remove_source(file_name)
+
+    @staticmethod
+    def __parsed_state(config):
+        """Get what changes whenever the unit of a config is reparsed."""
+        if not config.completer:
+            return None
+        return (config.completer, config.completer.tu_generation)
+
+    def __store_size(self, v_id, config):
+        """Measure the memory used by the unit of a config after a reparse.
+
+        Args:
+            v_id (int): view buffer id.
+            config (ViewConfig): config of the view.
+        """
+        size = config.completer.memory_usage() if config.completer else 0
+        with self.__rlock:
+            self.__config_sizes[v_id] = size
+
+    def __update_include_map(self, v_id, config):
+        """Store the files included by the unit of a config after a reparse.
+
+        Args:
+            v_id (int): view buffer id.
+            config (ViewConfig): config of the view.
+        """
+        if not config.completer or config.owner_file:
+            return
+        included_files = config.completer.included_files()
+        if included_files is None:
+            return
+        with self.__rlock:
+            self.__view_ids_by_file[config.file_name] = v_id
+        self.include_map.update_source(config.file_name, included_files)
+
+    @contextmanager
+    def __view_lock(self, v_id, blocking=True):
+        """Hold a lock that guards the config of a single view.
+
+        The lock of a view is only dropped once no thread uses it and the
+        view has no config, so that all threads always share the same lock
+        for a view.
+
+        Args:
+            v_id (int): view buffer id.
+            blocking (bool): if False, do not wait for a busy lock.
+
+        Yields:
+            bool: True if the lock is held.
+        """
+        with self.__rlock:
+            entry = self.__view_locks.setdefault(v_id, [RLock(), 0])
+            entry[1] += 1
+        locked = entry[0].acquire(blocking=blocking)
+        try:
+            yield locked
+        finally:
+            if locked:
+                entry[0].release()
+            with self.__rlock:
+                entry[1] -= 1
+                if not entry[1] and v_id not in self.__cache and \
+                        self.__view_locks.get(v_id) is entry:
+                    del self.__view_locks[v_id]
+
     def __run_timer(self):
         """We make sure we run a single thread."""
         if ViewConfigManager.TAG in self.__timer_cache:
@@ -165,15 +455,87 @@ class ViewConfigManager(object):
         """
         import gc
         with self.__rlock:
-            for v_id in list(self.__cache.keys()):
-                if self.__cache[v_id].is_older_than(self.__max_config_age):
+            configs = list(self.__cache.items())
+        for v_id, config in configs:
+            if v_id in self.__pinned_views:
+                log.debug("Keep config of pinned view: %s", v_id)
+                continue
+            if not config.is_older_than(self.__max_config_age):
+                log.debug("Skip young config: Age %s < %s. View: %s.",
+                          config.get_age(), self.__max_config_age, v_id)
+                continue
+            # A config that is being loaded right now is not old any more.
+            with self.__view_lock(v_id, blocking=False) as locked:
+                if not locked:
+                    continue
+                with self.__rlock:
+                    if self.__cache.get(v_id) is not config:
+                        continue
                     log.debug("Remove old config: %s", v_id)
                     del self.__cache[v_id]
-                    gc.collect()  # Explicitly collect garbage
-                else:
-                    log.debug("Skip young config: Age %s < %s. View: %s.",
-                              self.__cache[v_id].get_age(),
-                              self.__max_config_age,
-                              v_id)
+                    self.__config_sizes.pop(v_id, None)
+                    if not config.owner_file:
+                        self.__forget_source(config.file_name)
+                self.__dispose(config)
+            gc.collect()  # Explicitly collect garbage
+        self.__remove_configs_over_memory_budget()
         # Run the timer again.
         self.__run_timer()
+
+    def __remove_configs_over_memory_budget(self):
+        """Remove least recently used configs until they fit into memory.
+
+        The sizes measured after the last reparse of every config are used,
+        so that busy configs, e.g. being reparsed, never block this. Busy
+        configs are skipped this time.
+        """
+        import gc
+        if not self.__max_cache_memory:
+            return
+        with self.__rlock:
+            configs = list(self.__cache.items())
+            sizes = dict(self.__config_sizes)
+        total_size = sum(sizes.get(v_id, 0) for v_id, _ in configs)
+        log.debug("Configs use %s bytes out of %s",
+                  total_size, self.__max_cache_memory)
+        # Oldest usage first.
+        configs.sort(key=lambda item: item[1].get_age(), reverse=True)
+        removed_configs = False
+        for v_id, config in configs:
+            if total_size <= self.__max_cache_memory:
+                break
+            if not self.__can_remove(v_id):
+                continue
+            with self.__view_lock(v_id, blocking=False) as locked:
+                if not locked:
+                    continue
+                with self.__rlock:
+                    if self.__cache.get(v_id) is not config:
+                        continue
+                    log.debug("Remove config over memory budget: %s", v_id)
+                    del self.__cache[v_id]
+                    self.__config_sizes.pop(v_id, None)
+                    if not config.owner_file:
+                        self.__forget_source(config.file_name)
+                    total_size -= sizes.get(v_id, 0)
+                self.__dispose(config)
+                removed_configs = True
+        if removed_configs:
+            gc.collect()  # Explicitly collect garbage
+
+    def __can_remove(self, v_id):
+        """Check if a config can be removed automatically.
+
+        Args:
+            v_id (int): view buffer id.
+
+        Returns:
+            bool: False for the active view and pinned views.
+        """
+        if v_id in self.__pinned_views:
+            return False
+        try:
+            return v_id != SublBridge.active_view_id()
+        except AttributeError:
+            # There is no active view.
+            return True
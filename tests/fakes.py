@@ -0,0 +1,109 @@
+"""Fakes shared by the tests that run without Sublime Text."""
+from EasyClangComplete.plugin.settings.settings_storage import SettingsStorage
+
+
+class FakeSettings:
+    """Settings with fixed values instead of those of a view.
+
+    Any setting can be changed when creating the settings, e.g.
+    FakeSettings(use_owner_tu=True).
+    """
+
+    clang_binary = 'clang++-test'
+    clang_version = '10.0.0'
+    gutter_style = SettingsStorage.GUTTER_DOT_STYLE
+    linter_mark_style = SettingsStorage.MARK_STYLE_OUTLINE
+    max_cache_age = 60
+    max_cache_memory_mb = 0
+    max_cached_completions = 2
+    max_clang_binary_completions = 0
+    max_offscreen_error_regions = 0
+    project_folder = None
+    show_errors = False
+    triggers = ['.', '->', '::', '(']
+    use_owner_tu = False
+    use_serialized_diagnostics = False
+    use_stdin_for_clang_binary = True
+    use_symbol_index = True
+
+    def __init__(self, **settings_values):
+        """Override the default values of some settings."""
+        for name, value in settings_values.items():
+            setattr(self, name, value)
+
+
+class FakeCompleter:
+    """A completer with a unit of a fixed size that knows a symbol."""
+
+    def __init__(self, size=0, declaration=None, definition=None):
+        """Create a unit of the given size in bytes.
+
+        Args:
+            size (int): memory used by the unit.
+            declaration (IndexLocation): declaration of the symbol.
+            definition (IndexLocation): definition of the symbol if the unit
+                contains it.
+        """
+        self.size = size
+        self.declaration = declaration
+        self.definition = definition
+        self.disposed = False
+        self.tu_generation = 0
+        self.measured = 0
+        self.listed_includes = 0
+
+    def memory_usage(self):
+        """Get the memory used by the unit."""
+        self.measured += 1
+        return self.size
+
+    def included_files(self):
+        """Include a single header."""
+        self.listed_includes += 1
+        return set(['/tmp/test.h'])
+
+    def get_definition_location(self, view, row_col):
+        """Get the definition if the unit contains it."""
+        return self.definition
+
+    def get_declaration_location(self, view, row_col):
+        """Get the declaration."""
+        return self.declaration
+
+    def get_symbol_usr(self, view, row_col):
+        """Get the USR of the symbol."""
+        return "c:@F@foo#"
+
+    def dispose(self):
+        """Remember that the config was removed."""
+        self.disposed = True
+
+
+class FakeConfig:
+    """A config of a view with a unit of its own."""
+
+    owner_file = None
+    file_name = '/tmp/test_1.cpp'
+
+    def __init__(self, completer=None, age=0):
+        """Create a config last used the given number of seconds ago."""
+        self.completer = completer
+        self.age = age
+
+    def get_age(self):
+        """Get the age of the config."""
+        return self.age
+
+    def is_older_than(self, age_in_seconds):
+        """Check if the config is older than some time in secs."""
+        return self.age > age_in_seconds
+
+    def touch(self):
+        """Ignore marking the config as used."""
+        pass
+
+    def update_if_needed(self, view, settings):
+        """Reparse the unit if the view asks for it."""
+        if view.modified:
+            self.completer.tu_generation += 1
+        return self
@@ -0,0 +1,48 @@
+"""Test the cache of translation units stored on disk."""
+import tempfile
+from os import path
+from os import utime
+from unittest import TestCase
+from unittest.mock import patch
+
+from EasyClangComplete.plugin.completion import ast_cache
+
+AstCache = ast_cache.AstCache
+
+
+class TestAstCache(TestCase):
+    """Test evicting entries of the ast cache."""
+
+    def setUp(self):
+        """Store the cache in a folder of its own."""
+        self.folder = tempfile.mkdtemp()
+        patcher = patch.object(ast_cache.File, 'get_temp_dir',
+                               return_value=self.folder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_entry(self, file_name, size, last_used):
+        """Write an entry of the given size that was last used at a time."""
+        entry = AstCache(file_name, ['-std=c++11'], '10.0.0')
+        with open(entry.ast_file, 'wb') as ast_file:
+            ast_file.write(b'\0' * size)
+        with open(entry.meta_file, 'w') as meta_file:
+            meta_file.write('{}')
+        utime(entry.ast_file, (last_used, last_used))
+        return entry
+
+    def test_evict(self):
+        """Test that the least recently used entries are removed first."""
+        oldest = self.make_entry('/src/a.cpp', 100, 1000)
+        newest = self.make_entry('/src/b.cpp', 100, 3000)
+        middle = self.make_entry('/src/c.cpp', 100, 2000)
+        self.assertEqual(AstCache.evict(1000), 0)
+        self.assertEqual(AstCache.evict(250), 1)
+        self.assertFalse(path.exists(oldest.ast_file))
+        self.assertFalse(path.exists(oldest.meta_file))
+        self.assertTrue(path.exists(middle.ast_file))
+        self.assertEqual(AstCache.evict(150), 1)
+        self.assertFalse(path.exists(middle.ast_file))
+        self.assertTrue(path.exists(newest.ast_file))
+        self.assertEqual(AstCache.evict(0), 1)
+        self.assertFalse(path.exists(newest.ast_file))
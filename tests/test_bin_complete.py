@@ -0,0 +1,225 @@
+"""Test running the clang binary with the contents of a view."""
+from os import path
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from EasyClangComplete.plugin.completion import bin_complete
+from EasyClangComplete.tests import test_serialized_diagnostics
+from EasyClangComplete.tests.fakes import FakeSettings
+
+Completer = bin_complete.Completer
+# The tools test reloads the tools module, so patch the class used here.
+Tools = bin_complete.Tools
+
+FILE_NAME = path.join(path.sep + 'project', 'src', 'main.cpp')
+FILE_BODY = 'int main() { return 0; }\n'
+
+
+def make_view(body=FILE_BODY):
+    """Make a view with the given code."""
+    view = MagicMock()
+    view.file_name.return_value = FILE_NAME
+    view.substr.side_effect = lambda region: body[region.a:region.b]
+    view.size.return_value = len(body)
+    return view
+
+
+class TestBinComplete(TestCase):
+    """Test passing the code to clang through stdin."""
+
+    def setUp(self):
+        """Forget which binaries support stdin."""
+        Completer.stdin_support.clear()
+        self.completer = Completer(FakeSettings(), MagicMock())
+        self.completer.clang_flags = ['-c', '-fsyntax-only', '-x', 'c++']
+
+    def test_supports_stdin(self):
+        """Test that every binary is only checked once."""
+        with patch.object(Tools, 'run_command',
+                          return_value='COMPLETION: member : member') as run:
+            self.assertTrue(Completer.supports_stdin('clang++-test'))
+            self.assertTrue(Completer.supports_stdin('clang++-test'))
+        self.assertEqual(run.call_count, 1)
+        command = run.call_args[0][0]
+        self.assertEqual(command[-1], '-')
+        with patch.object(Tools, 'run_command',
+                          return_value='error: no such file'):
+            self.assertFalse(Completer.supports_stdin('old-clang'))
+
+    def test_update_through_stdin(self):
+        """Test that errors in stdin are reported for the file."""
+        Completer.stdin_support['clang++-test'] = True
+        output = '<stdin>:1:5: error: something is wrong\n'
+        with patch.object(Tools, 'run_command', return_value=output) as run:
+            output_text = self.completer.run_clang_command(
+                make_view(), "update")
+        self.assertEqual(output_text,
+                         FILE_NAME + ':1:5: error: something is wrong\n')
+        args, kwargs = run.call_args
+        self.assertEqual(args[0], ['clang++-test', '-c', '-fsyntax-only',
+                                   '-x', 'c++', '-'])
+        self.assertEqual(kwargs['input_text'], FILE_BODY)
+        self.assertEqual(kwargs['cwd'], path.dirname(FILE_NAME))
+        # The flags of the completer stay the same.
+        self.assertEqual(self.completer.clang_flags,
+                         ['-c', '-fsyntax-only', '-x', 'c++'])
+
+    def test_fallback_to_temp_file(self):
+        """Test that a temporary file is used without -x."""
+        Completer.stdin_support['clang++-test'] = True
+        self.completer.clang_flags = ['-c', '-fsyntax-only']
+        with patch.object(Tools, 'run_command', return_value='') as run:
+            self.completer.run_clang_command(make_view(), "update")
+        command = run.call_args[0][0]
+        self.assertNotEqual(command[-1], '-')
+        self.assertEqual(path.basename(command[-1]), 'main.cpp')
+        with open(command[-1]) as temp_file:
+            self.assertEqual(temp_file.read(), FILE_BODY)
+
+    def test_update_with_serialized_diagnostics(self):
+        """Test that warnings are read from serialized diagnostics."""
+        Completer.stdin_support['clang++-test'] = True
+        self.completer.use_serialized_diagnostics = True
+        settings = FakeSettings()
+        settings.show_errors = True
+
+        def write_diagnostics(command, **kwargs):
+            """Write diagnostics of code read from stdin like clang."""
+            writer = test_serialized_diagnostics.BitstreamWriter()
+            writer.enter_block(0, 2)
+            writer.unabbrev_record(1, [9])
+            for ops in [test_serialized_diagnostics.DIAG_ABBREV,
+                        test_serialized_diagnostics.RANGE_ABBREV,
+                        test_serialized_diagnostics.FILENAME_ABBREV]:
+                writer.define_abbrev(ops)
+            writer.exit_block()
+            for level, message in [(2, "unused variable 'x'"),
+                                   (2, "#pragma once in main file")]:
+                writer.enter_block(9, 4)
+                test_serialized_diagnostics.write_file_name(
+                    writer, 1, '<stdin>')
+                test_serialized_diagnostics.write_diag(
+                    writer, level,
+                    test_serialized_diagnostics.location(1, 1, 5), message)
+                writer.exit_block()
+            dia_file = command[command.index('-serialize-diagnostics') + 1]
+            with open(dia_file, 'wb') as output:
+                output.write(writer.data())
+            return ''
+        with patch.object(Tools, 'run_command',
+                          side_effect=write_diagnostics):
+            self.completer.update(make_view(), settings)
+        self.assertEqual(len(self.completer.latest_errors), 1)
+        warning = self.completer.latest_errors[0]
+        self.assertEqual(warning['file'], FILE_NAME)
+        self.assertEqual(warning['severity'], 2)
+
+    def test_update_without_serialized_diagnostics(self):
+        """Test that the output is parsed if no diagnostics are written."""
+        Completer.stdin_support['clang++-test'] = True
+        self.completer.use_serialized_diagnostics = True
+        settings = FakeSettings()
+        settings.show_errors = True
+        output = '<stdin>:1:5: error: something is wrong\n'
+        with patch.object(Tools, 'run_command', return_value=output):
+            self.completer.update(make_view(), settings)
+        self.assertEqual(self.completer.latest_errors, [
+            {'file': FILE_NAME, 'row': 0, 'col': 4,
+             'error': 'something is wrong'}])
+
+
+class TestParseCompletions(TestCase):
+    """Test parsing the completions printed by clang."""
+
+    def test_parse_completion(self):
+        """Test building trigger, hint and snippet of a completion."""
+        completion = Completer._parse_completion(
+            'COMPLETION: foo : [#void#]foo(<#double a#>, <#int b#>)')
+        self.assertEqual(completion, ['foo\tvoid foo(double a, int b)',
+                                      'foo(${1:double a}, ${2:int b})'])
+
+    def test_parse_optional_params(self):
+        """Test that optional parameters become regular ones."""
+        completion = Completer._parse_completion(
+            'COMPLETION: bar : [#int#]bar(<#int a#>{#, <#int b#>#})')
+        self.assertEqual(completion, ['bar\tint bar(int a, int b)',
+                                      'bar(${1:int a}, ${2:int b})'])
+
+    def test_parse_without_completion(self):
+        """Test that other lines are skipped."""
+        self.assertIsNone(Completer._parse_completion('1 error generated.'))
+        self.assertIsNone(Completer._parse_completion('COMPLETION: foo'))
+
+    def test_stop_early(self):
+        """Test that reading stops once enough completions are parsed."""
+        lines = iter(['COMPLETION: a{} : a{}'.format(i, i)
+                      for i in range(10)])
+        completions = Completer._parse_completions(lines, 3)
+        self.assertEqual([c[1] for c in completions], ['a0', 'a1', 'a2'])
+        self.assertEqual(next(lines), 'COMPLETION: a3 : a3')
+        self.assertEqual(len(Completer._parse_completions(lines)), 6)
+
+
+class TestCompletionCache(TestCase):
+    """Test reusing completions for the same code."""
+
+    def setUp(self):
+        """Create a completer that completes a single member."""
+        self.completer = Completer(FakeSettings(), MagicMock())
+        self.completer.clang_flags = ['-c', '-fsyntax-only']
+
+    def complete(self, body, trigger_position=None):
+        """Complete the code in body, by default at its end."""
+        if trigger_position is None:
+            trigger_position = len(body)
+        request = MagicMock()
+        request.get_view.return_value = make_view(body)
+        request.get_trigger_position.return_value = trigger_position
+        output = (line for line in ['COMPLETION: member : [#int#]member'])
+        with patch.object(Completer, 'stream_clang_command',
+                          return_value=output) as stream:
+            _, completions = self.completer.complete(request)
+        self.assertEqual(completions, [['member\tint member', 'member']])
+        return stream.call_count
+
+    def test_cache_key(self):
+        """Test which parts of the code completions depend on."""
+        body = 'int a;\nvoid f() { x = foo(a,  b).bar->'
+        key = self.completer.completion_cache_key(make_view(body), len(body))
+        self.assertEqual(key[1], hash('int a;\nvoid f() {'))
+        self.assertEqual(key[2], '->')
+        self.assertEqual(key[3], 'foo(a, b).bar')
+
+    def test_expression_before(self):
+        """Test finding the expression before a trigger."""
+        self.assertEqual(Completer._expression_before(' return obj'),
+                         'return obj')
+        self.assertEqual(Completer._expression_before('f(a, b.c'), 'b.c')
+        self.assertEqual(Completer._expression_before('x = std::vector<int>'),
+                         'std::vector<int>')
+        self.assertEqual(Completer._expression_before('y = *p[i + 1]'),
+                         'p[i + 1]')
+
+    def test_reuse_completions(self):
+        """Test that clang only runs if the code before changed."""
+        body = 'int a;\nvoid f(S s) { s.'
+        self.assertEqual(self.complete(body), 1)
+        # Same expression further down in the same block.
+        self.assertEqual(self.complete(body + '\n  s.', len(body)), 0)
+        # Code below the cursor does not matter.
+        self.assertEqual(self.complete(body + 'x; int b;', len(body)), 0)
+        # Code above the cursor does.
+        self.assertEqual(self.complete('int b;\nvoid f(S s) { s.'), 1)
+        # Saving the file clears the cache.
+        self.completer.update(make_view(body), FakeSettings())
+        self.assertEqual(self.complete(body), 1)
+
+    def test_least_recently_used_removed(self):
+        """Test that the cache is bounded."""
+        self.assertEqual(self.complete('void f() { a.'), 1)
+        self.assertEqual(self.complete('void f() { b.'), 1)
+        self.assertEqual(self.complete('void f() { a.'), 0)
+        self.assertEqual(self.complete('void f() { c.'), 1)
+        self.assertEqual(self.complete('void f() { a.'), 0)
+        self.assertEqual(self.complete('void f() { b.'), 1)
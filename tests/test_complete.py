@@ -3,10 +3,14 @@ import imp
 import sublime
 import platform
 from os import path
+from unittest.mock import patch
 
+from EasyClangComplete.plugin.completion import ast_cache
+from EasyClangComplete.plugin.completion import completion_index
 from EasyClangComplete.plugin.settings import settings_manager
 from EasyClangComplete.plugin.utils import action_request
 from EasyClangComplete.plugin.utils.subl import row_col
+from EasyClangComplete.plugin.view_config import view_config
 from EasyClangComplete.plugin.view_config import view_config_manager
 
 from EasyClangComplete.tests import gui_test_wrapper
@@ -14,11 +18,16 @@ from EasyClangComplete.tests import gui_test_wrapper
 imp.reload(gui_test_wrapper)
 imp.reload(row_col)
 imp.reload(settings_manager)
+imp.reload(view_config)
 imp.reload(view_config_manager)
 imp.reload(action_request)
+imp.reload(ast_cache)
 
 SettingsManager = settings_manager.SettingsManager
 ActionRequest = action_request.ActionRequest
+AstCache = ast_cache.AstCache
+CompletionIndex = completion_index.CompletionIndex
+ViewConfig = view_config.ViewConfig
 ViewConfigManager = view_config_manager.ViewConfigManager
 GuiTestWrapper = gui_test_wrapper.GuiTestWrapper
 ZeroIndexedRowCol = row_col.ZeroIndexedRowCol
@@ -58,15 +67,20 @@ class BaseTestCompleter(object):
         use_libclang (bool): decides if we use libclang in tests
     """
 
-    def set_up_completer(self):
+    def set_up_completer(self, **settings_values):
         """Set up a completer for the current view.
 
+        Args:
+            **settings_values: settings that differ from the defaults.
+
         Returns:
             BaseCompleter: completer for the current view.
         """
         manager = SettingsManager()
         settings = manager.settings_for_view(self.view)
         settings.use_libclang = self.use_libclang
+        for name, value in settings_values.items():
+            setattr(settings, name, value)
 
         view_config_manager = ViewConfigManager()
         view_config = view_config_manager.load_for_view(self.view, settings)
@@ -417,6 +431,266 @@ class BaseTestCompleter(object):
 
         self.tear_down_completer()
 
+    def test_complete_while_other_view_reparses(self):
+        """Test that a busy translation unit does not block other ones."""
+        if not self.use_libclang:
+            return
+        import threading
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        self.set_up_view(file_name)
+
+        manager = SettingsManager()
+        settings = manager.settings_for_view(self.view)
+        settings.use_libclang = self.use_libclang
+        busy_completer = ViewConfig(self.view, settings).completer
+        completer = ViewConfig(self.view, settings).completer
+
+        # Emulate a heavy reparse that holds the lock of the busy unit.
+        lock_taken = threading.Event()
+        reparse_done = threading.Event()
+
+        def heavy_reparse():
+            with busy_completer.tu_lock:
+                lock_taken.set()
+                # Give up eventually, so that a blocked completion fails.
+                reparse_done.wait(60)
+
+        reparse_thread = threading.Thread(target=heavy_reparse)
+        reparse_thread.start()
+        lock_taken.wait()
+        try:
+            # The other unit has a lock of its own that stays free.
+            self.assertIsNot(completer.tu_lock, busy_completer.tu_lock)
+            self.assertTrue(completer.tu_lock.acquire(blocking=False))
+            completer.tu_lock.release()
+
+            cursor_row_col = ZeroIndexedRowCol.from_one_indexed(
+                OneIndexedRowCol(9, 5))
+            location = cursor_row_col.as_1d_location(self.view)
+            request = ActionRequest(self.view, location)
+            (_, completions) = completer.complete(request)
+            # The busy unit is still reparsing after the completion.
+            self.assertTrue(reparse_thread.is_alive())
+        finally:
+            reparse_done.set()
+            reparse_thread.join()
+
+        expected = ['foo\tvoid foo(double a)', 'foo(${1:double a})']
+        self.assertIn(expected, completions)
+
+    def test_completers_share_index(self):
+        """Test that all libclang completers use the same index."""
+        if not self.use_libclang:
+            return
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        self.set_up_view(file_name)
+        manager = SettingsManager()
+        settings = manager.settings_for_view(self.view)
+        settings.use_libclang = self.use_libclang
+        first = ViewConfig(self.view, settings).completer
+        second = ViewConfig(self.view, settings).completer
+        self.assertIsNotNone(first.index)
+        self.assertIs(first.index, second.index)
+
+    def test_skip_redundant_reparse(self):
+        """Test that an unchanged buffer is not reparsed again."""
+        if not self.use_libclang:
+            return
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        self.set_up_view(file_name)
+        completer = self.set_up_completer()
+        manager = SettingsManager()
+        settings = manager.settings_for_view(self.view)
+        # Make sure the unit is fully parsed, e.g. if loaded from ast cache.
+        completer.update(self.view, settings)
+
+        generation = completer.tu_generation
+        avoided = completer.reparses_avoided
+        self.assertTrue(completer.update(self.view, settings))
+        self.assertEqual(completer.tu_generation, generation)
+        self.assertEqual(completer.reparses_avoided, avoided + 1)
+
+        # An edit requires a reparse.
+        self.view.run_command("insert", {"characters": " "})
+        self.assertTrue(completer.update(self.view, settings))
+        self.assertEqual(completer.tu_generation, generation + 1)
+        self.assertEqual(completer.reparses_avoided, avoided + 1)
+
+        self.tear_down_completer()
+
+    def test_update_saved_header(self):
+        """Test that a header changed on disk is reparsed by its owner."""
+        if not self.use_libclang:
+            return
+        import os
+        import shutil
+        import tempfile
+        from unittest.mock import MagicMock
+        folder = path.realpath(tempfile.mkdtemp())
+        header_file = path.join(folder, 'main.h')
+        file_name = path.join(folder, 'main.cpp')
+        with open(header_file, 'w') as header:
+            header.write('int foo();\n')
+        with open(file_name, 'w') as source:
+            source.write('#include "main.h"\nint main() { return foo(); }\n')
+        self.set_up_view(file_name)
+        completer = self.set_up_completer()
+        settings = SettingsManager().settings_for_view(self.view)
+        completer.update(self.view, settings)
+        self.assertTrue(completer.includes(header_file))
+
+        header_view = MagicMock()
+        header_view.file_name.return_value = header_file
+        header_view.is_dirty.return_value = False
+        header_view.size.return_value = 0
+        header_view.substr.return_value = ''
+        generation = completer.tu_generation
+        avoided = completer.reparses_avoided
+        self.assertTrue(completer.update_header(header_view, settings))
+        self.assertEqual(completer.tu_generation, generation)
+        self.assertEqual(completer.reparses_avoided, avoided + 1)
+
+        # The header changes on disk, e.g. on checkout.
+        with open(header_file, 'w') as header:
+            header.write('int foo(int a);\n')
+        mtime = path.getmtime(header_file) + 10
+        os.utime(header_file, (mtime, mtime))
+        self.assertTrue(completer.update_header(header_view, settings))
+        self.assertEqual(completer.tu_generation, generation + 1)
+        self.assertTrue(completer.update_header(header_view, settings))
+        self.assertEqual(completer.tu_generation, generation + 1)
+        self.assertEqual(completer.reparses_avoided, avoided + 2)
+
+        self.tear_down_completer()
+        shutil.rmtree(folder)
+
+    def test_ast_cache(self):
+        """Test that a parsed translation unit is stored on disk."""
+        if not self.use_libclang:
+            return
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        self.set_up_view(file_name)
+        completer = self.set_up_completer(use_ast_cache=True)
+        cache_entry = AstCache(
+            file_name, completer.clang_flags, completer.version_str)
+        self.assertTrue(cache_entry.is_up_to_date())
+        trans_unit = cache_entry.load(completer.cindex, completer.index)
+        self.assertIsNotNone(trans_unit)
+        other_entry = AstCache(
+            file_name, completer.clang_flags + ['-DOTHER'],
+            completer.version_str)
+        self.assertFalse(other_entry.is_up_to_date())
+        self.tear_down_completer()
+
+    def test_collect_symbols(self):
+        """Test that symbols of the main file are collected."""
+        if not self.use_libclang:
+            return
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        self.set_up_view(file_name)
+        completer = self.set_up_completer()
+        symbols = completer.collect_symbols(self.view)
+        spellings = [symbol[1] for symbol in symbols]
+        self.assertIn("A", spellings)
+        self.assertIn("foo", spellings)
+        self.assertIn("main", spellings)
+        # Parameters and local variables are not indexed.
+        self.assertNotIn("argc", spellings)
+        main_symbol = symbols[spellings.index("main")]
+        self.assertTrue(main_symbol[2])
+        self.assertEqual(main_symbol[3:], [7, 5])
+        self.tear_down_completer()
+
+    def test_refine_cached_completions(self):
+        """Test that typing after a trigger does not call clang again."""
+        if not self.use_libclang:
+            return
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        cursor_row_col = ZeroIndexedRowCol.from_one_indexed(
+            OneIndexedRowCol(9, 5))
+        self.set_up_view(file_name, cursor_position=cursor_row_col)
+        completer = self.set_up_completer()
+        trigger_position = cursor_row_col.as_1d_location(self.view)
+
+        code_complete_calls = []
+        original_code_complete = completer.tu.codeComplete
+
+        def counting_code_complete(*args, **kwargs):
+            code_complete_calls.append(args)
+            return original_code_complete(*args, **kwargs)
+
+        completer.tu.codeComplete = counting_code_complete
+
+        request = ActionRequest(self.view, trigger_position)
+        (_, completions) = completer.complete(request)
+        expected = ['foo\tvoid foo(double a)', 'foo(${1:double a})']
+        self.assertIn(expected, completions)
+        self.assertEqual(len(code_complete_calls), 1)
+
+        # Type more characters after the same trigger.
+        self.view.run_command("insert", {"characters": "fo"})
+        request = ActionRequest(self.view, trigger_position)
+        (_, completions) = completer.complete(request)
+        self.assertEqual(completions, [expected])
+        self.assertEqual(len(code_complete_calls), 1)
+
+        # The cache is not used once the cursor leaves the token.
+        self.view.run_command("insert", {"characters": "("})
+        request = ActionRequest(self.view, trigger_position)
+        completer.complete(request)
+        self.assertEqual(len(code_complete_calls), 2)
+
+        self.tear_down_completer()
+
+    def test_complete_missing_matches(self):
+        """Test that matches beyond the limit are found for a typed prefix."""
+        if not self.use_libclang:
+            return
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        cursor_row_col = ZeroIndexedRowCol.from_one_indexed(
+            OneIndexedRowCol(9, 5))
+        self.set_up_view(file_name, cursor_position=cursor_row_col)
+        completer = self.set_up_completer(max_completions_shown=1)
+        trigger_position = cursor_row_col.as_1d_location(self.view)
+
+        request = ActionRequest(self.view, trigger_position)
+        (_, completions) = completer.complete(request)
+        index = CompletionIndex(completions, 1)
+        self.assertTrue(index.is_cut)
+
+        # Type a prefix of a member that the completer stopped before.
+        prefix = "op" if completions[0][0].startswith("foo") else "fo"
+        matches = index.top(prefix, 1)
+        self.assertEqual(matches, [])
+        self.assertTrue(index.misses_matches(matches, 1))
+
+        # Completing again for the prefix finds it, as on_query_completions
+        # does once the index misses matches.
+        self.view.run_command("insert", {"characters": prefix})
+        request = ActionRequest(self.view, trigger_position)
+        (_, completions) = completer.complete(request)
+        refined = CompletionIndex(completions, 1)
+        matches = refined.top(prefix, 1)
+        self.assertEqual(len(matches), 1)
+        self.assertTrue(matches[0][0].startswith(prefix[0]))
+        self.assertFalse(refined.misses_matches(matches, 1))
+
+        self.tear_down_completer()
+
 
 class TestBinCompleter(BaseTestCompleter, GuiTestWrapper):
     """Test class for the binary based completer."""
@@ -427,3 +701,45 @@ if has_libclang():
     class TestLibCompleter(BaseTestCompleter, GuiTestWrapper):
         """Test class for the library based completer."""
         use_libclang = True
+
+    class TestProcCompleter(GuiTestWrapper):
+        """Test completing through libclang in worker processes."""
+
+        def set_up_completer(self):
+            """Set up a completer that sends requests to a worker.
+
+            Returns:
+                BaseCompleter: completer for the current view.
+            """
+            manager = SettingsManager()
+            self.settings = manager.settings_for_view(self.view)
+            self.settings.use_libclang = True
+            self.settings.libclang_worker_processes = 1
+            view_config = ViewConfigManager().load_for_view(
+                self.view, self.settings)
+            return view_config.completer
+
+        def test_update_complete_and_dispose(self):
+            """Test that the unit in the worker is updated and disposed."""
+            file_name = path.join(path.dirname(__file__),
+                                  'test_files',
+                                  'test.cpp')
+            self.set_up_view(file_name)
+            completer = self.set_up_completer()
+            self.assertEqual(completer.name, "proc")
+            self.assertTrue(completer.update(self.view, self.settings))
+
+            cursor_row_col = ZeroIndexedRowCol.from_one_indexed(
+                OneIndexedRowCol(9, 5))
+            location = cursor_row_col.as_1d_location(self.view)
+            request = ActionRequest(self.view, location)
+            (_, completions) = completer.complete(request)
+            expected = ['foo\tvoid foo(double a)', 'foo(${1:double a})']
+            self.assertIn(expected, completions)
+
+            v_id = self.view.buffer_id()
+            pool = completer.pool
+            with patch.object(pool, 'request',
+                              wraps=pool.request) as request_mock:
+                ViewConfigManager().clear_for_view(v_id)
+            request_mock.assert_called_once_with(v_id, "dispose", v_id=v_id)
@@ -0,0 +1,69 @@
+"""Test ranking completions by a typed prefix."""
+from unittest import TestCase
+
+import EasyClangComplete.plugin.completion.completion_index
+
+CompletionIndex = \
+    EasyClangComplete.plugin.completion.completion_index.CompletionIndex
+
+
+def completion(trigger):
+    """Create a completion in the format used by the completers."""
+    return [trigger + "\tvoid " + trigger + "()", trigger + "()"]
+
+
+class TestCompletionIndex(TestCase):
+    """Test the completion index."""
+
+    def test_word_starts(self):
+        """Test splitting triggers into words."""
+        self.assertEqual(CompletionIndex.word_starts("get_file_name"),
+                         [0, 4, 9])
+        self.assertEqual(CompletionIndex.word_starts("getFileName"),
+                         [0, 3, 7])
+        self.assertEqual(CompletionIndex.word_starts("_HTTPServer"), [1])
+        self.assertEqual(CompletionIndex.word_starts(""), [])
+
+    def test_tiers(self):
+        """Test that completions are ranked by how well they match."""
+        completions = [completion(trigger) for trigger in [
+            "fetch_it_le",
+            "set_file_name",
+            "getFileName",
+            "fileSize",
+            "foo",
+        ]]
+        index = CompletionIndex(completions)
+        self.assertEqual(index.top("file", 0), [
+            completions[3],  # starts with the prefix
+            completions[1],  # a word starts with the prefix
+            completions[2],
+            completions[0],  # the prefix is a subsequence
+        ])
+        self.assertEqual(index.top("gfn", 0), [
+            completions[2],  # initials
+        ])
+        self.assertEqual(index.top("GFN", 1), [completions[2]])
+
+    def test_limit(self):
+        """Test that the number of completions is limited."""
+        completions = [completion("func_{}".format(i)) for i in range(100)]
+        index = CompletionIndex(completions)
+        self.assertEqual(len(index), 100)
+        self.assertEqual(index.top("", 10), completions[:10])
+        self.assertEqual(index.top("", 0), completions)
+        self.assertEqual(index.top("func_1", 3), [
+            completions[1], completions[10], completions[11]])
+        self.assertEqual(index.top("xyz", 3), [])
+
+    def test_misses_matches(self):
+        """Test detecting that the completer stopped at the limit."""
+        completions = [completion("func_{}".format(i)) for i in range(10)]
+        cut_index = CompletionIndex(completions, 10)
+        self.assertTrue(cut_index.is_cut)
+        self.assertTrue(cut_index.misses_matches(cut_index.top("f_9", 5), 5))
+        self.assertFalse(cut_index.misses_matches(cut_index.top("f", 5), 5))
+        full_index = CompletionIndex(completions[:5], 10)
+        self.assertFalse(full_index.is_cut)
+        self.assertFalse(full_index.misses_matches([], 5))
+        self.assertFalse(CompletionIndex(completions).is_cut)
@@ -0,0 +1,275 @@
+"""Test generating and showing error regions incrementally."""
+from threading import Event
+from threading import Thread
+from threading import current_thread
+from unittest import TestCase
+from unittest.mock import patch
+
+import sublime
+
+from EasyClangComplete.plugin.error_vis import popup_error_vis
+from EasyClangComplete.tests.fakes import FakeSettings
+
+PopupErrorVis = popup_error_vis.PopupErrorVis
+
+LINE_LENGTH = 10
+
+
+class FakeView:
+    """A view with lines of equal length that counts calls to it."""
+
+    def __init__(self, num_rows, visible_rows):
+        """Create a view showing the first visible_rows rows."""
+        self.num_rows = num_rows
+        self.visible_rows = visible_rows
+        self.first_visible_row = 0
+        self.changes = 0
+        self.words_computed = 0
+        self.regions_added = []
+        self.regions = {}
+
+    def buffer_id(self):
+        """Get the id of the view."""
+        return 1
+
+    def file_name(self):
+        """Get the file of the view."""
+        return '/tmp/test.cpp'
+
+    def change_count(self):
+        """Get the number of changes."""
+        return self.changes
+
+    def visible_region(self):
+        """Get the visible region."""
+        first_row = self.first_visible_row
+        return sublime.Region(first_row * LINE_LENGTH,
+                              (first_row + self.visible_rows) *
+                              LINE_LENGTH - 1)
+
+    def rowcol(self, point):
+        """Convert a point to row and column."""
+        return point // LINE_LENGTH, point % LINE_LENGTH
+
+    def text_point(self, row, col):
+        """Convert row and column to a point."""
+        return row * LINE_LENGTH + col
+
+    def word(self, point):
+        """Get a word of two characters."""
+        self.words_computed += 1
+        return sublime.Region(point, point + 2)
+
+    def add_regions(self, key, regions, **kwargs):
+        """Remember the added regions."""
+        if key != PopupErrorVis._TAG_TRACKED:
+            self.regions_added.append((key, len(regions)))
+        self.regions[key] = list(regions)
+
+    def get_regions(self, key):
+        """Get the added regions."""
+        return self.regions.get(key, [])
+
+    def erase_regions(self, key):
+        """Forget the added regions."""
+        self.regions.pop(key, None)
+
+    def insert_rows(self, row, count):
+        """Insert empty rows before a row, moving regions after it."""
+        point = row * LINE_LENGTH
+        shift = count * LINE_LENGTH
+        self.num_rows += count
+        self.changes += 1
+        for key, regions in self.regions.items():
+            self.regions[key] = [
+                region if region.begin() < point else
+                sublime.Region(region.begin() + shift, region.end() + shift)
+                for region in regions]
+
+    def hide_popup(self):
+        """Ignore popups."""
+        pass
+
+
+class PausingView(FakeView):
+    """A view that pauses computing words in the given thread."""
+
+    def __init__(self, num_rows, visible_rows):
+        """Create a view that does not pause yet."""
+        super().__init__(num_rows, visible_rows)
+        self.paused_thread = None
+        self.paused = Event()
+        self.resume = Event()
+
+    def word(self, point):
+        """Wait to be resumed if called from the paused thread."""
+        if current_thread() is self.paused_thread:
+            self.paused.set()
+            self.resume.wait()
+        return super().word(point)
+
+
+def make_errors(rows):
+    """Make an error for every row."""
+    return [{'file': '/tmp/test.cpp', 'row': row, 'col': 1,
+             'error': 'error in row {}'.format(row), 'severity': 3}
+            for row in rows]
+
+
+class TestErrorRegions(TestCase):
+    """Test that only changed error regions are generated and shown."""
+
+    def test_unchanged_errors_reuse_regions(self):
+        """Test that regions are only generated for new errors."""
+        view = FakeView(100, 100)
+        error_vis = PopupErrorVis(FakeSettings())
+        error_vis.generate(view, make_errors(range(10)))
+        self.assertEqual(view.words_computed, 10)
+        error_vis.generate(view, make_errors(range(12)))
+        self.assertEqual(view.words_computed, 12)
+        view.changes += 1
+        error_vis.generate(view, make_errors(range(12)))
+        self.assertEqual(view.words_computed, 12)
+
+    def test_moved_errors_reuse_regions(self):
+        """Test that regions moved by edits are reused after an update."""
+        view = FakeView(100, 100)
+        error_vis = PopupErrorVis(FakeSettings())
+        error_vis.generate(view, make_errors(range(10)))
+        error_vis.show_errors(view)
+        # Editing clears the errors until the next update.
+        error_vis.clear(view)
+        view.insert_rows(5, 2)
+        errors = make_errors(range(5))
+        for error_dict in make_errors(range(5, 10)):
+            # Clang reports the same errors in their new rows.
+            error_dict['row'] += 2
+            errors.append(error_dict)
+        errors += make_errors([50])
+        error_vis.generate(view, errors)
+        self.assertEqual(view.words_computed, 10 + 1)
+        err_regions = error_vis.err_regions[view.buffer_id()]
+        self.assertEqual(err_regions[8][0]['region'],
+                         sublime.Region(8 * LINE_LENGTH + 1,
+                                        8 * LINE_LENGTH + 3))
+        # The error messages name their old rows, so they do not match.
+        error_vis.generate(view, make_errors(range(10)))
+        self.assertEqual(view.words_computed, 10 + 1 + 5)
+
+    def test_unchanged_regions_not_added_again(self):
+        """Test that regions are only added to the view if they changed."""
+        view = FakeView(100, 100)
+        error_vis = PopupErrorVis(FakeSettings())
+        error_vis.generate(view, make_errors(range(5)))
+        error_vis.show_errors(view)
+        # There are no warnings, so only error regions are added.
+        self.assertEqual(view.regions_added,
+                         [(PopupErrorVis._TAG_ERRORS, 5)])
+        error_vis.generate(view, make_errors(range(5)))
+        error_vis.show_errors(view)
+        self.assertEqual(len(view.regions_added), 1)
+        view.changes += 1
+        error_vis.generate(view, make_errors(range(5)))
+        error_vis.show_errors(view)
+        self.assertEqual(len(view.regions_added), 1)
+        error_vis.generate(view, make_errors(range(6)))
+        error_vis.show_errors(view)
+        self.assertEqual(view.regions_added[-1],
+                         (PopupErrorVis._TAG_ERRORS, 6))
+        self.assertEqual(len(view.regions_added), 2)
+        error_vis.clear(view)
+        error_vis.generate(view, make_errors(range(6)))
+        error_vis.show_errors(view)
+        self.assertEqual(len(view.regions_added), 3)
+
+    def test_erase_regions_with_hidden_ones(self):
+        """Test that erasing all regions also forgets the hidden ones."""
+        view = FakeView(100, 100)
+        error_vis = PopupErrorVis(FakeSettings())
+        error_vis.generate(view, make_errors(range(5)))
+        error_vis.show_errors(view)
+        error_vis.clear(view)
+        self.assertIn(PopupErrorVis._TAG_TRACKED, view.regions)
+        error_vis.erase_regions(view)
+        self.assertEqual(view.regions, {})
+        # Nothing is reused once the hidden regions are gone.
+        error_vis.generate(view, make_errors(range(5)))
+        self.assertEqual(view.words_computed, 10)
+
+    def test_offscreen_regions_capped(self):
+        """Test that only the closest offscreen errors get regions first."""
+        view = FakeView(1000, 10)
+        settings = FakeSettings(max_offscreen_error_regions=5)
+        error_vis = PopupErrorVis(settings)
+        with patch.object(popup_error_vis.sublime,
+                          'set_timeout_async') as set_timeout_async:
+            error_vis.generate(view, make_errors(range(0, 1000, 2)))
+        self.assertEqual(view.words_computed, 5 + 5)
+        err_regions = error_vis.err_regions[view.buffer_id()]
+        # All errors are still known, e.g. to show popups.
+        self.assertEqual(len(err_regions), 500)
+        self.assertIsNotNone(err_regions[18][0]['region'])
+        self.assertIsNone(err_regions[20][0]['region'])
+        error_vis.show_errors(view)
+        self.assertEqual(view.regions_added[0],
+                         (PopupErrorVis._TAG_ERRORS, 10))
+        # The rest is generated in background.
+        self.assertEqual(set_timeout_async.call_count, 1)
+        generate_skipped_regions = set_timeout_async.call_args[0][0]
+        generate_skipped_regions()
+        self.assertEqual(view.words_computed, 500)
+        err_regions = error_vis.err_regions[view.buffer_id()]
+        self.assertIsNotNone(err_regions[20][0]['region'])
+        self.assertEqual(view.regions_added[-1],
+                         (PopupErrorVis._TAG_ERRORS, 500))
+
+    def test_skipped_regions_of_old_errors(self):
+        """Test that the background pass ignores errors already replaced."""
+        view = FakeView(1000, 10)
+        settings = FakeSettings(max_offscreen_error_regions=5)
+        error_vis = PopupErrorVis(settings)
+        with patch.object(popup_error_vis.sublime,
+                          'set_timeout_async') as set_timeout_async:
+            error_vis.generate(view, make_errors(range(0, 1000, 2)))
+            generate_skipped_regions = set_timeout_async.call_args[0][0]
+            error_vis.generate(view, make_errors(range(10)))
+        self.assertEqual(set_timeout_async.call_count, 1)
+        generate_skipped_regions()
+        self.assertEqual(view.words_computed, 5 + 5 + 5)
+
+    def test_skipped_regions_while_errors_change(self):
+        """Test that new errors wait for the background pass to finish."""
+        view = PausingView(1000, 10)
+        self.addCleanup(view.resume.set)
+        settings = FakeSettings(max_offscreen_error_regions=5)
+        error_vis = PopupErrorVis(settings)
+        with patch.object(popup_error_vis.sublime,
+                          'set_timeout_async') as set_timeout_async:
+            error_vis.generate(view, make_errors(range(0, 1000, 2)))
+            generate_skipped_regions = set_timeout_async.call_args[0][0]
+            background = Thread(target=generate_skipped_regions)
+            view.paused_thread = background
+            background.start()
+            view.paused.wait()
+            update = Thread(target=error_vis.generate,
+                            args=(view, make_errors(range(10))))
+            update.start()
+            update.join(0.2)
+            self.assertTrue(update.is_alive())
+            view.resume.set()
+            background.join()
+            update.join()
+        # The regions of the new errors replace those of the old ones.
+        self.assertEqual(sorted(error_vis.err_regions[view.buffer_id()]),
+                         list(range(10)))
+        self.assertEqual(len(view.get_regions(PopupErrorVis._TAG_TRACKED)),
+                         10)
+
+    def test_errors_of_other_files_skipped(self):
+        """Test that errors in other files are ignored."""
+        view = FakeView(100, 100)
+        error_vis = PopupErrorVis(FakeSettings())
+        errors = make_errors(range(3))
+        errors[0]['file'] = '/tmp/other.h'
+        error_vis.generate(view, errors)
+        self.assertEqual(sorted(error_vis.err_regions[1]), [1, 2])
@@ -250,6 +250,33 @@ allow_code_wrap: true
         # cleanup
         self.tear_down_completer()
 
+    def test_info_cached(self):
+        """Test that hovering the same symbol reuses the popup."""
+        if not self.use_libclang:
+            # Ignore this test for binary completer.
+            return
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        self.set_up_view(file_name)
+        completer, settings = self.set_up_completer()
+        settings.show_index_references = False
+        pos = self.view.text_point(6, 7)
+        _, info_popup = completer.info(ActionRequest(self.view, pos),
+                                       settings)
+        self.assertIsNotNone(info_popup)
+        _, same_popup = completer.info(ActionRequest(self.view, pos - 1),
+                                       settings)
+        self.assertIs(same_popup, info_popup)
+        # A new translation unit invalidates the cache.
+        completer.parse_tu(self.view, settings)
+        _, new_popup = completer.info(ActionRequest(self.view, pos),
+                                      settings)
+        self.assertIsNot(new_popup, info_popup)
+        self.assertEqual(new_popup.as_markdown(), info_popup.as_markdown())
+        # cleanup
+        self.tear_down_completer()
+
     def test_info_no_full(self):
         """Test that doxygen comments are generated correctly."""
         if not self.use_libclang:
@@ -0,0 +1,58 @@
+"""Test the reverse include map."""
+from unittest import TestCase
+
+import EasyClangComplete.plugin.utils.include_map
+
+IncludeMap = EasyClangComplete.plugin.utils.include_map.IncludeMap
+
+
+class TestIncludeMap(TestCase):
+    """Test finding the owners of included files."""
+
+    def test_owners(self):
+        """Test that every source including a file is its owner."""
+        include_map = IncludeMap()
+        include_map.update_source('a.cpp', ['a.h', 'common.h'])
+        include_map.update_source('b.cpp', ['b.h', 'common.h'])
+        self.assertEqual(include_map.owners_of('a.h'), ['a.cpp'])
+        self.assertEqual(include_map.owners_of('b.h'), ['b.cpp'])
+        self.assertEqual(include_map.owners_of('common.h'),
+                         ['b.cpp', 'a.cpp'])
+        self.assertEqual(include_map.owners_of('other.h'), [])
+
+    def test_latest_owner_first(self):
+        """Test that the most recently parsed owner comes first."""
+        include_map = IncludeMap()
+        include_map.update_source('a.cpp', ['common.h'])
+        include_map.update_source('b.cpp', ['common.h'])
+        include_map.update_source('a.cpp', ['common.h'])
+        self.assertEqual(include_map.owners_of('common.h'),
+                         ['a.cpp', 'b.cpp'])
+
+    def test_update_replaces_includes(self):
+        """Test that files no longer included lose their owner."""
+        include_map = IncludeMap()
+        include_map.update_source('a.cpp', ['a.h', 'old.h'])
+        include_map.update_source('a.cpp', ['a.h', 'new.h'])
+        self.assertEqual(include_map.owners_of('old.h'), [])
+        self.assertEqual(include_map.owners_of('new.h'), ['a.cpp'])
+        self.assertEqual(include_map.includes('a.cpp'), {'a.h', 'new.h'})
+
+    def test_source_does_not_own_itself(self):
+        """Test that a source file is not stored as included by itself."""
+        include_map = IncludeMap()
+        include_map.update_source('a.cpp', ['a.cpp', 'a.h'])
+        self.assertEqual(include_map.owners_of('a.cpp'), [])
+        self.assertEqual(include_map.includes('a.cpp'), {'a.h'})
+
+    def test_remove_source(self):
+        """Test forgetting a source file."""
+        include_map = IncludeMap()
+        include_map.update_source('a.cpp', ['common.h'])
+        include_map.update_source('b.cpp', ['common.h'])
+        include_map.remove_source('b.cpp')
+        self.assertEqual(include_map.owners_of('common.h'), ['a.cpp'])
+        self.assertEqual(include_map.includes('b.cpp'), set())
+        include_map.remove_source('a.cpp')
+        self.assertEqual(include_map.owners_of('common.h'), [])
+        include_map.remove_source('unknown.cpp')
@@ -0,0 +1,81 @@
+"""Test measuring the stages of the plugin."""
+import json
+import shutil
+import tempfile
+import time
+from os import path
+from unittest import TestCase
+
+import EasyClangComplete.plugin.utils.instrumentation
+
+Instrumentation = \
+    EasyClangComplete.plugin.utils.instrumentation.Instrumentation
+
+
+class TestInstrumentation(TestCase):
+    """Test recording spans and reporting them."""
+
+    def setUp(self):
+        """Start with no recorded spans."""
+        Instrumentation.clear()
+
+    def tearDown(self):
+        """Forget the spans recorded by the test."""
+        Instrumentation.clear()
+
+    def test_percentiles(self):
+        """Test percentiles of recorded durations."""
+        self.assertIsNone(Instrumentation.percentiles("test"))
+        start = time.perf_counter()
+        for millis in range(1, 101):
+            Instrumentation.record("test", start, millis / 1000.0)
+        stats = Instrumentation.percentiles("test")
+        self.assertEqual(stats['count'], 100)
+        self.assertAlmostEqual(stats['p50'], 0.05)
+        self.assertAlmostEqual(stats['p95'], 0.095)
+        self.assertAlmostEqual(stats['p99'], 0.099)
+        self.assertAlmostEqual(stats['max'], 0.1)
+        self.assertIn("test", Instrumentation.report())
+
+    def test_span(self):
+        """Test that a span measures the time within a with statement."""
+        with Instrumentation.span(Instrumentation.PARSE, file="test.cpp"):
+            time.sleep(0.05)
+        with self.assertRaises(ValueError):
+            with Instrumentation.span(Instrumentation.PARSE):
+                raise ValueError("failed parse")
+        self.assertEqual(Instrumentation.span_names(),
+                         [Instrumentation.PARSE])
+        stats = Instrumentation.percentiles(Instrumentation.PARSE)
+        self.assertEqual(stats['count'], 2)
+        self.assertGreaterEqual(stats['max'], 0.05)
+
+    def test_samples_limited(self):
+        """Test that only the latest durations are kept."""
+        for _ in range(Instrumentation.MAX_SAMPLES + 10):
+            Instrumentation.record("test", 0.0, 0.001)
+        stats = Instrumentation.percentiles("test")
+        self.assertEqual(stats['count'], Instrumentation.MAX_SAMPLES)
+
+    def test_chrome_trace(self):
+        """Test exporting spans as Chrome trace events."""
+        with Instrumentation.span(Instrumentation.REPARSE, file="test.cpp"):
+            pass
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            file_name = path.join(tmp_dir, "trace.json")
+            self.assertEqual(
+                Instrumentation.export_chrome_trace(file_name), 1)
+            with open(file_name) as trace_file:
+                trace = json.load(trace_file)
+        finally:
+            shutil.rmtree(tmp_dir)
+        events = [event for event in trace['traceEvents']
+                  if event['ph'] == 'X']
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['name'], Instrumentation.REPARSE)
+        self.assertEqual(events[0]['args'], {'file': "test.cpp"})
+        self.assertGreaterEqual(events[0]['dur'], 0)
+        names = [event for event in trace['traceEvents']
+                 if event['ph'] == 'M']
+        self.assertEqual(names[0]['tid'], events[0]['tid'])
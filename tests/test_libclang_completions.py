@@ -0,0 +1,155 @@
+"""Test processing of completion results from libclang."""
+from unittest import TestCase
+
+import EasyClangComplete.plugin.completion.completion_index
+import EasyClangComplete.plugin.completion.libclang_completions
+
+libclang_completions = EasyClangComplete.plugin.completion.libclang_completions
+LibClangCompletions = libclang_completions.LibClangCompletions
+LazyCompletions = libclang_completions.LazyCompletions
+CompletionIndex = \
+    EasyClangComplete.plugin.completion.completion_index.CompletionIndex
+
+TYPED_TEXT = 1
+PLACE_HOLDER = 3
+RESULT_TYPE = 15
+
+
+class FakeChunk:
+    """Mimics a completion chunk from cindex."""
+
+    def __init__(self, spelling, kind, reads):
+        """Store the spelling and the kind of the chunk."""
+        self.__spelling = spelling
+        self.kind = kind
+        self.reads = reads
+
+    @property
+    def spelling(self):
+        """Count how many times the chunks are read."""
+        self.reads.append(self.__spelling)
+        return self.__spelling
+
+    def isKindTypedText(self):
+        """Check if the chunk is typed text."""
+        return self.kind == TYPED_TEXT
+
+    def isKindResultType(self):
+        """Check if the chunk is a result type."""
+        return self.kind == RESULT_TYPE
+
+    def isKindOptional(self):
+        """Check if the chunk is optional."""
+        return False
+
+    def isKindInformative(self):
+        """Check if the chunk is informative."""
+        return False
+
+    def isKindPlaceHolder(self):
+        """Check if the chunk is a placeholder."""
+        return self.kind == PLACE_HOLDER
+
+
+class FakeCompletionString(list):
+    """Mimics a completion string from cindex."""
+
+    def __init__(self, chunks, priority, availability):
+        """Store the chunks along with the priority."""
+        super().__init__(chunks)
+        self.priority = priority
+        self.availability = availability
+
+
+class FakeResult:
+    """Mimics a single completion result from cindex."""
+
+    def __init__(self, name, priority, reads, availability="Available"):
+        """Create a result for a function "void name(int a)"."""
+        self.kind = "FUNCTION_DECL"
+        self.string = FakeCompletionString([
+            FakeChunk("void", RESULT_TYPE, reads),
+            FakeChunk(name, TYPED_TEXT, reads),
+            FakeChunk("(", 0xff, reads),
+            FakeChunk("int a", PLACE_HOLDER, reads),
+            FakeChunk(")", 0xff, reads)], priority, availability)
+
+
+class FakeResults:
+    """Mimics completion results from cindex."""
+
+    def __init__(self, results):
+        """Store the results."""
+        self.results = results
+
+
+class TestLazyCompletions(TestCase):
+    """Test that completions are only created when needed."""
+
+    def setUp(self):
+        """Create many results with different priorities."""
+        self.reads = []
+        results = [FakeResult("func_{}".format(i), 1000 - i, self.reads)
+                   for i in range(1000)]
+        results.append(FakeResult("hidden", 0, self.reads,
+                                  availability="NotAccessible"))
+        self.complete_results = FakeResults(results)
+
+    def test_parse_all(self):
+        """Test that all valid completions are sorted by priority."""
+        completions = LibClangCompletions.parse_completions(
+            self.complete_results, [])
+        self.assertEqual(len(completions), 1000)
+        self.assertEqual(completions[0],
+                         ['func_999\tvoid func_999(int a)',
+                          'func_999(${1:int a})'])
+        self.assertEqual(completions[-1][0], 'func_0\tvoid func_0(int a)')
+
+    def test_first_materializes_only_shown(self):
+        """Test that only the best completions are materialized."""
+        lazy = LazyCompletions(self.complete_results, [])
+        completions = lazy.first(10)
+        expected = ["func_{}".format(i) for i in range(999, 989, -1)]
+        self.assertEqual([c[0].split('\t')[0] for c in completions],
+                         expected)
+        read_names = set(r for r in self.reads if r.startswith("func_"))
+        self.assertEqual(read_names, set(expected))
+
+    def test_matching_searches_the_rest(self):
+        """Test that typed prefix finds results that were not shown."""
+        lazy = LazyCompletions(self.complete_results, [])
+        lazy.first(10)
+        del self.reads[:]
+        completions = lazy.matching("fnc_12", 3)
+        self.assertEqual([c[0].split('\t')[0] for c in completions],
+                         ["func_912", "func_812", "func_712"])
+        # Only the typed text is read for the results that do not match.
+        void_reads = self.reads.count("void")
+        del self.reads[:]
+        LibClangCompletions.materialize(self.complete_results.results[0])
+        self.assertEqual(void_reads, 3 * self.reads.count("void"))
+
+    def test_parse_with_prefix(self):
+        """Test that a typed prefix searches all results."""
+        completions = LibClangCompletions.parse_completions(
+            self.complete_results, [], 2, "func_3")
+        self.assertEqual([c[0].split('\t')[0] for c in completions],
+                         ["func_993", "func_983"])
+
+    def test_index_falls_back_to_the_rest(self):
+        """Test a typed prefix matching a result below the limit."""
+        lazy = LazyCompletions(self.complete_results, [])
+        index = CompletionIndex(lazy.first(10), 10)
+        matches = index.top("func_12", 10)
+        self.assertEqual(matches, [])
+        self.assertTrue(index.misses_matches(matches, 10))
+        completions = lazy.matching("func_12", 10)
+        self.assertEqual(completions[0][0].split('\t')[0], "func_912")
+        refined = CompletionIndex(completions, 10)
+        self.assertIn(completions[0], refined.top("func_12", 10))
+
+    def test_fuzzy_match(self):
+        """Test fuzzy matching of a typed prefix."""
+        self.assertTrue(LibClangCompletions.fuzzy_match("fb", "FooBar"))
+        self.assertFalse(LibClangCompletions.fuzzy_match("bf", "FooBar"))
+        self.assertTrue(LibClangCompletions.fuzzy_match("", "FooBar"))
@@ -0,0 +1,45 @@
+"""Test the least recently used cache."""
+from unittest import TestCase
+
+from EasyClangComplete.plugin.utils.lru_cache import LruCache
+
+
+class TestLruCache(TestCase):
+    """Test storing and evicting values."""
+
+    def test_get_and_put(self):
+        """Test storing values."""
+        cache = LruCache(2)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.put('a', 2)
+        self.assertEqual(cache.get('a'), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_evict_least_recently_used(self):
+        """Test that reading a value keeps it in the cache."""
+        cache = LruCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_disabled(self):
+        """Test that a cache without size stores nothing."""
+        cache = LruCache(0)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_clear(self):
+        """Test removing all values."""
+        cache = LruCache(2)
+        cache.put('a', 1)
+        cache.clear()
+        self.assertNotIn('a', cache)
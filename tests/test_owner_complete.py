@@ -0,0 +1,247 @@
+"""Test serving headers from the translation unit of their owner."""
+import tempfile
+from os import path
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from EasyClangComplete.plugin.completion import owner_complete
+from EasyClangComplete.plugin.view_config import view_config_manager
+from EasyClangComplete.tests.fakes import FakeSettings
+
+OwnerCompleter = owner_complete.Completer
+ViewConfigManager = view_config_manager.ViewConfigManager
+
+
+class FakeOwner:
+    """Mimics the libclang completer of a source file."""
+
+    def __init__(self, included_files):
+        """Include the given files."""
+        self.compiler_variant = None
+        self.valid = True
+        self.clang_flags = []
+        self.latest_errors = []
+        self.included = set(included_files)
+        self.forgotten_headers = []
+        self.disposed = False
+        self.tu_generation = 0
+        self.size = 0
+
+    def includes(self, file_name):
+        """Check if a file is included."""
+        return file_name in self.included
+
+    def included_files(self):
+        """Get all the included files."""
+        return set(self.included)
+
+    def update(self, view, settings):
+        """Pretend to reparse the unit."""
+        self.tu_generation += 1
+        return True
+
+    def memory_usage(self):
+        """Get the memory the unit pretends to use."""
+        return self.size
+
+    def update_header(self, view, settings):
+        """Pretend to reparse the unit with the contents of a header."""
+        return self.includes(view.file_name())
+
+    def collect_header_symbols(self, file_name):
+        """Collect a symbol of an included file."""
+        if not self.includes(file_name):
+            return None
+        return [['c:@F@foo#', 'foo', False, 1, 6]]
+
+    def forget_header(self, file_name):
+        """Remember which headers are not served anymore."""
+        self.forgotten_headers.append(file_name)
+
+    def dispose(self):
+        """Remember that the config of the unit was removed."""
+        self.disposed = True
+
+
+class FakeViewConfig:
+    """A view config with a fake completer for sources and headers."""
+
+    def __init__(self, view, settings, owner=None):
+        """Create a config served by an owner or by a unit of its own."""
+        self.file_name = view.file_name()
+        self.owner_file = None
+        self.age = 0
+        if owner:
+            self.owner_file = owner.file_name
+            self.completer = OwnerCompleter(
+                settings, None, owner.completer, owner.file_name)
+        else:
+            self.completer = FakeOwner(view.included_files)
+
+    def update_if_needed(self, view, settings):
+        """Update the completer of the config."""
+        self.completer.update(view, settings)
+        return self
+
+    def get_age(self):
+        """Get the age of the config."""
+        return self.age
+
+    def is_older_than(self, age_in_seconds):
+        """Check if the config is older than some time in secs."""
+        return self.age > age_in_seconds
+
+    def is_served_by_owner(self, view):
+        """Check if an owner still serves the view."""
+        return bool(self.owner_file) and \
+            self.completer.has_owner(view.file_name())
+
+    def can_serve_headers(self, settings):
+        """Check if this config can serve headers."""
+        return not self.owner_file
+
+
+def make_view(v_id, file_name, included_files=()):
+    """Make a view of a file that includes other files."""
+    view = MagicMock()
+    view.buffer_id.return_value = v_id
+    view.file_name.return_value = file_name
+    view.is_scratch.return_value = False
+    view.included_files = included_files
+    return view
+
+
+class TestOwnerCompleter(TestCase):
+    """Test the completer that serves a header from its owner."""
+
+    def test_update_and_release(self):
+        """Test that the owner is told when it stops serving a header."""
+        owner = FakeOwner(['/src/main.h'])
+        completer = OwnerCompleter(FakeSettings(), None, owner, '/src/a.cpp')
+        view = make_view(1, '/src/main.h')
+        self.assertTrue(completer.update(view, FakeSettings()))
+        self.assertTrue(completer.has_owner('/src/main.h'))
+        completer.release('/src/main.h')
+        self.assertEqual(owner.forgotten_headers, ['/src/main.h'])
+        owner.included.clear()
+        self.assertFalse(completer.update(view, FakeSettings()))
+        self.assertFalse(completer.has_owner('/src/main.h'))
+
+    def test_collect_symbols(self):
+        """Test that symbols of a header are collected by its owner."""
+        owner = FakeOwner(['/src/main.h'])
+        completer = OwnerCompleter(FakeSettings(), None, owner, '/src/a.cpp')
+        self.assertEqual(completer.collect_symbols(make_view(1, '/src/main.h')),
+                         [['c:@F@foo#', 'foo', False, 1, 6]])
+        self.assertIsNone(
+            completer.collect_symbols(make_view(2, '/src/other.h')))
+        del owner
+        self.assertIsNone(
+            completer.collect_symbols(make_view(1, '/src/main.h')))
+
+    def test_owner_gone(self):
+        """Test that a completer without an owner serves nothing."""
+        owner = FakeOwner(['/src/main.h'])
+        completer = OwnerCompleter(FakeSettings(), None, owner, '/src/a.cpp')
+        del owner
+        self.assertIsNone(completer.owner())
+        completer.release('/src/main.h')
+        self.assertFalse(completer.update(make_view(1, '/src/main.h'),
+                                          FakeSettings()))
+
+
+class TestViewConfigManagerOwners(TestCase):
+    """Test switching a header between its owner and a unit of its own."""
+
+    def setUp(self):
+        """Create a source file and a header it includes."""
+        folder = tempfile.mkdtemp()
+        self.source_file = path.join(folder, 'main.cpp')
+        self.header_file = path.join(folder, 'main.h')
+        for file_name in [self.source_file, self.header_file]:
+            with open(file_name, 'w') as new_file:
+                new_file.write('\n')
+        self.manager = ViewConfigManager()
+        # Other tests reload the singleton module, so the thread cache is
+        # looked up where the manager looks it up.
+        timer_cache = view_config_manager.ThreadCache()
+        if ViewConfigManager.TAG in timer_cache:
+            timer_cache[ViewConfigManager.TAG].cancel()
+
+    def tearDown(self):
+        """Remove all configs."""
+        for v_id in [1, 2]:
+            self.manager.clear_for_view(v_id)
+
+    def test_switch_owner(self):
+        """Test that a header is released when its owner stops serving it."""
+        settings = FakeSettings(use_owner_tu=True)
+        source_view = make_view(1, self.source_file, [self.header_file])
+        header_view = make_view(2, self.header_file)
+        with patch.object(view_config_manager, 'ViewConfig',
+                          FakeViewConfig):
+            source_config = self.manager.load_for_view(source_view, settings)
+            owner = source_config.completer
+            header_config = self.manager.load_for_view(header_view, settings)
+            self.assertEqual(header_config.owner_file, self.source_file)
+
+            # The source does not include the header anymore.
+            owner.included.clear()
+            header_config = self.manager.load_for_view(header_view, settings)
+            self.assertIsNone(header_config.owner_file)
+            self.assertEqual(owner.forgotten_headers, [self.header_file])
+
+            # The source includes the header again.
+            owner.included.add(self.header_file)
+            self.manager.load_for_view(source_view, settings)
+            header_config = self.manager.load_for_view(header_view, settings)
+            self.assertEqual(header_config.owner_file, self.source_file)
+
+            self.manager.clear_for_view(2)
+            self.assertEqual(owner.forgotten_headers,
+                             [self.header_file, self.header_file])
+            self.assertFalse(owner.disposed)
+            self.manager.clear_for_view(1)
+            self.assertTrue(owner.disposed)
+
+    def test_removed_owner_forgotten(self):
+        """Test that old configs of owners are removed from include map."""
+        settings = FakeSettings(use_owner_tu=True)
+        source_view = make_view(1, self.source_file, [self.header_file])
+        header_view = make_view(2, self.header_file)
+        with patch.object(view_config_manager, 'ViewConfig',
+                          FakeViewConfig):
+            source_config = self.manager.load_for_view(source_view, settings)
+            self.assertEqual(self.manager.include_map.owners_of(
+                self.header_file), [self.source_file])
+            source_config.age = settings.max_cache_age + 1
+            self.__remove_configs()
+            self.assertFalse(self.manager.in_cache(1))
+            self.assertEqual(
+                self.manager.include_map.owners_of(self.header_file), [])
+            header_config = self.manager.load_for_view(header_view, settings)
+            self.assertIsNone(header_config.owner_file)
+
+    def test_owner_over_memory_budget_forgotten(self):
+        """Test that owners removed to free memory leave include map."""
+        settings = FakeSettings(use_owner_tu=True, max_cache_memory_mb=1)
+        source_view = make_view(1, self.source_file, [self.header_file])
+        with patch.object(view_config_manager, 'ViewConfig',
+                          FakeViewConfig):
+            source_config = self.manager.load_for_view(source_view, settings)
+            source_config.completer.size = 2 * 1024 * 1024
+            # Reparse to measure the new size.
+            self.manager.load_for_view(source_view, settings)
+            with patch.object(view_config_manager.SublBridge,
+                              'active_view_id', return_value=0):
+                self.__remove_configs()
+        self.assertFalse(self.manager.in_cache(1))
+        self.assertEqual(
+            self.manager.include_map.owners_of(self.header_file), [])
+
+    def __remove_configs(self):
+        """Run what the timer of the manager runs and stop it again."""
+        timer_cache = view_config_manager.ThreadCache()
+        timer_cache[ViewConfigManager.TAG].function()
+        timer_cache[ViewConfigManager.TAG].cancel()
@@ -0,0 +1,177 @@
+"""Test sharing precompiled headers between files."""
+import json
+import shutil
+import tempfile
+from os import path
+from os import utime
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import EasyClangComplete.plugin.completion.pch_manager
+
+PchManager = EasyClangComplete.plugin.completion.pch_manager.PchManager
+
+FLAGS = ['-x', 'c++', '-std=c++11', '-Iinclude']
+
+
+class FakeTranslationUnit:
+    """A parsed header that includes a single file."""
+
+    def __init__(self, included_file):
+        """Include the given file without errors."""
+        self.diagnostics = []
+        self.included_file = included_file
+
+    def get_includes(self):
+        """Get the included file."""
+        include = MagicMock()
+        include.include.name = self.included_file
+        return [include]
+
+    def save(self, file_name):
+        """Write a fake precompiled header."""
+        with open(file_name, 'w') as pch:
+            pch.write("pch")
+
+
+class FakePool:
+    """Collect the jobs instead of running them."""
+
+    def __init__(self):
+        """Start without jobs."""
+        self.jobs = []
+
+    def new_job(self, job):
+        """Store a job."""
+        self.jobs.append(job)
+
+    def run_jobs(self):
+        """Run all the stored jobs."""
+        jobs, self.jobs = self.jobs, []
+        for job in jobs:
+            job.function(*job.args)
+
+
+class TestPchManager(TestCase):
+    """Test finding and tracking shared includes."""
+
+    def setUp(self):
+        """Create an empty folder for the precompiled headers."""
+        self.folder = tempfile.mkdtemp()
+        self.manager = PchManager(self.folder)
+
+    def tearDown(self):
+        """Remove the folder."""
+        shutil.rmtree(self.folder)
+
+    def test_leading_includes(self):
+        """Test that only the includes in angle brackets on top are found."""
+        text = """/* License
+ * text */
+// comment
+#pragma once
+#include <vector>
+
+#  include <map>  // for std::map
+#include "local.h"
+#include <string>
+"""
+        self.assertEqual(PchManager.leading_includes(text),
+                         ("<vector>", "<map>"))
+        self.assertEqual(PchManager.leading_includes(
+            "#define FOO\n#include <vector>\n"), ())
+        self.assertEqual(PchManager.leading_includes(""), ())
+
+    def test_shared_includes(self):
+        """Test that only includes shared with another file are used."""
+        self.assertEqual(self.manager.shared_includes(
+            "a.cpp", ("<vector>", "<map>", "<set>"), FLAGS), ())
+        self.assertEqual(self.manager.shared_includes(
+            "b.cpp", ("<vector>", "<map>", "<list>"), FLAGS),
+            ("<vector>", "<map>"))
+        self.assertEqual(self.manager.shared_includes(
+            "a.cpp", ("<vector>", "<map>", "<set>"), FLAGS),
+            ("<vector>", "<map>"))
+        # Files with other flags share nothing.
+        self.assertEqual(self.manager.shared_includes(
+            "c.cpp", ("<vector>", "<map>"), FLAGS + ['-DFOO']), ())
+        # A file that changed its includes is not shared anymore.
+        self.manager.shared_includes("b.cpp", ("<string>",), FLAGS)
+        self.assertEqual(self.manager.shared_includes(
+            "a.cpp", ("<vector>", "<map>", "<set>"), FLAGS), ())
+
+    def test_header_flags(self):
+        """Test that the language of headers matches the one of sources."""
+        self.assertEqual(PchManager.header_flags(FLAGS),
+                         ['-x', 'c++-header', '-std=c++11', '-Iinclude'])
+        self.assertEqual(PchManager.header_flags(['-x', 'c'])[1], 'c-header')
+        self.assertIsNone(PchManager.header_flags(['-std=c++11']))
+
+    def test_is_up_to_date(self):
+        """Test that a header is outdated once an included file changes."""
+        header = path.join(self.folder, "vector")
+        with open(header, 'w') as header_file:
+            header_file.write("// vector")
+        pch_file = path.join(self.folder, "abcdef_0123.pch")
+        with open(pch_file, 'w') as pch:
+            pch.write("pch")
+        self.assertFalse(self.manager.is_up_to_date(pch_file))
+        with open(path.join(self.folder, "abcdef.json"), 'w') as meta:
+            json.dump({'pch_file': pch_file,
+                       'mtimes': {header: path.getmtime(header)}}, meta)
+        # The result is only checked again after a save.
+        self.assertFalse(self.manager.is_up_to_date(pch_file))
+        self.manager.file_saved()
+        self.assertTrue(self.manager.is_up_to_date(pch_file))
+        self.manager.file_saved()
+        with open(path.join(self.folder, "abcdef.json"), 'w') as meta:
+            json.dump({'pch_file': pch_file,
+                       'mtimes': {header: path.getmtime(header) - 10}}, meta)
+        self.assertFalse(self.manager.is_up_to_date(pch_file))
+
+    def test_build_in_background(self):
+        """Test building, sharing and replacing a precompiled header."""
+        header = path.join(self.folder, "vector")
+        with open(header, 'w') as header_file:
+            header_file.write("// vector")
+        cindex = MagicMock()
+        cindex.TranslationUnit.from_source.return_value = \
+            FakeTranslationUnit(header)
+        pool = FakePool()
+        text = "#include <vector>\nint main() {}\n"
+
+        def args_for(file_name):
+            return self.manager.args_for(
+                file_name, text, FLAGS, cindex, None, pool)
+
+        self.assertEqual(args_for("a.cpp"), [])
+        self.assertEqual(pool.jobs, [])
+        # The second file starts a single build in background.
+        self.assertEqual(args_for("b.cpp"), [])
+        self.assertEqual(args_for("b.cpp"), [])
+        self.assertEqual(len(pool.jobs), 1)
+        pool.run_jobs()
+        # Also the first file uses the header once it is built.
+        pch_args = args_for("a.cpp")
+        self.assertEqual(pch_args[0], '-include-pch')
+        old_pch_file = pch_args[1]
+        self.assertTrue(path.exists(old_pch_file))
+        self.assertEqual(args_for("b.cpp"), pch_args)
+        self.manager.acquire(old_pch_file)
+
+        # A changed header is noticed after a save and built again.
+        utime(header, (path.getmtime(header) + 10,) * 2)
+        self.assertEqual(args_for("a.cpp"), pch_args)
+        self.manager.file_saved()
+        self.assertEqual(args_for("a.cpp"), [])
+        pool.run_jobs()
+        new_pch_file = args_for("a.cpp")[1]
+        self.assertNotEqual(new_pch_file, old_pch_file)
+        # The old header is kept until nobody uses it.
+        self.assertTrue(path.exists(old_pch_file))
+        self.manager.release(old_pch_file)
+        self.assertFalse(path.exists(old_pch_file))
+
+        # Closed files are not shared with anymore.
+        self.manager.forget("b.cpp")
+        self.assertEqual(args_for("a.cpp"), [])
@@ -0,0 +1,32 @@
+"""Test picking views to prefetch."""
+from os import path
+from unittest import TestCase
+
+from EasyClangComplete.plugin.utils.prefetcher import Prefetcher
+
+
+class TestPrefetcher(TestCase):
+    """Test prefetcher."""
+
+    def test_counterparts_first(self):
+        """Test that header/source counterparts are picked first."""
+        folder = path.join("project", "src")
+        active_file = path.join(folder, "foo.cpp")
+        open_files = [path.join(folder, "bar.cpp"),
+                      path.join("project", "inc", "foo.h"),
+                      path.join(folder, "foo.h"),
+                      active_file]
+        picked = Prefetcher.pick_files(active_file, open_files,
+                                       ["../inc/"], max_files=5)
+        self.assertEqual(picked, [path.join("project", "inc", "foo.h"),
+                                  path.join(folder, "foo.h"),
+                                  path.join(folder, "bar.cpp")])
+
+    def test_budget(self):
+        """Test that no more than the allowed number of files is picked."""
+        open_files = ["a.cpp", "b.cpp", "c.cpp"]
+        self.assertEqual(
+            Prefetcher.pick_files("d.cpp", open_files, [], max_files=2),
+            ["a.cpp", "b.cpp"])
+        self.assertEqual(
+            Prefetcher.pick_files("d.cpp", open_files, [], max_files=0), [])
@@ -0,0 +1,56 @@
+"""Test creating the pool of libclang workers shared by all completers."""
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from EasyClangComplete.plugin.completion import proc_complete
+from EasyClangComplete.tests.fakes import FakeSettings
+
+Completer = proc_complete.Completer
+
+
+class TestSharedPool(TestCase):
+    """Test that libclang is only looked for when the pool changes."""
+
+    def setUp(self):
+        """Forget the shared pool and replace the workers."""
+        Completer.shared_pool = None
+        Completer.shared_pool_key = None
+        self.settings = FakeSettings(libclang_path=None,
+                                     libclang_worker_processes=1,
+                                     libclang_worker_python='python3',
+                                     max_completions_shown=0,
+                                     use_libclang_caching=True)
+        patchers = [
+            patch.object(proc_complete, 'WorkerPool',
+                         side_effect=lambda *args, **kwargs: MagicMock()),
+            patch.object(proc_complete.ClangUtils, 'find_libclang',
+                         return_value=('/lib', 'libclang.so')),
+            patch.object(proc_complete.ClangUtils,
+                         'get_cindex_module_for_version',
+                         return_value='clang.cindex50'),
+        ]
+        self.worker_pool, self.find_libclang, _ = [
+            patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, Completer, 'shared_pool', None)
+        self.addCleanup(setattr, Completer, 'shared_pool_key', None)
+
+    def test_find_libclang_once(self):
+        """Test that completers with the same settings share the pool."""
+        first = Completer(self.settings, None)
+        second = Completer(self.settings, None)
+        self.assertTrue(second.valid)
+        self.assertIs(first.pool, second.pool)
+        self.assertEqual(self.find_libclang.call_count, 1)
+        self.assertEqual(self.worker_pool.call_count, 1)
+
+    def test_new_pool_for_new_settings(self):
+        """Test that libclang is looked for again once settings change."""
+        first = Completer(self.settings, None)
+        self.settings.libclang_worker_processes = 2
+        second = Completer(self.settings, None)
+        self.assertIsNot(first.pool, second.pool)
+        first.pool.stop.assert_called_once_with()
+        self.assertEqual(self.find_libclang.call_count, 2)
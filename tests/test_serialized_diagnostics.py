@@ -0,0 +1,291 @@
+"""Test reading diagnostics serialized by clang."""
+import tempfile
+from os import path
+from unittest import TestCase
+
+from EasyClangComplete.plugin.completion import serialized_diagnostics
+
+SerializedDiagnostics = serialized_diagnostics.SerializedDiagnostics
+DiagnosticsFormatError = serialized_diagnostics.DiagnosticsFormatError
+
+FIXED = 1
+VBR = 2
+ARRAY = 3
+CHAR6 = 4
+BLOB = 5
+
+LOCATION = [(FIXED, 10), (FIXED, 32), (FIXED, 32), (FIXED, 32)]
+# Abbreviations clang defines in the BLOCKINFO block.
+VERSION_ABBREV = [(None, 1), (FIXED, 32)]
+DIAG_ABBREV = [(None, 2), (FIXED, 3)] + LOCATION + \
+    [(FIXED, 16), (FIXED, 10), (FIXED, 16), (BLOB, 0)]
+RANGE_ABBREV = [(None, 3)] + LOCATION + LOCATION
+FILENAME_ABBREV = [(None, 6), (FIXED, 10), (FIXED, 32), (FIXED, 32),
+                   (FIXED, 16), (BLOB, 0)]
+FIXIT_ABBREV = [(None, 7)] + LOCATION + LOCATION + [(FIXED, 16), (BLOB, 0)]
+# Abbreviation ids in the diagnostic block.
+DIAG_ID, RANGE_ID, FILENAME_ID, FIXIT_ID = 4, 5, 6, 7
+
+
+class BitstreamWriter:
+    """Write a bitstream the way clang serializes diagnostics."""
+
+    def __init__(self):
+        """Start a stream with the magic of serialized diagnostics."""
+        self.value = int.from_bytes(b"DIAG", 'little')
+        self.num_bits = 32
+        self.widths = [2]
+        self.length_positions = []
+
+    def emit(self, value, width):
+        """Write a fixed width value."""
+        self.value |= value << self.num_bits
+        self.num_bits += width
+
+    def emit_vbr(self, value, width):
+        """Write a variable width value."""
+        high_bit = 1 << (width - 1)
+        while value >= high_bit:
+            self.emit((value & (high_bit - 1)) | high_bit, width)
+            value >>= width - 1
+        self.emit(value, width)
+
+    def align_32(self):
+        """Skip to the next multiple of 32 bits."""
+        self.num_bits = (self.num_bits + 31) & ~31
+
+    def enter_block(self, block_id, width):
+        """Start a block."""
+        self.emit(1, self.widths[-1])
+        self.emit_vbr(block_id, 8)
+        self.emit_vbr(width, 4)
+        self.align_32()
+        self.length_positions.append(self.num_bits)
+        self.num_bits += 32
+        self.widths.append(width)
+
+    def exit_block(self):
+        """End a block and store its length."""
+        self.emit(0, self.widths.pop())
+        self.align_32()
+        position = self.length_positions.pop()
+        self.value |= ((self.num_bits - position - 32) // 32) << position
+
+    def define_abbrev(self, ops):
+        """Define an abbreviation."""
+        self.emit(2, self.widths[-1])
+        self.emit_vbr(len(ops), 5)
+        for encoding, value in ops:
+            if encoding is None:
+                self.emit(1, 1)
+                self.emit_vbr(value, 8)
+                continue
+            self.emit(0, 1)
+            self.emit(encoding, 3)
+            if encoding in (FIXED, VBR):
+                self.emit_vbr(value, 5)
+
+    def unabbrev_record(self, code, values):
+        """Write a record without abbreviation."""
+        self.emit(3, self.widths[-1])
+        self.emit_vbr(code, 6)
+        self.emit_vbr(len(values), 6)
+        for value in values:
+            self.emit_vbr(value, 6)
+
+    def record(self, abbrev_id, ops, values, blob=None):
+        """Write a record with an abbreviation."""
+        self.emit(abbrev_id, self.widths[-1])
+        values = list(values)
+        for encoding, width in ops:
+            if encoding is None:
+                continue
+            if encoding == FIXED:
+                self.emit(values.pop(0), width)
+            elif encoding == VBR:
+                self.emit_vbr(values.pop(0), width)
+            elif encoding == BLOB:
+                self.emit_vbr(len(blob), 6)
+                self.align_32()
+                for byte in blob:
+                    self.emit(byte, 8)
+                self.align_32()
+
+    def data(self):
+        """Get the written bytes."""
+        self.align_32()
+        return self.value.to_bytes(self.num_bits // 8, 'little')
+
+
+def location(file_id, row, col):
+    """Make the values of a location."""
+    return [file_id, row, col, 0]
+
+
+def write_file_name(writer, file_id, name):
+    """Write a FILENAME record."""
+    blob = name.encode('utf-8')
+    writer.record(FILENAME_ID, FILENAME_ABBREV,
+                  [file_id, 0, 0, len(blob)], blob)
+
+
+def write_diag(writer, level, loc, message):
+    """Write a DIAG record."""
+    blob = message.encode('utf-8')
+    writer.record(DIAG_ID, DIAG_ABBREV, [level] + loc + [0, 0, len(blob)],
+                  blob)
+
+
+def make_diagnostics():
+    """Serialize an error with a range, a fix-it and a note and a warning."""
+    writer = BitstreamWriter()
+    writer.enter_block(0, 2)
+    writer.unabbrev_record(1, [SerializedDiagnostics.BLOCK_META])
+    writer.define_abbrev(VERSION_ABBREV)
+    writer.unabbrev_record(1, [SerializedDiagnostics.BLOCK_DIAG])
+    for ops in [DIAG_ABBREV, RANGE_ABBREV, FILENAME_ABBREV, FIXIT_ABBREV]:
+        writer.define_abbrev(ops)
+    writer.exit_block()
+
+    writer.enter_block(SerializedDiagnostics.BLOCK_META, 3)
+    writer.record(4, VERSION_ABBREV, [2])
+    writer.exit_block()
+
+    writer.enter_block(SerializedDiagnostics.BLOCK_DIAG, 4)
+    write_file_name(writer, 1, '/src/main.cpp')
+    write_diag(writer, 3, location(1, 3, 9), "expected ';' after expression")
+    writer.record(RANGE_ID, RANGE_ABBREV,
+                  location(1, 3, 5) + location(1, 3, 9))
+    fixit = b';'
+    writer.record(FIXIT_ID, FIXIT_ABBREV,
+                  location(1, 3, 9) + location(1, 3, 9) + [len(fixit)],
+                  fixit)
+    # The first diagnostic in a header is only referenced in a note.
+    writer.enter_block(SerializedDiagnostics.BLOCK_DIAG, 4)
+    write_file_name(writer, 2, '/src/main.h')
+    write_diag(writer, 1, location(2, 1, 1), "declared here")
+    writer.exit_block()
+    # Clang writes flags without abbreviation.
+    writer.unabbrev_record(SerializedDiagnostics.RECORD_DIAG_FLAG,
+                           [1, 0])
+    writer.exit_block()
+
+    writer.enter_block(SerializedDiagnostics.BLOCK_DIAG, 4)
+    write_diag(writer, 2, location(2, 10, 2), "unused variable 'x'")
+    writer.exit_block()
+
+    writer.enter_block(SerializedDiagnostics.BLOCK_DIAG, 4)
+    write_diag(writer, 3, location(0, 0, 0), "no location")
+    writer.exit_block()
+    return writer.data()
+
+
+class TestSerializedDiagnostics(TestCase):
+    """Test decoding serialized diagnostics."""
+
+    def test_parse(self):
+        """Test reading errors, warnings, ranges and fix-its."""
+        errors = SerializedDiagnostics.parse(make_diagnostics())
+        self.assertEqual(len(errors), 2)
+        error, warning = errors
+        self.assertEqual(error['file'], '/src/main.cpp')
+        self.assertEqual((error['row'], error['col']), (2, 8))
+        self.assertEqual(error['error'], "expected ';' after expression")
+        self.assertEqual(error['severity'], 3)
+        self.assertEqual(error['ranges'], [
+            {'file': '/src/main.cpp', 'start': (2, 4), 'end': (2, 8)}])
+        self.assertEqual(error['fixits'], [
+            {'range': {'file': '/src/main.cpp',
+                       'start': (2, 8), 'end': (2, 8)},
+             'text': ';'}])
+        # The file of the note is known to later diagnostics.
+        self.assertEqual(warning['file'], '/src/main.h')
+        self.assertEqual((warning['row'], warning['col']), (9, 1))
+        self.assertEqual(warning['severity'], 2)
+        self.assertEqual(warning['ranges'], [])
+
+    def test_invalid_data(self):
+        """Test that invalid data are reported."""
+        with self.assertRaises(DiagnosticsFormatError):
+            SerializedDiagnostics.parse(b"BC\xc0\xde")
+        with self.assertRaises(DiagnosticsFormatError):
+            SerializedDiagnostics.parse(make_diagnostics()[:-12])
+
+    def test_read_file(self):
+        """Test reading diagnostics from a file."""
+        folder = tempfile.mkdtemp()
+        file_name = path.join(folder, 'main.cpp.dia')
+        self.assertIsNone(SerializedDiagnostics.read_file(file_name))
+        with open(file_name, 'wb') as dia_file:
+            dia_file.write(make_diagnostics())
+        self.assertEqual(len(SerializedDiagnostics.read_file(file_name)), 2)
+        with open(file_name, 'wb') as dia_file:
+            dia_file.write(b"DIAG\x01")
+        self.assertIsNone(SerializedDiagnostics.read_file(file_name))
+
+    def test_clang_output(self):
+        """Test decoding diagnostics written by clang.
+
+        The file was written by clang 22.1.8 with these arguments:
+            -fsyntax-only -std=c++11 -Wextra-semi
+            -serialize-diagnostics serialized_diagnostics.dia /src/main.cpp
+        from the following code:
+            struct A {
+              void f() {};
+            };
+            void foo(int a, int b);
+            void bar() { foo(1); }
+        It holds a warning with a flag, a range and a fix-it and an error
+        with a range and a note, along with category records.
+        """
+        file_name = path.join(path.dirname(__file__), 'test_files',
+                              'serialized_diagnostics.dia')
+        errors = SerializedDiagnostics.read_file(file_name)
+        self.assertEqual(len(errors), 2)
+        warning, error = errors
+        self.assertEqual(warning['file'], '/src/main.cpp')
+        self.assertEqual((warning['row'], warning['col']), (1, 13))
+        self.assertEqual(warning['severity'], 2)
+        self.assertEqual(warning['error'],
+                         "extra ';' after member function definition")
+        self.assertEqual(warning['ranges'], [
+            {'file': '/src/main.cpp', 'start': (1, 13), 'end': (1, 14)}])
+        self.assertEqual(warning['fixits'], [
+            {'range': {'file': '/src/main.cpp',
+                       'start': (1, 13), 'end': (1, 14)},
+             'text': ''}])
+        # The file name is only stored with the first diagnostic.
+        self.assertEqual(error['file'], '/src/main.cpp')
+        self.assertEqual((error['row'], error['col']), (4, 13))
+        self.assertEqual(error['severity'], 3)
+        self.assertEqual(error['error'],
+                         "no matching function for call to 'foo'")
+        self.assertEqual(error['ranges'], [
+            {'file': '/src/main.cpp', 'start': (4, 13), 'end': (4, 16)}])
+        self.assertEqual(error['fixits'], [])
+
+    def test_arrays(self):
+        """Test records with arrays of fixed width and char6 values."""
+        for element in [(FIXED, 7), (CHAR6, 0)]:
+            writer = BitstreamWriter()
+            writer.enter_block(SerializedDiagnostics.BLOCK_META, 3)
+            writer.define_abbrev([(None, 1), (FIXED, 4), (ARRAY, 0), element])
+            writer.emit(4, 3)
+            writer.emit(5, 4)
+            writer.emit_vbr(3, 6)
+            for value in [0, 1, 63 if element[0] == CHAR6 else 127]:
+                writer.emit(value, element[1] or 6)
+            writer.exit_block()
+            reader = serialized_diagnostics.BitstreamReader(writer.data(), 4)
+            self.assertEqual(reader.read(2), 1)
+            _, width = reader.enter_block()
+            self.assertEqual(reader.read(width), 2)
+            abbrevs = [reader.read_abbrev()]
+            code, values, blob = reader.read_record(reader.read(width),
+                                                    abbrevs)
+            self.assertEqual(code, 1)
+            if element[0] == CHAR6:
+                self.assertEqual(values, [5, ord('a'), ord('b'), ord('_')])
+            else:
+                self.assertEqual(values, [5, 0, 1, 127])
+            self.assertIsNone(blob)
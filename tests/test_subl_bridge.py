@@ -6,6 +6,7 @@ Attributes:
 """
 import imp
 from os import path
+from unittest.mock import patch
 
 from EasyClangComplete.plugin.settings import settings_manager
 from EasyClangComplete.plugin.utils.subl import subl_bridge
@@ -93,3 +94,19 @@ class test_tools_command(GuiTestWrapper):
 
         # Verify that we got the expected completions back.
         self.assertEqual(status, PosStatus.WRONG_TRIGGER)
+
+    def test_format_cut_completions(self):
+        """Test that cut completions are queried again while typing."""
+        completions = [['foo\tvoid foo()', 'foo()']]
+        self.assertEqual(
+            SublBridge.format_completions(completions, False), completions)
+        self.assertEqual(
+            SublBridge.format_completions(completions, True),
+            (completions, SublBridge.NO_DEFAULT_COMPLETIONS))
+        with patch.object(SublBridge, 'DYNAMIC_COMPLETIONS', 32):
+            self.assertEqual(
+                SublBridge.format_completions(completions, False, is_cut=True),
+                (completions, 32))
+            self.assertEqual(
+                SublBridge.format_completions(completions, True, is_cut=True),
+                (completions, SublBridge.NO_DEFAULT_COMPLETIONS | 32))
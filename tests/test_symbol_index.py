@@ -0,0 +1,161 @@
+"""Test the project-wide symbol index."""
+import shutil
+import tempfile
+from os import makedirs
+from os import path
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import sublime
+
+from EasyClangComplete.plugin.utils.index_location import IndexLocation
+from EasyClangComplete.plugin.utils.singleton import ThreadCache
+from EasyClangComplete.plugin.utils.singleton import ViewConfigCache
+from EasyClangComplete.plugin.utils.symbol_index import SymbolIndex
+from EasyClangComplete.plugin.view_config.view_config_manager import \
+    ViewConfigManager
+from EasyClangComplete.tests.fakes import FakeCompleter
+from EasyClangComplete.tests.fakes import FakeConfig
+from EasyClangComplete.tests.fakes import FakeSettings
+
+
+class TestSymbolIndex(TestCase):
+    """Test storing and looking up symbols."""
+
+    def setUp(self):
+        """Create source files and an empty index folder."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index_dir = path.join(self.tmp_dir, "index")
+        self.header = self.__create_file("foo.h")
+        self.source = self.__create_file("foo.cpp")
+
+    def tearDown(self):
+        """Remove all temporary files."""
+        shutil.rmtree(self.tmp_dir)
+
+    def __create_file(self, name):
+        file_name = path.join(self.tmp_dir, name)
+        with open(file_name, 'w') as new_file:
+            new_file.write("// " + name)
+        return file_name
+
+    def __create_index(self):
+        if not path.exists(self.index_dir):
+            makedirs(self.index_dir)
+        return SymbolIndex(self.index_dir)
+
+    def test_prefers_definition(self):
+        """Test that a definition in another file wins over a declaration."""
+        index = self.__create_index()
+        index.update_file(self.header, [["c:@F@foo#", "foo", False, 1, 6]])
+        location = index.find("c:@F@foo#")
+        self.assertEqual(location.file.name, self.header)
+        index.update_file(self.source, [["c:@F@foo#", "foo", True, 3, 6]])
+        location = index.find("c:@F@foo#")
+        self.assertEqual(location.file.name, self.source)
+        self.assertEqual((location.line, location.column), (3, 6))
+        self.assertIsNone(index.find("c:@F@bar#"))
+
+    def test_find_definition(self):
+        """Test that only definitions are found."""
+        index = self.__create_index()
+        index.update_file(self.header, [["c:@F@foo#", "foo", False, 1, 6]])
+        self.assertIsNone(index.find_definition("c:@F@foo#"))
+        index.update_file(self.source, [["c:@F@foo#", "foo", True, 3, 6]])
+        self.assertEqual(index.find_definition("c:@F@foo#").line, 3)
+
+    def test_update_replaces_symbols(self):
+        """Test that indexing a file again forgets its old symbols."""
+        index = self.__create_index()
+        index.update_file(self.source, [["c:@F@foo#", "foo", True, 3, 6]])
+        index.update_file(self.source, [["c:@F@bar#", "bar", True, 3, 6]])
+        self.assertIsNone(index.find("c:@F@foo#"))
+        self.assertIsNone(index.find_by_spelling("foo"))
+        self.assertEqual(index.find_by_spelling("bar").file.name,
+                         self.source)
+        index.remove_file(self.source)
+        self.assertIsNone(index.find("c:@F@bar#"))
+        self.assertFalse(index.is_up_to_date(self.source))
+
+    def test_persistent(self):
+        """Test that a new index reads the symbols stored on disk."""
+        index = self.__create_index()
+        index.update_file(self.source, [["c:@F@foo#", "foo", True, 3, 6]])
+        self.assertTrue(index.is_up_to_date(self.source))
+        new_index = self.__create_index()
+        self.assertTrue(new_index.is_up_to_date(self.source))
+        self.assertEqual(new_index.find("c:@F@foo#").line, 3)
+
+    def test_ambiguous_spelling(self):
+        """Test that ambiguous names are not resolved."""
+        index = self.__create_index()
+        index.update_file(self.source, [
+            ["c:@F@foo#I#", "foo", True, 3, 6],
+            ["c:@F@foo#d#", "foo", True, 4, 6]])
+        self.assertIsNone(index.find_by_spelling("foo"))
+
+
+class TestDeclarationLookup(TestCase):
+    """Test going to a declaration with the symbol index."""
+
+    V_ID = 42
+
+    def setUp(self):
+        """Create a manager with a view of a source file."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = path.join(self.tmp_dir, "main.cpp")
+        self.definition_file = path.join(self.tmp_dir, "foo.cpp")
+        for file_name in [self.source, self.definition_file]:
+            with open(file_name, 'w') as new_file:
+                new_file.write("\n")
+        self.view = MagicMock()
+        self.view.buffer_id.return_value = TestDeclarationLookup.V_ID
+        self.view.file_name.return_value = self.source
+        self.view.is_scratch.return_value = False
+        self.view.sel.return_value = [sublime.Region(0, 0)]
+        self.view.rowcol.return_value = (0, 0)
+        self.manager = ViewConfigManager()
+        if ViewConfigManager.TAG in ThreadCache():
+            ThreadCache()[ViewConfigManager.TAG].cancel()
+        self.config = FakeConfig()
+        ViewConfigCache()[TestDeclarationLookup.V_ID] = self.config
+
+    def tearDown(self):
+        """Remove the view config."""
+        self.manager.clear_for_view(TestDeclarationLookup.V_ID)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_index_per_project(self):
+        """Test that every project folder has an index of its own."""
+        settings_a = FakeSettings(project_folder="/project_a")
+        settings_b = FakeSettings(project_folder="/project_b")
+        first = self.manager.symbol_index_for(settings_a)
+        second = self.manager.symbol_index_for(settings_b)
+        self.assertIsNot(first, second)
+        self.assertNotEqual(first.folder, second.folder)
+        self.assertIs(first, self.manager.symbol_index_for(settings_a))
+
+    def test_unit_definition_first(self):
+        """Test that the index is used if the unit has no definition."""
+        settings = FakeSettings(project_folder=self.tmp_dir)
+        symbol_index = self.manager.symbol_index_for(settings)
+        symbol_index.update_file(self.definition_file,
+                                 [["c:@F@foo#", "foo", True, 3, 6]])
+        declaration = IndexLocation(self.source, 1, 6)
+        unit_definition = IndexLocation(self.source, 5, 6)
+
+        self.config.completer = FakeCompleter(declaration=declaration,
+                                              definition=unit_definition)
+        location = self.manager.trigger_get_declaration_location(
+            self.view, settings)
+        self.assertIs(location, unit_definition)
+
+        self.config.completer = FakeCompleter(declaration=declaration)
+        location = self.manager.trigger_get_declaration_location(
+            self.view, settings)
+        self.assertEqual(location.file.name, self.definition_file)
+
+        symbol_index.remove_file(self.definition_file)
+        location = self.manager.trigger_get_declaration_location(
+            self.view, settings)
+        self.assertIs(location, declaration)
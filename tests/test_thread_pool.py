@@ -7,6 +7,7 @@ import EasyClangComplete.plugin.utils.thread_job
 
 ThreadPool = EasyClangComplete.plugin.utils.thread_pool.ThreadPool
 ThreadJob = EasyClangComplete.plugin.utils.thread_job.ThreadJob
+JobToken = EasyClangComplete.plugin.utils.thread_job.JobToken
 
 
 def run_me(result):
@@ -15,6 +16,14 @@ def run_me(result):
     return result
 
 
+def run_in_phases(result):
+    """Run many short phases, stopping if the job gets outdated."""
+    for phase in range(20):
+        JobToken.check("phase {}".format(phase))
+        time.sleep(0.05)
+    return result
+
+
 TIMEOUT = 5.0
 
 
@@ -89,3 +98,164 @@ class TestThreadPool(TestCase):
         self.assertEqual(test_container.futures[1].result(), "job_1")
         self.assertFalse(test_container.futures[2].cancelled())
         self.assertEqual(test_container.futures[2].result(), "job_3")
+
+    def test_jobs_in_other_lanes_not_overridden(self):
+        """Test that jobs only override jobs from the same lane."""
+        test_container = TestContainer()
+        job_1 = ThreadJob(name="test_job",
+                          function=run_me,
+                          callback=test_container.on_job_done,
+                          args=["job_1"],
+                          lane=1)
+        job_2 = ThreadJob(name="test_job",
+                          function=run_me,
+                          callback=test_container.on_job_done,
+                          args=["job_2"],
+                          lane=1)
+        job_3 = ThreadJob(name="test_job",
+                          function=run_me,
+                          callback=test_container.on_job_done,
+                          args=["job_3"],
+                          lane=2)
+        pool = ThreadPool()
+        pool.new_job(job_1)
+        pool.new_job(job_2)
+        pool.new_job(job_3)
+        test_container.wait_until_got_number_of_callbacks(3)
+        self.assertEqual(len(test_container.futures), 3)
+        for future in test_container.futures:
+            self.assertFalse(future.cancelled())
+        results = [future.result() for future in test_container.futures]
+        self.assertEqual(sorted(results), ["job_1", "job_2", "job_3"])
+
+    def test_lanes_run_in_parallel(self):
+        """Test that jobs from different lanes run in parallel."""
+        test_container = TestContainer()
+        pool = ThreadPool(max_workers=3)
+        start = time.time()
+        for lane in range(3):
+            pool.new_job(ThreadJob(name="test_job",
+                                   function=run_me,
+                                   callback=test_container.on_job_done,
+                                   args=[lane],
+                                   lane=lane))
+        test_container.wait_until_got_number_of_callbacks(3)
+        self.assertEqual(len(test_container.futures), 3)
+        # Three jobs of 0.2 seconds each would need 0.6 seconds if run one
+        # after another.
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_single_lane_is_sequential(self):
+        """Test that jobs from the same lane never run in parallel."""
+        test_container = TestContainer()
+        pool = ThreadPool(max_workers=3)
+        start = time.time()
+        for name in ["update", "info"]:
+            pool.new_job(ThreadJob(name=name,
+                                   function=run_me,
+                                   callback=test_container.on_job_done,
+                                   args=[name],
+                                   lane=1))
+        test_container.wait_until_got_number_of_callbacks(2)
+        self.assertEqual(len(test_container.futures), 2)
+        self.assertGreaterEqual(time.time() - start, 0.4)
+        self.assertEqual(test_container.futures[0].result(), "update")
+        self.assertEqual(test_container.futures[1].result(), "info")
+
+    def test_resize(self):
+        """Test changing the number of workers."""
+        pool = ThreadPool()
+        self.assertEqual(pool.max_workers, 1)
+        pool.max_workers = 4
+        self.assertEqual(pool.max_workers, 4)
+        test_container = TestContainer()
+        pool.new_job(ThreadJob(name="test_job",
+                               function=run_me,
+                               callback=test_container.on_job_done,
+                               args=[True]))
+        test_container.wait_until_got_number_of_callbacks(1)
+        self.assertTrue(test_container.futures[0].result())
+
+    def test_background_jobs_wait(self):
+        """Test that background jobs only run when nothing else runs."""
+        test_container = TestContainer()
+        pool = ThreadPool(max_workers=3)
+        for lane in range(2):
+            pool.new_job(ThreadJob(name=ThreadJob.PREFETCH_TAG,
+                                   function=run_me,
+                                   callback=test_container.on_job_done,
+                                   args=["prefetch_{}".format(lane)],
+                                   lane=lane))
+        pool.new_job(ThreadJob(name="update",
+                               function=run_me,
+                               callback=test_container.on_job_done,
+                               args=["update"],
+                               lane=2))
+        test_container.wait_until_got_number_of_callbacks(3)
+        results = [future.result() for future in test_container.futures]
+        # The first background job might start before the update arrives,
+        # but the second one can only start after the first one is done.
+        self.assertEqual(results[-1], "prefetch_1")
+
+    def test_update_cancels_background_job(self):
+        """Test that an update of a view cancels its background job."""
+        test_container = TestContainer()
+        pool = ThreadPool(max_workers=2)
+        pool.new_job(ThreadJob(name="update",
+                               function=run_me,
+                               callback=test_container.on_job_done,
+                               args=["busy"],
+                               lane=1))
+        pool.new_job(ThreadJob(name=ThreadJob.PREFETCH_TAG,
+                               function=run_me,
+                               callback=test_container.on_job_done,
+                               args=["prefetch"],
+                               lane=2))
+        pool.new_job(ThreadJob(name=ThreadJob.UPDATE_TAG,
+                               function=run_me,
+                               callback=test_container.on_job_done,
+                               args=["update"],
+                               lane=2))
+        test_container.wait_until_got_number_of_callbacks(3)
+        self.assertTrue(test_container.futures[0].cancelled())
+        results = [future.result() for future in test_container.futures[1:]]
+        self.assertEqual(sorted(results), ["busy", "update"])
+
+    def test_running_job_stops_when_overridden(self):
+        """Test that an overridden running job stops at its next check."""
+        test_container = TestContainer()
+        pool = ThreadPool()
+        start = time.time()
+        job_1 = ThreadJob(name="test_job",
+                          function=run_in_phases,
+                          callback=test_container.on_job_done,
+                          args=["job_1"])
+        job_2 = ThreadJob(name="test_job",
+                          function=run_me,
+                          callback=test_container.on_job_done,
+                          args=["job_2"])
+        pool.new_job(job_1)
+        time.sleep(0.1)
+        pool.new_job(job_2)
+        test_container.wait_until_got_number_of_callbacks(2)
+        self.assertEqual(len(test_container.futures), 2)
+        # The stopped job is not cancelled but has no result.
+        self.assertFalse(test_container.futures[0].cancelled())
+        self.assertIsNone(test_container.futures[0].result())
+        self.assertEqual(test_container.futures[1].result(), "job_2")
+        # Running all the phases of job_1 would take a second.
+        self.assertLess(time.time() - start, 0.9)
+        self.assertLess(job_1.token.generation, job_2.token.generation)
+        stats = pool.cancellation_stats
+        self.assertEqual(stats['stopped_while_running'], 1)
+        self.assertEqual(sum(stats['skipped_phases'].values()), 1)
+        self.assertGreater(stats['seconds_before_stop'], 0.0)
+        report = pool.cancellation_report()
+        self.assertIn("jobs stopped while running:  1", report)
+        self.assertIn("stopped before '", report)
+
+    def test_check_outside_of_job(self):
+        """Test that checking a token outside of a pool does nothing."""
+        self.assertIsNone(JobToken.current())
+        JobToken.check("phase")
+        self.assertEqual(run_in_phases("done"), "done")
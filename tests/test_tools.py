@@ -53,3 +53,70 @@ class test_tools(TestCase):
         cmd = 'rm {}'.format(temp_file_path)
         Tools.run_command(cmd, shell=True)
         self.assertFalse(path.exists(temp_file_path))
+
+    def test_run_command_timeout(self):
+        """Test that a command and its children are stopped in time."""
+        import platform
+        import time
+        if platform.system() == 'Windows':
+            return
+        start = time.time()
+        # The output only ends once the child of the shell is killed too.
+        output = Tools.run_command('sleep 30 & sleep 30', shell=True,
+                                   default='stopped', timeout=0.5)
+        self.assertEqual(output, 'stopped')
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(Tools.run_command(['echo', 'done'], timeout=10),
+                         'done\n')
+
+    def test_run_command_cancelled(self):
+        """Test that a command is stopped once its job is cancelled."""
+        import platform
+        import threading
+        import time
+        from EasyClangComplete.plugin.utils.thread_job import JobToken
+        from EasyClangComplete.plugin.utils.thread_job import \
+            JobCancelledError
+        if platform.system() == 'Windows':
+            return
+        token = JobToken()
+        results = []
+
+        def run():
+            token.activate()
+            try:
+                Tools.run_command(['sleep', '30'], cancellable=True)
+                results.append('finished')
+            except JobCancelledError:
+                results.append('cancelled')
+            finally:
+                JobToken.deactivate()
+        thread = threading.Thread(target=run)
+        start = time.time()
+        thread.start()
+        time.sleep(0.2)
+        token.cancel()
+        thread.join(10)
+        self.assertEqual(results, ['cancelled'])
+        self.assertLess(time.time() - start, 10)
+
+    def test_iter_command_lines_cancelled(self):
+        """Test that reading the output stops once the job is cancelled."""
+        import platform
+        from EasyClangComplete.plugin.utils.thread_job import JobToken
+        from EasyClangComplete.plugin.utils.thread_job import \
+            JobCancelledError
+        if platform.system() == 'Windows':
+            return
+        token = JobToken()
+        token.activate()
+        try:
+            lines = Tools.iter_command_lines(
+                ['sh', '-c', 'echo first; sleep 30; echo second'],
+                cancellable=True)
+            self.assertEqual(next(lines), 'first\n')
+            token.cancel()
+            with self.assertRaises(JobCancelledError):
+                next(lines)
+        finally:
+            JobToken.deactivate()
@@ -110,14 +110,30 @@ class TestViewConfig(GuiTestWrapper):
         settings = manager.settings_for_view(self.view)
         view_config = ViewConfig(self.view, settings)
         flags = view_config.completer.clang_flags
-        is_update_needed = view_config.needs_update(view_config.completer,
-                                                    flags)
+        kind = view_config.fingerprint[0]
+        is_update_needed = view_config.needs_update(
+            ViewConfig.make_fingerprint(kind, flags))
         self.assertFalse(is_update_needed)
-        flags = []
         is_update_needed = view_config.needs_update(
-            view_config.completer, flags)
+            ViewConfig.make_fingerprint(kind, []))
+        self.assertTrue(is_update_needed)
+        is_update_needed = view_config.needs_update(
+            ViewConfig.make_fingerprint("other", flags))
         self.assertTrue(is_update_needed)
 
+    def test_update_keeps_completer(self):
+        """Test that an unchanged config does not create a new completer."""
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        self.set_up_view(file_name)
+        manager = SettingsManager()
+        settings = manager.settings_for_view(self.view)
+        view_config = ViewConfig(self.view, settings)
+        completer = view_config.completer
+        view_config.update_if_needed(self.view, settings)
+        self.assertIs(view_config.completer, completer)
+
     def test_needs_update_on_file_change(self):
         """Test view config changing when file changed."""
         file_name = path.join(path.dirname(__file__),
@@ -211,3 +227,24 @@ class TestViewConfigManager(GuiTestWrapper):
         view_config = config_manager.get_from_cache(self.view)
         self.assertIsNone(view_config)
         ViewConfigManager._ViewConfigManager__timer_period = initial_period
+
+    def test_pinned_config_not_removed(self):
+        """Test that a pinned config is not removed on timer."""
+        import time
+        file_name = path.join(path.dirname(__file__),
+                              'test_files',
+                              'test.cpp')
+        self.set_up_view(file_name)
+        manager = SettingsManager()
+        config_manager = ViewConfigManager(timer_period=1)
+        settings = manager.settings_for_view(self.view)
+        settings.max_cache_age = 2  # seconds
+        view_config = config_manager.load_for_view(self.view, settings)
+        self.assertIsNotNone(view_config)
+        config_manager.set_pinned(self.view.buffer_id(), True)
+        self.assertTrue(config_manager.is_pinned(self.view.buffer_id()))
+        time.sleep(3)
+        view_config = config_manager.get_from_cache(self.view)
+        self.assertIsNotNone(view_config)
+        config_manager.clear_for_view(self.view.buffer_id())
+        self.assertFalse(config_manager.is_pinned(self.view.buffer_id()))
@@ -0,0 +1,170 @@
+"""Test removing configs of the view config manager without Sublime Text."""
+from threading import Event
+from threading import Thread
+from unittest import TestCase
+from unittest.mock import patch
+
+from EasyClangComplete.plugin.utils.singleton import ViewConfigCache
+from EasyClangComplete.plugin.view_config import view_config_manager
+from EasyClangComplete.tests.fakes import FakeCompleter
+from EasyClangComplete.tests.fakes import FakeConfig
+from EasyClangComplete.tests.fakes import FakeSettings
+
+ViewConfigManager = view_config_manager.ViewConfigManager
+
+MB = 1024 * 1024
+
+
+class FakeView:
+    """A view that is modified or not."""
+
+    def __init__(self, v_id, modified):
+        """Create a view with an id."""
+        self.v_id = v_id
+        self.modified = modified
+
+    def buffer_id(self):
+        """Get the id of the view."""
+        return self.v_id
+
+    def file_name(self):
+        """Get the file of the view."""
+        return '/tmp/test_{}.cpp'.format(self.v_id)
+
+
+class TestMemoryBudget(TestCase):
+    """Test removing the least recently used configs over memory budget."""
+
+    def setUp(self):
+        """Create a manager without a running timer."""
+        self.manager = ViewConfigManager()
+        # Other tests reload the singleton module, so the thread cache is
+        # looked up where the manager looks it up.
+        timer_cache = view_config_manager.ThreadCache()
+        if ViewConfigManager.TAG in timer_cache:
+            timer_cache[ViewConfigManager.TAG].cancel()
+
+    def tearDown(self):
+        """Remove all the configs."""
+        ViewConfigCache().clear()
+
+    def test_remove_least_recently_used(self):
+        """Test that the oldest configs go first, unless kept."""
+        settings = FakeSettings(max_cache_memory_mb=250)
+        ages = {1: 30, 2: 20, 3: 10, 4: 40}
+        configs = {v_id: self.__load(v_id, settings, size=100 * MB)
+                   for v_id in ages}
+        for v_id, age in ages.items():
+            configs[v_id].age = age
+        self.manager.set_pinned(4, True)
+        with patch.object(view_config_manager.SublBridge, 'active_view_id',
+                          return_value=2):
+            self.__remove_configs()
+        self.assertEqual(sorted(ViewConfigCache().keys()), [2, 4])
+        # Only the sizes measured after reparsing are used.
+        for config in configs.values():
+            self.assertEqual(config.completer.measured, 1)
+        self.assertTrue(configs[1].completer.disposed)
+        self.assertTrue(configs[3].completer.disposed)
+        self.assertFalse(configs[2].completer.disposed)
+        self.assertFalse(configs[4].completer.disposed)
+
+    def test_no_budget(self):
+        """Test that nothing is removed without a budget."""
+        self.__load(1, FakeSettings(max_cache_memory_mb=0), size=100 * MB)
+        with patch.object(view_config_manager.SublBridge, 'active_view_id',
+                          return_value=2):
+            self.__remove_configs()
+        self.assertIn(1, ViewConfigCache())
+
+    def test_size_measured_after_reparse(self):
+        """Test that units are only measured if they were reparsed."""
+        settings = FakeSettings(max_cache_memory_mb=150)
+        config = self.__load(1, settings, size=100 * MB)
+        config.age = 30
+        self.__load(2, settings, size=100 * MB).age = 10
+        self.assertEqual(config.completer.measured, 1)
+        config.completer.size = 10 * MB
+        with patch.object(view_config_manager.SublBridge, 'is_valid_view',
+                          return_value=True):
+            self.manager.load_for_view(FakeView(1, modified=False), settings)
+            self.assertEqual(config.completer.measured, 1)
+            self.manager.load_for_view(FakeView(1, modified=True), settings)
+            self.assertEqual(config.completer.measured, 2)
+        # Both configs fit once the smaller unit is measured.
+        with patch.object(view_config_manager.SublBridge, 'active_view_id',
+                          return_value=0):
+            self.__remove_configs()
+        self.assertIn(1, ViewConfigCache())
+        self.assertIn(2, ViewConfigCache())
+
+    def __load(self, v_id, settings, size):
+        """Load a new config for a view with a unit of the given size.
+
+        Returns:
+            FakeConfig: config stored for the view.
+        """
+        def make_config(view, settings, owner):
+            config = FakeConfig(FakeCompleter(size=size))
+            config.file_name = view.file_name()
+            return config
+        with patch.object(view_config_manager.SublBridge, 'is_valid_view',
+                          return_value=True), \
+                patch.object(view_config_manager, 'ViewConfig', make_config):
+            self.manager.load_for_view(FakeView(v_id, modified=False),
+                                       settings)
+        return ViewConfigCache()[v_id]
+
+    @staticmethod
+    def __remove_configs():
+        """Run what the timer of the manager runs and stop it again."""
+        timer_cache = view_config_manager.ThreadCache()
+        timer_cache[ViewConfigManager.TAG].function()
+        timer_cache[ViewConfigManager.TAG].cancel()
+
+    def test_include_map_updated_after_reparse(self):
+        """Test that loading an unchanged view keeps the include map."""
+        config = FakeConfig(FakeCompleter(size=100), age=30)
+        ViewConfigCache()[1] = config
+        include_map = self.manager.include_map
+        with patch.object(view_config_manager.SublBridge, 'is_valid_view',
+                          return_value=True):
+            self.manager.load_for_view(FakeView(1, modified=False),
+                                       FakeSettings())
+            self.assertEqual(config.completer.listed_includes, 0)
+            self.assertEqual(include_map.owners_of('/tmp/test.h'), [])
+            self.manager.load_for_view(FakeView(1, modified=True),
+                                       FakeSettings())
+            self.assertEqual(config.completer.listed_includes, 1)
+            self.assertEqual(include_map.owners_of('/tmp/test.h'),
+                             ['/tmp/test_1.cpp'])
+
+    def test_view_lock_kept_while_clearing(self):
+        """Test that a view cannot be loaded while its config is cleared."""
+        config = FakeConfig(FakeCompleter(size=100), age=30)
+        disposing = Event()
+        disposed = Event()
+
+        def dispose():
+            disposing.set()
+            disposed.wait()
+        config.completer.dispose = dispose
+        ViewConfigCache()[1] = config
+        clearing = Thread(target=self.manager.clear_for_view, args=(1,))
+        loading = Thread(target=self.manager.load_for_view,
+                         args=(FakeView(1, modified=False), FakeSettings()))
+        with patch.object(view_config_manager.SublBridge, 'is_valid_view',
+                          return_value=True), \
+                patch.object(view_config_manager, 'ViewConfig',
+                             lambda *args: FakeConfig(FakeCompleter())):
+            clearing.start()
+            self.assertTrue(disposing.wait(timeout=5))
+            loading.start()
+            loading.join(timeout=0.2)
+            loaded_while_clearing = not loading.is_alive()
+            disposed.set()
+            clearing.join(timeout=5)
+            loading.join(timeout=5)
+        self.assertFalse(loaded_while_clearing)
+        self.assertFalse(loading.is_alive())
+        self.assertIsNot(ViewConfigCache()[1], config)
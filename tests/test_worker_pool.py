@@ -0,0 +1,100 @@
+"""Test pool of libclang worker processes."""
+import os
+import signal
+import shutil
+import time
+from threading import Timer
+from unittest import TestCase
+from unittest import skipIf
+
+import EasyClangComplete.plugin.completion.worker_pool
+from EasyClangComplete.plugin.utils.thread_job import JobCancelledError
+from EasyClangComplete.plugin.utils.thread_job import JobToken
+
+worker_pool = EasyClangComplete.plugin.completion.worker_pool
+WorkerPool = worker_pool.WorkerPool
+WorkerCrashedError = worker_pool.WorkerCrashedError
+WorkerRequestError = worker_pool.WorkerRequestError
+
+PYTHON_BINARY = shutil.which("python3")
+
+
+@skipIf(not PYTHON_BINARY, "no python3 interpreter to run the workers")
+class TestWorkerPool(TestCase):
+    """Test the worker pool. Pinging does not need libclang."""
+
+    def setUp(self):
+        """Create a pool with two workers."""
+        self.pool = WorkerPool(PYTHON_BINARY, 2, ["cindex50"])
+
+    def tearDown(self):
+        """Stop the workers."""
+        self.pool.stop()
+
+    def test_ping(self):
+        """Test that a worker answers the requests."""
+        result = self.pool.request(0, "ping")
+        self.assertEqual(result['pid'], self.pool.worker_for(0).pid)
+
+    def test_sharding(self):
+        """Test that views are spread between the workers."""
+        self.assertIs(self.pool.worker_for(0), self.pool.worker_for(2))
+        self.assertIsNot(self.pool.worker_for(0), self.pool.worker_for(1))
+        pid_0 = self.pool.request(0, "ping")['pid']
+        pid_1 = self.pool.request(1, "ping")['pid']
+        self.assertNotEqual(pid_0, pid_1)
+
+    def test_unknown_command(self):
+        """Test that a failed request does not kill the worker."""
+        pid = self.pool.request(0, "ping")['pid']
+        self.assertRaises(WorkerRequestError, self.pool.request, 0, "foo")
+        self.assertEqual(self.pool.request(0, "ping")['pid'], pid)
+
+    def test_crash_is_isolated(self):
+        """Test that a crashed worker is restarted and others keep running."""
+        crashed_pid = self.pool.request(0, "ping")['pid']
+        other_pid = self.pool.request(1, "ping")['pid']
+        os.kill(crashed_pid, signal.SIGTERM)
+        while self.pool.worker_for(0).pid:
+            time.sleep(0.05)
+        try:
+            new_pid = self.pool.request(0, "ping")['pid']
+        except WorkerCrashedError:
+            new_pid = self.pool.request(0, "ping")['pid']
+        self.assertNotEqual(new_pid, crashed_pid)
+        self.assertEqual(self.pool.request(1, "ping")['pid'], other_pid)
+
+    def test_memory_without_unit(self):
+        """Test that a view without a unit in the worker uses no memory."""
+        self.assertEqual(self.pool.request(0, "memory", v_id=0), 0)
+
+
+@skipIf(not PYTHON_BINARY, "no python3 interpreter to run the workers")
+class TestHungWorker(TestCase):
+    """Test that a worker that never answers does not block forever."""
+
+    def setUp(self):
+        """Create a worker that hangs instead of answering."""
+        self.worker = worker_pool.Worker(
+            [PYTHON_BINARY, "-c", "import time; time.sleep(60)"],
+            timeout=0.5)
+
+    def tearDown(self):
+        """Stop the worker."""
+        self.worker.stop()
+
+    def test_timeout(self):
+        """Test that a hung worker is stopped after the timeout."""
+        self.assertRaises(WorkerCrashedError, self.worker.request, "ping")
+        self.assertIsNone(self.worker.pid)
+
+    def test_cancelled_job(self):
+        """Test that a cancelled job stops waiting for the worker."""
+        token = JobToken()
+        token.activate()
+        Timer(0.1, token.cancel).start()
+        try:
+            self.assertRaises(JobCancelledError, self.worker.request, "ping")
+        finally:
+            JobToken.deactivate()
+        self.assertIsNone(self.worker.pid)